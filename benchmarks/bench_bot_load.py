@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест бота на поддельном Bot API.
+
+Поднимает FakeBotAPI (benchmarks/fake_bot_api.py) и настоящий
+диспетчер из bot.py в режиме long polling. N пользователей параллельно
+отправляют документы и нажимают кнопки convert:, а тест измеряет
+пропускную способность (обновлений в секунду), время до результата
+(от отправки документа до sendDocument) и долю ошибок.
+
+Без Calibre используйте --stub-delay: конвертер планировщика заменяется
+заглушкой с заданной длительностью.
+
+Запуск:
+    python benchmarks/bench_bot_load.py --users 50 --jobs 4 --stub-delay 0.5
+    python benchmarks/bench_bot_load.py --users 10 --latency 0.05,0.2 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_bot_api import FAKE_TOKEN, FakeBotAPI
+
+# bot.py читает конфигурацию при импорте
+os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+import bot as bot_module
+from benchmarks.corpus import generate_book
+from benchmarks.stub_converter import StubConverter
+from config import SEND_CHAT_BURST, SEND_CHAT_RATE, SEND_GLOBAL_RATE
+from services import Services, create_services
+from utils.send_queue import OutgoingScheduler
+
+
+class BotUnderTest:
+    """Настоящий бот (сессия, очередь исходящих, диспетчер) на поддельном API."""
+
+    def __init__(self, api: FakeBotAPI, stub: Optional[StubConverter] = None):
+        """
+        Args:
+            api: Запущенный поддельный API
+            stub: Конвертер-заглушка вместо BookConverter (None - настоящий конвертер)
+        """
+        self.api = api
+        self.stub = stub
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+        self.outgoing: Optional[OutgoingScheduler] = None
+        self.services: Services = create_services()
+        self._polling: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.stub is not None:
+            self.services.scheduler.converter = self.stub
+
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.api.url))
+        self.bot = Bot(FAKE_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        self.outgoing = OutgoingScheduler(
+            global_rate=SEND_GLOBAL_RATE,
+            chat_rate=SEND_CHAT_RATE,
+            chat_burst=SEND_CHAT_BURST
+        )
+        self.bot.session.middleware(self.outgoing)
+        self.dp = bot_module.create_dispatcher(self.services)
+        self._polling = asyncio.create_task(
+            self.dp.start_polling(self.bot, handle_signals=False, polling_timeout=1)
+        )
+
+    async def stop(self) -> None:
+        # Обработчики дописывают состояние после отправки результата: ждем их,
+        # иначе остановка polling закроет хранилище FSM посреди записи
+        pending = getattr(self.dp, "_handle_update_tasks", set())
+        if pending:
+            await asyncio.wait(list(pending), timeout=30)
+        if self._polling is not None:
+            await self.dp.stop_polling()
+            await self._polling
+        await self.outgoing.close()
+        await self.bot.session.close()
+        self.services.close()
+
+
+async def _next_event(inbox: asyncio.Queue, deadline: float):
+    return await asyncio.wait_for(inbox.get(), max(0.0, deadline - time.monotonic()))
+
+
+def _has_format_keyboard(message: dict) -> bool:
+    rows = message.get("reply_markup", {}).get("inline_keyboard", [])
+    return any(button.get("callback_data", "").startswith("convert:") for row in rows for button in row)
+
+
+async def run_job(
+    api: FakeBotAPI, chat_id: int, document: dict, target: str, timeout: float, decision_delay: float = 0.0
+) -> Tuple[bool, float, str]:
+    """
+    Один пользовательский сценарий: документ → выбор формата → результат.
+
+    Args:
+        decision_delay: Пауза пользователя перед нажатием кнопки формата
+
+    Returns:
+        tuple: (успех, время до результата в секундах, причина неудачи)
+    """
+    inbox = api.inbox(chat_id)
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    api.push_document(chat_id, document)
+    try:
+        while True:
+            method, message = await _next_event(inbox, deadline)
+            if method == "editMessageText" and _has_format_keyboard(message):
+                break
+            if message.get("text", "").startswith("❌"):
+                return False, time.perf_counter() - started, "validation"
+
+        if decision_delay > 0:
+            await asyncio.sleep(decision_delay)
+        api.push_callback(chat_id, message, f"convert:{target}")
+        while True:
+            method, result = await _next_event(inbox, deadline)
+            if method == "sendDocument":
+                return True, time.perf_counter() - started, ""
+            if method == "editMessageText" and result.get("text", "").startswith("❌"):
+                return False, time.perf_counter() - started, "conversion"
+    except asyncio.TimeoutError:
+        return False, time.perf_counter() - started, "timeout"
+
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль по отсортированной выборке (0, если выборка пуста)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20, help="одновременных пользователей")
+    parser.add_argument("--jobs", type=int, default=3, help="документов на пользователя")
+    parser.add_argument("--format", default="epub", help="формат отправляемых книг (см. corpus.py)")
+    parser.add_argument("--size", type=int, default=100_000, help="размер книги в байтах")
+    parser.add_argument("--target", default="txt", help="целевой формат")
+    parser.add_argument("--latency", default="0.02,0.08", help="задержка ответа API: мин,макс в секундах")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--stub-delay", type=float, default=None,
+                        help="заменить конвертер заглушкой с этой длительностью (секунд)")
+    parser.add_argument("--stub-failures", type=float, default=0.0, help="доля неудач заглушки")
+    parser.add_argument("--timeout", type=float, default=600, help="таймаут одного сценария")
+    parser.add_argument("--json", dest="json_path", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    low, high = (float(value) for value in args.latency.split(","))
+    api = FakeBotAPI(latency=(low, high), rate_limit_ratio=args.rate_limit)
+    await api.start()
+
+    book = generate_book(args.format, args.size, Path(tempfile.gettempdir()) / "book_converter_corpus")
+    data = book.read_bytes()
+
+    stub = StubConverter(args.stub_delay, args.stub_failures) if args.stub_delay is not None else None
+    under_test = BotUnderTest(api, stub)
+    await under_test.start()
+
+    async def user(index: int):
+        chat_id = 100_000 + index
+        results = []
+        for job in range(args.jobs):
+            document = api.add_file(data, f"book_{index}_{job}.{book.suffix.lstrip('.')}")
+            results.append(await run_job(api, chat_id, document, args.target, args.timeout))
+        return results
+
+    print(f"👥 {args.users} пользователей × {args.jobs} документов, {book.name} → {args.target}, API {api.url}")
+    started = time.perf_counter()
+    try:
+        per_user = await asyncio.gather(*(user(index) for index in range(args.users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await under_test.stop()
+        await api.stop()
+
+    results = [result for user_results in per_user for result in user_results]
+    times = [seconds for ok, seconds, _ in results if ok]
+    failures = {}
+    for ok, _, reason in results:
+        if not ok:
+            failures[reason] = failures.get(reason, 0) + 1
+
+    report = {
+        "jobs": len(results),
+        "ok": len(times),
+        "failures": failures,
+        "error_rate": 1 - len(times) / len(results) if results else 0.0,
+        "elapsed_seconds": elapsed,
+        "updates_per_second": api.updates_delivered / elapsed if elapsed else 0.0,
+        "jobs_per_second": len(times) / elapsed if elapsed else 0.0,
+        "time_to_result_p50": statistics.median(times) if times else 0.0,
+        "time_to_result_p99": percentile(times, 0.99),
+        "api_calls": dict(api.calls),
+        "rate_limited": dict(api.rate_limited),
+    }
+
+    print(f"⏱️ {elapsed:.1f} с: {report['updates_per_second']:.1f} обновлений/с, "
+          f"{report['jobs_per_second']:.2f} задач/с")
+    print(f"📈 Время до результата: p50 {report['time_to_result_p50']:.2f} с, "
+          f"p99 {report['time_to_result_p99']:.2f} с")
+    print(f"❌ Ошибки: {report['error_rate']:.1%} {failures or ''}")
+    print(f"📡 Вызовы API: {dict(api.calls.most_common())}; 429: {sum(api.rate_limited.values())}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конвертации на синтетическом корпусе.
+
+Прогоняет детерминированные книги (см. benchmarks/corpus.py) через
+BookConverter.convert и LargeFileConverter.convert_with_progress для
+каждой пары форматов и записывает время, CPU и пиковый RSS дочерних
+процессов в JSON. Режим --compare сравнивает два файла результатов
+и завершается с кодом 1, если есть регрессии.
+
+Запуск:
+    python benchmarks/bench_conversion.py --sizes 100k,1m --output base.json
+    python benchmarks/bench_conversion.py --compare base.json new.json --threshold 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.corpus import DEFAULT_SEED, DEFAULT_SIZES, FORMATS, generate_book, size_label
+from converter.child_usage import collect_child_usage
+from converter.converter import BookConverter
+from converter.large_file_converter import LargeFileConverter
+
+OUTPUT_FORMATS = ("epub", "fb2", "mobi", "pdf", "txt", "html")
+ENGINES = ("book", "large")
+
+
+def parse_size(value: str) -> int:
+    """Размер из строки: 100k, 5m или число байт."""
+    value = value.strip().lower()
+    multipliers = {"k": 1000, "m": 1_000_000}
+    if value[-1:] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def run_info(ebook_convert: str) -> dict:
+    """Сведения об окружении прогона."""
+    def command_output(cmd):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=30).stdout.strip().splitlines()[0]
+        except (OSError, subprocess.SubprocessError, IndexError):
+            return None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": command_output(["git", "rev-parse", "--short", "HEAD"]),
+        "calibre": command_output([ebook_convert, "--version"]),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+async def convert_once(engine: str, book: Path, dst: str, timeout: int, ebook_convert: str) -> dict:
+    """Конвертирует копию книги в отдельной директории и измеряет ресурсы."""
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_conv_"))
+    try:
+        input_path = work_dir / book.name
+        shutil.copyfile(book, input_path)
+
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        with collect_child_usage() as usages:
+            if engine == "book":
+                result = await BookConverter(timeout=timeout, ebook_convert=ebook_convert).convert(input_path, dst)
+            else:
+                result = await LargeFileConverter(ebook_convert=ebook_convert).convert_with_progress(
+                    input_path, dst, timeout=timeout
+                )
+        wall = time.perf_counter() - start
+
+        if usages:
+            cpu = sum(usage.cpu_seconds for usage in usages)
+            max_rss = max(usage.max_rss_bytes for usage in usages)
+        else:
+            # Без обертки usage_wrapper - накопленные значения по всем детям процесса
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = (children.ru_utime - children_before.ru_utime) + (children.ru_stime - children_before.ru_stime)
+            max_rss = children.ru_maxrss * 1024
+
+        ok = result is not None and Path(result).exists()
+        return {
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "max_rss_bytes": max_rss,
+            "ok": ok,
+            "output_bytes": Path(result).stat().st_size if ok else 0,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def run(args) -> int:
+    if shutil.which(args.ebook_convert) is None:
+        print(f"❌ {args.ebook_convert} не найден - установите Calibre")
+        return 1
+
+    corpus_dir = Path(args.corpus_dir)
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    formats = args.formats.split(",")
+    targets = args.targets.split(",")
+    engines = args.engines.split(",")
+
+    results = []
+    print(f"{'Книга':>28} | {'→':>5} | {'движок':>6} | {'время':>9} | {'CPU':>9} | {'RSS':>8} | результат")
+    print("-" * 90)
+    for fmt in formats:
+        for size in sizes:
+            book = generate_book(fmt, size, corpus_dir, args.seed)
+            src = book.suffix.lstrip(".")
+            for dst in targets:
+                if dst == src:
+                    continue
+                for engine in engines:
+                    for repeat in range(args.repeat):
+                        measurement = await convert_once(engine, book, dst, args.timeout, args.ebook_convert)
+                        results.append({
+                            "input": book.name,
+                            "corpus_format": fmt,
+                            "src": src,
+                            "dst": dst,
+                            "size": size_label(size),
+                            "size_bytes": book.stat().st_size,
+                            "engine": engine,
+                            "repeat": repeat,
+                            **measurement,
+                        })
+                        print(
+                            f"{book.name:>28} | {dst:>5} | {engine:>6} | {measurement['wall_seconds']:>7.2f} с | "
+                            f"{measurement['cpu_seconds']:>7.2f} с | "
+                            f"{measurement['max_rss_bytes'] / 1_048_576:>5.0f} МБ | "
+                            f"{'✅' if measurement['ok'] else '❌'}"
+                        )
+
+    report = {"meta": {**run_info(args.ebook_convert), "seed": args.seed}, "results": results}
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 Результаты: {args.output} ({len(results)} измерений)")
+    return 0
+
+
+def summarize(report: dict) -> dict:
+    """Медианы по ключу (движок, формат корпуса, целевой формат, размер)."""
+    groups = {}
+    for row in report["results"]:
+        key = (row["engine"], row.get("corpus_format", row["src"]), row["dst"], row["size"])
+        groups.setdefault(key, []).append(row)
+    return {
+        key: {
+            "wall_seconds": statistics.median(row["wall_seconds"] for row in rows),
+            "cpu_seconds": statistics.median(row["cpu_seconds"] for row in rows),
+            "max_rss_bytes": max(row["max_rss_bytes"] for row in rows),
+            "ok": all(row["ok"] for row in rows),
+        }
+        for key, rows in groups.items()
+    }
+
+
+def compare(base: dict, new: dict, threshold: float, min_delta: float) -> list:
+    """
+    Сравнивает два прогона.
+
+    Регрессия - рост метрики больше чем на threshold (доля) и, для времени,
+    больше чем на min_delta секунд (чтобы не реагировать на шум коротких
+    конвертаций), либо конвертация, переставшая завершаться успешно.
+
+    Returns:
+        list: Строки (ключ, метрика, база, новое значение, изменение)
+    """
+    regressions = []
+    base_summary, new_summary = summarize(base), summarize(new)
+    for key in sorted(base_summary.keys() & new_summary.keys()):
+        old, current = base_summary[key], new_summary[key]
+        if old["ok"] and not current["ok"]:
+            regressions.append((key, "ok", True, False, None))
+            continue
+        for metric, floor in (("wall_seconds", min_delta), ("cpu_seconds", min_delta), ("max_rss_bytes", 0)):
+            before, after = old[metric], current[metric]
+            if before <= 0:
+                continue
+            change = (after - before) / before
+            if change > threshold and after - before > floor:
+                regressions.append((key, metric, before, after, change))
+    return regressions
+
+
+def run_compare(args) -> int:
+    base_path, new_path = args.compare
+    base = json.loads(Path(base_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+
+    base_summary, new_summary = summarize(base), summarize(new)
+    print(f"{'Движок':>6} | {'пара':>16} | {'размер':>6} | {'база':>9} | {'новое':>9} | {'изменение':>9}")
+    print("-" * 70)
+    for key in sorted(base_summary.keys() & new_summary.keys()):
+        engine, fmt, dst, size = key
+        before, after = base_summary[key]["wall_seconds"], new_summary[key]["wall_seconds"]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{engine:>6} | {fmt + ' → ' + dst:>16} | {size:>6} | {before:>7.2f} с | {after:>7.2f} с | {change:>+8.1f}%")
+
+    missing = base_summary.keys() - new_summary.keys()
+    if missing:
+        print(f"\n⚠️ Нет в новом прогоне: {len(missing)} сочетаний")
+
+    regressions = compare(base, new, args.threshold, args.min_delta)
+    if not regressions:
+        print(f"\n✅ Регрессий нет (порог {args.threshold:.0%})")
+        return 0
+
+    print(f"\n❌ Регрессии ({len(regressions)}):")
+    for (engine, fmt, dst, size), metric, before, after, change in regressions:
+        if metric == "ok":
+            print(f"  {engine} {fmt} → {dst} {size}: конвертация перестала выполняться")
+        else:
+            print(f"  {engine} {fmt} → {dst} {size}: {metric} {before:g} → {after:g} ({change:+.1%})")
+    return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus-dir", default=str(Path(tempfile.gettempdir()) / "book_converter_corpus"),
+                        help="директория синтетического корпуса (переиспользуется между прогонами)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="форматы корпуса")
+    parser.add_argument("--targets", default=",".join(OUTPUT_FORMATS), help="целевые форматы")
+    parser.add_argument("--sizes", default=",".join(size_label(size) for size in DEFAULT_SIZES),
+                        help="размеры книг (100k, 1m, ...)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="book - BookConverter, large - LargeFileConverter")
+    parser.add_argument("--repeat", type=int, default=1, help="повторов каждого измерения")
+    parser.add_argument("--timeout", type=int, default=1800, help="таймаут одной конвертации, секунд")
+    parser.add_argument("--ebook-convert", default=os.getenv("EBOOK_CONVERT_BIN", "ebook-convert"),
+                        help="исполняемый файл ebook-convert")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed генератора корпуса")
+    parser.add_argument("--output", default="bench_conversion.json", help="файл результатов")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="сравнить два файла результатов")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимый рост метрики (доля)")
+    parser.add_argument("--min-delta", type=float, default=0.5,
+                        help="минимальный рост времени/CPU в секундах, считающийся регрессией")
+    args = parser.parse_args()
+
+    if args.compare:
+        return run_compare(args)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки event loop при интенсивном логировании.
+
+Несколько задач пишут в лог (как конвертер, логирующий командную строку
+ebook-convert и прогресс), а задача-зонд каждую миллисекунду замеряет,
+насколько позже ожидаемого она просыпается. Сравниваются:
+
+- direct: FileHandler в корневом логгере (запись в файл в event loop);
+- queue: QueueHandler + QueueListener из utils.logging_setup.
+
+--fsync моделирует медленный диск (fsync после каждой записи).
+
+Запуск:
+    python benchmarks/bench_logging_latency.py --records 20000 --fsync
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.logging_setup import DEFAULT_FORMAT, start_queue_logging, stop_logging
+
+PROBE_INTERVAL = 0.001
+
+
+class FsyncFileHandler(logging.FileHandler):
+    """FileHandler, сбрасывающий каждую запись на диск."""
+
+    def emit(self, record):
+        super().emit(record)
+        self.flush()
+        os.fsync(self.stream.fileno())
+
+
+async def probe(stop: asyncio.Event, lags: list) -> None:
+    """Замеряет опоздание пробуждений event loop."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def producer(records: int, line: str) -> None:
+    logger = logging.getLogger("bench.converter")
+    for i in range(records):
+        logger.info(f"Выполнение команды: {line} #{i}")
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+
+
+async def run(producers: int, records: int) -> list:
+    lags: list = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    line = "ebook-convert /tmp/book_converter/book_abc.fb2 /tmp/out.epub " + "--option=value " * 20
+    await asyncio.gather(*(producer(records // producers, line) for _ in range(producers)))
+    stop.set()
+    await probe_task
+    return lags
+
+
+def configure(mode: str, log_path: Path, fsync: bool) -> None:
+    handler = (FsyncFileHandler if fsync else logging.FileHandler)(log_path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+        old.close()
+    if mode == "direct":
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        start_queue_logging([handler], "INFO")
+
+
+def report(mode: str, lags: list, elapsed: float) -> None:
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[int(len(lags_ms) * 0.99) - 1] if lags_ms else 0.0
+    print(
+        f"{mode:>7}: {elapsed:6.2f} с, замеров {len(lags_ms):6d}, "
+        f"задержка median {statistics.median(lags_ms):6.2f} мс, "
+        f"p99 {p99:7.2f} мс, max {lags_ms[-1]:7.2f} мс"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=20000, help="записей лога за прогон")
+    parser.add_argument("--producers", type=int, default=4, help="задач, пишущих в лог")
+    parser.add_argument("--fsync", action="store_true", help="fsync после каждой записи")
+    parser.add_argument("--dir", default=None, help="директория файла лога")
+    args = parser.parse_args()
+
+    log_dir = Path(args.dir or tempfile.mkdtemp(prefix="bench_logging_"))
+    print(f"📊 {args.records} записей, {args.producers} задач, fsync={'да' if args.fsync else 'нет'}")
+    for mode in ("direct", "queue"):
+        log_path = log_dir / f"{mode}.log"
+        configure(mode, log_path, args.fsync)
+        start = time.perf_counter()
+        lags = asyncio.run(run(args.producers, args.records))
+        elapsed = time.perf_counter() - start
+        # Для queue в elapsed не входит дописывание очереди - это и есть выигрыш
+        stop_logging()
+        report(mode, lags, elapsed)
+        log_path.unlink(missing_ok=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти на пути обработки документа.
+
+N пользователей одновременно отправляют по большому документу (по
+умолчанию 50 МБ), и каждый проходит handle_document (скачивание,
+TempFileManager, FileValidator.validate_file) и handle_conversion через
+поддельный Bot API и поддельный ebook-convert. Для каждого уровня
+параллельности замеряются пиковая куча Python (tracemalloc), пиковый
+RSS процесса и число копий на байт входа: прирост пика кучи, деленный
+на суммарный объем документов. Поддельный API отдает файлы с диска
+через sendfile, поэтому в замер попадает только память бота.
+
+По приросту RSS на документ оценивается, сколько больших файлов бот
+выдержит одновременно в контейнере с --limit-mb памяти. --max-rss-mb и
+--max-copies превращают прогон в проверку для CI (код выхода 1).
+
+Запуск:
+    python benchmarks/bench_memory.py --users 1,10,50
+    python benchmarks/bench_memory.py --users 4 --size 10000000 --max-copies 0.5 --max-rss-mb 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FAKE_EBOOK_CONVERT = Path(__file__).resolve().parent / "fake_ebook_convert.py"
+
+MB = 1_048_576
+
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (Linux), иначе пиковый за все время."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss - в КБ на Linux и в байтах на macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class RssSampler:
+    """Фоновый поток, отслеживающий пиковый RSS между reset() и peak."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def reset(self) -> int:
+        self.peak = current_rss()
+        return self.peak
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+async def run_level(api, sampler: RssSampler, users: int, book: Path, target: str, timeout: float) -> dict:
+    """N одновременных документов; память - прирост относительно начала прогона."""
+    from benchmarks.bench_bot_load import run_job
+
+    heap_before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    rss_before = sampler.reset()
+    started = time.perf_counter()
+
+    results = await asyncio.gather(*(
+        run_job(api, 400_000 + index, api.add_file_path(book, f"big_{users}_{index}{book.suffix}"), target, timeout)
+        for index in range(users)
+    ))
+
+    elapsed = time.perf_counter() - started
+    heap_peak = tracemalloc.get_traced_memory()[1]
+    input_bytes = users * book.stat().st_size
+    failures = [reason for ok, _, reason in results if not ok]
+    return {
+        "users": users,
+        "ok": users - len(failures),
+        "failures": failures,
+        "seconds": elapsed,
+        "heap_peak_mb": heap_peak / MB,
+        "heap_growth_mb": (heap_peak - heap_before) / MB,
+        "rss_before_mb": rss_before / MB,
+        "rss_peak_mb": sampler.peak / MB,
+        "rss_per_document_mb": (sampler.peak - rss_before) / users / MB,
+        "copies_per_byte": (heap_peak - heap_before) / input_bytes,
+    }
+
+
+def capacity(result: dict, limit_mb: float) -> float:
+    """Оценка числа одновременных документов до исчерпания limit_mb."""
+    per_document = max(result["rss_per_document_mb"], 0.01)
+    return max(0.0, (limit_mb - result["rss_before_mb"]) / per_document)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", default="1,10,50", help="одновременных документов (через запятую)")
+    parser.add_argument("--format", default="txt", help="формат книг (см. corpus.py)")
+    parser.add_argument("--size", type=int, default=50_000_000, help="размер документа в байтах")
+    parser.add_argument("--target", default="epub", help="целевой формат")
+    parser.add_argument("--convert-delay", type=float, default=0.5, help="длительность поддельной конвертации")
+    parser.add_argument("--output-ratio", type=float, default=0.1, help="размер результата / размер входа")
+    parser.add_argument("--limit-mb", type=float, default=512, help="лимит памяти контейнера для оценки")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="проверка: пиковый RSS не выше")
+    parser.add_argument("--max-copies", type=float, default=None, help="проверка: копий на байт не больше")
+    parser.add_argument("--timeout", type=float, default=600, help="таймаут одной задачи")
+    parser.add_argument("--json", dest="json_path", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    # Конфигурация читается при импорте бота
+    os.environ["EBOOK_CONVERT_BIN"] = str(FAKE_EBOOK_CONVERT)
+    os.environ["FAKE_EBOOK_CONVERT_DELAY"] = str(args.convert_delay)
+    os.environ["FAKE_EBOOK_CONVERT_OUTPUT_RATIO"] = str(args.output_ratio)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    # Импорт задает BOT_TOKEN поддельного API до чтения config.py
+    from benchmarks.bench_bot_load import BotUnderTest
+    from benchmarks.corpus import generate_book
+    from benchmarks.fake_bot_api import FakeBotAPI
+
+    corpus_dir = Path(tempfile.gettempdir()) / "book_converter_corpus"
+    book = generate_book(args.format, args.size, corpus_dir)
+    warmup_book = generate_book(args.format, 100_000, corpus_dir)
+
+    api = FakeBotAPI()
+    await api.start()
+    under_test = BotUnderTest(api)
+    await under_test.start()
+    sampler = RssSampler()
+    tracemalloc.start()
+
+    print(f"📚 {book.name} ({book.stat().st_size / MB:.1f} МБ) → {args.target}, лимит {args.limit_mb:g} МБ")
+    print(f"{'докум.':>6} | {'куча пик':>9} | {'RSS пик':>9} | {'RSS/док.':>9} | {'копий/байт':>10} | {'время':>7} | оценка")
+    print("-" * 82)
+    results = []
+    try:
+        # Первая задача создает пулы потоков, сессии и кеши - не относим их к документам
+        await run_level(api, sampler, 1, warmup_book, args.target, args.timeout)
+        for users in (int(value) for value in args.users.split(",")):
+            result = await run_level(api, sampler, users, book, args.target, args.timeout)
+            result["capacity"] = capacity(result, args.limit_mb)
+            results.append(result)
+            print(
+                f"{users:>6} | {result['heap_peak_mb']:>6.1f} МБ | {result['rss_peak_mb']:>6.1f} МБ | "
+                f"{result['rss_per_document_mb']:>6.2f} МБ | {result['copies_per_byte']:>10.3f} | "
+                f"{result['seconds']:>5.1f} с | ~{result['capacity']:.0f} док."
+                + (f"  ❌ {len(result['failures'])} неудач: {result['failures']}" if result["failures"] else "")
+            )
+    finally:
+        tracemalloc.stop()
+        sampler.close()
+        await under_test.stop()
+        await api.stop()
+
+    problems = []
+    for result in results:
+        if result["failures"]:
+            problems.append(f"{result['users']} док.: неудачных задач {len(result['failures'])}")
+        if args.max_rss_mb is not None and result["rss_peak_mb"] > args.max_rss_mb:
+            problems.append(f"{result['users']} док.: RSS {result['rss_peak_mb']:.0f} МБ > {args.max_rss_mb:g} МБ")
+        if args.max_copies is not None and result["copies_per_byte"] > args.max_copies:
+            problems.append(
+                f"{result['users']} док.: {result['copies_per_byte']:.2f} копий на байт > {args.max_copies:g}"
+            )
+
+    if args.json_path:
+        report = {"book": book.name, "size": book.stat().st_size, "limit_mb": args.limit_mb, "results": results}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк накладных расходов бота без Calibre.
+
+Прогоняет задачи handle_document → handle_conversion через настоящий
+диспетчер, поддельный Bot API без задержек и детерминированную замену
+ebook-convert (benchmarks/fake_ebook_convert.py). Время конвертации
+задается явно, поэтому все остальное - это стоимость оркестрации:
+обращения к FSM, копирование и stat файлов, правки сообщений, логи.
+Несколько значений --users показывают, до скольких задач в секунду
+масштабируется Python-часть.
+
+Запуск:
+    python benchmarks/bench_orchestration.py --users 1,10,50 --jobs 20
+    python benchmarks/bench_orchestration.py --users 10 --profile --convert-delay 0.2
+"""
+import argparse
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FAKE_EBOOK_CONVERT = Path(__file__).resolve().parent / "fake_ebook_convert.py"
+
+# Категории встроенных вызовов для --profile
+PROFILE_CATEGORIES = {
+    "stat": ("posix.stat", "posix.lstat", "posix.fstat"),
+    "open": ("io.open",),
+    "unlink": ("posix.unlink",),
+    "copy": ("posix.sendfile", "_fastcopy_sendfile", "copyfileobj"),
+}
+
+
+class CountingHandler(logging.Handler):
+    """Считает записи лога, прошедшие фильтр уровня."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records += 1
+
+
+def count_storage_calls(storage, counter: Counter) -> None:
+    """Оборачивает методы хранилища FSM счетчиками вызовов."""
+    for name in ("get_state", "set_state", "get_data", "set_data"):
+        method = getattr(storage, name)
+
+        async def counted(*args, _method=method, _name=name, **kwargs):
+            counter[_name] += 1
+            return await _method(*args, **kwargs)
+
+        setattr(storage, name, counted)
+
+
+def profile_summary(profiler: cProfile.Profile, jobs: int) -> dict:
+    """Вызовы по категориям на задачу (только поток event loop)."""
+    stats = pstats.Stats(profiler)
+    summary = Counter()
+    for (_, _, function), (_, calls, *_rest) in stats.stats.items():
+        for category, names in PROFILE_CATEGORIES.items():
+            if any(name in function for name in names):
+                summary[category] += calls
+    return {category: summary[category] / jobs for category in PROFILE_CATEGORIES}
+
+
+async def run_level(args, api, storage_calls: Counter, users: int, book_data: bytes, suffix: str) -> dict:
+    """Один прогон с заданным числом пользователей (счетчики - приращения за прогон)."""
+    from benchmarks.bench_bot_load import percentile, run_job
+
+    calls_before, storage_before = Counter(api.calls), Counter(storage_calls)
+
+    async def user(index: int):
+        results = []
+        for job in range(args.jobs):
+            document = api.add_file(book_data, f"book_{index}_{job}{suffix}")
+            results.append(await run_job(api, 300_000 + index, document, args.target, args.timeout))
+        return results
+
+    profiler = cProfile.Profile() if args.profile else None
+    cpu_started = time.process_time()
+    children_started = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        per_user = await asyncio.gather(*(user(index) for index in range(users)))
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        children_cpu = (
+            children.ru_utime - children_started.ru_utime + children.ru_stime - children_started.ru_stime
+        )
+
+    results = [result for user_results in per_user for result in user_results]
+    jobs = len(results)
+    times = [seconds for ok, seconds, _ in results if ok]
+    calls = api.calls - calls_before
+    del calls["getUpdates"]
+    return {
+        "users": users,
+        "jobs": jobs,
+        "ok": len(times),
+        "jobs_per_second": len(times) / elapsed,
+        "latency_p50": statistics.median(times) if times else 0.0,
+        "latency_p99": percentile(times, 0.99),
+        "overhead_p50": (statistics.median(times) - args.convert_delay) if times else 0.0,
+        "cpu_ms_per_job": cpu / jobs * 1000,
+        "children_cpu_ms_per_job": children_cpu / jobs * 1000,
+        "api_calls_per_job": {method: count / jobs for method, count in calls.items()},
+        "fsm_calls_per_job": {name: count / jobs for name, count in (storage_calls - storage_before).items()},
+        "profile_per_job": profile_summary(profiler, jobs) if profiler else None,
+        "profiler": profiler,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", default="1,10,50", help="одновременных пользователей (через запятую)")
+    parser.add_argument("--jobs", type=int, default=10, help="задач на пользователя")
+    parser.add_argument("--format", default="epub", help="формат книг (см. corpus.py)")
+    parser.add_argument("--size", type=int, default=100_000, help="размер книги в байтах")
+    parser.add_argument("--target", default="txt", help="целевой формат")
+    parser.add_argument("--convert-delay", type=float, default=0.0, help="длительность поддельной конвертации")
+    parser.add_argument("--fsm", default=None, help="FSM_STORAGE_URL (по умолчанию - как в config.py)")
+    parser.add_argument("--throttled", action="store_true",
+                        help="оставить лимиты исходящих запросов SEND_* (по умолчанию сняты)")
+    parser.add_argument("--profile", action="store_true", help="профилировать event loop (cProfile)")
+    parser.add_argument("--timeout", type=float, default=120, help="таймаут одной задачи")
+    args = parser.parse_args()
+
+    # Конфигурация читается при импорте бота
+    os.environ["EBOOK_CONVERT_BIN"] = str(FAKE_EBOOK_CONVERT)
+    os.environ["FAKE_EBOOK_CONVERT_DELAY"] = str(args.convert_delay)
+    os.environ.setdefault("MAX_CONCURRENT_CONVERSIONS", "64")
+    if args.fsm:
+        os.environ["FSM_STORAGE_URL"] = args.fsm
+    if not args.throttled:
+        # Лимиты Telegram ограничили бы пропускную способность, а не Python
+        os.environ.update(SEND_GLOBAL_RATE="100000", SEND_CHAT_RATE="100000", SEND_CHAT_BURST="100000")
+
+    # Импорт задает BOT_TOKEN поддельного API до чтения config.py
+    from benchmarks.bench_bot_load import BotUnderTest
+    from benchmarks.corpus import generate_book
+    from benchmarks.fake_bot_api import FakeBotAPI
+    from config import LOG_LEVEL
+    from utils.logging_setup import start_queue_logging, stop_logging
+
+    # Логирование как в продакшене (файл через фоновый поток), плюс счетчик записей
+    log_dir = Path(tempfile.mkdtemp(prefix="bench_orch_"))
+    log_counter = CountingHandler()
+    start_queue_logging([logging.FileHandler(log_dir / "bot.log", encoding="utf-8"), log_counter], LOG_LEVEL)
+
+    book = generate_book(args.format, args.size, Path(tempfile.gettempdir()) / "book_converter_corpus")
+    book_data = book.read_bytes()
+
+    print(f"📚 {book.name} → {args.target}, конвертация {args.convert_delay:g} с, "
+          f"MAX_CONCURRENT_CONVERSIONS={os.environ['MAX_CONCURRENT_CONVERSIONS']}")
+    print(f"{'польз.':>6} | {'задач/с':>8} | {'p50':>8} | {'p99':>8} | {'накладные':>9} | {'CPU бота':>9} | {'CPU детей':>9} | логов/задачу")
+    print("-" * 98)
+    # Роутеры бота - синглтоны модулей, поэтому диспетчер один на все прогоны
+    api = FakeBotAPI()
+    await api.start()
+    under_test = BotUnderTest(api)
+    await under_test.start()
+    storage_calls: Counter = Counter()
+    count_storage_calls(under_test.dp.storage, storage_calls)
+    try:
+        for users in (int(value) for value in args.users.split(",")):
+            logs_before = log_counter.records
+            result = await run_level(args, api, storage_calls, users, book_data, book.suffix)
+            logs_per_job = (log_counter.records - logs_before) / result["jobs"]
+            print(
+                f"{users:>6} | {result['jobs_per_second']:>8.1f} | {result['latency_p50'] * 1000:>5.0f} мс | "
+                f"{result['latency_p99'] * 1000:>5.0f} мс | {result['overhead_p50'] * 1000:>6.0f} мс | "
+                f"{result['cpu_ms_per_job']:>6.1f} мс | {result['children_cpu_ms_per_job']:>6.1f} мс | {logs_per_job:.1f}"
+                + ("" if result["ok"] == result["jobs"] else f"  ❌ {result['jobs'] - result['ok']} неудач")
+            )
+            print(f"         API/задачу: { {k: round(v, 1) for k, v in sorted(result['api_calls_per_job'].items())} }")
+            print(f"         FSM/задачу: { {k: round(v, 1) for k, v in sorted(result['fsm_calls_per_job'].items())} }")
+            if result["profiler"]:
+                print(f"         вызовы/задачу (поток loop): "
+                      f"{ {k: round(v, 1) for k, v in result['profile_per_job'].items()} }")
+                pstats.Stats(result["profiler"]).sort_stats("cumulative").print_stats(15)
+    finally:
+        await under_test.stop()
+        await api.stop()
+        stop_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
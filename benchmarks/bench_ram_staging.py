@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк RAM-уровня временных файлов.
+
+Моделирует файловый ввод-вывод одной задачи конвертации: сохранение
+загруженного файла, чтение его конвертером, запись результата рядом
+с исходником, чтение результата при отправке и удаление обоих файлов.
+Сравнивает задержку на задачу для дискового и RAM-уровня (tmpfs).
+
+Запуск:
+    python benchmarks/bench_ram_staging.py --jobs 200 --ram-dir /dev/shm
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.file_manager import TempFileManager
+
+SIZES = [100 * 1024, 512 * 1024, 2 * 1024 * 1024]
+
+
+async def run_job(manager: TempFileManager, data: bytes, fsync: bool) -> float:
+    """Выполняет одну модельную задачу и возвращает ее длительность в секундах."""
+    start = time.perf_counter()
+
+    input_path = await manager.save_file_from_bytes(data, "book.fb2")
+    input_path.read_bytes()  # ebook-convert читает исходник
+
+    output_path = input_path.with_suffix(".epub")
+    with open(output_path, "wb") as f:  # ebook-convert пишет результат
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    output_path.read_bytes()  # answer_document читает результат
+
+    output_path.unlink()
+    manager.release(input_path)
+    return time.perf_counter() - start
+
+
+async def bench(manager: TempFileManager, size: int, jobs: int, fsync: bool) -> list:
+    """Прогоняет серию задач одного размера."""
+    data = os.urandom(size)
+    # Прогрев
+    for _ in range(5):
+        await run_job(manager, data, fsync)
+    return [await run_job(manager, data, fsync) for _ in range(jobs)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=200, help="задач на размер")
+    parser.add_argument("--disk-dir", default=None, help="дисковая директория")
+    parser.add_argument("--ram-dir", default="/dev/shm", help="директория tmpfs")
+    parser.add_argument("--fsync", action="store_true", help="fsync результата (худший случай)")
+    args = parser.parse_args()
+
+    disk_root = Path(args.disk_dir or tempfile.mkdtemp(prefix="bench_disk_"))
+    ram_root = Path(args.ram_dir)
+    if not ram_root.is_dir():
+        print(f"❌ RAM-директория {ram_root} недоступна")
+        return 1
+
+    disk_manager = TempFileManager(base_dir=str(disk_root / "book_converter"))
+    ram_manager = TempFileManager(
+        base_dir=str(disk_root / "book_converter"),
+        ram_dir=str(ram_root / f"book_converter_bench_{os.getpid()}"),
+        ram_budget=64 * 1024 * 1024,
+        ram_max_file_size=max(SIZES)
+    )
+
+    print(f"📂 Диск: {disk_manager.base_dir}")
+    print(f"🧠 RAM:  {ram_manager.ram_dir}")
+    print(f"{'Размер':>10} | {'диск p50':>10} | {'RAM p50':>10} | {'экономия':>10} | {'диск p99':>10} | {'RAM p99':>10}")
+    print("-" * 75)
+
+    for size in SIZES:
+        disk = sorted(await bench(disk_manager, size, args.jobs, args.fsync))
+        ram = sorted(await bench(ram_manager, size, args.jobs, args.fsync))
+        p50_disk, p50_ram = statistics.median(disk), statistics.median(ram)
+        p99_disk, p99_ram = disk[int(len(disk) * 0.99) - 1], ram[int(len(ram) * 0.99) - 1]
+        print(
+            f"{size // 1024:>7} КБ | {p50_disk * 1000:>7.3f} мс | {p50_ram * 1000:>7.3f} мс | "
+            f"{(p50_disk - p50_ram) * 1000:>7.3f} мс | {p99_disk * 1000:>7.3f} мс | {p99_ram * 1000:>7.3f} мс"
+        )
+
+    ram_manager.ram_dir.rmdir()
+    if not args.disk_dir:
+        shutil.rmtree(disk_root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта бота: от запуска процесса до первого getUpdates.
+
+Запускает bot.py отдельным процессом (`python -X importtime`) против
+поддельного Bot API (benchmarks/fake_bot_api.py через BOT_API_URL) и
+замеряет время от запуска процесса до первого запроса getUpdates, время
+импортов до него и его распределение по пакетам. Модули, импортированные
+после первого getUpdates (отложенные импорты и фоновый прогрев), в сумму
+не входят и перечисляются отдельно. -X importtime сам немного замедляет
+импорт, поэтому сравнивайте прогоны только между собой. Логи, базы и
+временные файлы бота - во временном каталоге. --max-seconds превращает
+прогон в проверку для CI (код выхода 1).
+
+Запуск:
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --repeat 3 --top 15 --json startup.json --max-seconds 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Добавляем путь к проекту
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_bot_api import FAKE_TOKEN, FakeBotAPI
+
+IMPORT_PREFIX = "import time:"
+# Пакеты проекта: их отложенные импорты перечисляются в отчете
+PROJECT_PACKAGES = {"bot", "config", "services", "converter", "handlers", "jobs", "keyboards", "utils", "web"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_importtime(lines: List[str]) -> List[Tuple[str, int]]:
+    """Строки -X importtime -> (модуль, собственное время в мкс) по порядку импорта."""
+    modules = []
+    for line in lines:
+        if not line.startswith(IMPORT_PREFIX):
+            continue
+        own, _, name = line[len(IMPORT_PREFIX):].split("|", 2)
+        if own.strip().isdigit():
+            modules.append((name.strip(), int(own)))
+    return modules
+
+
+def bot_env(tmp: Path, api_url: str) -> Dict[str, str]:
+    """Окружение бота: поддельный API, long polling, все файлы во временном каталоге."""
+    env = dict(os.environ)
+    env.update(
+        # .env разработчика не подмешивается в замер
+        PRODUCTION="1",
+        BOT_TOKEN=FAKE_TOKEN,
+        BOT_API_URL=api_url,
+        WEBHOOK_HOST="",
+        JOB_QUEUE_URL="",
+        HEALTH_CHECK_PORT=str(free_port()),
+        TEMP_DIR=str(tmp / "temp"),
+        RAM_TEMP_DIR=str(tmp / "ram"),
+        LOG_FILE=str(tmp / "bot.log"),
+        LOG_LEVEL="WARNING",
+        ERROR_DB_PATH=str(tmp / "errors.db"),
+        COST_DB_PATH=str(tmp / "costs.db"),
+        TRACE_DIR=str(tmp / "traces"),
+        PROFILE_DIR=str(tmp / "profiles"),
+    )
+    env.pop("TRAFFIC_LOG_FILE", None)
+    return env
+
+
+async def run_once(timeout: float, settle: float) -> dict:
+    """Один запуск бота: время до первого getUpdates и импорты до и после него."""
+    api = FakeBotAPI()
+    await api.start()
+    lines: List[Tuple[float, str]] = []
+
+    async def read_stderr(stream: asyncio.StreamReader) -> None:
+        while line := await stream.readline():
+            lines.append((time.monotonic(), line.decode(errors="replace")))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-X", "importtime", str(ROOT / "bot.py"),
+            cwd=str(ROOT), env=bot_env(Path(tmp), api.url),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        reader = asyncio.create_task(read_stderr(process.stderr))
+        try:
+            await asyncio.wait_for(api.polling.wait(), timeout)
+            # Фоновый прогрев после старта попадает в отложенные импорты
+            await asyncio.sleep(settle)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if process.returncode is None:
+                process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+            await reader
+            await api.stop()
+
+    if api.first_poll_at is None:
+        errors = [line.rstrip() for _, line in lines if not line.startswith(IMPORT_PREFIX)]
+        raise RuntimeError("бот не начал polling: " + " / ".join(errors[-5:]))
+
+    before = parse_importtime([line for at, line in lines if at <= api.first_poll_at])
+    after = parse_importtime([line for at, line in lines if at > api.first_poll_at])
+    packages = Counter()
+    for name, own in before:
+        packages[name.split(".")[0]] += own
+    return {
+        "seconds_to_poll": api.first_poll_at - started,
+        "import_seconds": sum(own for _, own in before) / 1e6,
+        "modules": len(before),
+        "packages": {name: own / 1e6 for name, own in packages.items()},
+        "deferred": [name for name, _ in after if name.split(".")[0] in PROJECT_PACKAGES],
+        "deferred_seconds": sum(own for _, own in after) / 1e6,
+    }
+
+
+def summarize(runs: List[dict], top: int) -> dict:
+    """Медианы по запускам."""
+    packages = {}
+    for name in {name for run in runs for name in run["packages"]}:
+        packages[name] = statistics.median(run["packages"].get(name, 0.0) for run in runs)
+    return {
+        "runs": len(runs),
+        "seconds_to_poll": statistics.median(run["seconds_to_poll"] for run in runs),
+        "import_seconds": statistics.median(run["import_seconds"] for run in runs),
+        "modules": statistics.median(run["modules"] for run in runs),
+        "deferred_seconds": statistics.median(run["deferred_seconds"] for run in runs),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+        "deferred": runs[-1]["deferred"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="запусков бота (в отчете - медианы)")
+    parser.add_argument("--top", type=int, default=12, help="пакетов в отчете")
+    parser.add_argument("--timeout", type=float, default=60, help="ожидание первого getUpdates, секунд")
+    parser.add_argument("--settle", type=float, default=3.0,
+                        help="сколько работать после первого getUpdates (прогрев конвертера - через секунду)")
+    parser.add_argument("--max-seconds", type=float, default=None, help="проверка: время до getUpdates не больше")
+    parser.add_argument("--json", dest="json_path", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for number in range(1, args.repeat + 1):
+        run = await run_once(args.timeout, args.settle)
+        runs.append(run)
+        print(
+            f"🚀 Запуск {number}: getUpdates через {run['seconds_to_poll']:.2f} с, "
+            f"импорты {run['import_seconds']:.2f} с ({run['modules']} модулей)"
+        )
+    summary = summarize(runs, args.top)
+
+    print(f"\nМедиана: до getUpdates {summary['seconds_to_poll']:.2f} с, импорты {summary['import_seconds']:.2f} с")
+    print(f"{'пакет':<20} | {'импорт':>8}")
+    print("-" * 31)
+    for name, seconds in summary["packages"].items():
+        print(f"{name:<20} | {seconds * 1000:>5.0f} мс")
+    if summary["deferred"]:
+        print(f"\nОтложено после getUpdates ({summary['deferred_seconds'] * 1000:.0f} мс): "
+              + ", ".join(summary["deferred"]))
+
+    if args.json_path:
+        report = {"summary": summary, "runs": runs}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if args.max_seconds is not None and summary["seconds_to_poll"] > args.max_seconds:
+        print(f"❌ Время до getUpdates {summary['seconds_to_poll']:.2f} с > {args.max_seconds:g} с")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
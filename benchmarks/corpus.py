@@ -0,0 +1,309 @@
+"""
+Детерминированный синтетический корпус книг для бенчмарков.
+
+Генерирует TXT, HTML, FB2, EPUB, текстовые и графические PDF заданного
+размера. Содержимое зависит только от формата, размера и seed, поэтому
+прогоны на разных машинах и в разное время сравнимы между собой.
+
+Использование:
+    from benchmarks.corpus import generate_book
+    path = generate_book("fb2", 1_000_000, Path("corpus"))
+"""
+import io
+import random
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+# Форматы корпуса: "pdf" - текстовый PDF, "pdf-image" - PDF из изображений
+FORMATS = ("txt", "html", "fb2", "epub", "pdf", "pdf-image")
+DEFAULT_SIZES = (100_000, 1_000_000, 5_000_000, 20_000_000, 50_000_000)
+DEFAULT_SEED = 20240101
+
+_SYLLABLES = (
+    "ка", "ло", "ми", "ра", "ту", "не", "до", "ва", "ри", "со", "ли", "ма", "ко", "та", "зе",
+    "по", "ну", "ше", "ви", "го", "да", "бе", "ро", "чи", "жа", "фу", "ха", "це", "ды", "ю",
+)
+_LATIN = "abcdefghijklmnopqrstuvwxyz"
+
+
+def size_label(size: int) -> str:
+    """Короткая метка размера: 100k, 1m, 50m."""
+    if size >= 1_000_000:
+        return f"{size // 1_000_000}m"
+    return f"{size // 1000}k"
+
+
+def book_filename(fmt: str, size: int, seed: int = DEFAULT_SEED) -> str:
+    """Имя файла книги в корпусе (формат и размер читаются из имени)."""
+    extension = "pdf" if fmt.startswith("pdf") else fmt
+    return f"{fmt}_{size_label(size)}_{seed}.{extension}"
+
+
+class _TextSource:
+    """Детерминированный генератор псевдотекста."""
+
+    def __init__(self, seed: int, cyrillic: bool = True):
+        self.rng = random.Random(seed)
+        words = []
+        for _ in range(2000):
+            if cyrillic:
+                words.append("".join(self.rng.choice(_SYLLABLES) for _ in range(self.rng.randint(1, 4))))
+            else:
+                words.append("".join(self.rng.choice(_LATIN) for _ in range(self.rng.randint(2, 9))))
+        # Пул абзацев: генерировать каждый абзац заново для 50 МБ слишком долго
+        self.paragraphs = [self._paragraph(words) for _ in range(400)]
+
+    def _paragraph(self, words: List[str]) -> str:
+        sentences = []
+        for _ in range(self.rng.randint(2, 7)):
+            sentence = " ".join(self.rng.choice(words) for _ in range(self.rng.randint(5, 18)))
+            sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        return " ".join(sentences)
+
+    def paragraphs_until(self, size: int) -> Iterator[str]:
+        """Абзацы, пока суммарный размер в UTF-8 не достигнет size байт."""
+        total = 0
+        while total < size:
+            paragraph = self.rng.choice(self.paragraphs)
+            total += len(paragraph.encode("utf-8")) + 2
+            yield paragraph
+
+    def chapters(self, size: int, per_chapter: int = 40) -> Iterator[Tuple[str, List[str]]]:
+        """Главы (заголовок, абзацы) общим размером около size байт."""
+        chapter: List[str] = []
+        number = 1
+        for paragraph in self.paragraphs_until(size):
+            chapter.append(paragraph)
+            if len(chapter) >= per_chapter:
+                yield f"Глава {number}", chapter
+                chapter, number = [], number + 1
+        if chapter or number == 1:
+            yield f"Глава {number}", chapter
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _write_txt(path: Path, size: int, seed: int) -> None:
+    source = _TextSource(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for title, paragraphs in source.chapters(size):
+            f.write(f"{title}\n\n")
+            for paragraph in paragraphs:
+                f.write(paragraph + "\n\n")
+
+
+def _write_html(path: Path, size: int, seed: int) -> None:
+    source = _TextSource(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<!DOCTYPE html>\n<html lang="ru"><head><meta charset="utf-8">'
+                f"<title>Синтетическая книга {seed}</title></head><body>\n")
+        for title, paragraphs in source.chapters(size):
+            f.write(f"<h1>{title}</h1>\n")
+            for paragraph in paragraphs:
+                f.write(f"<p>{_escape(paragraph)}</p>\n")
+        f.write("</body></html>\n")
+
+
+def _write_fb2(path: Path, size: int, seed: int) -> None:
+    source = _TextSource(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0">\n'
+            "<description><title-info><genre>prose</genre>"
+            "<author><first-name>Тест</first-name><last-name>Бенчмарков</last-name></author>"
+            f"<book-title>Синтетическая книга {seed}</book-title><lang>ru</lang></title-info>"
+            "<document-info><author><nickname>corpus</nickname></author>"
+            f"<id>bench-{seed}-{size}</id><version>1.0</version></document-info></description>\n<body>\n"
+        )
+        for title, paragraphs in source.chapters(size):
+            f.write(f"<section><title><p>{title}</p></title>\n")
+            for paragraph in paragraphs:
+                f.write(f"<p>{_escape(paragraph)}</p>\n")
+            f.write("</section>\n")
+        f.write("</body>\n</FictionBook>\n")
+
+
+def _write_epub(path: Path, size: int, seed: int) -> None:
+    source = _TextSource(seed)
+    with open(path, "wb") as raw, zipfile.ZipFile(raw, "w") as epub:
+        epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr(
+            "META-INF/container.xml",
+            '<?xml version="1.0"?>\n<container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>",
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+        # Текст сжимается примерно втрое: генерируем с запасом и следим за размером архива
+        chapters = []
+        for number, (title, paragraphs) in enumerate(source.chapters(size * 4), start=1):
+            name = f"chapter{number:04d}.xhtml"
+            body = "\n".join(f"<p>{_escape(paragraph)}</p>" for paragraph in paragraphs)
+            epub.writestr(
+                f"OEBPS/{name}",
+                '<?xml version="1.0" encoding="utf-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml">'
+                f"<head><title>{title}</title></head><body><h1>{title}</h1>\n{body}\n</body></html>",
+                compress_type=zipfile.ZIP_DEFLATED
+            )
+            chapters.append((name, title))
+            if raw.tell() >= size:
+                break
+
+        manifest = "\n".join(
+            f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>'
+            for i, (name, _) in enumerate(chapters)
+        )
+        spine = "\n".join(f'<itemref idref="c{i}"/>' for i in range(len(chapters)))
+        nav_points = "\n".join(
+            f'<navPoint id="n{i}" playOrder="{i + 1}"><navLabel><text>{title}</text></navLabel>'
+            f'<content src="{name}"/></navPoint>'
+            for i, (name, title) in enumerate(chapters)
+        )
+        epub.writestr(
+            "OEBPS/content.opf",
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="id">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f"<dc:title>Синтетическая книга {seed}</dc:title><dc:language>ru</dc:language>"
+            f'<dc:identifier id="id">bench-{seed}-{size}</dc:identifier></metadata>'
+            f'<manifest><item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>\n{manifest}</manifest>'
+            f'<spine toc="ncx">\n{spine}</spine></package>',
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+        epub.writestr(
+            "OEBPS/toc.ncx",
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+            f'<head><meta name="dtb:uid" content="bench-{seed}-{size}"/></head>'
+            f"<docTitle><text>Синтетическая книга {seed}</text></docTitle><navMap>\n{nav_points}</navMap></ncx>",
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+
+
+class _PdfWriter:
+    """Минимальный писатель PDF: объекты, страницы, таблица xref."""
+
+    def __init__(self):
+        self.objects: List[bytes] = []
+
+    def add(self, body: bytes) -> int:
+        self.objects.append(body)
+        return len(self.objects)
+
+    def reserve(self) -> int:
+        return self.add(b"")
+
+    def set(self, number: int, body: bytes) -> None:
+        self.objects[number - 1] = body
+
+    def write(self, path: Path, root: int) -> None:
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                  % (len(self.objects) + 1, root, xref))
+        path.write_bytes(out.getvalue())
+
+
+def _stream(data: bytes, extra: bytes = b"") -> bytes:
+    return b"<< /Length %d %s>>\nstream\n" % (len(data), extra) + data + b"\nendstream"
+
+
+def _write_pdf(path: Path, size: int, seed: int, images: bool) -> None:
+    rng = random.Random(seed)
+    # Встроенный шрифт Helvetica не содержит кириллицы - текст латиницей
+    source = _TextSource(seed, cyrillic=False)
+    pdf = _PdfWriter()
+    pages_id = pdf.reserve()
+    font_id = pdf.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    total = 0
+
+    while total < size or not page_ids:
+        if images:
+            # Шум не сжимается: размер файла предсказуем
+            width, height = (160, 120) if size < 1_000_000 else (800, 600)
+            pixels = rng.randbytes(width * height * 3)
+            image_id = pdf.add(_stream(
+                pixels,
+                b"/Type /XObject /Subtype /Image /Width %d /Height %d "
+                b"/ColorSpace /DeviceRGB /BitsPerComponent 8 " % (width, height)
+            ))
+            content = b"q 500 0 0 375 50 400 cm /Im0 Do Q BT /F1 12 Tf 50 380 Td (Page %d) Tj ET" % (
+                len(page_ids) + 1
+            )
+            resources = b"<< /Font << /F1 %d 0 R >> /XObject << /Im0 %d 0 R >> >>" % (font_id, image_id)
+            total += len(pixels)
+        else:
+            lines = []
+            for paragraph in source.paragraphs_until(3000):
+                words = paragraph.split()
+                for start in range(0, len(words), 12):
+                    line = " ".join(words[start:start + 12])
+                    lines.append(b"(" + line.encode("latin-1") + b") '")
+            content = b"BT /F1 10 Tf 12 TL 50 800 Td\n" + b"\n".join(lines[:60]) + b"\nET"
+            resources = b"<< /Font << /F1 %d 0 R >> >>" % font_id
+
+        content_id = pdf.add(_stream(content))
+        page_ids.append(pdf.add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources %s /Contents %d 0 R >>"
+            % (pages_id, resources, content_id)
+        ))
+        total += len(content) + 200
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    pdf.set(pages_id, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    root = pdf.add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    pdf.write(path, root)
+
+
+def generate_book(fmt: str, size: int, directory: Path, seed: int = DEFAULT_SEED) -> Path:
+    """
+    Создает книгу (или возвращает уже созданную) в директории корпуса.
+
+    Args:
+        fmt: Формат из FORMATS
+        size: Примерный размер файла в байтах
+        directory: Директория корпуса
+        seed: Seed генератора
+
+    Returns:
+        Path: Путь к файлу книги
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат корпуса: {fmt}")
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / book_filename(fmt, size, seed)
+    if path.exists():
+        return path
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if fmt == "txt":
+        _write_txt(tmp_path, size, seed)
+    elif fmt == "html":
+        _write_html(tmp_path, size, seed)
+    elif fmt == "fb2":
+        _write_fb2(tmp_path, size, seed)
+    elif fmt == "epub":
+        _write_epub(tmp_path, size, seed)
+    else:
+        _write_pdf(tmp_path, size, seed, images=fmt == "pdf-image")
+    tmp_path.replace(path)
+    return path
+
+
+def generate_corpus(directory: Path, formats=FORMATS, sizes=DEFAULT_SIZES, seed: int = DEFAULT_SEED) -> List[Path]:
+    """Создает все сочетания форматов и размеров."""
+    return [generate_book(fmt, size, directory, seed) for fmt in formats for size in sizes]
@@ -0,0 +1,262 @@
+"""
+Локальный поддельный сервер Telegram Bot API.
+
+Обслуживает методы, которые использует бот (getUpdates, getFile,
+скачивание файлов, sendMessage, editMessageText, sendDocument и др.),
+с настраиваемой задержкой ответа и долей ответов 429. Обновления
+(документы и нажатия кнопок) создает тестовый код, а сообщения бота
+попадают в почтовые ящики чатов, откуда их читает генератор нагрузки.
+
+Бот подключается к серверу через собственную сессию:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+FAKE_TOKEN = "123456789:AAFakeTokenForLocalBotApiServer00000"
+BOT_USER = {"id": 123456789, "is_bot": True, "first_name": "BookConverter", "username": "fake_converter_bot"}
+
+# Методы, для которых имитируется flood control
+THROTTLED_METHODS = {"sendMessage", "editMessageText", "sendDocument", "deleteMessage"}
+
+
+class FakeBotAPI:
+    """Bot API в процессе теста: очередь обновлений, файлы и ящики чатов."""
+
+    def __init__(
+        self,
+        latency: Tuple[float, float] = (0.0, 0.0),
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0
+    ):
+        """
+        Args:
+            latency: Диапазон задержки ответа в секундах (равномерно)
+            rate_limit_ratio: Доля запросов из THROTTLED_METHODS, получающих 429
+            retry_after: Значение retry_after в ответах 429
+            seed: Seed генератора задержек и ошибок
+        """
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.updates_delivered = 0
+        self.url: Optional[str] = None
+        # Время первого getUpdates (time.monotonic): бот закончил запуск
+        self.first_poll_at: Optional[float] = None
+        self.polling = asyncio.Event()
+
+        self._updates: List[dict] = []
+        self._update_id = 0
+        self._new_updates = asyncio.Event()
+        # Содержимое файла или путь к нему на диске
+        self._files: Dict[str, Union[bytes, Path]] = {}
+        self._message_id = 0
+        self._inboxes: Dict[int, asyncio.Queue] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(client_max_size=128 * 1_048_576)
+        self.app.router.add_post("/bot{token}/{method}", self._handle_method)
+        self.app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер и возвращает его базовый URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        """Останавливает сервер."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # Сторона пользователя
+
+    def add_file(self, data: bytes, file_name: str, mime_type: str = "application/octet-stream") -> dict:
+        """Регистрирует файл и возвращает объект Document для обновления."""
+        return self._add(data, file_name, mime_type)
+
+    def add_file_path(self, path: Path, file_name: str, mime_type: str = "application/octet-stream") -> dict:
+        """
+        Регистрирует файл на диске: он отдается через sendfile и не
+        занимает память процесса (нужно для замеров памяти бота).
+        """
+        return self._add(Path(path), file_name, mime_type)
+
+    def _add(self, content: Union[bytes, Path], file_name: str, mime_type: str) -> dict:
+        file_id = f"file{len(self._files) + 1:06d}"
+        self._files[file_id] = content
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"u{file_id}",
+            "file_name": file_name,
+            "mime_type": mime_type,
+            "file_size": self._file_size(content),
+        }
+
+    def push_document(self, chat_id: int, document: dict) -> dict:
+        """Пользователь отправляет боту документ."""
+        message = self._message(chat_id, from_user=self._user(chat_id), document=document)
+        self._push({"message": message})
+        return message
+
+    def push_callback(self, chat_id: int, message: dict, data: str) -> None:
+        """Пользователь нажимает inline-кнопку под сообщением бота."""
+        self._push({"callback_query": {
+            "id": f"cb{self._update_id + 1}",
+            "from": self._user(chat_id),
+            "message": message,
+            "chat_instance": str(chat_id),
+            "data": data,
+        }})
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        """Очередь событий (method, message) - все, что бот сделал в чате."""
+        return self._inboxes.setdefault(chat_id, asyncio.Queue())
+
+    # Реализация Bot API
+
+    @staticmethod
+    def _file_size(content: Union[bytes, Path, None]) -> int:
+        if content is None:
+            return 0
+        return content.stat().st_size if isinstance(content, Path) else len(content)
+
+    def _user(self, chat_id: int) -> dict:
+        return {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}", "language_code": "ru"}
+
+    def _message(self, chat_id: int, from_user: dict = BOT_USER, **fields) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": from_user,
+            **fields,
+        }
+
+    def _push(self, update: dict) -> None:
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def _deliver(self, chat_id: int, method: str, message: Any) -> None:
+        self.inbox(chat_id).put_nowait((method, message))
+
+    async def _get_updates(self, params: dict) -> List[dict]:
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), min(timeout, 1.0))
+            except asyncio.TimeoutError:
+                pass
+        batch = self._updates[:limit]
+        self.updates_delivered += len(batch)
+        return batch
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if method == "getUpdates" and self.first_poll_at is None:
+            self.first_poll_at = time.monotonic()
+            self.polling.set()
+
+        if method != "getUpdates":
+            low, high = self.latency
+            if high > 0:
+                await asyncio.sleep(self.rng.uniform(low, high))
+            if method in THROTTLED_METHODS and self.rng.random() < self.rate_limit_ratio:
+                self.rate_limited[method] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+
+        result = await self._dispatch(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _dispatch(self, method: str, params: dict) -> Any:
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method == "getFile":
+            file_id = params["file_id"]
+            return {
+                "file_id": file_id,
+                "file_unique_id": f"u{file_id}",
+                "file_size": self._file_size(self._files.get(file_id)),
+                "file_path": f"documents/{file_id}",
+            }
+        if method == "sendMessage":
+            message = self._message(chat_id, text=params.get("text", ""))
+            self._deliver(chat_id, method, message)
+            return message
+        if method == "editMessageText":
+            fields = {"text": params.get("text", "")}
+            if params.get("reply_markup"):
+                fields["reply_markup"] = json.loads(params["reply_markup"])
+            message = self._message(chat_id, **fields)
+            message["message_id"] = int(params["message_id"])
+            self._message_id -= 1
+            self._deliver(chat_id, method, message)
+            return message
+        if method == "sendDocument":
+            document = params.get("document")
+            # Считаем размер по частям, не держа загруженный файл в памяти
+            size = 0
+            if hasattr(document, "file"):
+                while chunk := document.file.read(1_048_576):
+                    size += len(chunk)
+            message = self._message(chat_id, document={
+                "file_id": f"out{self._message_id}",
+                "file_unique_id": f"uout{self._message_id}",
+                "file_name": getattr(document, "filename", "document"),
+                "file_size": size,
+            }, caption=params.get("caption", ""))
+            self._deliver(chat_id, method, message)
+            return message
+        if method == "deleteMessage":
+            self._deliver(chat_id, method, {"message_id": int(params["message_id"])})
+            return True
+        # deleteWebhook, answerCallbackQuery и прочие методы без результата
+        return True
+
+    async def _handle_file(self, request: web.Request) -> web.StreamResponse:
+        file_id = request.match_info["path"].rsplit("/", 1)[-1]
+        content = self._files.get(file_id)
+        if content is None:
+            raise web.HTTPNotFound()
+        if isinstance(content, Path):
+            return web.FileResponse(content)
+        return web.Response(body=content, content_type="application/octet-stream")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Детерминированная замена ebook-convert для тестов и бенчмарков.
+
+Принимает те же аргументы (ebook-convert INPUT OUTPUT [опции]), выжидает
+заданное время, печатает строки прогресса как calibre и пишет результат
+заданного размера. Поведение настраивается переменными окружения:
+
+    FAKE_EBOOK_CONVERT_DELAY           секунд на конвертацию (0)
+    FAKE_EBOOK_CONVERT_SECONDS_PER_MB  дополнительно секунд на МБ входа (0)
+    FAKE_EBOOK_CONVERT_OUTPUT_RATIO    размер результата / размер входа (1.0)
+    FAKE_EBOOK_CONVERT_OUTPUT_BYTES    точный размер результата (перекрывает RATIO)
+    FAKE_EBOOK_CONVERT_COPY            1 - результат - копия входа (постобработка EPUB)
+    FAKE_EBOOK_CONVERT_PROGRESS_LINES  строк прогресса в stdout (10)
+    FAKE_EBOOK_CONVERT_FAIL            error | corrupt | memory | no-output | hang | crash
+    FAKE_EBOOK_CONVERT_FAIL_RATE       доля отказов (по умолчанию все, если FAIL задан)
+
+Отказ при FAIL_RATE < 1 определяется по имени и размеру входа, поэтому
+один и тот же файл всегда ведет себя одинаково.
+
+Использование:
+    EBOOK_CONVERT_BIN=benchmarks/fake_ebook_convert.py python bot.py
+"""
+import os
+import shutil
+import signal
+import sys
+import time
+import zlib
+
+VERSION = "ebook-convert (calibre 7.0.0 fake)"
+
+FAILURES = {
+    "error": (1, "Conversion error: Failed to convert input"),
+    "corrupt": (1, "ValueError: Input file is corrupt or invalid"),
+    "memory": (1, "MemoryError: out of memory"),
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _should_fail(input_path: str, size: int) -> bool:
+    if not os.environ.get("FAKE_EBOOK_CONVERT_FAIL"):
+        return False
+    rate = _env_float("FAKE_EBOOK_CONVERT_FAIL_RATE", 1.0)
+    bucket = zlib.crc32(f"{os.path.basename(input_path)}:{size}".encode()) % 10_000
+    return bucket < rate * 10_000
+
+
+def _write_output(path: str, size: int) -> None:
+    chunk = (b"fake ebook-convert output\n" * 2622)[:65536]
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(chunk[:size])
+            size -= len(chunk)
+
+
+def main(argv) -> int:
+    if "--version" in argv:
+        print(VERSION)
+        return 0
+    paths = [arg for arg in argv if not arg.startswith("-")]
+    if len(paths) < 2:
+        print("Usage: ebook-convert input_file output_file [options]", file=sys.stderr)
+        return 1
+    input_path, output_path = paths[0], paths[1]
+    try:
+        input_size = os.path.getsize(input_path)
+    except OSError:
+        print(f"ValueError: Input file {input_path} does not exist", file=sys.stderr)
+        return 1
+
+    delay = (
+        _env_float("FAKE_EBOOK_CONVERT_DELAY", 0.0)
+        + _env_float("FAKE_EBOOK_CONVERT_SECONDS_PER_MB", 0.0) * input_size / 1_048_576
+    )
+    lines = int(_env_float("FAKE_EBOOK_CONVERT_PROGRESS_LINES", 10))
+    failure = os.environ.get("FAKE_EBOOK_CONVERT_FAIL", "") if _should_fail(input_path, input_size) else ""
+
+    if failure == "hang":
+        while True:
+            time.sleep(3600)
+
+    print(f"Converting {os.path.basename(input_path)} to {os.path.splitext(output_path)[1]}", flush=True)
+    for step in range(1, lines + 1):
+        time.sleep(delay / max(lines, 1))
+        print(f"{step * 100 // lines}% Converting input to HTML...", flush=True)
+    if lines == 0:
+        time.sleep(delay)
+
+    if failure == "crash":
+        os.kill(os.getpid(), signal.SIGKILL)
+    if failure in FAILURES:
+        code, message = FAILURES[failure]
+        print(message, file=sys.stderr)
+        return code
+    if failure == "no-output":
+        return 0
+
+    output_bytes = os.environ.get("FAKE_EBOOK_CONVERT_OUTPUT_BYTES")
+    size = int(output_bytes) if output_bytes else int(input_size * _env_float("FAKE_EBOOK_CONVERT_OUTPUT_RATIO", 1.0))
+    if os.environ.get("FAKE_EBOOK_CONVERT_COPY") == "1":
+        shutil.copyfile(input_path, output_path)
+    else:
+        _write_output(output_path, size)
+    print(f"Output saved to   {output_path}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанного трафика на локальном экземпляре бота.
+
+Читает журнал TRAFFIC_LOG_FILE (utils/traffic_recorder.py), создает
+синтетические файлы того же формата и размера (benchmarks/corpus.py)
+и отправляет их боту через поддельный Bot API в исходном ритме или
+ускоренно. Пользователи выбирают тот же формат с той же паузой, а
+заглушка конвертера повторяет записанное время и результат конвертации.
+Так настройки планировщика и параллельности проверяются на реальной
+форме нагрузки до выкладки.
+
+Запуск:
+    MAX_CONCURRENT_CONVERSIONS=4 python benchmarks/replay_traffic.py traffic.jsonl --speed 10
+    python benchmarks/replay_traffic.py traffic.jsonl --converter real
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_bot_load import BotUnderTest, percentile, run_job
+from benchmarks.corpus import FORMATS, generate_book
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.stub_converter import StubConverter
+from config import MAX_CONCURRENT_CONVERSIONS
+from utils.traffic_recorder import OUTCOME_EXPIRED, OUTCOME_INVALID, OUTCOME_OK, load_traffic
+
+CHAT_ID_BASE = 200_000
+
+
+def quantize_size(size: int) -> int:
+    """Округляет размер до двух значащих цифр, чтобы корпус не разрастался."""
+    digits = len(str(size))
+    return max(1000, round(size, -(digits - 2)) if digits > 2 else size)
+
+
+def synthetic_file(event: dict, corpus_dir: Path, rng: random.Random) -> bytes:
+    """Файл, повторяющий формат и размер записанного."""
+    size = quantize_size(event["size_kb"] * 1024)
+    if event["outcome"] == OUTCOME_INVALID or event["src"] not in FORMATS:
+        # Файл, не проходящий проверку типа
+        return rng.randbytes(size)
+    return generate_book(event["src"], size, corpus_dir).read_bytes()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("traffic", help="журнал трафика (JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение поступления задач (1 - исходный ритм)")
+    parser.add_argument("--scale-conversions", action="store_true",
+                        help="ускорять и время конвертации (сохраняет загрузку, сокращает прогон)")
+    parser.add_argument("--converter", choices=("stub", "real"), default="stub",
+                        help="stub - записанное время и результат, real - BookConverter (нужен Calibre)")
+    parser.add_argument("--limit", type=int, default=None, help="воспроизвести только первые N задач")
+    parser.add_argument("--latency", default="0.02,0.08", help="задержка ответа API: мин,макс в секундах")
+    parser.add_argument("--timeout", type=float, default=3600, help="таймаут одной задачи")
+    parser.add_argument("--corpus-dir", default=str(Path(tempfile.gettempdir()) / "book_converter_corpus"))
+    parser.add_argument("--json", dest="json_path", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    events = [event for event in load_traffic(args.traffic) if event["outcome"] != OUTCOME_EXPIRED]
+    events = events[:args.limit] if args.limit else events
+    if not events:
+        print("❌ В журнале нет задач для воспроизведения")
+        return 1
+
+    rng = random.Random(0)
+    corpus_dir = Path(args.corpus_dir)
+    conversion_scale = args.speed if args.scale_conversions else 1.0
+    stub = None
+    if args.converter == "stub":
+        # Заглушка узнает задачу по user_id: у каждой задачи свой пользователь
+        stub = StubConverter(jobs={
+            CHAT_ID_BASE + index: (
+                (event["conversion_seconds"] or 0) / conversion_scale,
+                event["outcome"] == OUTCOME_OK
+            )
+            for index, event in enumerate(events)
+        })
+
+    print(f"📼 {len(events)} задач за {events[-1]['arrival'] - events[0]['arrival']:.0f} с, "
+          f"ускорение {args.speed:g}x, конвертер {args.converter}, "
+          f"MAX_CONCURRENT_CONVERSIONS={MAX_CONCURRENT_CONVERSIONS}")
+    files = [synthetic_file(event, corpus_dir, rng) for event in events]
+
+    low, high = (float(value) for value in args.latency.split(","))
+    api = FakeBotAPI(latency=(low, high))
+    await api.start()
+    under_test = BotUnderTest(api, stub)
+    await under_test.start()
+
+    max_queue_depth = 0
+
+    async def sample_queue():
+        nonlocal max_queue_depth
+        while True:
+            max_queue_depth = max(max_queue_depth, under_test.services.queue_depth)
+            await asyncio.sleep(0.1)
+
+    async def replay(index: int, event: dict, data: bytes, start: float):
+        delay = (event["arrival"] - events[0]["arrival"]) / args.speed
+        await asyncio.sleep(max(0.0, start + delay - time.monotonic()))
+        document = api.add_file(data, f"replay_{index}.{event['src']}")
+        return await run_job(
+            api, CHAT_ID_BASE + index, document, event["dst"] or "epub", args.timeout,
+            decision_delay=(event["decision_seconds"] or 0) / args.speed
+        )
+
+    sampler = asyncio.create_task(sample_queue())
+    started = time.monotonic()
+    try:
+        results = await asyncio.gather(*(
+            replay(index, event, data, started) for index, (event, data) in enumerate(zip(events, files))
+        ))
+    finally:
+        elapsed = time.monotonic() - started
+        sampler.cancel()
+        await under_test.stop()
+        await api.stop()
+
+    times = [seconds for ok, seconds, _ in results if ok]
+    recorded = Counter(event["outcome"] for event in events)
+    replayed = Counter(OUTCOME_OK if ok else reason for ok, _, reason in results)
+    report = {
+        "jobs": len(events),
+        "speed": args.speed,
+        "converter": args.converter,
+        "max_concurrent_conversions": MAX_CONCURRENT_CONVERSIONS,
+        "elapsed_seconds": elapsed,
+        "recorded_outcomes": dict(recorded),
+        "replayed_outcomes": dict(replayed),
+        "time_to_result_p50": statistics.median(times) if times else 0.0,
+        "time_to_result_p99": percentile(times, 0.99),
+        "max_queue_depth": max_queue_depth,
+    }
+
+    print(f"⏱️ Прогон: {elapsed:.1f} с")
+    print(f"📈 Время до результата: p50 {report['time_to_result_p50']:.2f} с, "
+          f"p99 {report['time_to_result_p99']:.2f} с; макс. очередь {max_queue_depth}")
+    print(f"📊 Записано: {dict(recorded)}; воспроизведено: {dict(replayed)}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
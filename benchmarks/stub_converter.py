@@ -0,0 +1,54 @@
+"""
+Конвертер-заглушка для нагрузочных тестов без Calibre.
+
+Повторяет интерфейс BookConverter.convert: выжидает заданное время,
+отправляет одно сообщение о прогрессе и пишет результат рядом с
+исходником. Подменяет конвертер планировщика:
+    services.scheduler.converter = StubConverter(delay=0.5)
+"""
+import asyncio
+import random
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+class StubConverter:
+    """Конвертация без внешнего процесса с заданной длительностью."""
+
+    def __init__(
+        self,
+        delay: float = 0.5,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        jobs: Optional[Dict[int, Tuple[float, bool]]] = None
+    ):
+        """
+        Args:
+            delay: Длительность "конвертации" в секундах
+            failure_rate: Доля конвертаций, завершающихся ошибкой
+            seed: Seed генератора ошибок
+            jobs: Длительность и успех по user_id (для воспроизведения трафика)
+        """
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.jobs = jobs or {}
+
+    async def convert(
+        self,
+        input_path: Path,
+        output_format: str,
+        progress_callback: Optional[Callable] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[Path]:
+        if progress_callback:
+            await progress_callback(f"⚙️ Конвертирую в {output_format.upper()}...")
+        delay, ok = self.jobs.get(user_id, (self.delay, self.rng.random() >= self.failure_rate))
+        await asyncio.sleep(delay)
+        if not ok:
+            return None
+
+        output_path = input_path.with_name(f"{input_path.stem}_stub.{output_format}")
+        await asyncio.to_thread(shutil.copyfile, input_path, output_path)
+        return output_path
@@ -4,27 +4,171 @@ Telegram бот для конвертации электронных книг.
 """
 import asyncio
 import logging
+import secrets
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-
-from config import BOT_TOKEN
-from handlers import commands, documents, callbacks
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN, BOT_API_URL, BOT_API_LOCAL, WEBHOOK_URL, WEBHOOK_PORT, WEBHOOK_PATH,
+    WEBHOOK_SECRET, WEBHOOK_MAX_CONCURRENT_UPDATES, HEALTH_CHECK_PORT,
+    HEALTH_MAX_LOOP_LAG, HEALTH_MIN_FREE_MB, HEALTH_MAX_POLL_AGE, TEMP_DIR, LOOP_STALL_THRESHOLD,
+    EBOOK_CONVERT_BIN,
+    FSM_STORAGE_URL, TEMP_FILE_TTL, JANITOR_INTERVAL,
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST,
+    ERROR_DB_PATH, ERROR_LOG_MAX_ENTRIES, TRACE_DIR, TRACE_SAMPLE_RATE, COST_DB_PATH, TRAFFIC_LOG_FILE,
+    LOG_LEVEL, LOG_FILE, LOG_JSON, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN
 )
+from converter.child_usage import close_cost_ledger, configure_cost_ledger
+from handlers import commands, documents, callbacks, batch
+from services import Services, create_services
+from utils.fsm_storage import create_fsm_storage
+from utils.error_manager import error_manager
+from utils.health import HealthMonitor, UpdatePollObserver
+from utils.janitor import run_janitor
+from utils.logging_setup import setup_logging, stop_logging
+from utils.loop_monitor import LoopWatchdog
+from utils.metrics import QUEUE_DEPTH, TEMP_DIR_BYTES
+from utils.send_queue import OutgoingScheduler
+from utils.tracing import configure_tracing, shutdown_tracing
+from utils.traffic_recorder import close_traffic_recorder, configure_traffic_recorder
+from web.app import create_web_app, start_web_server
+from web.monitoring import HEALTH_KEY, register_monitoring_routes
 
 logger = logging.getLogger(__name__)
 
 
+def create_dispatcher(services: Services) -> Dispatcher:
+    """
+    Создает диспетчер с зарегистрированными роутерами.
+
+    Args:
+        services: Общие сервисы; обработчики получают их аргументом services
+
+    Returns:
+        Dispatcher: Настроенный диспетчер
+    """
+    storage = create_fsm_storage(FSM_STORAGE_URL, ttl=TEMP_FILE_TTL)
+    dp = Dispatcher(storage=storage, services=services)
+
+    # Регистрация роутеров
+    dp.include_router(commands.router)
+    dp.include_router(documents.router)
+    dp.include_router(callbacks.router)
+    dp.include_router(batch.router)
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    return dp
+
+
+def register_gauges(outgoing: OutgoingScheduler, services: Services) -> None:
+    """
+    Подключает метрики, вычисляемые при чтении /metrics.
+
+    Args:
+        outgoing: Планировщик исходящих запросов
+        services: Общие сервисы бота
+    """
+    QUEUE_DEPTH.labels("conversions").set_function(lambda: services.queue_depth)
+    QUEUE_DEPTH.labels("outgoing").set_function(lambda: outgoing.queue_depth)
+    TEMP_DIR_BYTES.labels("disk").set_function(lambda: services.file_manager.tier_bytes()["disk"])
+    TEMP_DIR_BYTES.labels("ram").set_function(lambda: services.file_manager.tier_bytes()["ram"])
+
+
+async def on_startup(dispatcher: Dispatcher, services: Services):
+    """
+    Запуск фоновых задач: уборка временных файлов и устаревших состояний,
+    создание конвертера после старта (первый getUpdates его не ждет).
+    """
+    dispatcher["janitor_task"] = asyncio.create_task(run_janitor(
+        services.file_manager,
+        ttl=TEMP_FILE_TTL,
+        interval=JANITOR_INTERVAL,
+        storage=dispatcher.storage,
+        job_queue=services.job_queue
+    ))
+    dispatcher["warm_up_task"] = asyncio.create_task(services.warm_up())
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """
+    Остановка фоновых задач.
+    """
+    for name in ("janitor_task", "warm_up_task"):
+        task = dispatcher.workflow_data.pop(name, None)
+        if task:
+            task.cancel()
+    error_manager.close()
+
+
+async def run_polling(bot: Bot, dp: Dispatcher, app: web.Application):
+    """
+    Запуск бота в режиме long polling.
+
+    Служебные эндпоинты приложения app доступны на HEALTH_CHECK_PORT.
+    """
+    # Удаление вебхука (на случай, если был установлен)
+    await bot.delete_webhook(drop_pending_updates=True)
+
+    runner = await start_web_server(app, [HEALTH_CHECK_PORT])
+    try:
+        logger.info("Бот запущен (long polling)")
+        await dp.start_polling(bot)
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, app: web.Application):
+    """
+    Запуск бота в режиме вебхука на aiohttp-сервере.
+
+    Вебхук и служебные эндпоинты обслуживает одно приложение app.
+    """
+    from web.webhook import WebhookHandler
+
+    secret = WEBHOOK_SECRET
+    if not secret:
+        # Для нескольких экземпляров за балансировщиком секрет должен быть общим
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET не задан, сгенерирован временный секрет")
+
+    webhook = WebhookHandler(
+        dp, bot, secret,
+        max_concurrent=WEBHOOK_MAX_CONCURRENT_UPDATES,
+        on_update=app[HEALTH_KEY].mark_update
+    )
+    webhook.register(app, WEBHOOK_PATH)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    runner = await start_web_server(app, [WEBHOOK_PORT, HEALTH_CHECK_PORT])
+    try:
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info(f"Бот запущен (вебхук {WEBHOOK_URL})")
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+        await webhook.close()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+
 async def main():
     """
     Основная функция запуска бота.
@@ -33,33 +177,80 @@ async def main():
         logger.error("BOT_TOKEN не найден в переменных окружения")
         return
         
+    error_manager.max_entries = ERROR_LOG_MAX_ENTRIES
+    error_manager.attach_store(ERROR_DB_PATH)
+    configure_tracing(TRACE_DIR, TRACE_SAMPLE_RATE)
+    configure_cost_ledger(COST_DB_PATH)
+    configure_traffic_recorder(TRAFFIC_LOG_FILE)
+
     # Инициализация бота и диспетчера
+    session = None
+    if BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_URL, is_local=BOT_API_LOCAL))
     bot = Bot(
         token=BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Регистрация роутеров
-    dp.include_router(commands.router)
-    dp.include_router(documents.router)
-    dp.include_router(callbacks.router)
-    
-    # Удаление вебхука (на случай, если был установлен)
-    await bot.delete_webhook(drop_pending_updates=True)
-    
-    logger.info("Бот запущен")
+    # Все исходящие запросы в чаты идут через очередь с учетом flood control
+    outgoing = OutgoingScheduler(
+        global_rate=SEND_GLOBAL_RATE,
+        chat_rate=SEND_CHAT_RATE,
+        chat_burst=SEND_CHAT_BURST
+    )
+    bot.session.middleware(outgoing)
+    services = create_services()
+    dp = create_dispatcher(services)
+
+    # Состояние для /health/*: в режиме вебхука обновления приходят только
+    # при активности пользователей, поэтому давность не проверяется
+    health = HealthMonitor(
+        TEMP_DIR,
+        queue_depth=lambda: services.queue_depth,
+        calibre_cmd=EBOOK_CONVERT_BIN,
+        max_loop_lag=HEALTH_MAX_LOOP_LAG,
+        min_free_bytes=HEALTH_MIN_FREE_MB * 1_048_576,
+        max_update_age=None if WEBHOOK_URL else HEALTH_MAX_POLL_AGE
+    )
+    bot.session.middleware(UpdatePollObserver(health))
+
+    app = create_web_app()
+    register_monitoring_routes(app, health)
+    register_gauges(outgoing, services)
+    await health.start()
+    watchdog = LoopWatchdog(threshold=LOOP_STALL_THRESHOLD)
+    watchdog.start()
     
     try:
-        # Запуск поллинга
-        await dp.start_polling(bot)
+        if WEBHOOK_URL:
+            await run_webhook(bot, dp, app)
+        else:
+            await run_polling(bot, dp, app)
     finally:
+        await watchdog.stop()
+        await health.stop()
+        await outgoing.close()
         await bot.session.close()
+        shutdown_tracing()
+        close_cost_ledger()
+        close_traffic_recorder()
+        services.close()
         logger.info("Бот остановлен")
 
 
 if __name__ == "__main__":
+    # Запись в файл и консоль - в фоновом потоке, не в event loop
+    setup_logging(
+        LOG_LEVEL,
+        log_file=LOG_FILE,
+        json_format=LOG_JSON,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        rotate_when=LOG_ROTATE_WHEN
+    )
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
+    finally:
+        stop_logging()
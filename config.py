@@ -9,21 +9,108 @@ from dotenv import load_dotenv
 if not os.getenv("PRODUCTION"):
     load_dotenv()
 
-# Telegram
+# Telegram (нужен только боту: bot.py проверяет его при запуске, воркеру и
+# convert_library.py токен не нужен)
 BOT_TOKEN: Final = os.getenv("BOT_TOKEN")
-
-# Проверка токена
-if not BOT_TOKEN:
-    raise ValueError("BOT_TOKEN is required. Set it in .env file or environment variable.")
+# Свой сервер Bot API (telegram-bot-api или benchmarks/fake_bot_api.py); пусто - api.telegram.org
+BOT_API_URL: Final = os.getenv("BOT_API_URL") or None
+# Сервер запущен с --local: файлы читаются с диска, а не скачиваются по HTTP
+BOT_API_LOCAL: Final = os.getenv("BOT_API_LOCAL", "0").lower() in ("1", "true", "yes")
 
 # Файлы
 MAX_FILE_SIZE: Final = 52_428_800  # 50 МБ в байтах
 TEMP_DIR: Final = os.getenv("TEMP_DIR", "/tmp/book_converter")
 CONVERSION_TIMEOUT: Final = int(os.getenv("CONVERSION_TIMEOUT", "60"))  # секунд
+# Исполняемый файл calibre (для тестов без calibre - benchmarks/fake_ebook_convert.py)
+EBOOK_CONVERT_BIN: Final = os.getenv("EBOOK_CONVERT_BIN", "ebook-convert")
+# Лимит размера отправляемого файла (Bot API - 50 МБ); больший результат уменьшается или делится на тома
+UPLOAD_LIMIT: Final = int(os.getenv("UPLOAD_LIMIT", str(MAX_FILE_SIZE)))
+# Пережатие изображений EPUB после конвертации (нужен Pillow); 0 процессов - по числу ядер
+IMAGE_OPTIMIZE: Final = os.getenv("IMAGE_OPTIMIZE", "1").lower() in ("1", "true", "yes")
+IMAGE_MAX_WIDTH: Final = int(os.getenv("IMAGE_MAX_WIDTH", "1264"))
+IMAGE_MAX_HEIGHT: Final = int(os.getenv("IMAGE_MAX_HEIGHT", "1680"))
+IMAGE_JPEG_QUALITY: Final = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_WORKERS: Final = int(os.getenv("IMAGE_WORKERS", "0"))
+# Перепаковка EPUB/HTMLZ/TXTZ параллельным deflate; 0 потоков - по числу ядер
+ZIP_REPACK: Final = os.getenv("ZIP_REPACK", "1").lower() in ("1", "true", "yes")
+ZIP_LEVEL: Final = int(os.getenv("ZIP_LEVEL", "9"))
+ZIP_WORKERS: Final = int(os.getenv("ZIP_WORKERS", "0"))
+# Пакетная конвертация: книги из ZIP-архива или альбома документов
+BATCH_MAX_FILES: Final = int(os.getenv("BATCH_MAX_FILES", "20"))
+BATCH_MAX_TOTAL: Final = int(os.getenv("BATCH_MAX_TOTAL", str(200 * 1_048_576)))  # байт после распаковки
+# Сколько ждать следующий документ альбома, прежде чем собрать пакет
+MEDIA_GROUP_WAIT: Final = float(os.getenv("MEDIA_GROUP_WAIT", "1.0"))  # секунд
+# Время жизни временных файлов и состояний FSM незавершенных конвертаций
+TEMP_FILE_TTL: Final = int(os.getenv("TEMP_FILE_TTL", str(6 * 3600)))  # секунд
+JANITOR_INTERVAL: Final = int(os.getenv("JANITOR_INTERVAL", "600"))  # секунд
+
+# Хранилище FSM: memory, sqlite:///path/fsm.db или redis://host:6379/0
+FSM_STORAGE_URL: Final = os.getenv("FSM_STORAGE_URL", f"sqlite:///{TEMP_DIR}/fsm.db")
+
+# RAM-уровень временных файлов (tmpfs): небольшие файлы не касаются диска
+RAM_TEMP_DIR: Final = os.getenv("RAM_TEMP_DIR", "/dev/shm/book_converter")
+RAM_TEMP_BUDGET: Final = int(os.getenv("RAM_TEMP_BUDGET", "0"))  # байт, 0 - отключено
+RAM_TEMP_MAX_FILE: Final = int(os.getenv("RAM_TEMP_MAX_FILE", str(2 * 1_048_576)))  # байт
+
+# Конвертации: локальный лимит и очередь воркеров
+MAX_CONCURRENT_CONVERSIONS: Final = int(os.getenv("MAX_CONCURRENT_CONVERSIONS", "2"))
+# sqlite:///data/jobs.db или redis://host:6379/0; пусто - конвертация в процессе бота
+JOB_QUEUE_URL: Final = os.getenv("JOB_QUEUE_URL")
+JOB_LEASE_SECONDS: Final = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS: Final = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+# Исходящие запросы к Bot API (лимиты Telegram: ~30 сообщений/с, ~1 сообщение/с в чат)
+SEND_GLOBAL_RATE: Final = float(os.getenv("SEND_GLOBAL_RATE", "25"))
+SEND_CHAT_RATE: Final = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST: Final = float(os.getenv("SEND_CHAT_BURST", "3"))
+
+# Вебхук (если WEBHOOK_HOST не задан, бот работает через long polling)
+WEBHOOK_HOST: Final = os.getenv("WEBHOOK_HOST")
+WEBHOOK_PORT: Final = int(os.getenv("WEBHOOK_PORT", "8000"))
+WEBHOOK_PATH: Final = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL: Final = f"{WEBHOOK_HOST}{WEBHOOK_PATH}" if WEBHOOK_HOST else None
+WEBHOOK_SECRET: Final = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONCURRENT_UPDATES: Final = int(os.getenv("WEBHOOK_MAX_CONCURRENT_UPDATES", "32"))
+
+# Служебные эндпоинты (/metrics, /health/live, /health/ready) в режиме polling и вебхука
+HEALTH_CHECK_PORT: Final = int(os.getenv("HEALTH_CHECK_PORT", "8080"))
+# Пороги готовности: задержка event loop, свободное место, давность getUpdates
+HEALTH_MAX_LOOP_LAG: Final = float(os.getenv("HEALTH_MAX_LOOP_LAG", "1.0"))  # секунд
+HEALTH_MIN_FREE_MB: Final = int(os.getenv("HEALTH_MIN_FREE_MB", "500"))
+HEALTH_MAX_POLL_AGE: Final = float(os.getenv("HEALTH_MAX_POLL_AGE", "120"))  # секунд
+# Блокировка event loop дольше порога логируется со стеком
+LOOP_STALL_THRESHOLD: Final = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))  # секунд
+# Профили команды /profile (collapsed stacks для flamegraph)
+PROFILE_DIR: Final = os.getenv("PROFILE_DIR", "logs/profiles")
+
+# Администраторы (ID через запятую) - доступ к служебным командам
+ADMIN_IDS: Final = frozenset(
+    int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()
+)
+
+# Журнал ошибок: последние ошибки в памяти, все - в SQLite
+ERROR_DB_PATH: Final = os.getenv("ERROR_DB_PATH", "logs/errors.db")
+ERROR_LOG_MAX_ENTRIES: Final = int(os.getenv("ERROR_LOG_MAX_ENTRIES", "1000"))
+
+# Трассировка задач: доля трассируемых задач (0 - выключено) и директория файлов OTLP/JSON
+TRACE_SAMPLE_RATE: Final = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_DIR: Final = os.getenv("TRACE_DIR", "logs/traces")
+
+# Журнал ресурсов (CPU, RSS, I/O) процессов ebook-convert и gs
+COST_DB_PATH: Final = os.getenv("COST_DB_PATH", "logs/costs.db")
+
+# Обезличенная запись трафика для воспроизведения (пусто - выключено)
+TRAFFIC_LOG_FILE: Final = os.getenv("TRAFFIC_LOG_FILE") or None
 
 # Режим работы
 PRODUCTION: Final = bool(os.getenv("PRODUCTION", False))
 LOG_LEVEL: Final = os.getenv("LOG_LEVEL", "INFO")
+# Лог пишется фоновым потоком; ротация по размеру или по времени (LOG_ROTATE_WHEN=midnight)
+LOG_FILE: Final = os.getenv("LOG_FILE", "bot.log")
+LOG_JSON: Final = os.getenv("LOG_JSON", "").lower() in ("1", "true", "yes")
+LOG_MAX_BYTES: Final = int(os.getenv("LOG_MAX_BYTES", str(10 * 1_048_576)))
+LOG_BACKUP_COUNT: Final = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN: Final = os.getenv("LOG_ROTATE_WHEN") or None
 
 # Поддерживаемые форматы
 SUPPORTED_INPUT_FORMATS: Final = {
@@ -39,11 +126,3 @@ SUPPORTED_OUTPUT_FORMATS: Final = {
     'mobi': 'MOBI'
 }
 
-# MIME типы для валидации
-MIME_TYPES: Final = {
-    'application/pdf': 'pdf',
-    'application/epub+zip': 'epub',
-    'application/x-fictionbook+xml': 'fb2',
-    'text/plain': 'txt',
-    'text/html': 'html'
-}
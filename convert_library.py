@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Пакетная конвертация библиотеки без бота.
+
+Обходит дерево каталогов и конвертирует книги в пуле процессов: в каждом
+процессе свой BookConverter, книга сначала проверяется FileValidator.
+Результаты повторяют структуру исходного каталога в --output. Книги,
+уже сконвертированные в этот формат (по SHA-256 содержимого), пропускаются;
+одинаковые книги в разных местах конвертируются один раз. Манифест
+(JSON: статус, результаты и время этапов по каждому файлу) обновляется по
+ходу работы, поэтому прерванный запуск продолжается с того же места.
+Не нужен ни BOT_TOKEN, ни aiogram.
+
+Запуск:
+    python convert_library.py ~/books --output ~/books_epub --format epub --workers 4
+    python convert_library.py ~/books --output ~/books_epub --retry-failed
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import CONVERSION_TIMEOUT, EBOOK_CONVERT_BIN, SUPPORTED_INPUT_FORMATS, SUPPORTED_OUTPUT_FORMATS
+from converter.converter import BookConverter
+from converter.size_target import VOLUME_SUFFIX, find_volumes
+from converter.validators import FileValidator
+from services import create_converter
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Рабочие каталоги конвертаций внутри --output (остатки прерванного запуска удаляются)
+WORK_PREFIX = ".convert-"
+HASH_CHUNK = 1 << 20
+# Манифест пишется не чаще раза в столько секунд (и в конце работы)
+SAVE_INTERVAL = 1.0
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_INVALID = "invalid"
+STATUS_SKIPPED = "skipped"
+# Повторная конвертация не поможет: книга та же, конвертер тот же
+FINAL_STATUSES = {STATUS_OK, STATUS_FAILED, STATUS_INVALID, STATUS_SKIPPED}
+
+# Конвертер процесса пула (создается в _init_worker)
+_converter: Optional[BookConverter] = None
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 содержимого файла, читается частями."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_books(root: Path, exclude: Optional[Path] = None) -> Iterator[Path]:
+    """Файлы поддерживаемых форматов по порядку обхода (без каталога результатов)."""
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(
+            name for name in subdirs
+            if not name.startswith(".") and (exclude is None or Path(directory, name).resolve() != exclude)
+        )
+        for name in sorted(files):
+            if Path(name).suffix.lower().lstrip(".") in SUPPORTED_INPUT_FORMATS:
+                yield Path(directory, name)
+
+
+class Manifest:
+    """Манифест запуска: записи по относительному пути исходного файла."""
+
+    def __init__(self, path: Path, output_format: str):
+        self.path = path
+        self.output_format = output_format
+        self.files: Dict[str, dict] = {}
+        # sha256 -> пути с таким содержимым (поиск готовых книг без обхода всех записей)
+        self._by_hash: Dict[str, List[str]] = {}
+        self._saved_at = 0.0
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == MANIFEST_VERSION and data.get("format") == output_format:
+                for rel, entry in data.get("files", {}).items():
+                    self.record(rel, entry)
+            else:
+                logger.warning(f"Манифест {path} другого формата или версии - начинаю заново")
+
+    def record(self, rel: str, entry: dict) -> None:
+        """Добавляет или заменяет запись файла."""
+        previous = self.files.get(rel)
+        if previous is not None and previous.get("sha256") != entry.get("sha256"):
+            self._by_hash.get(previous.get("sha256"), []).remove(rel)
+        if previous is None or previous.get("sha256") != entry.get("sha256"):
+            self._by_hash.setdefault(entry.get("sha256"), []).append(rel)
+        self.files[rel] = entry
+
+    def cached(self, sha256: str, retry_failed: bool) -> Optional[dict]:
+        """Готовая запись для книги с таким содержимым (результаты на месте)."""
+        for rel in self._by_hash.get(sha256, []):
+            entry = self.files[rel]
+            if entry.get("status") not in FINAL_STATUSES:
+                continue
+            if entry["status"] == STATUS_OK:
+                if all((self.path.parent / output).exists() for output in entry.get("outputs", [])):
+                    return entry
+            elif not retry_failed:
+                return entry
+        return None
+
+    def save(self, force: bool = False) -> None:
+        """Атомарно записывает манифест (не чаще SAVE_INTERVAL без force)."""
+        now = time.monotonic()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        self._saved_at = now
+        data = {"version": MANIFEST_VERSION, "format": self.output_format, "updated": time.time(), "files": self.files}
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        temp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(temp_path, self.path)
+
+
+def _init_worker(timeout: int, ebook_convert: str) -> None:
+    """Конвертер процесса: параллельность дает пул, поэтому вспомогательные пулы по одному."""
+    global _converter
+    # Без лимита загрузки: результат не отправляется в Telegram
+    _converter = create_converter(
+        ebook_convert=ebook_convert, upload_limit=None, image_workers=1, zip_workers=1, timeout=timeout
+    )
+
+
+def output_paths(destination: Path, count: int) -> List[Path]:
+    """Пути результатов книги: один файл или тома с суффиксом _ТомN."""
+    if count == 1:
+        return [destination]
+    return [
+        destination.with_name(f"{destination.stem}{VOLUME_SUFFIX}{number}{destination.suffix}")
+        for number in range(1, count + 1)
+    ]
+
+
+def hash_book(source: str) -> dict:
+    """Хеш книги (выполняется в процессе пула)."""
+    started = time.perf_counter()
+    sha256 = file_sha256(Path(source))
+    return {"sha256": sha256, "hash_seconds": time.perf_counter() - started}
+
+
+def convert_book(source: str, destination: str, output_format: str) -> dict:
+    """
+    Проверяет и конвертирует одну книгу (выполняется в процессе пула).
+
+    Args:
+        source: Исходный файл
+        destination: Путь результата (тома - output_paths; каталог создается)
+        output_format: Целевой формат
+
+    Returns:
+        dict: status, outputs (пути результатов), error, время этапов
+    """
+    seconds = {}
+    started = time.perf_counter()
+    result = FileValidator.inspect(Path(source))
+    seconds["validate"] = time.perf_counter() - started
+    if not result.is_valid:
+        return {"status": STATUS_INVALID, "error": result.error, "seconds": seconds}
+    if result.format == output_format:
+        return {"status": STATUS_SKIPPED, "error": "Книга уже в целевом формате", "seconds": seconds}
+
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    # Результат BookConverter пишет рядом с входом: вход - ссылка в рабочем каталоге
+    with tempfile.TemporaryDirectory(prefix=WORK_PREFIX, dir=destination.parent) as work:
+        link = Path(work) / f"{destination.stem}.{result.format}"
+        try:
+            link.symlink_to(Path(source).resolve())
+        except OSError:
+            shutil.copyfile(source, link)
+        output_path = asyncio.run(_converter.convert(link, output_format))
+        seconds["convert"] = time.perf_counter() - started
+        if output_path is None or not output_path.exists():
+            return {"status": STATUS_FAILED, "error": "Конвертация не удалась", "seconds": seconds}
+
+        volumes = find_volumes(output_path)
+        outputs = output_paths(destination, len(volumes))
+        for volume, target in zip(volumes, outputs):
+            os.replace(volume, target)
+    return {"status": STATUS_OK, "outputs": [str(output) for output in outputs], "seconds": seconds}
+
+
+def _copy_outputs(entry: dict, destination: Path, output_root: Path) -> List[str]:
+    """Результаты книги-дубликата: жесткие ссылки (или копии) результатов оригинала."""
+    outputs = []
+    sources = entry.get("outputs", [])
+    for source, target in zip(sources, output_paths(destination, len(sources))):
+        source = output_root / source
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target != source:
+            target.unlink(missing_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+        outputs.append(target.relative_to(output_root).as_posix())
+    return outputs
+
+
+def run(args) -> int:
+    root = Path(args.source).resolve()
+    output_root = Path(args.output).resolve()
+    output_root.mkdir(parents=True, exist_ok=True)
+    for stale in output_root.rglob(f"{WORK_PREFIX}*"):
+        shutil.rmtree(stale, ignore_errors=True)
+
+    manifest = Manifest(Path(args.manifest).resolve() if args.manifest else output_root / MANIFEST_NAME, args.format)
+    books = list(find_books(root, exclude=output_root))
+    total = len(books)
+    counts: Dict[str, int] = {}
+    done = 0
+
+    def finish(rel: str, entry: dict, cached: bool = False) -> None:
+        nonlocal done
+        done += 1
+        manifest.record(rel, entry)
+        manifest.save()
+        status = "cached" if cached else entry["status"]
+        counts[status] = counts.get(status, 0) + 1
+        spent = sum(entry.get("seconds", {}).values())
+        note = f" - {entry['error']}" if entry.get("error") and not cached else ""
+        print(f"[{done}/{total}] {status:<8} {rel} ({spent:.1f}с){note}", flush=True)
+
+    def destination_for(rel: str) -> Path:
+        return (output_root / rel).with_suffix(f".{args.format}")
+
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(args.timeout, args.ebook_convert)
+    )
+    pending: Dict[Future, tuple] = {}
+    # Книги с содержимым, которое уже конвертируется: sha256 -> [относительные пути]
+    duplicates: Dict[str, List[str]] = {}
+    def unreadable(rel: str, error: OSError) -> None:
+        # Висячая ссылка или файл без прав на чтение не останавливают весь запуск
+        finish(rel, {"status": STATUS_FAILED, "error": f"Не удалось прочитать файл: {error}", "seconds": {}})
+
+    try:
+        for book in books:
+            rel = book.relative_to(root).as_posix()
+            try:
+                stat = book.stat()
+            except OSError as e:
+                unreadable(rel, e)
+                continue
+            previous = manifest.files.get(rel)
+            if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime_ns:
+                # Файл не менялся - хеш из манифеста
+                future = Future()
+                future.set_result({"sha256": previous["sha256"], "hash_seconds": 0.0})
+            else:
+                future = pool.submit(hash_book, str(book))
+            pending[future] = ("hash", rel, book, stat)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, rel, book, stat, *rest = pending.pop(future)
+                if kind == "hash":
+                    try:
+                        hashed = future.result()
+                    except OSError as e:
+                        unreadable(rel, e)
+                        continue
+                    sha256 = hashed["sha256"]
+                    entry = {
+                        "sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime_ns,
+                        "seconds": {"hash": hashed["hash_seconds"]}
+                    }
+                    cached = manifest.cached(sha256, args.retry_failed)
+                    if cached is not None:
+                        entry.update(status=cached["status"], error=cached.get("error"))
+                        if cached["status"] == STATUS_OK:
+                            entry["outputs"] = _copy_outputs(cached, destination_for(rel), output_root)
+                        finish(rel, entry, cached=True)
+                    elif sha256 in duplicates:
+                        duplicates[sha256].append(rel)
+                        manifest.record(rel, dict(entry, status="pending"))
+                    else:
+                        duplicates[sha256] = []
+                        # Прошлые результаты этого пути (книга изменилась) больше не нужны
+                        for output in (manifest.files.get(rel) or {}).get("outputs", []):
+                            (output_root / output).unlink(missing_ok=True)
+                        manifest.record(rel, dict(entry, status="pending"))
+                        convert = pool.submit(convert_book, str(book), str(destination_for(rel)), args.format)
+                        pending[convert] = ("convert", rel, book, stat, entry)
+                    continue
+
+                entry = rest[0]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"status": STATUS_FAILED, "error": f"Ошибка процесса конвертации: {e}", "seconds": {}}
+                entry["seconds"].update(result.pop("seconds", {}))
+                entry.update(result)
+                if entry.get("outputs"):
+                    entry["outputs"] = [Path(output).relative_to(output_root).as_posix() for output in entry["outputs"]]
+                finish(rel, entry)
+                for duplicate in duplicates.pop(entry["sha256"], []):
+                    copied = dict(manifest.files[duplicate], status=entry["status"], error=entry.get("error"))
+                    if entry["status"] == STATUS_OK:
+                        copied["outputs"] = _copy_outputs(entry, destination_for(duplicate), output_root)
+                    finish(duplicate, copied, cached=True)
+    except KeyboardInterrupt:
+        print("Прервано: манифест сохранен, повторный запуск продолжит работу", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    finally:
+        # Незавершенные книги остаются в манифесте как pending и конвертируются при повторе
+        manifest.save(force=True)
+        pool.shutdown(cancel_futures=True)
+
+    summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+    print(f"Готово за {time.perf_counter() - started:.1f}с ({summary}). Манифест: {manifest.path}")
+    return 1 if counts.get(STATUS_FAILED) else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетная конвертация библиотеки книг")
+    parser.add_argument("source", help="каталог с книгами (обходится рекурсивно)")
+    parser.add_argument("--output", required=True, help="каталог результатов (структура как в source)")
+    parser.add_argument("--format", default="epub", choices=sorted(SUPPORTED_OUTPUT_FORMATS), help="целевой формат")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов конвертации")
+    parser.add_argument("--timeout", type=int, default=CONVERSION_TIMEOUT, help="таймаут одной книги, секунд")
+    parser.add_argument("--manifest", help=f"путь манифеста (по умолчанию OUTPUT/{MANIFEST_NAME})")
+    parser.add_argument("--retry-failed", action="store_true", help="повторить книги, которые не удались раньше")
+    parser.add_argument("--ebook-convert", default=EBOOK_CONVERT_BIN, help="исполняемый файл ebook-convert")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный лог конвертера")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    if not Path(args.source).is_dir():
+        print(f"Каталог {args.source} не найден", file=sys.stderr)
+        return 2
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
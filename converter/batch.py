@@ -0,0 +1,294 @@
+"""
+Пакетная конвертация: книги из ZIP-архива или альбома документов.
+
+Архив распаковывается потоково: каждая книга копируется частями в свой
+временный файл, вложенные архивы (типичный .fb2.zip внутри архива)
+раскрываются на один уровень, размеры ограничены заявленными в архиве.
+Книги конвертируются параллельно через переданную функцию convert (в боте -
+ConversionScheduler.convert с его лимитами), результаты собираются в
+ZIP-архивы не больше лимита загрузки.
+"""
+import asyncio
+import logging
+import re
+import shutil
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from config import MAX_FILE_SIZE, SUPPORTED_INPUT_FORMATS
+from converter.size_target import VOLUME_SUFFIX, find_volumes
+from converter.sniffer import SNIFF_BYTES, ZIP_LOCAL_SIGNATURE, sniff_format
+from utils.error_manager import ErrorCode
+
+logger = logging.getLogger(__name__)
+
+RAR_SIGNATURE = b"Rar!\x1a\x07"
+ZIP_EMPTY_SIGNATURE = b"PK\x05\x06"
+COPY_CHUNK = 1 << 20
+# Глубина вложенных архивов: архив из .fb2.zip раскрывается, глубже - нет
+MAX_NESTING = 1
+# Имена без флага UTF-8 в архивах из Windows - почти всегда CP866
+ZIP_NAME_ENCODING = "cp866"
+
+# Уже сжатые форматы хранятся в архиве результата без сжатия
+STORED_FORMATS = {"epub", "pdf", "mobi", "azw3", "docx", "htmlz", "txtz"}
+# Заголовки ZIP на запись (локальный и центральный) без имени и конец архива
+ZIP_ENTRY_OVERHEAD = 30 + 46
+ZIP_END_OVERHEAD = 22
+PART_SUFFIX = "_Часть"
+
+_JUNK = re.compile(r"(^|/)(\.[^/]*|Thumbs\.db|desktop\.ini)$|^__MACOSX/", re.IGNORECASE)
+
+
+@dataclass
+class BatchBook:
+    """Книга пакета: имя, под которым ее прислали, и временный файл."""
+
+    name: str
+    path: str
+
+
+@dataclass
+class ExtractResult:
+    """Результат распаковки архива."""
+
+    books: List[BatchBook] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    error_code: Optional[ErrorCode] = None
+
+
+@dataclass
+class BatchReport:
+    """Итог пакетной конвертации."""
+
+    total: int = 0
+    done: int = 0
+    # Файлы результата по порядку книг: (имя в архиве, путь)
+    files: List[Tuple[str, Path]] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+
+
+def sniff_archive(path: Path) -> Optional[str]:
+    """
+    Определяет, прислан ли архив с книгами, а не сама книга.
+
+    Args:
+        path: Скачанный файл
+
+    Returns:
+        str: "zip" или "rar"; None - не архив (EPUB - книга, а не архив)
+    """
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(RAR_SIGNATURE):
+        return "rar"
+    if head.startswith(ZIP_EMPTY_SIGNATURE):
+        return "zip"
+    if head.startswith(ZIP_LOCAL_SIGNATURE) and sniff_format(head) is None:
+        return "zip"
+    return None
+
+
+def _copy_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, target: Path) -> None:
+    """Копирует запись частями: в памяти не больше COPY_CHUNK."""
+    with archive.open(info) as source, open(target, "wb") as out:
+        shutil.copyfileobj(source, out, COPY_CHUNK)
+
+
+def _extract_members(
+    archive: zipfile.ZipFile,
+    create_file: Callable[[str, int], Path],
+    result: ExtractResult,
+    limits: dict,
+    depth: int = 0
+) -> None:
+    for info in archive.infolist():
+        if info.is_dir() or _JUNK.search(info.filename):
+            continue
+        # Только имя файла: пути внутри архива не выходят за временный каталог
+        name = info.filename.rsplit("/", 1)[-1]
+        extension = Path(name).suffix.lower().lstrip(".")
+        nested = extension == "zip" and depth < MAX_NESTING
+        if not nested and extension not in SUPPORTED_INPUT_FORMATS:
+            result.skipped.append(name)
+            continue
+        if len(result.books) >= limits["max_books"] or info.file_size > limits["max_file"] \
+                or limits["total"] + info.file_size > limits["max_total"]:
+            result.skipped.append(name)
+            continue
+
+        target = create_file(f".{extension}", info.file_size)
+        try:
+            _copy_member(archive, info, target)
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError, EOFError, OSError) as e:
+            # Поврежденная или зашифрованная запись не мешает остальным
+            logger.warning(f"Не удалось распаковать {info.filename}: {e}")
+            target.unlink(missing_ok=True)
+            result.skipped.append(name)
+            continue
+
+        if not nested:
+            limits["total"] += info.file_size
+            result.books.append(BatchBook(name=name, path=str(target)))
+            continue
+        try:
+            with zipfile.ZipFile(target, metadata_encoding=ZIP_NAME_ENCODING) as inner:
+                _extract_members(inner, create_file, result, limits, depth + 1)
+        except zipfile.BadZipFile:
+            result.skipped.append(name)
+        finally:
+            target.unlink(missing_ok=True)
+
+
+def extract_books(
+    archive_path: Path,
+    create_file: Callable[[str, int], Path],
+    max_books: int = 20,
+    max_total: int = 200 * 1_048_576,
+    max_file: int = MAX_FILE_SIZE
+) -> ExtractResult:
+    """
+    Распаковывает книги из ZIP-архива во временные файлы (синхронно).
+
+    Записи неподдерживаемых форматов, превышающие лимиты и поврежденные
+    пропускаются и перечисляются в skipped.
+
+    Args:
+        archive_path: ZIP-архив
+        create_file: Создает пустой временный файл (расширение, ожидаемый размер)
+        max_books: Максимум книг из архива
+        max_total: Максимум байт всех книг после распаковки
+        max_file: Максимальный размер одной книги
+
+    Returns:
+        ExtractResult: Книги по порядку архива или ошибка
+    """
+    result = ExtractResult()
+    limits = {"max_books": max_books, "max_total": max_total, "max_file": max_file, "total": 0}
+    try:
+        with zipfile.ZipFile(archive_path, metadata_encoding=ZIP_NAME_ENCODING) as archive:
+            _extract_members(archive, create_file, result, limits)
+    except (zipfile.BadZipFile, OSError) as e:
+        for book in result.books:
+            Path(book.path).unlink(missing_ok=True)
+        result.books = []
+        result.error = f"Архив поврежден: {e}"
+        result.error_code = ErrorCode.VALIDATION_TRUNCATED_ARCHIVE
+        return result
+
+    if not result.books:
+        result.error = "В архиве нет книг поддерживаемых форматов"
+        result.error_code = ErrorCode.VALIDATION_UNSUPPORTED_FORMAT
+    return result
+
+
+def result_name(book_name: str, output_format: str, number: int = 1, total: int = 1) -> str:
+    """Имя результата в архиве: имя книги с новым расширением (и номером тома)."""
+    stem = Path(book_name).stem or "Book"
+    if total > 1:
+        stem = f"{stem}{VOLUME_SUFFIX}{number}"
+    return f"{stem}.{output_format}"
+
+
+def _unique(name: str, used: set) -> str:
+    candidate, index = name, 2
+    while candidate in used:
+        path = Path(name)
+        candidate = f"{path.stem} ({index}){path.suffix}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+async def convert_batch(
+    books: List[BatchBook],
+    output_format: str,
+    convert: Callable[[Path, str], Awaitable[Optional[Path]]],
+    concurrency: int = 2,
+    progress_callback: Optional[Callable[[BatchReport], Awaitable[None]]] = None
+) -> BatchReport:
+    """
+    Конвертирует книги пакета параллельно.
+
+    concurrency ограничивает число книг пакета в работе одновременно:
+    остальные пользователи встают в общую очередь между книгами пакета,
+    а не ждут весь пакет.
+
+    Args:
+        books: Книги пакета
+        output_format: Целевой формат
+        convert: Конвертация одной книги (путь, формат) -> путь результата
+        concurrency: Книг пакета в работе одновременно
+        progress_callback: Вызывается после каждой книги с текущим отчетом
+
+    Returns:
+        BatchReport: Файлы результата (тома - отдельными файлами) и ошибки
+    """
+    report = BatchReport(total=len(books))
+    outputs: List[List[Path]] = [[] for _ in books]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, book: BatchBook) -> None:
+        async with semaphore:
+            try:
+                output_path = await convert(Path(book.path), output_format)
+            except Exception as e:
+                logger.error(f"Пакет: ошибка конвертации {book.name}: {e}")
+                output_path = None
+        if output_path is not None and output_path.exists():
+            outputs[index] = find_volumes(output_path)
+        else:
+            report.failed.append(book.name)
+        report.done += 1
+        if progress_callback:
+            await progress_callback(report)
+
+    await asyncio.gather(*(run(index, book) for index, book in enumerate(books)))
+
+    used = set()
+    for book, volumes in zip(books, outputs):
+        for number, volume in enumerate(volumes, 1):
+            name = _unique(result_name(book.name, output_format, number, len(volumes)), used)
+            report.files.append((name, volume))
+    report.failed.sort(key=[book.name for book in books].index)
+    return report
+
+
+def pack_results(files: List[Tuple[str, Path]], target: Path, limit: Optional[int] = None) -> List[Path]:
+    """
+    Собирает результаты в ZIP-архивы не больше limit (синхронно).
+
+    Файлы раскладываются по порядку; если все не помещаются в один архив,
+    следующие части - target с суффиксом _Часть2, _Часть3...
+
+    Args:
+        files: (имя в архиве, путь) по порядку
+        target: Путь первого архива
+        limit: Максимальный размер архива (None - один архив)
+
+    Returns:
+        List[Path]: Архивы по порядку
+    """
+    parts: List[List[Tuple[str, Path]]] = [[]]
+    size = ZIP_END_OVERHEAD
+    for name, path in files:
+        # Оценка сверху: deflate текстовых форматов только уменьшает размер
+        entry_size = path.stat().st_size + ZIP_ENTRY_OVERHEAD + 2 * len(name.encode())
+        if limit and parts[-1] and size + entry_size > limit:
+            parts.append([])
+            size = ZIP_END_OVERHEAD
+        parts[-1].append((name, path))
+        size += entry_size
+
+    archives = []
+    for number, part in enumerate(parts, 1):
+        path = target if number == 1 else target.with_name(f"{target.stem}{PART_SUFFIX}{number}{target.suffix}")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, source in part:
+                stored = source.suffix.lower().lstrip(".") in STORED_FORMATS
+                archive.write(source, name, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+        archives.append(path)
+    return archives
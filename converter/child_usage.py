@@ -0,0 +1,203 @@
+"""
+Учет ресурсов дочерних процессов конвертации (ebook-convert, gs).
+
+Команда запускается через converter/usage_wrapper.py, который получает
+rusage завершившегося процесса через os.wait4. Собрать его напрямую
+нельзя: процессы asyncio забирает child watcher цикла событий.
+
+Результат попадает в метрики, журнал стоимости (CostLedger), атрибуты
+текущего спана трассы и в список collect_child_usage() - так воркер
+прикладывает ресурсы к записи задачи.
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from utils.cost_ledger import CostLedger
+from utils.metrics import (
+    CHILD_BLOCK_IO_BYTES, CHILD_CPU_SECONDS, CHILD_MAX_RSS_BYTES, format_label, size_bucket
+)
+from utils.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+WRAPPER = str(Path(__file__).with_name("usage_wrapper.py"))
+
+# Размер блока в ru_inblock/ru_oublock
+BLOCK_SIZE = 512
+
+
+@dataclass
+class ChildUsage:
+    """Ресурсы, потребленные дочерним процессом."""
+
+    tool: str
+    src: str
+    dst: str
+    input_bytes: int
+    returncode: int
+    wall_seconds: float
+    user_cpu_seconds: float
+    sys_cpu_seconds: float
+    max_rss_bytes: int
+    read_blocks: int
+    write_blocks: int
+
+    @property
+    def cpu_seconds(self) -> float:
+        return self.user_cpu_seconds + self.sys_cpu_seconds
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_ledger: Optional[CostLedger] = None
+_collector: ContextVar[Optional[List[ChildUsage]]] = ContextVar("child_usage", default=None)
+
+
+def configure_cost_ledger(db_path: str) -> None:
+    """Включает запись журнала стоимости конвертаций."""
+    global _ledger
+    if _ledger is None:
+        _ledger = CostLedger(db_path)
+
+
+def get_cost_ledger() -> Optional[CostLedger]:
+    """Журнал стоимости (None, если не включен)."""
+    return _ledger
+
+
+def close_cost_ledger() -> None:
+    """Дописывает журнал и останавливает фоновый поток."""
+    global _ledger
+    if _ledger is not None:
+        _ledger.close()
+        _ledger = None
+
+
+@contextmanager
+def collect_child_usage() -> Iterator[List[ChildUsage]]:
+    """
+    Собирает ресурсы процессов, запущенных внутри блока.
+
+    Задачи, созданные внутри блока, наследуют контекст и пишут в тот же список.
+    """
+    usages: List[ChildUsage] = []
+    token = _collector.set(usages)
+    try:
+        yield usages
+    finally:
+        _collector.reset(token)
+
+
+class UsageProbe:
+    """
+    Учет ресурсов одного запуска внешней программы.
+
+    Пример:
+        probe = UsageProbe("ebook-convert", input_path, "epub")
+        process = await asyncio.create_subprocess_exec(*probe.wrap(cmd), ...)
+        await process.wait()
+        probe.collect()
+    """
+
+    # os.wait4 есть только на Unix; на Windows команда запускается как есть
+    supported = hasattr(os, "wait4")
+
+    def __init__(self, tool: str, input_path: Path, dst: str):
+        """
+        Args:
+            tool: Имя программы для меток (ebook-convert, gs)
+            input_path: Входной файл (формат и размер для отчета)
+            dst: Целевой формат
+        """
+        self.tool = tool
+        self.src = format_label(Path(input_path).suffix)
+        self.dst = format_label(dst)
+        try:
+            self.input_bytes = Path(input_path).stat().st_size
+        except OSError:
+            self.input_bytes = 0
+        self.usage_path: Optional[str] = None
+
+    def wrap(self, cmd: List[str]) -> List[str]:
+        """Возвращает команду, запускаемую через обертку учета ресурсов."""
+        if not self.supported:
+            return cmd
+        fd, self.usage_path = tempfile.mkstemp(prefix="usage_", suffix=".json")
+        os.close(fd)
+        return [sys.executable, WRAPPER, self.usage_path, "--", *cmd]
+
+    def collect(self) -> Optional[ChildUsage]:
+        """
+        Читает rusage завершившегося процесса и записывает его.
+
+        Returns:
+            ChildUsage или None, если данные недоступны (процесс убит и т.п.)
+        """
+        if self.usage_path is None:
+            return None
+        try:
+            with open(self.usage_path) as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            # Обертку убили до записи (таймаут) - ресурсов не знаем
+            return None
+        finally:
+            for path in (self.usage_path, f"{self.usage_path}.tmp"):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self.usage_path = None
+
+        usage = ChildUsage(
+            tool=self.tool,
+            src=self.src,
+            dst=self.dst,
+            input_bytes=self.input_bytes,
+            returncode=raw["returncode"],
+            wall_seconds=raw["wall_seconds"],
+            user_cpu_seconds=raw["user_cpu_seconds"],
+            sys_cpu_seconds=raw["sys_cpu_seconds"],
+            max_rss_bytes=raw["max_rss_bytes"],
+            read_blocks=raw["read_blocks"],
+            write_blocks=raw["write_blocks"],
+        )
+        record_usage(usage)
+        return usage
+
+
+def record_usage(usage: ChildUsage) -> None:
+    """Передает ресурсы процесса в метрики, журнал, трассу и сборщик задачи."""
+    size = size_bucket(usage.input_bytes)
+    CHILD_CPU_SECONDS.labels(usage.tool, usage.src, usage.dst, size).observe(usage.cpu_seconds)
+    CHILD_MAX_RSS_BYTES.labels(usage.tool, usage.src, usage.dst, size).observe(usage.max_rss_bytes)
+    CHILD_BLOCK_IO_BYTES.labels(usage.tool, "read").inc(usage.read_blocks * BLOCK_SIZE)
+    CHILD_BLOCK_IO_BYTES.labels(usage.tool, "write").inc(usage.write_blocks * BLOCK_SIZE)
+
+    if _ledger is not None:
+        record = usage.to_dict()
+        record["size_bucket"] = size
+        _ledger.append(record)
+
+    trace = current_trace()
+    if trace is not None:
+        trace.current.set_attribute("cpu_seconds", round(usage.cpu_seconds, 3))
+        trace.current.set_attribute("max_rss_bytes", usage.max_rss_bytes)
+
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(usage)
+
+    logger.info(
+        f"{usage.tool} ({usage.src} → {usage.dst}): CPU {usage.cpu_seconds:.2f} с, "
+        f"RSS {usage.max_rss_bytes // 1_048_576} МБ"
+    )
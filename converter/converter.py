@@ -5,29 +5,57 @@ import asyncio
 import subprocess
 import re
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Sequence
 import logging
 import time
 
+from converter.image_optimizer import EpubImageOptimizer
 from converter.large_file_converter import LargeFileConverter
+from converter.zip_repack import ZipRepacker
+from converter.size_target import (
+    PROFILES, drop_fonts, estimate_input, predict_size, split_epub, volume_path
+)
 from utils.error_manager import error_manager, ErrorCode
+from utils.metrics import ACTIVE_CHILDREN, POSTPROCESS_SAVED_BYTES, observe_stage
+from converter.child_usage import UsageProbe
+from utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Подмножество глифов вместо целых шрифтов, когда книга близка к лимиту
+SUBSET_FONTS = ("--subset-embedded-fonts",)
+# ZIP-контейнеры, которые перепаковываются с лучшим сжатием
+REPACK_FORMATS = {"epub", "htmlz", "txtz"}
+
 
 class BookConverter:
     """
     Конвертер книг с использованием calibre ebook-convert.
     """
     
-    def __init__(self, timeout: int = 300):
+    def __init__(
+        self,
+        timeout: int = 300,
+        ebook_convert: str = "ebook-convert",
+        image_optimizer: Optional[EpubImageOptimizer] = None,
+        upload_limit: Optional[int] = None,
+        zip_repacker: Optional[ZipRepacker] = None
+    ):
         """
         Инициализация конвертера.
         
         Args:
             timeout: Таймаут конвертации в секундах (по умолчанию 5 минут)
+            ebook_convert: Исполняемый файл ebook-convert (EBOOK_CONVERT_BIN)
+            image_optimizer: Пережатие изображений EPUB после конвертации (None - выключено)
+            upload_limit: Максимальный размер результата в байтах (None - без подгонки)
+            zip_repacker: Перепаковка EPUB/HTMLZ/TXTZ с лучшим сжатием (None - выключено)
         """
         self.timeout = timeout
+        self.ebook_convert = ebook_convert
+        self.image_optimizer = image_optimizer
+        self.upload_limit = upload_limit
+        self.zip_repacker = zip_repacker
         self.large_file_threshold = 20  # МБ - порог для больших файлов
         logger.info(f"BookConverter инициализирован с таймаутом {timeout} секунд")
     
@@ -110,21 +138,269 @@ class BookConverter:
         
         return params
     
+    async def _postprocess(self, output_path: Path, input_path: Path, output_format: str) -> None:
+        """
+        Пережимает изображения готового EPUB и перепаковывает архив.
+
+        Ошибки постобработки не ломают конвертацию: пользователь получит
+        исходный результат ebook-convert.
+        """
+        if self.image_optimizer is not None and output_format == "epub":
+            await self._optimize_images(output_path, input_path, output_format)
+        await self._repack(output_path, input_path, output_format)
+
+    async def _optimize_images(self, output_path: Path, input_path: Path, output_format: str) -> None:
+        started = time.perf_counter()
+        size = output_path.stat().st_size
+        try:
+            with span("image-optimize", dst=output_format):
+                report = await self.image_optimizer.optimize(output_path)
+        except Exception as e:
+            observe_stage("images", input_path.suffix, output_format, size, time.perf_counter() - started, ok=False)
+            logger.warning(f"Пережатие изображений {output_path.name} не удалось: {e}")
+            return
+        if report is None:
+            return
+        observe_stage("images", input_path.suffix, output_format, size, report.seconds)
+        POSTPROCESS_SAVED_BYTES.labels("images").inc(report.bytes_saved)
+        logger.info(
+            f"Изображения {output_path.name}: {report.images} шт., пережато {report.recompressed}, "
+            f"дубликатов {report.duplicates}, сэкономлено {report.bytes_saved / 1024:.0f} КБ "
+            f"за {report.seconds:.2f}с"
+        )
+
+    async def _repack(self, output_path: Path, input_path: Path, output_format: str) -> None:
+        """Перепаковывает ZIP-контейнер; последний шаг перед отправкой."""
+        if self.zip_repacker is None or output_format not in REPACK_FORMATS:
+            return
+        started = time.perf_counter()
+        size = output_path.stat().st_size
+        try:
+            with span("zip-repack", dst=output_format):
+                report = await self.zip_repacker.repack(output_path)
+        except Exception as e:
+            observe_stage("repack", input_path.suffix, output_format, size, time.perf_counter() - started, ok=False)
+            logger.warning(f"Перепаковка {output_path.name} не удалась: {e}")
+            return
+        observe_stage("repack", input_path.suffix, output_format, size, report.seconds)
+        POSTPROCESS_SAVED_BYTES.labels("repack").inc(report.bytes_saved)
+        logger.info(
+            f"Перепаковка {output_path.name}: записей {report.entries}, удалено {report.dropped}, "
+            f"сэкономлено {report.bytes_saved / 1024:.0f} КБ за {report.seconds:.2f}с"
+        )
+
     async def convert(
-        self, 
-        input_path: Path, 
+        self,
+        input_path: Path,
         output_format: str,
         progress_callback: Optional[callable] = None,
         user_id: Optional[int] = None
     ) -> Optional[Path]:
         """
         Асинхронно конвертирует книгу в указанный формат с поддержкой больших файлов.
+
+        Если задан upload_limit, результат укладывается в лимит: размер
+        прогнозируется до конвертации, EPUB уменьшается профилями из
+        converter.size_target, а книга, которая все равно не помещается,
+        делится на тома (остальные тома - size_target.find_volumes).
+        
+        Args:
+            input_path: Путь к исходному файлу
+            output_format: Целевой формат (без точки)
+            progress_callback: Функция для уведомлений о прогрессе
+            user_id: ID пользователя для логирования ошибок
+            
+        Returns:
+            Path к конвертированному файлу (первому тому) или None при ошибке
+        """
+        if not self.upload_limit or not input_path.exists():
+            return await self._convert_file(input_path, output_format, progress_callback, user_id)
+
+        estimate = await asyncio.to_thread(estimate_input, input_path)
+        predicted = predict_size(estimate, output_format)
+        oversize = predicted > self.upload_limit
+        if oversize:
+            logger.info(
+                f"Прогноз размера {input_path.name} → {output_format}: {predicted / 1_048_576:.1f} МБ, "
+                f"лимит {self.upload_limit / 1_048_576:.0f} МБ"
+            )
+            if progress_callback:
+                await progress_callback("📦 Книга больше лимита Telegram, уменьшаю размер...")
+            if output_format != "epub":
+                return await self._convert_in_volumes(input_path, output_format, progress_callback, user_id)
+
+        output_path = await self._convert_file(
+            input_path, output_format, progress_callback, user_id,
+            extra_params=SUBSET_FONTS if oversize else ()
+        )
+        if output_path is None or output_path.stat().st_size <= self.upload_limit:
+            return output_path
+        if output_format == "epub":
+            volumes = await self._fit_epub(output_path, output_format, input_path, progress_callback)
+            # Профили и деление на тома пишут архивы заново со стандартным сжатием
+            for volume in volumes:
+                await self._repack(volume, input_path, output_format)
+            return self._check_volumes(volumes, input_path, output_format, user_id)
+
+        # Прогноз ошибся: результат пересобирается через EPUB
+        logger.warning(
+            f"{output_path.name}: {output_path.stat().st_size / 1_048_576:.1f} МБ больше лимита, "
+            f"прогноз был {predicted / 1_048_576:.1f} МБ"
+        )
+        output_path.unlink()
+        return await self._convert_in_volumes(input_path, output_format, progress_callback, user_id)
+
+    async def _fit_epub(
+        self,
+        epub_path: Path,
+        output_format: str,
+        input_path: Path,
+        progress_callback: Optional[callable] = None
+    ) -> List[Path]:
+        """
+        Уменьшает EPUB профилями, а если не хватает - делит на тома.
+
+        Профиль применяется к готовому EPUB, без повторного запуска
+        ebook-convert; профили, которые по прогнозу не помогут, пропускаются.
+
+        Args:
+            epub_path: Готовый EPUB
+            output_format: Формат, в который будет сконвертирован EPUB
+            input_path: Исходный файл (для метрик)
+            progress_callback: Функция для уведомлений о прогрессе
+
+        Returns:
+            List[Path]: Тома EPUB по порядку (один, если книга поместилась)
+        """
+        started = time.perf_counter()
+        size_before = epub_path.stat().st_size
+        current = PROFILES[0]
+        estimate = await asyncio.to_thread(estimate_input, epub_path)
+
+        def fits() -> bool:
+            if output_format == "epub":
+                return epub_path.stat().st_size <= self.upload_limit
+            return predict_size(estimate, output_format) <= self.upload_limit
+
+        with span("size-target", dst=output_format):
+            try:
+                for index, profile in enumerate(PROFILES[1:], 1):
+                    if fits():
+                        break
+                    predicted = predict_size(estimate, output_format, profile, current)
+                    if predicted >= predict_size(estimate, output_format):
+                        continue
+                    if predicted > self.upload_limit and index < len(PROFILES) - 1:
+                        continue
+                    if progress_callback:
+                        await progress_callback(f"🗜 Уменьшаю книгу (профиль {profile.name})...")
+                    if self.image_optimizer is not None:
+                        await self.image_optimizer.optimize(epub_path, profile.max_size, profile.jpeg_quality)
+                    if profile.drop_fonts:
+                        await asyncio.to_thread(drop_fonts, epub_path)
+                    current = profile
+                    estimate = await asyncio.to_thread(estimate_input, epub_path)
+                    logger.info(
+                        f"{epub_path.name}: профиль {profile.name}, {epub_path.stat().st_size / 1_048_576:.1f} МБ"
+                    )
+
+                volumes = [epub_path]
+                if not fits():
+                    if progress_callback:
+                        await progress_callback("📚 Делю книгу на тома...")
+                    volumes = await asyncio.to_thread(split_epub, epub_path, self.upload_limit, output_format)
+            except Exception as e:
+                # Книга остается одним файлом; _check_volumes сообщит о превышении лимита
+                logger.warning(f"Не удалось уменьшить {epub_path.name}: {e}")
+                volumes = [epub_path]
+
+        size_after = sum(volume.stat().st_size for volume in volumes)
+        POSTPROCESS_SAVED_BYTES.labels("size_target").inc(max(0, size_before - size_after))
+        observe_stage("size_target", input_path.suffix, output_format, size_before, time.perf_counter() - started)
+        return volumes
+
+    async def _convert_in_volumes(
+        self,
+        input_path: Path,
+        output_format: str,
+        progress_callback: Optional[callable],
+        user_id: Optional[int]
+    ) -> Optional[Path]:
+        """
+        Конвертация через EPUB: книга уменьшается и делится на тома в EPUB,
+        затем каждый том конвертируется в целевой формат.
+        """
+        epub_path = await self._convert_file(
+            input_path, "epub", progress_callback, user_id, extra_params=SUBSET_FONTS
+        )
+        if epub_path is None:
+            return None
+        epub_volumes = await self._fit_epub(epub_path, output_format, input_path, progress_callback)
+
+        final_path = self.generate_output_filename(input_path, output_format)
+        outputs = []
+        try:
+            for number, volume in enumerate(epub_volumes, 1):
+                if progress_callback and len(epub_volumes) > 1:
+                    await progress_callback(f"⚙️ Том {number} из {len(epub_volumes)}: конвертирую в {output_format.upper()}...")
+                output_path = await self._convert_file(volume, output_format, None, user_id)
+                if output_path is None:
+                    for path in outputs:
+                        path.unlink(missing_ok=True)
+                    return None
+                target = volume_path(final_path, number) if len(epub_volumes) > 1 else final_path
+                outputs.append(output_path.replace(target))
+        finally:
+            for volume in epub_volumes:
+                volume.unlink(missing_ok=True)
+        return self._check_volumes(outputs, input_path, output_format, user_id)
+
+    def _check_volumes(
+        self,
+        volumes: List[Path],
+        input_path: Path,
+        output_format: str,
+        user_id: Optional[int]
+    ) -> Optional[Path]:
+        """Первый том, если все тома укладываются в лимит, иначе None."""
+        oversized = [volume for volume in volumes if volume.stat().st_size > self.upload_limit]
+        if not oversized:
+            if len(volumes) > 1:
+                logger.info(f"{input_path.name} → {output_format}: {len(volumes)} тома(ов)")
+            return volumes[0]
+
+        error_id = error_manager.log_error(
+            ErrorCode.CONVERSION_OUTPUT_TOO_LARGE,
+            context={
+                'input_path': str(input_path),
+                'target_format': output_format,
+                'volumes': len(volumes),
+                'largest_mb': round(max(volume.stat().st_size for volume in oversized) / 1_048_576, 1)
+            },
+            user_id=user_id
+        )
+        logger.error(f"Результат {input_path.name} не помещается в лимит даже по томам (Error ID: {error_id})")
+        for volume in volumes:
+            volume.unlink(missing_ok=True)
+        return None
+
+    async def _convert_file(
+        self, 
+        input_path: Path, 
+        output_format: str,
+        progress_callback: Optional[callable] = None,
+        user_id: Optional[int] = None,
+        extra_params: Sequence[str] = ()
+    ) -> Optional[Path]:
+        """
+        Одна конвертация ebook-convert (без подгонки под лимит размера).
         
         Args:
             input_path: Путь к исходному файлу
             output_format: Целевой формат (без точки)
             progress_callback: Функция для уведомлений о прогрессе
             user_id: ID пользователя для логирования ошибок
+            extra_params: Дополнительные параметры ebook-convert
             
         Returns:
             Path к конвертированному файлу или None при ошибке
@@ -150,12 +426,15 @@ class BookConverter:
             if file_size_mb > self.large_file_threshold:
                 logger.info(f"Большой файл ({file_size_mb:.1f} МБ), используем оптимизированный конвертер")
                 
-                large_converter = LargeFileConverter(progress_callback)
-                return await large_converter.convert_with_progress(
+                large_converter = LargeFileConverter(progress_callback, ebook_convert=self.ebook_convert)
+                output_path = await large_converter.convert_with_progress(
                     input_path, 
                     output_format,
                     timeout=1800  # 30 минут для больших файлов
                 )
+                if output_path:
+                    await self._postprocess(output_path, input_path, output_format)
+                return output_path
             
             # Обычная конвертация для небольших файлов
             if progress_callback:
@@ -169,28 +448,46 @@ class BookConverter:
             
             # Команда для ebook-convert
             cmd = [
-                'ebook-convert',
+                self.ebook_convert,
                 str(input_path),
                 str(output_path)
-            ] + format_params
+            ] + format_params + list(extra_params)
             
             logger.info(f"Выполнение команды: {' '.join(cmd)}")
             
             # Запускаем процесс асинхронно
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Ждем завершения с таймаутом
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=self.timeout
+            conversion_start = time.perf_counter()
+            probe = UsageProbe("ebook-convert", input_path, output_format)
+            with ACTIVE_CHILDREN.labels("ebook-convert").track_inprogress(), \
+                    span("ebook-convert", dst=output_format):
+                process = await asyncio.create_subprocess_exec(
+                    *probe.wrap(cmd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                
+                # Ждем завершения с таймаутом
+                try:
+                    stdout, stderr = await asyncio.wait_for(
+                        process.communicate(),
+                        timeout=self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    # Не оставляем ebook-convert работать после таймаута
+                    process.kill()
+                    await process.wait()
+                    raise
+                finally:
+                    probe.collect()
+            observe_stage(
+                "conversion", input_path.suffix, output_format, input_path.stat().st_size,
+                time.perf_counter() - conversion_start, ok=process.returncode == 0
             )
             
             # Проверяем код возврата
             if process.returncode == 0:
+                if output_path.exists():
+                    await self._postprocess(output_path, input_path, output_format)
                 duration = time.time() - start_time
                 output_size_mb = output_path.stat().st_size / (1024 * 1024) if output_path.exists() else 0
                 
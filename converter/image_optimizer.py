@@ -0,0 +1,422 @@
+"""
+Постобработка EPUB: пережатие и уменьшение изображений.
+
+Книги с иллюстрациями после ebook-convert часто получаются больше
+исходника: calibre копирует изображения как есть. Этот этап открывает
+EPUB, уменьшает изображения до разрешения читалки и пережимает их в
+пуле процессов, заменяет одинаковые изображения (по SHA-256) одним
+файлом и переписывает архив. Дубликат удаляется, только если после
+перевода ссылок его имя больше не встречается в разметке. Результат
+сохраняется, только если архив стал меньше. В работе одновременно
+лишь несколько изображений на процесс пула, поэтому память родителя не
+растет с числом иллюстраций.
+
+Нужен Pillow (pip install Pillow); без него этап пропускается.
+"""
+import asyncio
+import copy
+import hashlib
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Collection, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import unquote
+
+# Pillow импортируется только в процессах пула: боту и воркеру он не нужен
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# Файлы, в которых могут быть ссылки на изображения
+TEXT_EXTENSIONS = {".xhtml", ".html", ".htm", ".css", ".opf", ".ncx", ".svg", ".xml"}
+# Форматы Pillow, которые пережимаются без смены формата (ссылки не меняются)
+RECOMPRESSIBLE = {"JPEG", "PNG", "WEBP"}
+# Изображений в работе на один процесс пула
+IMAGES_PER_WORKER = 2
+
+# Ссылка в разметке или CSS: значение в кавычках или в url(...) до #фрагмента или ?запроса
+_REFERENCE = re.compile(r'(["\'(])([^"\'()<>#?\s]+)(?=[#?"\')])')
+_MANIFEST_ITEM = re.compile(r'\s*<item\b[^>]*/>')
+_HREF = re.compile(r'\bhref=["\']([^"\']+)["\']')
+_ID = re.compile(r'\bid=["\']([^"\']+)["\']')
+
+
+@dataclass
+class ImageOptimizationReport:
+    """Итог постобработки одного EPUB."""
+
+    images: int = 0
+    recompressed: int = 0
+    duplicates: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def recompress_image(data: bytes, max_size: Tuple[int, int], jpeg_quality: int) -> Optional[bytes]:
+    """
+    Уменьшает и пережимает изображение (выполняется в процессе пула).
+
+    Args:
+        data: Исходное изображение
+        max_size: Максимальные ширина и высота
+        jpeg_quality: Качество JPEG/WebP
+
+    Returns:
+        bytes: Новое изображение или None, если меньше не получилось
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format
+        if image_format not in RECOMPRESSIBLE or getattr(image, "is_animated", False):
+            return None
+        image.load()
+        icc_profile = image.info.get("icc_profile")
+        if image.width > max_size[0] or image.height > max_size[1]:
+            if image.mode == "P":
+                image = image.convert("RGBA")
+            image.thumbnail(max_size, Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == "JPEG":
+            if image.mode not in ("RGB", "L", "CMYK"):
+                image = image.convert("RGB")
+            # Без progressive: старые читалки не открывают прогрессивный JPEG
+            image.save(output, "JPEG", quality=jpeg_quality, optimize=True, icc_profile=icc_profile)
+        elif image_format == "PNG":
+            image.save(output, "PNG", optimize=True)
+        else:
+            image.save(output, "WEBP", quality=jpeg_quality, method=6)
+
+    result = output.getvalue()
+    return result if len(result) < len(data) else None
+
+
+def _relative(target: str, base_file: str) -> str:
+    """Путь к target относительно файла base_file (внутри архива)."""
+    return posixpath.relpath(target, posixpath.dirname(base_file) or ".")
+
+
+def _resolve(href: str, base_file: str) -> str:
+    """Путь в архиве, на который указывает ссылка href из файла base_file."""
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_file), unquote(href)))
+
+
+def _rewrite_references(name: str, text: str, duplicates: Dict[str, str], manifest_ids: Dict[str, str]) -> str:
+    """Переводит ссылки на дубликаты изображений на оставленный файл."""
+    if name.lower().endswith(".opf"):
+        # Элементы манифеста дубликатов удаляются, ссылки на их id (обложка) переводятся
+        redirected: Dict[str, str] = {}
+
+        def drop_item(match: re.Match) -> str:
+            href = _HREF.search(match.group(0))
+            original = duplicates.get(_resolve(href.group(1), name)) if href else None
+            if original is None:
+                return match.group(0)
+            item_id = _ID.search(match.group(0))
+            if item_id and manifest_ids.get(original):
+                redirected[item_id.group(1)] = manifest_ids[original]
+            return ""
+
+        text = _MANIFEST_ITEM.sub(drop_item, text)
+        for item_id, original_id in redirected.items():
+            text = re.sub(
+                r'(\b(?:content|idref)=(["\']))' + re.escape(item_id) + r'(?=\2)',
+                lambda ref: ref.group(1) + original_id,
+                text
+            )
+
+    def redirect(match: re.Match) -> str:
+        # Ссылки сравниваются после раскодирования %XX и нормализации ./ и ../
+        original = duplicates.get(_resolve(match.group(2), name))
+        return match.group(0) if original is None else match.group(1) + _relative(original, name)
+
+    return _REFERENCE.sub(redirect, text)
+
+
+def _still_referenced(duplicates: Iterable[str], texts: Iterable[str]) -> Set[str]:
+    """
+    Дубликаты, имя которых осталось в разметке после перевода ссылок.
+
+    Ссылку, которую не удалось распознать (абсолютный путь, необычная
+    запись), нельзя оставить висячей, поэтому такой дубликат сохраняется.
+    Проверка по имени файла осторожна: совпадение с другим файлом лишь
+    оставляет дубликат в архиве.
+    """
+    unquoted = [unquote(text) for text in texts]
+    return {
+        duplicate for duplicate in duplicates
+        if any(posixpath.basename(duplicate) in text for text in unquoted)
+    }
+
+
+def _manifest_ids(archive: zipfile.ZipFile, names) -> Dict[str, str]:
+    """id элементов манифеста OPF по полному пути файла в архиве."""
+    ids = {}
+    for name in names:
+        if not name.lower().endswith(".opf"):
+            continue
+        opf = archive.read(name).decode("utf-8", errors="ignore")
+        for item in re.finditer(r"<item\b[^>]*>", opf):
+            href = _HREF.search(item.group(0))
+            item_id = _ID.search(item.group(0))
+            if href and item_id:
+                ids[_resolve(href.group(1), name)] = item_id.group(1)
+    return ids
+
+
+def write_epub(
+    target_path: Path,
+    source: zipfile.ZipFile,
+    replaced: Optional[Dict[str, bytes]] = None,
+    skip: Collection[str] = (),
+    include: Optional[Callable[[str], bool]] = None
+) -> None:
+    """
+    Записывает копию EPUB с замененными и пропущенными записями.
+
+    Args:
+        target_path: Куда записать архив
+        source: Исходный архив
+        replaced: Новое содержимое записей по имени
+        skip: Имена записей, которые не попадают в копию
+        include: Фильтр имен записей (None - все)
+    """
+    replaced = replaced or {}
+    with zipfile.ZipFile(target_path, "w", zipfile.ZIP_DEFLATED) as target:
+        # mimetype - первой записью и без сжатия (требование OCF)
+        ordered = sorted(source.infolist(), key=lambda info: info.filename != "mimetype")
+        for info in ordered:
+            if info.filename in skip or (include is not None and not include(info.filename)):
+                continue
+            data = replaced[info.filename] if info.filename in replaced else source.read(info)
+            compress_type = zipfile.ZIP_STORED if info.filename == "mimetype" else info.compress_type
+            # writestr меняет смещения в ZipInfo - исходный архив должен остаться читаемым
+            target.writestr(copy.copy(info), data, compress_type=compress_type)
+
+
+def replace_epub(
+    epub_path: Path,
+    source: zipfile.ZipFile,
+    replaced: Dict[str, bytes],
+    skip: Collection[str] = ()
+) -> Optional[int]:
+    """
+    Переписывает EPUB на месте, если новый архив меньше.
+
+    Returns:
+        int: Новый размер или None, если выигрыша нет и файл не тронут
+    """
+    fd, temp_name = tempfile.mkstemp(suffix=".epub", dir=epub_path.parent)
+    os.close(fd)
+    temp_path = Path(temp_name)
+    try:
+        write_epub(temp_path, source, replaced, skip)
+        new_size = temp_path.stat().st_size
+        if new_size >= epub_path.stat().st_size:
+            return None
+        os.replace(temp_path, epub_path)
+        return new_size
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def optimize_epub(
+    epub_path: Path,
+    pool: Executor,
+    max_size: Tuple[int, int] = (1264, 1680),
+    jpeg_quality: int = 80,
+    min_image_bytes: int = 8192,
+    workers: int = 1
+) -> ImageOptimizationReport:
+    """
+    Пережимает изображения EPUB и убирает дубликаты (синхронно).
+
+    Args:
+        epub_path: Путь к EPUB, файл заменяется на месте
+        pool: Пул процессов для recompress_image
+        max_size: Максимальные ширина и высота изображений
+        jpeg_quality: Качество JPEG/WebP
+        min_image_bytes: Изображения меньше этого размера не пережимаются
+        workers: Процессов в пуле (ограничивает число изображений в работе)
+
+    Returns:
+        ImageOptimizationReport: Сколько изображений обработано и байт сэкономлено
+    """
+    started = time.perf_counter()
+    report = ImageOptimizationReport(bytes_before=epub_path.stat().st_size)
+    report.bytes_after = report.bytes_before
+
+    with zipfile.ZipFile(epub_path) as source:
+        infos = source.infolist()
+        names = [info.filename for info in infos]
+        text_names = [name for name in names if posixpath.splitext(name.lower())[1] in TEXT_EXTENSIONS]
+
+        # Одинаковые изображения: дубликат -> первый файл с тем же содержимым
+        by_digest: Dict[bytes, str] = {}
+        duplicates: Dict[str, str] = {}
+        replaced: Dict[str, bytes] = {}
+        # Задачи пула -> имя изображения; оригиналы в памяти только у задач окна
+        futures: Dict[Future, str] = {}
+        window = max(1, workers) * IMAGES_PER_WORKER
+
+        def collect(done) -> None:
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    logger.debug(f"Изображение {name} не пережато: {e}")
+                    continue
+                if result is not None:
+                    replaced[name] = result
+
+        for info in infos:
+            if posixpath.splitext(info.filename.lower())[1] not in IMAGE_EXTENSIONS:
+                continue
+            report.images += 1
+            data = source.read(info)
+            digest = hashlib.sha256(data).digest()
+            if digest in by_digest:
+                duplicates[info.filename] = by_digest[digest]
+                continue
+            by_digest[digest] = info.filename
+            if len(data) >= min_image_bytes:
+                futures[pool.submit(recompress_image, data, max_size, jpeg_quality)] = info.filename
+                while len(futures) >= window:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect(done)
+        collect(list(futures))
+
+        texts: Dict[str, bytes] = {}
+        if duplicates:
+            try:
+                originals = {name: source.read(name).decode("utf-8") for name in text_names}
+            except UnicodeDecodeError:
+                # Ссылки в файле не в UTF-8 не переписать - дубликаты оставляем
+                logger.debug(f"{epub_path.name}: не UTF-8 разметка, дубликаты не удаляются")
+                originals, duplicates = {}, {}
+            manifest_ids = _manifest_ids(source, text_names) if duplicates else {}
+
+            rewritten: Dict[str, str] = {}
+            while duplicates:
+                rewritten = {
+                    name: _rewrite_references(name, text, duplicates, manifest_ids)
+                    for name, text in originals.items()
+                }
+                # Дубликат с оставшимися ссылками сохраняется, ссылки на него не трогаем
+                kept = _still_referenced(duplicates, rewritten.values())
+                if not kept:
+                    break
+                logger.debug(f"{epub_path.name}: дубликаты с нераспознанными ссылками сохранены: {sorted(kept)}")
+                duplicates = {duplicate: original for duplicate, original in duplicates.items() if duplicate not in kept}
+            if duplicates:
+                texts = {
+                    name: text.encode("utf-8") for name, text in rewritten.items() if text != originals[name]
+                }
+
+        if not replaced and not duplicates:
+            report.seconds = time.perf_counter() - started
+            return report
+
+        new_size = replace_epub(epub_path, source, {**replaced, **texts}, skip=duplicates)
+        if new_size is not None:
+            report.bytes_after = new_size
+            report.recompressed = len(replaced)
+            report.duplicates = len(duplicates)
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+class EpubImageOptimizer:
+    """Постобработка EPUB в общем пуле процессов."""
+
+    def __init__(
+        self,
+        max_size: Tuple[int, int] = (1264, 1680),
+        jpeg_quality: int = 80,
+        workers: Optional[int] = None,
+        min_image_bytes: int = 8192
+    ):
+        """
+        Args:
+            max_size: Максимальные ширина и высота (по умолчанию - экран Kindle Oasis)
+            jpeg_quality: Качество JPEG/WebP
+            workers: Процессов в пуле (None - по числу ядер)
+            min_image_bytes: Изображения меньше этого размера не пережимаются
+        """
+        self.max_size = max_size
+        self.jpeg_quality = jpeg_quality
+        self.workers = workers or os.cpu_count() or 1
+        self.min_image_bytes = min_image_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if not PIL_AVAILABLE:
+            logger.warning("Pillow не установлен, пережатие изображений EPUB отключено")
+
+    @property
+    def available(self) -> bool:
+        return PIL_AVAILABLE
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Не fork: в процессе бота работают потоки (логи, хранилища)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    async def optimize(
+        self,
+        epub_path: Path,
+        max_size: Optional[Tuple[int, int]] = None,
+        jpeg_quality: Optional[int] = None
+    ) -> Optional[ImageOptimizationReport]:
+        """
+        Пережимает изображения EPUB, не блокируя event loop.
+
+        Args:
+            epub_path: Путь к EPUB (заменяется на месте)
+            max_size: Размер вместо настроенного (профили уменьшения размера)
+            jpeg_quality: Качество вместо настроенного
+
+        Returns:
+            ImageOptimizationReport или None, если Pillow не установлен
+        """
+        if not PIL_AVAILABLE:
+            return None
+        try:
+            return await asyncio.to_thread(
+                optimize_epub, epub_path, self._get_pool(),
+                max_size or self.max_size, jpeg_quality or self.jpeg_quality, self.min_image_bytes,
+                self.workers
+            )
+        except BrokenProcessPool:
+            # Процесс пула убит (OOM killer): следующий вызов создаст новый пул
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Останавливает пул процессов."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -10,20 +10,26 @@ import time
 import os
 import tempfile
 
+from converter.child_usage import UsageProbe
+from utils.metrics import ACTIVE_CHILDREN, observe_stage
+from utils.tracing import span
+
 logger = logging.getLogger(__name__)
 
 
 class LargeFileConverter:
     """Конвертер с оптимизацией для больших файлов."""
     
-    def __init__(self, progress_callback: Optional[Callable] = None):
+    def __init__(self, progress_callback: Optional[Callable] = None, ebook_convert: str = "ebook-convert"):
         """
         Инициализация конвертера для больших файлов.
         
         Args:
             progress_callback: Функция для уведомлений о прогрессе
+            ebook_convert: Исполняемый файл ebook-convert
         """
         self.progress_callback = progress_callback
+        self.ebook_convert = ebook_convert
         
     async def optimize_pdf_before_conversion(self, input_path: Path) -> Path:
         """
@@ -59,14 +65,28 @@ class LargeFileConverter:
                 str(input_path)
             ]
             
-            process = await asyncio.create_subprocess_exec(
-                *optimize_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            optimize_start = time.perf_counter()
+            probe = UsageProbe("gs", input_path, "pdf")
+            with ACTIVE_CHILDREN.labels("gs").track_inprogress(), span("gs"):
+                process = await asyncio.create_subprocess_exec(
+                    *probe.wrap(optimize_cmd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=300)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise
+                finally:
+                    probe.collect()
+            observe_stage(
+                "optimize", "pdf", "pdf", input_path.stat().st_size,
+                time.perf_counter() - optimize_start, ok=process.returncode == 0
             )
             
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=300)
-            
             if process.returncode == 0 and optimized_path.exists():
                 original_size = input_path.stat().st_size / (1024 * 1024)
                 optimized_size = optimized_path.stat().st_size / (1024 * 1024)
@@ -198,7 +218,7 @@ class LargeFileConverter:
             
             # Команда для конвертации
             cmd = [
-                'ebook-convert',
+                self.ebook_convert,
                 str(working_file),
                 str(output_path),
                 '--verbose'  # Включаем подробный вывод для отслеживания
@@ -207,15 +227,27 @@ class LargeFileConverter:
             logger.info(f"Конвертация большого файла: {' '.join(cmd[:3])} + {len(format_params)} параметров")
             
             # Запускаем конвертацию с мониторингом
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT
+            conversion_start = time.perf_counter()
+            probe = UsageProbe("ebook-convert", input_path, target_format)
+            with ACTIVE_CHILDREN.labels("ebook-convert").track_inprogress(), \
+                    span("ebook-convert", dst=target_format):
+                process = await asyncio.create_subprocess_exec(
+                    *probe.wrap(cmd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT
+                )
+                
+                # Мониторим прогресс
+                try:
+                    await self._monitor_conversion_progress(process, timeout)
+                finally:
+                    probe.collect()
+            observe_stage(
+                "conversion", input_path.suffix, target_format, input_path.stat().st_size,
+                time.perf_counter() - conversion_start,
+                ok=process.returncode == 0 and output_path.exists()
             )
             
-            # Мониторим прогресс
-            await self._monitor_conversion_progress(process, timeout)
-            
             if process.returncode == 0 and output_path.exists():
                 duration = time.time() - start_time
                 output_size_mb = output_path.stat().st_size / (1024 * 1024)
@@ -0,0 +1,386 @@
+"""
+Размер результата под лимит загрузки Telegram.
+
+Bot API принимает документы до 50 МБ; книга, которая после конвертации
+не помещается в лимит, не может быть доставлена. Модуль прогнозирует
+размер результата по составу исходного файла (текст, изображения,
+шрифты), уменьшает готовый EPUB все более жесткими профилями (качество
+и разрешение изображений, удаление встроенных шрифтов) и, если этого
+мало, делит книгу на пронумерованные тома по документам spine.
+"""
+import logging
+import mmap
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+from urllib.parse import unquote
+
+from converter.image_optimizer import IMAGE_EXTENSIONS, replace_epub, write_epub
+
+logger = logging.getLogger(__name__)
+
+FONT_EXTENSIONS = {".ttf", ".otf", ".woff", ".woff2"}
+
+# Доля сжатого текста от размера разметки/текста (deflate по русскому тексту)
+TEXT_RATIO = 0.4
+# Текст PDF после извлечения занимает малую часть файла без изображений
+PDF_TEXT_RATIO = 0.15
+# Доля base64 от декодированных данных
+BASE64_RATIO = 0.75
+
+# Во сколько раз результат больше EPUB-эквивалента: (текст, изображения)
+OUTPUT_FACTORS: Dict[str, Tuple[float, float]] = {
+    "epub": (1.0, 1.0),
+    "mobi": (1.3, 1.0),
+    "pdf": (1.5, 1.0),
+    "fb2": (2.5, 1.34),
+    "txt": (2.5, 0.0),
+    "html": (2.5, 0.0),
+}
+
+# Запас тома под служебные файлы архива и неточность прогноза
+VOLUME_MARGIN = 0.95
+VOLUME_SUFFIX = "_Том"
+
+_PDF_IMAGE = re.compile(rb"/Subtype\s*/Image")
+_PDF_LENGTH = re.compile(rb"/Length\s+(\d+)(?!\s+\d+\s+R)")
+_FB2_BINARY = re.compile(rb"<binary\b[^>]*>(.*?)</binary>", re.DOTALL)
+_REFERENCE = re.compile(r'(?:src|href)=["\']([^"\'#?]+)', re.IGNORECASE)
+_FONT_FACE = re.compile(r"@font-face\s*\{[^}]*\}", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class SizeProfile:
+    """Профиль уменьшения EPUB."""
+
+    name: str
+    max_size: Tuple[int, int]
+    jpeg_quality: int
+    # Ожидаемый объем изображений относительно профиля standard
+    image_ratio: float
+    drop_fonts: bool = False
+
+
+PROFILES = (
+    SizeProfile("standard", (1264, 1680), 80, 1.0),
+    SizeProfile("compact", (1072, 1448), 60, 0.55),
+    SizeProfile("small", (758, 1024), 45, 0.25, drop_fonts=True),
+    SizeProfile("tiny", (600, 800), 30, 0.15, drop_fonts=True),
+)
+
+
+@dataclass
+class SizeEstimate:
+    """Состав книги в байтах EPUB-эквивалента."""
+
+    text_bytes: int = 0
+    image_bytes: int = 0
+    font_bytes: int = 0
+
+
+def predict_size(
+    estimate: SizeEstimate,
+    output_format: str,
+    profile: SizeProfile = PROFILES[0],
+    current: SizeProfile = PROFILES[0]
+) -> int:
+    """
+    Прогноз размера результата.
+
+    Args:
+        estimate: Состав книги
+        output_format: Целевой формат
+        profile: Профиль, который будет применен
+        current: Профиль, с которым получен estimate
+
+    Returns:
+        int: Ожидаемый размер в байтах
+    """
+    text_factor, image_factor = OUTPUT_FACTORS.get(output_format, (1.0, 1.0))
+    fonts = 0 if profile.drop_fonts else estimate.font_bytes
+    images = estimate.image_bytes * profile.image_ratio / current.image_ratio
+    return int(text_factor * (estimate.text_bytes + fonts) + image_factor * images)
+
+
+def _estimate_epub(path: Path) -> SizeEstimate:
+    estimate = SizeEstimate()
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            extension = posixpath.splitext(info.filename.lower())[1]
+            if extension in IMAGE_EXTENSIONS:
+                estimate.image_bytes += info.compress_size
+            elif extension in FONT_EXTENSIONS:
+                estimate.font_bytes += info.compress_size
+            else:
+                estimate.text_bytes += info.compress_size
+    return estimate
+
+
+def _estimate_pdf(path: Path) -> SizeEstimate:
+    """Изображения - потоки XObject /Image, длина берется из их словаря."""
+    size = path.stat().st_size
+    images = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for match in _PDF_IMAGE.finditer(data):
+            start = data.rfind(b"<<", max(0, match.start() - 1024), match.start())
+            end = data.find(b"stream", match.end(), match.end() + 1024)
+            if start < 0 or end < 0:
+                continue
+            length = _PDF_LENGTH.search(data, start, end)
+            if length:
+                images += int(length.group(1))
+    images = min(images, size)
+    return SizeEstimate(text_bytes=int((size - images) * PDF_TEXT_RATIO), image_bytes=images)
+
+
+def _estimate_fb2(path: Path) -> SizeEstimate:
+    size = path.stat().st_size
+    binaries = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for match in _FB2_BINARY.finditer(data):
+            binaries += match.end(1) - match.start(1)
+    return SizeEstimate(
+        text_bytes=int((size - binaries) * TEXT_RATIO),
+        image_bytes=int(binaries * BASE64_RATIO)
+    )
+
+
+def estimate_input(path: Path) -> SizeEstimate:
+    """
+    Оценивает состав книги по исходному файлу (без конвертации).
+
+    Args:
+        path: Исходный файл (формат по расширению)
+
+    Returns:
+        SizeEstimate: Текст, изображения и шрифты в байтах EPUB-эквивалента
+    """
+    extension = path.suffix.lower()
+    try:
+        if extension == ".epub":
+            return _estimate_epub(path)
+        if extension == ".pdf":
+            return _estimate_pdf(path)
+        if extension == ".fb2":
+            return _estimate_fb2(path)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        logger.debug(f"Не удалось разобрать {path.name} для прогноза размера: {e}")
+    return SizeEstimate(text_bytes=int(path.stat().st_size * TEXT_RATIO))
+
+
+def drop_fonts(epub_path: Path) -> int:
+    """
+    Удаляет встроенные шрифты из EPUB вместе с правилами @font-face.
+
+    Returns:
+        int: Сэкономлено байт
+    """
+    before = epub_path.stat().st_size
+    with zipfile.ZipFile(epub_path) as source:
+        names = source.namelist()
+        fonts = {name for name in names if posixpath.splitext(name.lower())[1] in FONT_EXTENSIONS}
+        if not fonts:
+            return 0
+        replaced = {}
+        for name in names:
+            lower = name.lower()
+            if lower.endswith(".css"):
+                css = source.read(name).decode("utf-8", errors="replace")
+                replaced[name] = _FONT_FACE.sub("", css).encode("utf-8")
+            elif lower.endswith(".opf"):
+                opf = source.read(name).decode("utf-8")
+                base = posixpath.dirname(name)
+                replaced[name] = _remove_items(opf, base, fonts).encode("utf-8")
+        new_size = replace_epub(epub_path, source, replaced, skip=fonts)
+    return before - new_size if new_size is not None else 0
+
+
+def volume_path(output_path: Path, number: int) -> Path:
+    """Путь тома number для результата output_path."""
+    return output_path.with_name(f"{output_path.stem}{VOLUME_SUFFIX}{number}{output_path.suffix}")
+
+
+def find_volumes(output_path: Path) -> List[Path]:
+    """
+    Все тома результата по пути первого тома.
+
+    Args:
+        output_path: Результат конвертации (первый том или единственный файл)
+
+    Returns:
+        List[Path]: Тома по порядку (или [output_path], если книга не делилась)
+    """
+    match = re.fullmatch(rf"(.*){VOLUME_SUFFIX}1", output_path.stem)
+    if not match:
+        return [output_path]
+    base = output_path.with_name(match.group(1) + output_path.suffix)
+    volumes = []
+    while volume_path(base, len(volumes) + 1).exists():
+        volumes.append(volume_path(base, len(volumes) + 1))
+    return volumes
+
+
+def _resolve(base: str, href: str) -> str:
+    return posixpath.normpath(posixpath.join(base, unquote(href)))
+
+
+def _remove_items(opf: str, base: str, removed: Set[str]) -> str:
+    """Удаляет из OPF элементы манифеста, ссылки spine и guide на файлы removed."""
+    removed_ids = set()
+
+    def drop_item(match):
+        href = re.search(r'\bhref=["\']([^"\']+)["\']', match.group(0))
+        if href and _resolve(base, href.group(1)) in removed:
+            item_id = re.search(r'\bid=["\']([^"\']+)["\']', match.group(0))
+            if item_id:
+                removed_ids.add(item_id.group(1))
+            return ""
+        return match.group(0)
+
+    opf = re.sub(r"\s*<(?:\w+:)?(?:item|reference)\b[^>]*/>", drop_item, opf)
+
+    def drop_itemref(match):
+        idref = re.search(r'\bidref=["\']([^"\']+)["\']', match.group(0))
+        return "" if idref and idref.group(1) in removed_ids else match.group(0)
+
+    return re.sub(r"\s*<(?:\w+:)?itemref\b[^>]*/>", drop_itemref, opf)
+
+
+def _rootfile(archive: zipfile.ZipFile) -> str:
+    container = ET.fromstring(archive.read("META-INF/container.xml"))
+    return container.find(".//{*}rootfile").get("full-path")
+
+
+def _filter_ncx(ncx: bytes, base: str, kept: Set[str]) -> bytes:
+    """Оставляет в оглавлении NCX только пункты, ведущие в том."""
+    root = ET.fromstring(ncx)
+    if root.tag.startswith("{"):
+        # Иначе ElementTree запишет пространство имен NCX с префиксом ns0
+        ET.register_namespace("", root.tag[1:].split("}")[0])
+
+    def prune(parent) -> None:
+        for point in list(parent.findall("{*}navPoint")):
+            prune(point)
+            content = point.find("{*}content")
+            target = _resolve(base, content.get("src", "").split("#")[0]) if content is not None else ""
+            if target in kept:
+                continue
+            child = point.find("{*}navPoint/{*}content")
+            if child is not None and content is not None:
+                # Сама глава в другом томе, но ее подглавы здесь
+                content.set("src", child.get("src"))
+            else:
+                parent.remove(point)
+
+    nav_map = root.find("{*}navMap")
+    if nav_map is not None:
+        prune(nav_map)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def split_epub(epub_path: Path, limit: int, output_format: str = "epub") -> List[Path]:
+    """
+    Делит EPUB на тома, каждый из которых после конвертации в output_format
+    укладывается в limit.
+
+    Документы spine распределяются по порядку; в каждый том попадают
+    стили, шрифты и изображения, на которые ссылаются его документы.
+    Исходный файл удаляется, тома записываются рядом (volume_path).
+
+    Args:
+        epub_path: Исходный EPUB
+        limit: Лимит размера тома в байтах результата
+        output_format: Формат, в который будут конвертированы тома
+
+    Returns:
+        List[Path]: Тома по порядку; [epub_path], если делить нечего
+    """
+    text_factor, image_factor = OUTPUT_FACTORS.get(output_format, (1.0, 1.0))
+    with zipfile.ZipFile(epub_path) as source:
+        infos = {info.filename: info for info in source.infolist()}
+        opf_name = _rootfile(source)
+        base = posixpath.dirname(opf_name)
+        package = ET.fromstring(source.read(opf_name))
+        manifest = {
+            item.get("id"): item for item in package.findall(".//{*}manifest/{*}item")
+        }
+        spine = []
+        for itemref in package.findall(".//{*}spine/{*}itemref"):
+            item = manifest.get(itemref.get("idref"))
+            if item is None or "nav" in (item.get("properties") or "").split():
+                continue
+            name = _resolve(base, item.get("href"))
+            if name in infos and name not in spine:
+                spine.append(name)
+        images = {name for name in infos if posixpath.splitext(name.lower())[1] in IMAGE_EXTENSIONS}
+
+        # Изображения каждого документа; остальные файлы общие для всех томов
+        references: Dict[str, Set[str]] = {}
+        for name in spine:
+            text = source.read(name).decode("utf-8", errors="ignore")
+            folder = posixpath.dirname(name)
+            references[name] = {
+                target for target in (_resolve(folder, href) for href in _REFERENCE.findall(text))
+                if target in images
+            }
+        used = set().union(*references.values()) if references else set()
+        shared = set(infos) - set(spine) - used
+
+        def cost(names) -> float:
+            return sum(
+                infos[name].compress_size * (image_factor if name in images else text_factor)
+                for name in names
+            )
+
+        budget = limit * VOLUME_MARGIN - cost(shared)
+        volumes: List[List[str]] = [[]]
+        volume_images: Set[str] = set()
+        volume_cost = 0.0
+        for name in spine:
+            new_images = references[name] - volume_images
+            document_cost = cost([name]) + cost(new_images)
+            if volumes[-1] and volume_cost + document_cost > budget:
+                volumes.append([])
+                volume_images = set()
+                new_images = references[name]
+                document_cost = cost([name]) + cost(new_images)
+                volume_cost = 0.0
+            volumes[-1].append(name)
+            volume_images |= new_images
+            volume_cost += document_cost
+
+        if len(volumes) < 2:
+            return [epub_path]
+
+        opf = source.read(opf_name).decode("utf-8")
+        ncx_names = [name for name in shared if name.lower().endswith(".ncx")]
+        paths = []
+        for number, documents in enumerate(volumes, 1):
+            kept = set(documents).union(*(references[name] for name in documents))
+            removed = (set(spine) | used) - kept
+            volume_opf = _remove_items(opf, base, removed)
+            volume_opf = re.sub(
+                r"(<dc:title[^>]*>)(.*?)(</dc:title>)",
+                lambda match: f"{match.group(1)}{match.group(2)} (Том {number})" + match.group(3),
+                volume_opf, count=1, flags=re.DOTALL
+            )
+            replaced = {opf_name: volume_opf.encode("utf-8")}
+            for ncx_name in ncx_names:
+                replaced[ncx_name] = _filter_ncx(source.read(ncx_name), posixpath.dirname(ncx_name), kept)
+
+            path = volume_path(epub_path, number)
+            write_epub(path, source, replaced, skip=removed)
+            paths.append(path)
+
+    # Тома прошлой конвертации того же файла не должны попасть в результат
+    number = len(paths) + 1
+    while volume_path(epub_path, number).exists():
+        volume_path(epub_path, number).unlink()
+        number += 1
+    epub_path.unlink()
+    logger.info(f"{epub_path.name} разделен на {len(paths)} тома(ов)")
+    return paths
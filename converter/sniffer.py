@@ -0,0 +1,163 @@
+"""
+Определение формата книги по содержимому (magic bytes).
+
+Читает только первые SNIFF_BYTES байт файла и распознает PDF (заголовок
+%PDF-), EPUB (ZIP, первая запись mimetype = application/epub+zip), FB2
+(XML с корневым элементом FictionBook), HTML и простой текст (по BOM и
+пробной декодировке). Формат определяется по содержимому, поэтому
+файл с неверным расширением получает свой настоящий формат.
+
+Заменяет libmagic: не нужна база сигнатур, не сканируется весь файл и
+нет молчаливого пропуска проверки, если библиотека не установлена.
+"""
+import codecs
+import re
+import struct
+from pathlib import Path
+from typing import Optional
+
+# Сколько байт начала файла читается для определения формата
+SNIFF_BYTES = 8192
+
+# PDF допускает мусор перед заголовком в первых 1024 байтах
+PDF_HEADER_WINDOW = 1024
+PDF_SIGNATURE = b"%PDF-"
+
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+EPUB_MIMETYPE = b"application/epub+zip"
+
+# Доля управляющих символов, после которой файл считается двоичным
+MAX_CONTROL_RATIO = 0.01
+_TEXT_CONTROLS = set(b"\t\n\r\f\v\x1b")
+
+# Корневой элемент XML после пролога, комментариев и DOCTYPE
+_XML_ROOT = re.compile(
+    r"^(?:\s|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>\[]*(?:\[.*?\])?\s*>)*<([A-Za-z_][\w.:-]*)",
+    re.DOTALL
+)
+_HTML_MARKERS = re.compile(r"<!DOCTYPE\s+html|<html[\s>]|<head[\s>]|<body[\s>]", re.IGNORECASE)
+# Текстовые форматы, которые не книги: их нельзя принимать как простой текст
+NON_BOOK_TEXT = ("{\\rtf", "%!PS")
+
+
+def text_encoding(head: bytes) -> Optional[str]:
+    """
+    Определяет кодировку текстового фрагмента.
+
+    Args:
+        head: Начало файла
+
+    Returns:
+        str: utf-8-sig, utf-16, utf-8 или cp1251; None - данные двоичные
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if b"\x00" in head:
+        return None
+
+    controls = sum(1 for byte in head if byte < 0x20 and byte not in _TEXT_CONTROLS)
+    if head and controls / len(head) > MAX_CONTROL_RATIO:
+        return None
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # Фрагмент мог оборваться посреди многобайтового символа
+        if e.start >= len(head) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+    # Книги не в UTF-8 - почти всегда Windows-1251
+    return "cp1251"
+
+
+def _sniff_zip(head: bytes) -> Optional[str]:
+    """EPUB - ZIP с записью mimetype в начале (OCF)."""
+    if len(head) < ZIP_LOCAL_HEADER.size:
+        return None
+    fields = ZIP_LOCAL_HEADER.unpack_from(head)
+    name_length, extra_length = fields[9], fields[10]
+    name_start = ZIP_LOCAL_HEADER.size
+    name = head[name_start:name_start + name_length]
+    data_start = name_start + name_length + extra_length
+    if name == b"mimetype" and head[data_start:data_start + len(EPUB_MIMETYPE)] == EPUB_MIMETYPE:
+        return "epub"
+    # Упаковщики, нарушающие порядок записей: ищем признаки OCF в начале архива
+    if b"META-INF/container.xml" in head or EPUB_MIMETYPE in head:
+        return "epub"
+    return None
+
+
+def _pdf_header(head: bytes) -> bool:
+    """
+    Заголовок %PDF- в начале файла или после мусора.
+
+    Мусором считаются пробелы и двоичные данные; текст, в котором
+    упоминается %PDF-, - не PDF.
+    """
+    position = head.find(PDF_SIGNATURE, 0, PDF_HEADER_WINDOW)
+    if position < 0:
+        return False
+    junk = head[:position]
+    return not junk.strip() or text_encoding(junk) is None
+
+
+def _sniff_markup(text: str) -> Optional[str]:
+    """FB2, HTML, txt или None для прочего XML и текстовых форматов не книг."""
+    root = _XML_ROOT.match(text)
+    if root:
+        local_name = root.group(1).rsplit(":", 1)[-1].lower()
+        if local_name == "fictionbook":
+            return "fb2"
+        if local_name == "html":
+            return "html"
+    if _HTML_MARKERS.search(text):
+        return "html"
+    if text.lstrip().startswith("<?xml"):
+        # XML, но не книга: docx-фрагменты, RSS и т.п.
+        return None
+    if text.lstrip().startswith(NON_BOOK_TEXT):
+        return None
+    return "txt"
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """
+    Определяет формат книги по началу файла.
+
+    Args:
+        head: Первые байты файла (достаточно SNIFF_BYTES)
+
+    Returns:
+        str: pdf, epub, fb2, html или txt; None - формат не поддерживается
+    """
+    if _pdf_header(head):
+        return "pdf"
+    if head.startswith(ZIP_LOCAL_SIGNATURE):
+        return _sniff_zip(head)
+
+    encoding = text_encoding(head)
+    if encoding is None:
+        return None
+    if encoding == "utf-16":
+        text = head[:len(head) // 2 * 2].decode("utf-16", errors="ignore")
+    else:
+        # Разметку достаточно искать в ASCII-части, latin-1 декодирует любые байты
+        text = head[len(codecs.BOM_UTF8) if encoding == "utf-8-sig" else 0:].decode("latin-1")
+    return _sniff_markup(text)
+
+
+def sniff_file(file_path: Path, size: int = SNIFF_BYTES) -> Optional[str]:
+    """
+    Определяет формат файла, читая только его начало.
+
+    Args:
+        file_path: Путь к файлу
+        size: Сколько байт читать
+
+    Returns:
+        str: Формат файла или None
+    """
+    with open(file_path, "rb") as f:
+        return sniff_format(f.read(size))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Обертка для учета ресурсов дочернего процесса.
+
+Запускает команду, дожидается ее через os.wait4 и записывает rusage
+(процессорное время, пиковый RSS, блочный ввод-вывод) в JSON-файл.
+Вывод команды не перехватывается, код возврата передается как есть.
+
+Обертка завершает команду вместе с собой (PR_SET_PDEATHSIG на Linux)
+и пересылает ей SIGTERM/SIGINT/SIGHUP. Модуль запускается как отдельный
+скрипт, поэтому использует только стандартную библиотеку.
+
+Запуск:
+    python usage_wrapper.py /tmp/usage.json -- ebook-convert in.fb2 out.epub
+"""
+import ctypes
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+PR_SET_PDEATHSIG = 1
+
+
+def _set_pdeathsig(sig: int = signal.SIGKILL) -> None:
+    """Просит ядро послать сигнал процессу при завершении его родителя (Linux)."""
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.prctl(PR_SET_PDEATHSIG, sig)
+    except (OSError, AttributeError):
+        pass
+
+
+def main(argv) -> int:
+    if len(argv) < 3 or argv[1] != "--":
+        print("usage: usage_wrapper.py USAGE_FILE -- COMMAND [ARGS...]", file=sys.stderr)
+        return 2
+    usage_path, cmd = argv[0], argv[2:]
+
+    parent = os.getppid()
+    _set_pdeathsig()
+    if os.getppid() != parent:
+        # Родитель умер до установки PDEATHSIG
+        return 1
+
+    start = time.monotonic()
+    try:
+        child = subprocess.Popen(cmd, preexec_fn=_set_pdeathsig)
+    except OSError as e:
+        print(f"{cmd[0]}: {e}", file=sys.stderr)
+        return 127
+
+    def forward(signum, frame):
+        try:
+            child.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, forward)
+
+    _, status, rusage = os.wait4(child.pid, 0)
+    returncode = os.waitstatus_to_exitcode(status)
+    # Процесс уже собран через wait4, Popen не должен ждать его повторно
+    child.returncode = returncode
+
+    usage = {
+        "returncode": returncode,
+        "wall_seconds": round(time.monotonic() - start, 6),
+        "user_cpu_seconds": rusage.ru_utime,
+        "sys_cpu_seconds": rusage.ru_stime,
+        # ru_maxrss: килобайты на Linux, байты на macOS
+        "max_rss_bytes": rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "read_blocks": rusage.ru_inblock,
+        "write_blocks": rusage.ru_oublock,
+    }
+    tmp_path = f"{usage_path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(usage, f)
+        os.replace(tmp_path, usage_path)
+    except OSError as e:
+        print(f"usage_wrapper: не удалось записать {usage_path}: {e}", file=sys.stderr)
+
+    return returncode if returncode >= 0 else 128 - returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
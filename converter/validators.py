@@ -1,50 +1,360 @@
 """
 Модуль валидации входящих файлов.
+
+Кроме формата проверяется структура книги: обрезанный ZIP, PDF без
+таблицы xref или FB2 с ошибкой XML отклоняются за миллисекунды, а не
+после долгого запуска ebook-convert. HTML проверяется нестрого: calibre
+принимает и неаккуратную разметку, поэтому отклоняются только обрезанные
+и двоичные файлы. Файл читается через mmap, в память
+попадают только нужные фрагменты.
 """
+import codecs
+import logging
+import mmap
+import re
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Optional
-try:
-    import magic
-    MAGIC_AVAILABLE = True
-except ImportError:
-    MAGIC_AVAILABLE = False
-from config import SUPPORTED_INPUT_FORMATS, MAX_FILE_SIZE, MIME_TYPES
+from typing import Dict, Optional, Tuple
+from xml.parsers import expat
+from converter.sniffer import SNIFF_BYTES, sniff_file, text_encoding
+from utils.error_manager import ErrorCode
+from config import SUPPORTED_INPUT_FORMATS, MAX_FILE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Текстовые форматы, между которыми решает расширение, а не содержимое:
+# HTML без разметки в начале файла неотличим от текста
+TEXT_FORMATS = {'txt', 'html'}
+
+# Структуры ZIP (APPNOTE.TXT)
+ZIP_EOCD = struct.Struct("<4sHHHHIIH")
+ZIP_EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP64_LOCATOR = struct.Struct("<4sIQI")
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_EOCD = struct.Struct("<4sQHHIIQQQQ")
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+ZIP_CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+ZIP_CENTRAL_SIGNATURE = b"PK\x01\x02"
+ZIP_LOCAL_HEADER_SIZE = 30
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+# Комментарий архива - до 64 КБ после записи конца центрального каталога
+ZIP_MAX_COMMENT = 65535
+
+OCF_CONTAINER = "META-INF/container.xml"
+_OPF_PATH = re.compile(rb'full-path\s*=\s*["\']([^"\']+)["\']')
+
+_PDF_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_PDF_XREF_TARGET = re.compile(rb"\s*(?:xref|\d+\s+\d+\s+obj)")
+_PDF_PAGES = re.compile(rb"/Type\s*/Pages\b")
+_PDF_COUNT = re.compile(rb"/Count\s+(\d+)")
+# Окрестность словаря /Pages, в которой ищется /Count, и предел размера объекта
+PDF_DICT_WINDOW = 1024
+PDF_OBJECT_WINDOW = 1_048_576
+
+# Размер фрагмента для потокового разбора XML и HTML
+XML_CHUNK = 1_048_576
+
+
+@dataclass
+class ValidationResult:
+    """Результат проверки файла."""
+
+    is_valid: bool
+    error: Optional[str] = None
+    format: Optional[str] = None
+    error_code: Optional[ErrorCode] = None
+
+
+StructureError = Tuple[ErrorCode, str]
+
+
+def _zip_central_directory(mm: mmap.mmap) -> Tuple[Optional[StructureError], int, int, int]:
+    """Находит центральный каталог ZIP: (ошибка, смещение, размер, записей)."""
+    eocd = mm.rfind(ZIP_EOCD_SIGNATURE, max(0, len(mm) - ZIP_EOCD.size - ZIP_MAX_COMMENT))
+    if eocd < 0 or eocd + ZIP_EOCD.size > len(mm):
+        return (ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив обрезан: нет оглавления ZIP"), 0, 0, 0
+    _, _, _, _, entries, cd_size, cd_offset, _ = ZIP_EOCD.unpack_from(mm, eocd)
+    end = eocd
+
+    if 0xFFFFFFFF in (cd_size, cd_offset) or entries == 0xFFFF:
+        locator = eocd - ZIP64_LOCATOR.size
+        if locator < 0 or mm[locator:locator + 4] != ZIP64_LOCATOR_SIGNATURE:
+            return (ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив поврежден: нет записи ZIP64"), 0, 0, 0
+        end = ZIP64_LOCATOR.unpack_from(mm, locator)[2]
+        if end + ZIP64_EOCD.size > len(mm) or mm[end:end + 4] != ZIP64_EOCD_SIGNATURE:
+            return (ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив поврежден: нет записи ZIP64"), 0, 0, 0
+        _, _, _, _, _, _, _, entries, cd_size, cd_offset = ZIP64_EOCD.unpack_from(mm, end)
+
+    if cd_offset + cd_size > end:
+        return (ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив обрезан: оглавление ZIP за концом данных"), 0, 0, 0
+    return None, cd_offset, cd_size, entries
+
+
+def _check_epub(mm: mmap.mmap) -> Optional[StructureError]:
+    """Центральный каталог ZIP цел, container.xml указывает на имеющийся OPF."""
+    error, cd_offset, cd_size, entries = _zip_central_directory(mm)
+    if error:
+        return error
+
+    # Имя записи -> (метод сжатия, сжатый размер, начало данных)
+    members: Dict[bytes, Tuple[int, int, int]] = {}
+    position = cd_offset
+    for _ in range(entries):
+        if position + ZIP_CENTRAL_HEADER.size > cd_offset + cd_size \
+                or mm[position:position + 4] != ZIP_CENTRAL_SIGNATURE:
+            return ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив поврежден: ошибка в оглавлении ZIP"
+        fields = ZIP_CENTRAL_HEADER.unpack_from(mm, position)
+        method, compressed = fields[4], fields[8]
+        name_length, extra_length, comment_length, local_offset = fields[10], fields[11], fields[12], fields[16]
+        name = mm[position + ZIP_CENTRAL_HEADER.size:position + ZIP_CENTRAL_HEADER.size + name_length]
+        position += ZIP_CENTRAL_HEADER.size + name_length + extra_length + comment_length
+
+        if 0xFFFFFFFF in (compressed, local_offset):
+            continue  # размеры в ZIP64-расширении, локальную запись не проверяем
+        if local_offset + ZIP_LOCAL_HEADER_SIZE > cd_offset \
+                or mm[local_offset:local_offset + 4] != ZIP_LOCAL_SIGNATURE:
+            return ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив поврежден: запись ZIP не найдена"
+        local_name, local_extra = struct.unpack_from("<HH", mm, local_offset + 26)
+        data_start = local_offset + ZIP_LOCAL_HEADER_SIZE + local_name + local_extra
+        if data_start + compressed > cd_offset:
+            return ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, "Архив обрезан: данные записи за концом файла"
+        members[name] = (method, compressed, data_start)
+
+    container = members.get(OCF_CONTAINER.encode())
+    if container is None:
+        return ErrorCode.VALIDATION_MISSING_OPF, f"В EPUB нет {OCF_CONTAINER}"
+    method, compressed, data_start = container
+    data = mm[data_start:data_start + compressed]
+    if method == zipfile.ZIP_DEFLATED:
+        try:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        except zlib.error:
+            return ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, f"Архив поврежден: не распаковывается {OCF_CONTAINER}"
+    elif method != zipfile.ZIP_STORED:
+        return None  # редкий метод сжатия - оставляем проверку calibre
+
+    opf = _OPF_PATH.search(data)
+    if opf is None:
+        return ErrorCode.VALIDATION_MISSING_OPF, f"{OCF_CONTAINER} не указывает файл OPF"
+    if opf.group(1) not in members:
+        return ErrorCode.VALIDATION_MISSING_OPF, "В EPUB нет файла OPF, указанного в container.xml"
+    return None
+
+
+def _check_pdf(mm: mmap.mmap) -> Optional[StructureError]:
+    """Есть %%EOF и startxref внутри файла, в дереве страниц есть страницы."""
+    eof = mm.rfind(b"%%EOF")
+    if eof < 0:
+        return ErrorCode.VALIDATION_BROKEN_XREF, "PDF обрезан: нет маркера конца файла"
+    startxref = mm.rfind(b"startxref", 0, eof)
+    target = _PDF_STARTXREF.match(mm[startxref:eof]) if startxref >= 0 else None
+    if target is None:
+        return ErrorCode.VALIDATION_BROKEN_XREF, "PDF поврежден: нет ссылки на таблицу xref"
+    offset = int(target.group(1))
+    if offset >= len(mm):
+        return ErrorCode.VALIDATION_BROKEN_XREF, "PDF обрезан: таблица xref за концом файла"
+    # Смещение мимо таблицы читатели PDF восстанавливают сканированием - не отклоняем
+    if not _PDF_XREF_TARGET.match(mm[offset:offset + 64]):
+        logger.debug(f"startxref {offset} не указывает на таблицу xref")
+
+    counts = []
+    for pages in _PDF_PAGES.finditer(mm):
+        # /Count ищем в пределах объекта: у плоского дерева длинный массив /Kids
+        start = max(mm.rfind(b"obj", max(0, pages.start() - PDF_DICT_WINDOW), pages.start()), 0)
+        end = mm.find(b"endobj", pages.end(), pages.end() + PDF_OBJECT_WINDOW)
+        body = mm[start:end if end >= 0 else pages.end() + PDF_DICT_WINDOW]
+        counts.extend(int(count.group(1)) for count in _PDF_COUNT.finditer(body))
+    if counts:
+        if max(counts) == 0:
+            return ErrorCode.VALIDATION_NO_PAGES, "В PDF нет страниц"
+    elif mm.find(b"/ObjStm") < 0:
+        # Без потоков объектов дерево страниц лежит открытым текстом
+        return ErrorCode.VALIDATION_NO_PAGES, "В PDF нет дерева страниц"
+    return None
+
+
+def _check_xml(mm: mmap.mmap) -> Optional[StructureError]:
+    """Потоковая проверка корректности XML (FB2, XHTML)."""
+    parser = expat.ParserCreate()
+    # Неизвестные сущности (&nbsp; и т.п.) calibre понимает - не считаем ошибкой
+    parser.UseForeignDTD(True)
+    try:
+        for start in range(0, len(mm), XML_CHUNK):
+            parser.Parse(mm[start:start + XML_CHUNK], False)
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        return (
+            ErrorCode.VALIDATION_MALFORMED_XML,
+            f"Ошибка XML в строке {e.lineno}: {expat.ErrorString(e.code)}"
+        )
+    return None
+
+
+class _HtmlScanner(HTMLParser):
+    """Нестрогий разбор HTML: следит только за корневым элементом."""
+
+    def __init__(self):
+        # Без convert_charrefs текст не копится в буфере до следующего тега
+        super().__init__(convert_charrefs=False)
+        self.root_opened = False
+        self.root_closed = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "html":
+            self.root_opened = True
+
+    def handle_endtag(self, tag):
+        if tag == "html":
+            self.root_closed = True
+
+
+def _check_html(mm: mmap.mmap) -> Optional[StructureError]:
+    """Нестрогая потоковая проверка HTML: только обрезанные и двоичные файлы."""
+    head = mm[:SNIFF_BYTES]
+    encoding = text_encoding(head) or "utf-8"
+    xhtml = head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"<?xml")
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    scanner = _HtmlScanner()
+    for start in range(0, len(mm), XML_CHUNK):
+        chunk = mm[start:start + XML_CHUNK]
+        if encoding != "utf-16" and b"\x00" in chunk:
+            return ErrorCode.FILE_INVALID_TYPE, "HTML поврежден: двоичные данные внутри файла"
+        scanner.feed(decoder.decode(chunk))
+    scanner.feed(decoder.decode(b"", True))
+
+    # Незавершенный тег или комментарий остается в буфере разборщика
+    if scanner.rawdata.lstrip().startswith("<"):
+        return ErrorCode.VALIDATION_MALFORMED_XML, "HTML обрезан: незакрытый тег в конце файла"
+    # В XHTML закрывающий </html> обязателен, его отсутствие - признак обрезки
+    if xhtml and scanner.root_opened and not scanner.root_closed:
+        return ErrorCode.VALIDATION_MALFORMED_XML, "HTML обрезан: нет закрывающего </html>"
+    return None
 
 
 class FileValidator:
     """Класс для валидации файлов книг."""
-    
+
     @staticmethod
     def validate_file(file_path: Path) -> tuple[bool, Optional[str]]:
         """
         Валидирует файл книги.
-        
+
         Args:
             file_path: Путь к файлу
-            
+
         Returns:
             tuple: (is_valid, error_message)
         """
+        result = FileValidator.inspect(file_path)
+        return result.is_valid, result.error
+
+    @staticmethod
+    def detect_format(file_path: Path) -> tuple[bool, Optional[str], Optional[str]]:
+        """
+        Валидирует файл и определяет его настоящий формат по содержимому.
+
+        Формат берется из содержимого, даже если расширение неверное или
+        отсутствует (книга.txt, которая на самом деле EPUB, и т.п.).
+
+        Args:
+            file_path: Путь к файлу
+
+        Returns:
+            tuple: (is_valid, error_message, format)
+        """
+        result = FileValidator._detect(file_path)
+        return result.is_valid, result.error, result.format
+
+    @staticmethod
+    def _detect(file_path: Path) -> ValidationResult:
+        """Проверка размера и формата по содержимому (без структуры)."""
         # Проверка существования
         if not file_path.exists():
-            return False, "Файл не найден"
-            
+            return ValidationResult(False, "Файл не найден", error_code=ErrorCode.FILE_NOT_FOUND)
+
         # Проверка размера
-        if file_path.stat().st_size > MAX_FILE_SIZE:
-            return False, f"Файл слишком большой (макс. {MAX_FILE_SIZE // 1_048_576} МБ)"
-            
-        # Проверка формата по расширению
+        size = file_path.stat().st_size
+        if size > MAX_FILE_SIZE:
+            return ValidationResult(
+                False, f"Файл слишком большой (макс. {MAX_FILE_SIZE // 1_048_576} МБ)",
+                error_code=ErrorCode.FILE_TOO_LARGE
+            )
+        if size == 0:
+            return ValidationResult(False, "Файл пуст", error_code=ErrorCode.VALIDATION_EMPTY_FILE)
+
         extension = file_path.suffix.lower().lstrip('.')
-        if extension not in SUPPORTED_INPUT_FORMATS:
-            return False, f"Формат .{extension} не поддерживается"
-            
-        # Проверка MIME-типа (если доступен python-magic)
-        if MAGIC_AVAILABLE:
-            try:
-                mime = magic.from_file(str(file_path), mime=True)
-                if mime not in MIME_TYPES:
-                    return False, "Неверный тип файла"
-            except Exception:
-                pass  # Игнорируем ошибки magic
-            
-        return True, None
+        try:
+            detected = sniff_file(file_path)
+        except OSError:
+            return ValidationResult(False, "Не удалось прочитать файл", error_code=ErrorCode.FILE_ACCESS_DENIED)
+
+        if detected is None or detected not in SUPPORTED_INPUT_FORMATS:
+            if extension not in SUPPORTED_INPUT_FORMATS:
+                return ValidationResult(
+                    False, f"Формат .{extension} не поддерживается",
+                    error_code=ErrorCode.VALIDATION_UNSUPPORTED_FORMAT
+                )
+            return ValidationResult(False, "Неверный тип файла", error_code=ErrorCode.FILE_INVALID_TYPE)
+
+        if detected == 'txt' and extension not in SUPPORTED_INPUT_FORMATS:
+            # Простой текст с чужим расширением (.md, .csv, ...) не переименовывается в .txt
+            return ValidationResult(
+                False, f"Формат .{extension} не поддерживается",
+                error_code=ErrorCode.VALIDATION_UNSUPPORTED_FORMAT
+            )
+        if detected in TEXT_FORMATS and extension in TEXT_FORMATS:
+            return ValidationResult(True, format=extension)
+        return ValidationResult(True, format=detected)
+
+    @staticmethod
+    def check_structure(file_path: Path, file_format: str) -> Optional[StructureError]:
+        """
+        Быстрая проверка структуры книги до запуска ebook-convert.
+
+        EPUB - центральный каталог ZIP и наличие OPF, PDF - трейлер,
+        startxref и число страниц, FB2 - корректность XML. HTML и XHTML
+        проверяются нестрого (обрезка, двоичные данные): calibre принимает
+        неаккуратную разметку. Текст не проверяется.
+
+        Args:
+            file_path: Путь к файлу
+            file_format: Формат, определенный по содержимому
+
+        Returns:
+            tuple: (код ошибки, сообщение) или None, если структура в порядке
+        """
+        checks = {'epub': _check_epub, 'pdf': _check_pdf, 'fb2': _check_xml, 'html': _check_html}
+        check = checks.get(file_format)
+        if check is None:
+            return None
+
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return check(mm)
+
+    @staticmethod
+    def inspect(file_path: Path) -> ValidationResult:
+        """
+        Полная проверка: размер, формат по содержимому и структура.
+
+        Args:
+            file_path: Путь к файлу
+
+        Returns:
+            ValidationResult: Результат с форматом или кодом ошибки
+        """
+        result = FileValidator._detect(file_path)
+        if not result.is_valid:
+            return result
+        try:
+            problem = FileValidator.check_structure(file_path, result.format)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось проверить структуру {file_path.name}: {e}")
+            problem = None
+        if problem is not None:
+            error_code, error = problem
+            return ValidationResult(False, error, result.format, error_code)
+        return result
@@ -0,0 +1,306 @@
+"""
+Перепаковка ZIP-контейнеров (EPUB, HTMLZ, TXTZ) с лучшим сжатием.
+
+calibre пишет архивы стандартным zipfile (deflate, уровень 6). Здесь
+записи сжимаются заново на настроенном уровне: каждая запись делится на
+блоки по BLOCK_SIZE, блоки сжимаются параллельно в пуле потоков (zlib
+отпускает GIL) со словарем из последних 32 КБ предыдущего блока, как в
+pigz, и склеиваются в один поток deflate. Изображения и шрифты уже
+сжаты: они сжимаются уровнем MEDIA_LEVEL, а если deflate не помогает,
+хранятся без сжатия. Архив пишется потоково во
+временный файл: в памяти только блоки в работе. mimetype остается
+первой записью без сжатия, каталоги, служебные файлы ОС и повторы имен
+удаляются. Результат заменяет исходный файл, только если стал меньше.
+"""
+import asyncio
+import logging
+import os
+import re
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1 << 20
+# Окно deflate: словарь следующего блока
+DICTIONARY_SIZE = 32 * 1024
+# Блоков в работе на один поток пула
+BLOCKS_PER_WORKER = 4
+
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sHHHHIIH")
+# Смещение поля CRC-32 в локальном заголовке
+LOCAL_CRC_OFFSET = 14
+ZIP_VERSION = 20
+UTF8_FLAG = 0x800
+ZIP32_LIMIT = 0xFFFFFFFF
+
+# Уже сжатые форматы: выигрыш от deflate не зависит от уровня, сжимаются быстрейшим
+MEDIA_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".woff", ".woff2", ".mp3", ".mp4", ".m4a"}
+MEDIA_LEVEL = 1
+
+# Каталоги не нужны читалкам; служебные файлы macOS и Windows
+_JUNK = re.compile(r"(^|/)(\.DS_Store|Thumbs\.db|desktop\.ini)$|^__MACOSX/", re.IGNORECASE)
+
+
+@dataclass
+class RepackReport:
+    """Итог перепаковки одного архива."""
+
+    entries: int = 0
+    dropped: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+@dataclass
+class _Entry:
+    info: zipfile.ZipInfo
+    offset: int = 0
+    method: int = zipfile.ZIP_DEFLATED
+    crc: int = 0
+    size: int = 0
+    compressed: int = 0
+    name: bytes = b""
+    flags: int = 0
+
+
+def deflate_block(data: bytes, level: int, dictionary: bytes, last: bool) -> bytes:
+    """
+    Сжимает блок сырым deflate (выполняется в потоке пула).
+
+    Не последний блок завершается Z_SYNC_FLUSH: поток выравнивается по
+    байту без признака конца, и блоки можно склеить.
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 8, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 8)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _dos_time(date_time) -> tuple:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+
+def _select_entries(source: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Записи без каталогов, мусора и повторов; mimetype первой."""
+    latest = {}
+    for info in source.infolist():
+        # При повторе имени читатели видят последнюю запись
+        latest[info.filename] = info
+    kept = [info for name, info in latest.items() if not info.is_dir() and not _JUNK.search(name)]
+    return sorted(kept, key=lambda info: info.filename != "mimetype")
+
+
+class _ArchiveWriter:
+    """Потоковая запись ZIP с заполнением заголовков после данных."""
+
+    def __init__(self, out):
+        self.out = out
+        self.entries: List[_Entry] = []
+
+    def start(self, entry: _Entry) -> None:
+        entry.offset = self.out.tell()
+        try:
+            entry.name = entry.info.filename.encode("ascii")
+        except UnicodeEncodeError:
+            entry.name = entry.info.filename.encode("utf-8")
+            entry.flags = UTF8_FLAG
+        self.out.write(self._local_header(entry))
+        self.out.write(entry.name)
+
+    def _local_header(self, entry: _Entry) -> bytes:
+        dos_time, dos_date = _dos_time(entry.info.date_time)
+        return LOCAL_HEADER.pack(
+            b"PK\x03\x04", ZIP_VERSION, entry.flags, entry.method, dos_time, dos_date,
+            entry.crc, entry.compressed, entry.size, len(entry.name), 0
+        )
+
+    def write(self, entry: _Entry, data: bytes) -> None:
+        self.out.write(data)
+        entry.compressed += len(data)
+
+    def finish(self, entry: _Entry) -> None:
+        """Дописывает CRC и размеры в локальный заголовок."""
+        end = self.out.tell()
+        self.out.seek(entry.offset + LOCAL_CRC_OFFSET)
+        self.out.write(struct.pack("<III", entry.crc, entry.compressed, entry.size))
+        self.out.seek(end)
+        self.entries.append(entry)
+
+    def rewind(self, entry: _Entry) -> None:
+        """Отменяет запись entry, чтобы записать ее заново."""
+        self.out.seek(entry.offset)
+        self.out.truncate()
+        entry.compressed = 0
+
+    def close(self) -> None:
+        directory_offset = self.out.tell()
+        for entry in self.entries:
+            dos_time, dos_date = _dos_time(entry.info.date_time)
+            self.out.write(CENTRAL_HEADER.pack(
+                b"PK\x01\x02", (entry.info.create_system << 8) | ZIP_VERSION, ZIP_VERSION,
+                entry.flags, entry.method, dos_time, dos_date, entry.crc, entry.compressed,
+                entry.size, len(entry.name), 0, 0, 0, 0, entry.info.external_attr, entry.offset
+            ))
+            self.out.write(entry.name)
+        directory_size = self.out.tell() - directory_offset
+        self.out.write(END_OF_CENTRAL_DIRECTORY.pack(
+            b"PK\x05\x06", 0, 0, len(self.entries), len(self.entries), directory_size, directory_offset, 0
+        ))
+
+
+def _store(writer: _ArchiveWriter, source: zipfile.ZipFile, entry: _Entry) -> None:
+    entry.method = zipfile.ZIP_STORED
+    entry.crc = entry.size = 0
+    writer.start(entry)
+    with source.open(entry.info) as data:
+        while chunk := data.read(BLOCK_SIZE):
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            entry.size += len(chunk)
+            writer.write(entry, chunk)
+    writer.finish(entry)
+
+
+def repack_zip(path: Path, pool: Executor, level: int = 9, workers: int = 1) -> RepackReport:
+    """
+    Перепаковывает ZIP-контейнер на месте (синхронно).
+
+    Args:
+        path: Архив (EPUB, HTMLZ, TXTZ)
+        pool: Пул потоков для deflate_block
+        level: Уровень сжатия zlib
+        workers: Потоков в пуле (ограничивает число блоков в работе)
+
+    Returns:
+        RepackReport: Сколько записей переписано и удалено, байт сэкономлено
+    """
+    started = time.perf_counter()
+    report = RepackReport(bytes_before=path.stat().st_size)
+    report.bytes_after = report.bytes_before
+
+    with zipfile.ZipFile(path) as source:
+        infos = _select_entries(source)
+        report.entries = len(infos)
+        report.dropped = len(source.infolist()) - len(infos)
+        if any(info.file_size >= ZIP32_LIMIT for info in infos):
+            report.seconds = time.perf_counter() - started
+            return report
+
+        fd, temp_name = tempfile.mkstemp(suffix=path.suffix, dir=path.parent)
+        temp_path = Path(temp_name)
+        try:
+            with os.fdopen(fd, "w+b") as out:
+                writer = _ArchiveWriter(out)
+                # Очередь записи: ("start", entry), ("block", entry, future), ("end", entry)
+                pending = deque()
+                in_flight = 0
+                window = max(1, workers) * BLOCKS_PER_WORKER
+
+                def write_next() -> None:
+                    nonlocal in_flight
+                    kind, entry, *rest = pending.popleft()
+                    if kind == "start":
+                        writer.start(entry)
+                    elif kind == "block":
+                        writer.write(entry, rest[0].result())
+                        in_flight -= 1
+                    elif entry.compressed >= entry.size:
+                        # Несжимаемые данные (JPEG, шрифты WOFF) выгоднее хранить как есть
+                        writer.rewind(entry)
+                        _store(writer, source, entry)
+                    else:
+                        writer.finish(entry)
+
+                for info in infos:
+                    entry = _Entry(info)
+                    if info.filename == "mimetype" or info.file_size == 0:
+                        while pending:
+                            write_next()
+                        _store(writer, source, entry)
+                        continue
+
+                    pending.append(("start", entry))
+                    entry_level = MEDIA_LEVEL if os.path.splitext(info.filename.lower())[1] in MEDIA_EXTENSIONS else level
+                    dictionary = b""
+                    with source.open(info) as data:
+                        block = data.read(BLOCK_SIZE)
+                        while block:
+                            following = data.read(BLOCK_SIZE)
+                            entry.crc = zlib.crc32(block, entry.crc)
+                            entry.size += len(block)
+                            future = pool.submit(deflate_block, block, entry_level, dictionary, not following)
+                            pending.append(("block", entry, future))
+                            in_flight += 1
+                            dictionary = block[-DICTIONARY_SIZE:]
+                            block = following
+                            while in_flight > window:
+                                write_next()
+                    pending.append(("end", entry))
+
+                while pending:
+                    write_next()
+                writer.close()
+
+            new_size = temp_path.stat().st_size
+            if new_size < report.bytes_before:
+                os.replace(temp_path, path)
+                report.bytes_after = new_size
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+class ZipRepacker:
+    """Перепаковка архивов в общем пуле потоков."""
+
+    def __init__(self, level: int = 9, workers: Optional[int] = None):
+        """
+        Args:
+            level: Уровень сжатия zlib (1-9)
+            workers: Потоков сжатия (None - по числу ядер)
+        """
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="zip-repack")
+        return self._pool
+
+    async def repack(self, path: Path) -> RepackReport:
+        """
+        Перепаковывает архив, не блокируя event loop.
+
+        Args:
+            path: Архив (заменяется на месте)
+
+        Returns:
+            RepackReport
+        """
+        return await asyncio.to_thread(repack_zip, path, self._get_pool(), self.level, self.workers)
+
+    def close(self) -> None:
+        """Останавливает пул потоков."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
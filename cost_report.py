@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Отчет о ресурсах конвертаций по парам форматов.
+
+Читает журнал, который пишут бот и воркеры (COST_DB_PATH): процессорное
+время, пиковый RSS и блочный ввод-вывод ebook-convert и gs.
+
+Запуск:
+    python cost_report.py --days 7
+    python cost_report.py --db /app/logs/costs.db --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from utils.cost_ledger import CostLedger, format_cost_report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ресурсы конвертаций по парам форматов")
+    parser.add_argument("--db", default=os.getenv("COST_DB_PATH", "logs/costs.db"), help="журнал ресурсов")
+    parser.add_argument("--days", type=float, default=7, help="период в днях (0 - за все время)")
+    parser.add_argument("--json", action="store_true", help="вывести строки отчета в JSON")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"Журнал {args.db} не найден", file=sys.stderr)
+        return 1
+
+    ledger = CostLedger(args.db)
+    try:
+        since = time.time() - args.days * 86400 if args.days > 0 else None
+        rows = ledger.report(since)
+    finally:
+        ledger.close()
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(format_cost_report(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
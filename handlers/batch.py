@@ -0,0 +1,152 @@
+"""
+Обработчик пакетной конвертации (книги из ZIP-архива или альбома).
+"""
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.fsm.context import FSMContext
+from pathlib import Path
+from typing import TYPE_CHECKING
+import asyncio
+import logging
+import time
+
+from handlers.callbacks import cancel_progress, start_progress
+from services import Services
+from utils.error_manager import error_manager, ErrorCode
+from utils.send_queue import Priority, send_priority
+from utils.metrics import observe_stage
+from utils.tracing import span
+from config import MAX_CONCURRENT_CONVERSIONS, MAX_FILE_SIZE, UPLOAD_LIMIT
+
+if TYPE_CHECKING:
+    from converter.batch import BatchReport
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Подпись документа в Telegram - до 1024 символов
+CAPTION_NAMES_LIMIT = 600
+
+
+def _names(names, limit: int = CAPTION_NAMES_LIMIT) -> str:
+    text = ", ".join(names)
+    return text if len(text) <= limit else text[:limit].rsplit(", ", 1)[0] + ", ..."
+
+
+def _progress_text(report: "BatchReport", target_format: str) -> str:
+    return (
+        f"📚 Пакетная конвертация в {target_format.upper()}\n"
+        f"✅ Готово: {report.done - len(report.failed)} из {report.total}\n"
+        + (f"❌ Ошибок: {len(report.failed)}\n" if report.failed else "")
+    )
+
+
+@router.callback_query(F.data.startswith("batch:"))
+async def handle_batch_conversion(callback: CallbackQuery, state: FSMContext, services: Services):
+    """
+    Конвертирует все книги пакета в выбранный формат и отправляет один архив.
+
+    Книги идут через общий планировщик (его лимит параллельности и
+    очередь воркеров), пользователь видит одно сообщение со сводным
+    прогрессом.
+    """
+    from converter.batch import BatchBook, BatchReport, convert_batch, pack_results
+
+    target_format = callback.data.split(":")[1]
+    file_manager = services.file_manager
+    data = await state.get_data()
+    await state.clear()
+    books = [BatchBook(**book) for book in data.get("batch", [])]
+    skipped = data.get("batch_skipped", [])
+    user_id = callback.from_user.id
+
+    # Файлы могли быть удалены уборщиком, пока состояние ждало выбора формата
+    books = [book for book in books if Path(book.path).exists()]
+    if not books:
+        await callback.answer("❌ Файлы не найдены. Отправьте их заново.")
+        await callback.message.delete()
+        return
+
+    report = BatchReport(total=len(books))
+    await callback.message.edit_text(_progress_text(report, target_format))
+
+    async def send_progress(text: str):
+        try:
+            await callback.message.edit_text(text)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс пакета: {e}")
+
+    # Прогресс не ждет отправки; устаревшие правки схлопывает очередь исходящих запросов
+    pending_progress = set()
+
+    async def update_progress(current: "BatchReport"):
+        start_progress(send_progress(_progress_text(current, target_format)), pending_progress)
+
+    archives = []
+    try:
+        report = await convert_batch(
+            books,
+            target_format,
+            lambda path, fmt: services.scheduler.convert(path, fmt, user_id=user_id),
+            concurrency=MAX_CONCURRENT_CONVERSIONS,
+            progress_callback=update_progress
+        )
+        await cancel_progress(pending_progress)
+        if not report.files:
+            error_id = error_manager.log_error(
+                ErrorCode.CONVERSION_FAILED,
+                context={'target_format': target_format, 'batch': [book.name for book in books]},
+                user_id=user_id
+            )
+            with send_priority(Priority.ERROR):
+                await callback.message.edit_text(
+                    error_manager.get_user_message(ErrorCode.CONVERSION_FAILED, error_id),
+                    parse_mode="Markdown"
+                )
+            return
+
+        target = file_manager.new_file(".zip")
+        archives = [target]
+        archives = await asyncio.to_thread(pack_results, report.files, target, UPLOAD_LIMIT or MAX_FILE_SIZE)
+        for number, archive in enumerate(archives, 1):
+            part = f"_Часть{number}" if len(archives) > 1 else ""
+            caption = f"📦 Книги в формате {target_format.upper()}: {len(books) - len(report.failed)} из {len(books)}"
+            if len(archives) > 1:
+                caption += f"\n📚 Архив {number} из {len(archives)}"
+            if number == 1 and report.failed:
+                caption += f"\n❌ Не удалось: {_names(report.failed)}"
+            if number == 1 and skipped:
+                caption += f"\n⏭ Пропущено: {_names(skipped, CAPTION_NAMES_LIMIT // 2)}"
+
+            started = time.perf_counter()
+            with span("answer_document", size=archive.stat().st_size, volume=number):
+                await callback.message.answer_document(
+                    document=FSInputFile(archive, filename=f"Книги_{target_format.upper()}{part}.zip"),
+                    caption=caption,
+                    # Имена файлов - как есть, без разметки HTML по умолчанию
+                    parse_mode=None
+                )
+            observe_stage("upload", ".zip", target_format, archive.stat().st_size, time.perf_counter() - started)
+        await callback.message.delete()
+
+    except Exception as e:
+        await cancel_progress(pending_progress)
+        error_id = error_manager.log_error(
+            ErrorCode.UNKNOWN_ERROR,
+            exception=e,
+            context={'target_format': target_format, 'batch': [book.name for book in books]},
+            user_id=user_id
+        )
+        logger.error(f"Ошибка в handle_batch_conversion: {e} (Error ID: {error_id})")
+        with send_priority(Priority.ERROR):
+            await callback.message.edit_text(
+                error_manager.get_user_message(ErrorCode.UNKNOWN_ERROR, error_id),
+                parse_mode="Markdown"
+            )
+    finally:
+        for book in books:
+            file_manager.release(Path(book.path))
+        for _, output in report.files:
+            output.unlink(missing_ok=True)
+        for archive in archives:
+            file_manager.release(archive)
@@ -5,39 +5,85 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
 from pathlib import Path
+import asyncio
 import logging
+import time
 
-from converter.converter import BookConverter
-from converter.validators import FileValidator
-from utils.file_manager import TempFileManager
+from converter.child_usage import collect_child_usage
+from services import Services
 from utils.error_manager import error_manager, ErrorCode
+from utils.send_queue import Priority, send_priority
+from utils.metrics import observe_stage
+from utils.tracing import finish_trace, resume_trace, span
+from utils.traffic_recorder import (
+    OUTCOME_ERROR, OUTCOME_EXPIRED, OUTCOME_FAILED, OUTCOME_OK, record_traffic
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-converter = BookConverter()
+# Фоновые отправки прогресса (ссылки нужны, чтобы задачи не собрал GC)
+progress_tasks = set()
+
+
+def start_progress(coro, pending: set) -> None:
+    """
+    Отправляет прогресс в фоне, не задерживая конвертацию.
+
+    Args:
+        coro: Корутина отправки
+        pending: Задачи прогресса одного сообщения (для cancel_progress)
+    """
+    task = asyncio.create_task(coro)
+    for tasks in (progress_tasks, pending):
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+async def cancel_progress(pending: set) -> None:
+    """
+    Отменяет неотправленный прогресс перед итоговой правкой или удалением
+    сообщения: иначе устаревший текст может прийти после них.
+    """
+    tasks = list(pending)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 @router.callback_query(F.data.startswith("convert:"))
-async def handle_conversion(callback: CallbackQuery, state: FSMContext):
+async def handle_conversion(callback: CallbackQuery, state: FSMContext, services: Services):
     """
     Обработчик выбора формата для конвертации с прогрессивными уведомлениями.
     """
+    from converter.size_target import find_volumes
+
     target_format = callback.data.split(":")[1]
     
     data = await state.get_data()
     file_path = data.get("file_path")
     file_name = data.get("file_name")
     user_id = callback.from_user.id
+    arrived_at = data.get("arrived_at") or time.time()
+    decision_seconds = time.time() - arrived_at
+    src_format = Path(file_name or "").suffix
     
-    if not file_path:
+    # Файл мог быть удален уборщиком, пока состояние ждало выбора формата
+    if not file_path or not Path(file_path).exists():
+        record_traffic(arrived_at, src_format, 0, OUTCOME_EXPIRED, target_format, decision_seconds)
         await callback.answer("❌ Файл не найден. Отправьте файл заново.")
         await callback.message.delete()
+        await state.clear()
         return
     
     # Проверяем размер файла для определения стратегии
     input_path = Path(file_path)
-    file_size_mb = input_path.stat().st_size / (1024 * 1024)
+    file_size = input_path.stat().st_size
+    file_size_mb = file_size / (1024 * 1024)
+    trace = resume_trace(data.get("trace"), "handle_conversion", dst=target_format, size=file_size)
+    delivered = False
+    outcome = OUTCOME_ERROR
+    conversion_seconds = None
     
     # Начальное сообщение
     if file_size_mb > 20:
@@ -56,57 +102,88 @@ async def handle_conversion(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.edit_text(initial_message, parse_mode="Markdown")
     
-    # Функция для обновления прогресса
-    async def update_progress(message: str):
+    async def send_progress(text: str):
         try:
-            current_text = (
-                f"🚀 *Конвертация в процессе*\n"
-                f"📄 *Файл:* {file_name}\n"
-                f"🎯 *Формат:* {target_format.upper()}\n\n"
-                f"{message}"
-            )
-            await callback.message.edit_text(current_text, parse_mode="Markdown")
+            await callback.message.edit_text(text, parse_mode="Markdown")
         except Exception as e:
             logger.warning(f"Не удалось обновить прогресс: {e}")
+
+    # Функция для обновления прогресса: не ждет отправки, чтобы не тормозить
+    # конвертацию; устаревшие правки схлопывает очередь исходящих запросов
+    pending_progress = set()
+
+    async def update_progress(message: str):
+        current_text = (
+            f"🚀 *Конвертация в процессе*\n"
+            f"📄 *Файл:* {file_name}\n"
+            f"🎯 *Формат:* {target_format.upper()}\n\n"
+            f"{message}"
+        )
+        start_progress(send_progress(current_text), pending_progress)
     
     try:
         # Запускаем конвертацию с callback для прогресса
-        output_path = await converter.convert(
-            input_path, 
-            target_format, 
-            progress_callback=update_progress,
-            user_id=user_id
+        conversion_started = time.perf_counter()
+        with collect_child_usage() as usages:
+            output_path = await services.scheduler.convert(
+                input_path, 
+                target_format, 
+                progress_callback=update_progress,
+                user_id=user_id
+            )
+        await cancel_progress(pending_progress)
+        # Время работы конвертера без ожидания в очереди; у воркеров оно
+        # не видно, тогда записывается полное время
+        conversion_seconds = (
+            sum(usage.wall_seconds for usage in usages) if usages else time.perf_counter() - conversion_started
         )
+        outcome = OUTCOME_FAILED
         
         if output_path and output_path.exists():
-            # Отправляем результат
-            document = FSInputFile(output_path, filename=output_path.name)
-            
-            output_size_mb = output_path.stat().st_size / (1024 * 1024)
-            
-            # Специальное сообщение для больших файлов
-            if file_size_mb > 20:
-                caption = (
-                    f"🎉 *Большой файл успешно сконвертирован!*\n\n"
-                    f"📄 *Исходный файл:* {file_name} ({file_size_mb:.1f} МБ)\n"
-                    f"📊 *Результат:* {output_path.name} ({output_size_mb:.1f} МБ)\n"
-                    f"🎯 *Формат:* {target_format.upper()}\n\n"
-                    f"🔥 *Оптимизировано для быстрой загрузки!*"
-                    + (f"\n⚡ *Совместимо с Kindle!*" if target_format.lower() == 'epub' else "")
-                )
-            else:
-                caption = (
-                    f"✅ *Готово!* Ваш файл в формате *{target_format.upper()}*\n"
-                    f"📄 *Имя файла:* `{output_path.name}`\n"
-                    f"📊 *Размер:* {output_size_mb:.1f} МБ\n\n"
-                    + (f"🔥 *Оптимизировано для Kindle!*" if target_format.lower() == 'epub' else "")
+            # Результат больше лимита загрузки приходит несколькими томами
+            volumes = find_volumes(output_path)
+            for number, volume in enumerate(volumes, 1):
+                document = FSInputFile(volume, filename=volume.name)
+                output_size_mb = volume.stat().st_size / (1024 * 1024)
+
+                if len(volumes) > 1:
+                    caption = (
+                        f"📚 *Том {number} из {len(volumes)}*\n"
+                        f"📄 *Имя файла:* `{volume.name}`\n"
+                        f"📊 *Размер:* {output_size_mb:.1f} МБ\n\n"
+                        f"Книга не помещается в один файл Telegram и разделена на тома"
+                    )
+                # Специальное сообщение для больших файлов
+                elif file_size_mb > 20:
+                    caption = (
+                        f"🎉 *Большой файл успешно сконвертирован!*\n\n"
+                        f"📄 *Исходный файл:* {file_name} ({file_size_mb:.1f} МБ)\n"
+                        f"📊 *Результат:* {volume.name} ({output_size_mb:.1f} МБ)\n"
+                        f"🎯 *Формат:* {target_format.upper()}\n\n"
+                        f"🔥 *Оптимизировано для быстрой загрузки!*"
+                        + (f"\n⚡ *Совместимо с Kindle!*" if target_format.lower() == 'epub' else "")
+                    )
+                else:
+                    caption = (
+                        f"✅ *Готово!* Ваш файл в формате *{target_format.upper()}*\n"
+                        f"📄 *Имя файла:* `{volume.name}`\n"
+                        f"📊 *Размер:* {output_size_mb:.1f} МБ\n\n"
+                        + (f"🔥 *Оптимизировано для Kindle!*" if target_format.lower() == 'epub' else "")
+                    )
+
+                started = time.perf_counter()
+                with span("answer_document", size=volume.stat().st_size, volume=number):
+                    await callback.message.answer_document(
+                        document=document,
+                        caption=caption,
+                        parse_mode="Markdown"
+                    )
+                observe_stage(
+                    "upload", input_path.suffix, target_format,
+                    file_size, time.perf_counter() - started
                 )
-            
-            await callback.message.answer_document(
-                document=document,
-                caption=caption,
-                parse_mode="Markdown"
-            )
+            delivered = True
+            outcome = OUTCOME_OK
             
             # Удаляем сообщение со статусом
             await callback.message.delete()
@@ -114,7 +191,8 @@ async def handle_conversion(callback: CallbackQuery, state: FSMContext):
             # Удаляем файлы
             try:
                 input_path.unlink()
-                output_path.unlink()
+                for volume in volumes:
+                    volume.unlink()
             except:
                 pass
                 
@@ -162,10 +240,12 @@ async def handle_conversion(callback: CallbackQuery, state: FSMContext):
             else:
                 error_message = error_manager.get_user_message(ErrorCode.CONVERSION_FAILED, error_id)
             
-            await callback.message.edit_text(error_message, parse_mode="Markdown")
+            with send_priority(Priority.ERROR):
+                await callback.message.edit_text(error_message, parse_mode="Markdown")
             
     except Exception as e:
         # Обрабатываем неожиданные ошибки
+        await cancel_progress(pending_progress)
         error_id = error_manager.log_error(
             ErrorCode.UNKNOWN_ERROR,
             exception=e,
@@ -181,11 +261,17 @@ async def handle_conversion(callback: CallbackQuery, state: FSMContext):
         error_message = error_manager.get_user_message(ErrorCode.UNKNOWN_ERROR, error_id)
         
         logger.error(f"Ошибка в handle_conversion: {e} (Error ID: {error_id})")
-        await callback.message.edit_text(
-            error_message,
-            parse_mode="Markdown"
-        )
+        with send_priority(Priority.ERROR):
+            await callback.message.edit_text(
+                error_message,
+                parse_mode="Markdown"
+            )
     finally:
+        finish_trace(trace, error=not delivered)
+        record_traffic(
+            arrived_at, src_format, file_size, outcome,
+            target_format, decision_seconds, conversion_seconds
+        )
         # Очищаем состояние
         await state.clear()
 
@@ -1,12 +1,20 @@
 """
 Обработчики команд бота.
 """
+import asyncio
+import time
+
 from aiogram import Router
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message
-from config import MAX_FILE_SIZE
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import FSInputFile, Message
+from config import MAX_FILE_SIZE, ADMIN_IDS, PROFILE_DIR
+from converter.child_usage import get_cost_ledger
+from utils.cost_ledger import format_cost_report
+from utils.error_manager import error_manager
+from utils.profiler import MAX_DURATION, SamplingProfiler, top_functions
 
 router = Router()
+profiler = SamplingProfiler(PROFILE_DIR)
 
 
 @router.message(CommandStart())
@@ -57,3 +65,118 @@ async def cmd_cancel(message: Message):
         message: Входящее сообщение
     """
     await message.answer("Текущая операция отменена.")
+
+
+@router.message(Command("error"))
+async def cmd_error(message: Message, command: CommandObject):
+    """
+    Обработчик команды /error ERR-... (только для администраторов).
+
+    Показывает подробности ошибки по ID, который пользователь получил
+    в сообщении об ошибке.
+
+    Args:
+        message: Входящее сообщение
+        command: Разобранная команда с аргументами
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    error_id = (command.args or "").strip().upper()
+    if not error_id:
+        await message.answer("Использование: /error ERR-ГГГГММДД-XXXXXXXX")
+        return
+
+    error_info = await asyncio.to_thread(error_manager.get_error, error_id)
+    if error_info is None:
+        await message.answer(f"Ошибка {error_id} не найдена")
+        return
+
+    context_lines = "\n".join(
+        f"  {key}: {str(value)[:200]}" for key, value in error_info['context'].items()
+    )
+    await message.answer(
+        f"🆔 {error_info['error_id']}\n"
+        f"🔢 Код: {error_info['code']} ({error_info['code_name']})\n"
+        f"🕒 Время: {error_info['timestamp']}\n"
+        f"👤 Пользователь: {error_info['user_id']}\n"
+        f"💥 Исключение: {error_info['exception_type']}: {error_info['exception']}\n"
+        f"📋 Контекст:\n{context_lines or '  -'}",
+        parse_mode=None
+    )
+
+
+@router.message(Command("costs"))
+async def cmd_costs(message: Message, command: CommandObject):
+    """
+    Обработчик команды /costs [дней] (только для администраторов).
+
+    Показывает ресурсы ebook-convert и gs по парам форматов
+    за последние N дней (по умолчанию 7).
+
+    Args:
+        message: Входящее сообщение
+        command: Разобранная команда с аргументами
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    ledger = get_cost_ledger()
+    if ledger is None:
+        await message.answer("Учет ресурсов конвертаций не включен")
+        return
+
+    try:
+        days = float((command.args or "7").strip())
+    except ValueError:
+        await message.answer("Использование: /costs [дней]")
+        return
+
+    rows = await asyncio.to_thread(ledger.report, time.time() - days * 86400)
+    # Ограничение Telegram - 4096 символов
+    await message.answer(
+        f"💰 Ресурсы конвертаций за {days:g} дн.\n\n{format_cost_report(rows)}"[:4096],
+        parse_mode=None
+    )
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """
+    Обработчик команды /profile [секунд] (только для администраторов).
+
+    Снимает стеки всех потоков бота в течение N секунд (по умолчанию 10)
+    и присылает файл collapsed stacks для flamegraph.pl или speedscope.
+
+    Args:
+        message: Входящее сообщение
+        command: Разобранная команда с аргументами
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    try:
+        seconds = float((command.args or "10").strip())
+    except ValueError:
+        await message.answer(f"Использование: /profile [секунд, до {MAX_DURATION}]")
+        return
+    if profiler.running:
+        await message.answer("Профилирование уже выполняется")
+        return
+
+    seconds = max(1.0, min(seconds, MAX_DURATION))
+    await message.answer(f"🔬 Профилирование {seconds:g} с...")
+    try:
+        path, stacks, samples = await asyncio.to_thread(profiler.run, seconds)
+    except RuntimeError as e:
+        await message.answer(str(e))
+        return
+
+    top = "\n".join(
+        f"{count * 100 // max(samples, 1):>3}% {frame}" for frame, count in top_functions(stacks)
+    )
+    await message.answer_document(
+        FSInputFile(path),
+        caption=f"{samples} сэмплов. Чаще всего на вершине стека:\n{top}"[:1024],
+        parse_mode=None
+    )
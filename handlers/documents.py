@@ -4,37 +4,206 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
+from dataclasses import asdict
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Tuple
+import asyncio
 import logging
-import io
+import time
 
-from converter.converter import BookConverter
-from converter.validators import FileValidator
+from services import Services
+from utils.error_manager import error_manager
 from utils.file_manager import TempFileManager
 from keyboards.inline import create_format_keyboard
-from config import MAX_FILE_SIZE
+from utils.send_queue import Priority, send_priority
+from utils.metrics import observe_stage
+from utils.tracing import finish_trace, span, start_trace
+from utils.traffic_recorder import OUTCOME_ERROR, OUTCOME_INVALID, OUTCOME_TOO_LARGE, record_traffic
+from config import MAX_FILE_SIZE, BATCH_MAX_FILES, BATCH_MAX_TOTAL, MEDIA_GROUP_WAIT
+
+if TYPE_CHECKING:
+    from converter.batch import BatchBook, ExtractResult
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-file_manager = TempFileManager()
-converter = BookConverter()
-validator = FileValidator()
+# Документы альбомов, которые еще собираются: media_group_id -> сообщения.
+# Группа живет в памяти процесса: если обновления одного альбома попадут на
+# разные экземпляры бота (вебхук за балансировщиком), альбом придет
+# несколькими пакетами
+media_groups: Dict[str, List[Message]] = {}
+
+
+async def download_document(message: Message, file_manager: TempFileManager) -> Path:
+    """Скачивает документ сообщения во временный файл."""
+    document = message.document
+    started = time.perf_counter()
+    with span("get_file"):
+        file = await message.bot.get_file(document.file_id)
+    with span("download", size=document.file_size):
+        # Пишем поток прямо во временный файл, не собирая его в памяти
+        temp_path = await file_manager.save_file_from_download(
+            lambda path: message.bot.download_file(file.file_path, destination=path),
+            document.file_name,
+            document.file_size
+        )
+    observe_stage(
+        "download", Path(document.file_name or "").suffix or "-", "-",
+        document.file_size, time.perf_counter() - started
+    )
+    return temp_path
+
+
+def unpack_archive(archive_path: Path, file_manager: TempFileManager) -> "ExtractResult":
+    """Распаковывает книги архива (синхронно) и удаляет сам архив."""
+    from converter.batch import extract_books
+
+    try:
+        return extract_books(
+            archive_path,
+            lambda suffix, size: file_manager.new_file(suffix, size),
+            max_books=BATCH_MAX_FILES,
+            max_total=BATCH_MAX_TOTAL,
+            max_file=MAX_FILE_SIZE
+        )
+    finally:
+        file_manager.release(archive_path)
+
+
+def prepare_batch(books: List["BatchBook"], services: Services) -> Tuple[List["BatchBook"], List[str]]:
+    """
+    Проверяет книги пакета (синхронно): битые удаляются, расширение - по содержимому.
+
+    Returns:
+        tuple: (годные книги, имена отклоненных)
+    """
+    from converter.batch import BatchBook
+
+    valid, rejected = [], []
+    for book in books:
+        path = Path(book.path)
+        result = services.validator.inspect(path)
+        if not result.is_valid:
+            services.file_manager.release(path)
+            rejected.append(book.name)
+            continue
+        if path.suffix.lower() != f".{result.format}":
+            path = services.file_manager.change_suffix(path, f".{result.format}")
+        valid.append(BatchBook(name=book.name, path=str(path)))
+    return valid, rejected
+
+
+async def offer_batch(
+    status_msg: Message, state: FSMContext, books: List["BatchBook"], skipped: List[str], services: Services
+) -> None:
+    """Сохраняет пакет в состоянии и показывает выбор формата для всех книг."""
+    books, rejected = await asyncio.to_thread(prepare_batch, books, services)
+    skipped = skipped + rejected
+    if not books:
+        with send_priority(Priority.ERROR):
+            await status_msg.edit_text("❌ Среди файлов нет книг, которые можно сконвертировать.")
+        return
+
+    await state.update_data(
+        batch=[asdict(book) for book in books],
+        batch_skipped=skipped,
+        arrived_at=time.time()
+    )
+    formats = {Path(book.path).suffix.lstrip(".") for book in books}
+    names = "\n".join(f"• {book.name}" for book in books[:10])
+    if len(books) > 10:
+        names += f"\n• ... и еще {len(books) - 10}"
+    text = f"📚 Пакет: {len(books)} кн.\n{names}\n"
+    if skipped:
+        text += f"\n⏭ Пропущено файлов: {len(skipped)}\n"
+    with send_priority(Priority.NORMAL):
+        await status_msg.edit_text(
+            text + "\nВыберите формат для всех книг (результат придет одним архивом):",
+            # Имена файлов - как есть, без разметки HTML по умолчанию
+            parse_mode=None,
+            reply_markup=create_format_keyboard(formats.pop() if len(formats) == 1 else "", action="batch")
+        )
+
+
+async def collect_media_group(message: Message, state: FSMContext, services: Services) -> None:
+    """
+    Собирает документы альбома в один пакет.
+
+    Документы альбома приходят отдельными обновлениями подряд: первый
+    обработчик ждет, пока новые перестанут приходить MEDIA_GROUP_WAIT
+    секунд, и обрабатывает всю группу, остальные только добавляются в нее.
+    Собираются только документы, пришедшие в этот процесс (media_groups).
+    """
+    group = media_groups.get(message.media_group_id)
+    if group is not None:
+        group.append(message)
+        return
+    group = media_groups[message.media_group_id] = [message]
+    try:
+        collected = 0
+        while collected != len(group):
+            collected = len(group)
+            await asyncio.sleep(MEDIA_GROUP_WAIT)
+    finally:
+        media_groups.pop(message.media_group_id, None)
+
+    from converter.batch import BatchBook, sniff_archive
+
+    file_manager = services.file_manager
+    status_msg = await message.reply(f"⏳ Загружаю файлы ({len(group)})...")
+    books, skipped = [], []
+    try:
+        for item in group:
+            document = item.document
+            name = document.file_name or "book"
+            if document.file_size > MAX_FILE_SIZE or len(books) >= BATCH_MAX_FILES:
+                skipped.append(name)
+                continue
+            temp_path = await download_document(item, file_manager)
+            if await asyncio.to_thread(sniff_archive, temp_path) == "zip":
+                unpacked = await asyncio.to_thread(unpack_archive, temp_path, file_manager)
+                books.extend(unpacked.books)
+                skipped.extend(unpacked.skipped)
+            else:
+                books.append(BatchBook(name=name, path=str(temp_path)))
+        await offer_batch(status_msg, state, books, skipped, services)
+    except Exception as e:
+        logger.error(f"Ошибка обработки альбома: {e}")
+        for book in books:
+            file_manager.release(Path(book.path))
+        with send_priority(Priority.ERROR):
+            await status_msg.edit_text(
+                "❌ Произошла ошибка при обработке файлов.\n"
+                "Попробуйте еще раз."
+            )
 
 
 @router.message(F.document)
-async def handle_document(message: Message, state: FSMContext):
+async def handle_document(message: Message, state: FSMContext, services: Services):
     """
     Обработчик входящих документов.
     
     Args:
         message: Сообщение с документом
         state: Состояние FSM
+        services: Общие сервисы бота (из контекста диспетчера)
     """
+    if message.media_group_id:
+        await collect_media_group(message, state, services)
+        return
+
+    from converter.batch import sniff_archive
+
+    file_manager = services.file_manager
+
     document = message.document
+    file_name = document.file_name
+    arrived_at = time.time()
+    src_format = Path(file_name or "").suffix or "-"
     
     # Проверяем размер
     if document.file_size > MAX_FILE_SIZE:
+        record_traffic(arrived_at, src_format, document.file_size, OUTCOME_TOO_LARGE)
         await message.reply(
             f"❌ Файл слишком большой!\n"
             f"Максимальный размер: {MAX_FILE_SIZE // 1_048_576} МБ"
@@ -44,57 +213,102 @@ async def handle_document(message: Message, state: FSMContext):
     # Отправляем статус
     status_msg = await message.reply("⏳ Загружаю файл...")
     
+    trace = start_trace(
+        "handle_document", src=src_format.lstrip(".") or "-", size=document.file_size
+    )
+    failed = True
+    
     try:
         # Скачиваем файл
-        file = await message.bot.get_file(document.file_id)
-        file_data = await message.bot.download_file(file.file_path)
-        
-        # Читаем данные из BytesIO
-        if isinstance(file_data, io.BytesIO):
-            file_bytes = file_data.getvalue()
-        else:
-            file_bytes = file_data
-        
-        # Сохраняем во временный файл
-        temp_path = await file_manager.save_file_from_bytes(
-            file_bytes, 
-            document.file_name
-        )
+        temp_path = await download_document(message, file_manager)
+
+        # Архив с книгами: одна книга (типичный .fb2.zip) - обычная конвертация, несколько - пакет
+        archive = await asyncio.to_thread(sniff_archive, temp_path)
+        if archive == "rar":
+            file_manager.release(temp_path)
+            record_traffic(arrived_at, src_format, document.file_size, OUTCOME_INVALID)
+            with send_priority(Priority.ERROR):
+                await status_msg.edit_text("❌ Архивы RAR не поддерживаются. Упакуйте книги в ZIP.")
+            failed = False
+            return
+        if archive == "zip":
+            unpacked = await asyncio.to_thread(unpack_archive, temp_path, file_manager)
+            if unpacked.error:
+                record_traffic(arrived_at, src_format, document.file_size, OUTCOME_INVALID)
+                with send_priority(Priority.ERROR):
+                    await status_msg.edit_text(f"❌ {unpacked.error}")
+                failed = False
+                return
+            if len(unpacked.books) > 1:
+                await offer_batch(status_msg, state, unpacked.books, unpacked.skipped, services)
+                failed = False
+                return
+            temp_path, file_name = Path(unpacked.books[0].path), unpacked.books[0].name
         
         # Валидируем
-        is_valid, error = validator.validate_file(temp_path)
-        if not is_valid:
-            await status_msg.edit_text(f"❌ {error}")
+        started = time.perf_counter()
+        with span("validate") as validate_span:
+            # Чтение файла (начало и структура через mmap) - синхронное, не блокируем event loop
+            result = await asyncio.to_thread(services.validator.inspect, temp_path)
+            if validate_span is not None:
+                validate_span.set_attribute("valid", result.is_valid)
+        observe_stage(
+            "validation", src_format, "-", document.file_size,
+            time.perf_counter() - started, ok=result.is_valid
+        )
+        if not result.is_valid:
+            record_traffic(arrived_at, src_format, document.file_size, OUTCOME_INVALID)
+            error_text = f"❌ {result.error}"
+            if result.format is not None:
+                # Формат распознан, но книга повреждена - код нужен для поддержки
+                error_id = error_manager.log_error(
+                    result.error_code,
+                    context={'file_name': file_name, 'format': result.format, 'error': result.error},
+                    user_id=message.from_user.id if message.from_user else None
+                )
+                error_text += f"\n\n🆔 Код ошибки: {result.error_code.value} | ID: {error_id}"
+            with send_priority(Priority.ERROR):
+                await status_msg.edit_text(error_text)
             # Удаляем временный файл
-            try:
-                temp_path.unlink()
-            except:
-                pass
+            file_manager.release(temp_path)
             return
+        real_format = result.format
         
-        # Определяем формат
-        current_format = temp_path.suffix.lstrip('.')
+        # Формат - по содержимому: ebook-convert выбирает входной плагин по расширению
+        if temp_path.suffix.lower() != f".{real_format}":
+            logger.info(f"Файл {file_name} на самом деле {real_format.upper()}")
+            temp_path = file_manager.change_suffix(temp_path, f".{real_format}")
+        current_format = real_format
         
-        # Сохраняем путь в состоянии
+        # Сохраняем путь в состоянии (и контекст трассы для handle_conversion)
         await state.update_data(
             file_path=str(temp_path),
-            file_name=document.file_name,
-            current_format=current_format
+            file_name=file_name,
+            current_format=current_format,
+            arrived_at=arrived_at,
+            trace=trace.context() if trace else None
         )
         
-        # Показываем клавиатуру с форматами
-        await status_msg.edit_text(
-            f"📄 Файл: *{document.file_name}*\n"
-            f"📊 Формат: *{current_format.upper()}*\n"
-            f"📦 Размер: *{document.file_size // 1024} КБ*\n\n"
-            f"Выберите формат для конвертации:",
-            parse_mode="Markdown",
-            reply_markup=create_format_keyboard(current_format)
-        )
+        # Показываем клавиатуру с форматами (это не прогресс, а ответ пользователю);
+        # размер - книги, а не архива, из которого она распакована
+        with send_priority(Priority.NORMAL):
+            await status_msg.edit_text(
+                f"📄 Файл: *{file_name}*\n"
+                f"📊 Формат: *{current_format.upper()}*\n"
+                f"📦 Размер: *{temp_path.stat().st_size // 1024} КБ*\n\n"
+                f"Выберите формат для конвертации:",
+                parse_mode="Markdown",
+                reply_markup=create_format_keyboard(current_format)
+            )
+        failed = False
         
     except Exception as e:
         logger.error(f"Ошибка обработки документа: {e}")
-        await status_msg.edit_text(
-            "❌ Произошла ошибка при обработке файла.\n"
-            "Попробуйте еще раз."
-        )
+        record_traffic(arrived_at, src_format, document.file_size, OUTCOME_ERROR)
+        with send_priority(Priority.ERROR):
+            await status_msg.edit_text(
+                "❌ Произошла ошибка при обработке файла.\n"
+                "Попробуйте еще раз."
+            )
+    finally:
+        finish_trace(trace, error=failed)
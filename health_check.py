@@ -1,59 +1,65 @@
 #!/usr/bin/env python3
 """
 Health check скрипт для мониторинга состояния бота.
+
+Опрашивает эндпоинт /health/ready (или /health/live) работающего бота.
+Сами проверки (calibre, свободное место, getUpdates) бот выполняет в фоне,
+поэтому скрипт не запускает процессов и подходит для частых проверок
+(Docker HEALTHCHECK, systemd, балансировщик).
+
+Код возврата: 0 - бот готов, 1 - не готов или недоступен.
 """
-import asyncio
-import sys
+import argparse
+import json
 import os
-import logging
-from datetime import datetime
-from pathlib import Path
+import sys
+import urllib.error
+import urllib.request
 
-# Добавляем путь к проекту
-sys.path.append('/opt/telegram-bot')
 
-async def health_check():
-    """Проверка состояния бота"""
+def health_check(url: str, timeout: float) -> bool:
+    """Запрашивает эндпоинт и печатает отчет."""
     try:
-        # Проверяем конфигурацию
-        from config import BOT_TOKEN
-        if not BOT_TOKEN:
-            raise ValueError("BOT_TOKEN not configured")
-        
-        # Проверяем доступность Calibre
-        import subprocess
-        result = subprocess.run(['ebook-convert', '--version'], 
-                              capture_output=True, text=True, timeout=5)
-        if result.returncode != 0:
-            raise Exception("Calibre not available")
-        
-        # Проверяем директории
-        temp_dir = Path('/opt/telegram-bot/temp')
-        logs_dir = Path('/opt/telegram-bot/logs')
-        
-        if not temp_dir.exists():
-            temp_dir.mkdir(parents=True)
-        if not logs_dir.exists():
-            logs_dir.mkdir(parents=True)
-        
-        # Проверяем свободное место
-        import shutil
-        total, used, free = shutil.disk_usage('/opt/telegram-bot')
-        free_gb = free // (1024**3)
-        
-        if free_gb < 1:  # Меньше 1GB свободного места
-            raise Exception(f"Low disk space: {free_gb}GB free")
-        
-        print(f"✅ Health check passed at {datetime.now()}")
-        print(f"📁 Free disk space: {free_gb}GB")
-        print(f"🔧 Calibre version: {result.stdout.strip()}")
-        
-        return True
-        
-    except Exception as e:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            report = json.load(response)
+            ok = True
+    except urllib.error.HTTPError as e:
+        # 503 содержит отчет с причинами
+        try:
+            report = json.load(e)
+        except ValueError:
+            report = {}
+        ok = False
+    except (urllib.error.URLError, OSError, ValueError) as e:
         print(f"❌ Health check failed: {e}")
         return False
 
+    if ok:
+        print("✅ Health check passed")
+    else:
+        print("❌ Health check failed")
+        for problem in report.get("problems", []):
+            print(f"   - {problem}")
+    for key, value in report.items():
+        if key not in ("problems", "ready", "live"):
+            print(f"   {key}: {value}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка состояния бота")
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('HEALTH_CHECK_PORT', '8080')}",
+        help="Адрес служебного HTTP-сервера бота"
+    )
+    parser.add_argument("--live", action="store_true", help="Проверить только liveness")
+    parser.add_argument("--timeout", type=float, default=3, help="Таймаут запроса (сек)")
+    args = parser.parse_args()
+
+    path = "/health/live" if args.live else "/health/ready"
+    return 0 if health_check(args.url.rstrip("/") + path, args.timeout) else 1
+
+
 if __name__ == "__main__":
-    success = asyncio.run(health_check())
-    sys.exit(0 if success else 1)
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Надежная очередь задач конвертации.
+
+Фронтенд (aiogram) ставит задачи в очередь, отдельные процессы-воркеры
+(возможно, на других узлах) захватывают их с арендой (lease), продлевают
+аренду heartbeat-ами и сообщают результат. Если воркер упал, аренда
+истекает и задача возвращается в очередь.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Статусы задач
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+FINISHED_STATUSES = {STATUS_DONE, STATUS_FAILED}
+
+
+@dataclass
+class Job:
+    """Задача конвертации в очереди."""
+
+    id: str
+    status: str
+    payload: Dict[str, Any]
+    result: Optional[Dict[str, Any]] = None
+    progress: Optional[str] = None
+    worker_id: Optional[str] = None
+    attempts: int = 0
+    created_at: float = 0.0
+    claimed_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        """Задача завершена (успешно или с ошибкой)."""
+        return self.status in FINISHED_STATUSES
+
+
+class JobQueue(ABC):
+    """
+    Интерфейс очереди задач.
+
+    Методы синхронные и быстрые; из асинхронного кода их следует вызывать
+    через asyncio.to_thread.
+    """
+
+    def __init__(self, max_attempts: int = 2):
+        """
+        Args:
+            max_attempts: Сколько раз задачу можно захватить, прежде чем
+                она будет помечена как проваленная (защита от "ядовитых" файлов)
+        """
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        """Ставит задачу в очередь и возвращает ее ID."""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """Захватывает следующую задачу с арендой; None, если очередь пуста."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Продлевает аренду; False, если задача уже не принадлежит воркеру."""
+
+    @abstractmethod
+    def set_progress(self, job_id: str, worker_id: str, progress: str) -> None:
+        """Сохраняет текст прогресса для передачи пользователю."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Помечает задачу выполненной."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: Dict[str, Any]) -> bool:
+        """Помечает задачу проваленной (без повторов)."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """Возвращает задачу по ID."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Количество задач, ожидающих воркера."""
+
+    @abstractmethod
+    def purge(self, older_than: float) -> int:
+        """Удаляет завершенные задачи старше older_than секунд."""
+
+    def close(self) -> None:
+        """Освобождает ресурсы очереди."""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Очередь задач на SQLite в режиме WAL.
+
+    Подходит для нескольких процессов на одной машине (или на общем
+    локальном томе). Захват задачи выполняется в транзакции BEGIN IMMEDIATE,
+    поэтому одну задачу не могут получить два воркера.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            progress TEXT,
+            worker_id TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            claimed_at REAL,
+            lease_until REAL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_until);
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 2):
+        """
+        Args:
+            db_path: Путь к файлу базы данных
+            max_attempts: Максимум захватов одной задачи
+        """
+        super().__init__(max_attempts)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            isolation_level=None,  # Транзакциями управляем явно
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _row_to_job(self, row: sqlite3.Row) -> Job:
+        """Преобразует строку таблицы в Job."""
+        return Job(
+            id=row["id"],
+            status=row["status"],
+            payload=json.loads(row["payload"]),
+            result=json.loads(row["result"]) if row["result"] else None,
+            progress=row["progress"],
+            worker_id=row["worker_id"],
+            attempts=row["attempts"],
+            created_at=row["created_at"],
+            claimed_at=row["claimed_at"],
+            finished_at=row["finished_at"]
+        )
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, json.dumps(payload), time.time())
+            )
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Задачи упавших воркеров: повтор или окончательный провал
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, result = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (STATUS_FAILED, now, json.dumps({"error": "lease_expired"}),
+                     STATUS_RUNNING, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (STATUS_QUEUED, STATUS_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                    "claimed_at = ?, lease_until = ? WHERE id = ?",
+                    (STATUS_RUNNING, worker_id, now, now + lease_seconds, row["id"])
+                )
+                job_row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(job_row)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (time.time() + lease_seconds, job_id, worker_id, STATUS_RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def set_progress(self, job_id: str, worker_id: str, progress: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ? WHERE id = ? AND worker_id = ?",
+                (progress, job_id, worker_id)
+            )
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: Dict[str, Any]) -> bool:
+        """Переводит задачу в финальный статус, если ею владеет воркер."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (status, json.dumps(result), time.time(), job_id, worker_id, STATUS_RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._finish(job_id, worker_id, STATUS_DONE, result)
+
+    def fail(self, job_id: str, worker_id: str, error: Dict[str, Any]) -> bool:
+        return self._finish(job_id, worker_id, STATUS_FAILED, error)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        # Аренда истекла и повторов не осталось - задача фактически провалена
+        if (job.status == STATUS_RUNNING and row["lease_until"] is not None
+                and row["lease_until"] < time.time() and job.attempts >= self.max_attempts):
+            job.status = STATUS_FAILED
+            job.result = {"error": "lease_expired"}
+        return job
+
+    def depth(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()
+        return row[0]
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (STATUS_DONE, STATUS_FAILED, time.time() - older_than)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_queue(url: str, max_attempts: int = 2) -> JobQueue:
+    """
+    Создает очередь задач по URL.
+
+    Поддерживаются схемы:
+        sqlite:///relative/path.db, sqlite:////absolute/path.db
+        redis://host:port/db
+
+    Args:
+        url: URL очереди
+        max_attempts: Максимум захватов одной задачи
+
+    Returns:
+        JobQueue: Экземпляр очереди
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteJobQueue(url[len("sqlite:///"):], max_attempts=max_attempts)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        from jobs.redis_queue import RedisJobQueue
+        return RedisJobQueue(url, max_attempts=max_attempts)
+    raise ValueError(f"Неподдерживаемый URL очереди задач: {url}")
@@ -0,0 +1,203 @@
+"""
+Очередь задач на Redis для воркеров на нескольких узлах.
+"""
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from jobs.queue import (
+    Job, JobQueue, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED
+)
+
+logger = logging.getLogger(__name__)
+
+# KEYS: очередь, аренды; ARGV: префикс ключа задачи, воркер, время, конец аренды, статус.
+# Ключ задачи собирается внутри скрипта: очередь рассчитана на один узел Redis, не кластер
+CLAIM_SCRIPT = """
+local job_id = redis.call('LPOP', KEYS[1])
+if not job_id then
+    return nil
+end
+local key = ARGV[1] .. job_id
+redis.call('ZADD', KEYS[2], ARGV[4], job_id)
+redis.call('HSET', key, 'status', ARGV[5], 'worker_id', ARGV[2], 'claimed_at', ARGV[3])
+redis.call('HINCRBY', key, 'attempts', 1)
+return {job_id, redis.call('HGETALL', key)}
+"""
+
+# KEYS: аренды, очередь; ARGV: префикс ключа задачи, задача, максимум захватов, время,
+# срок хранения, статус провала, результат провала, статус ожидания.
+# Возвращает {0} - аренду уже снял другой воркер, {1, попыток} - провал, {2, попыток} - возврат
+REQUEUE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[2]) == 0 then
+    return {0}
+end
+local key = ARGV[1] .. ARGV[2]
+local attempts = tonumber(redis.call('HGET', key, 'attempts') or '0')
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('HSET', key, 'status', ARGV[6], 'result', ARGV[7], 'finished_at', ARGV[4])
+    redis.call('EXPIRE', key, ARGV[5])
+    return {1, attempts}
+end
+redis.call('HSET', key, 'status', ARGV[8], 'worker_id', '')
+redis.call('LPUSH', KEYS[2], ARGV[2])
+return {2, attempts}
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Очередь задач на Redis.
+
+    Структуры данных:
+        {prefix}:job:<id>  - hash с полями задачи
+        {prefix}:queue     - list ожидающих задач (FIFO)
+        {prefix}:leases    - sorted set аренд (score = время истечения)
+
+    Захват (LPOP + аренда) и возврат задачи с истекшей арендой (ZREM +
+    LPUSH) выполняются Lua-скриптами, то есть атомарно: воркер, упавший
+    или потерявший соединение посреди захвата, не может потерять задачу -
+    она либо еще в очереди, либо уже в {prefix}:leases. Возврат выполняет
+    тот воркер, чей скрипт удалил аренду, поэтому задача не возвращается
+    в очередь дважды.
+    """
+
+    FINISHED_TTL = 24 * 3600  # Сколько хранить завершенные задачи
+
+    def __init__(self, url: str, max_attempts: int = 2, prefix: str = "bookbot:jobs"):
+        """
+        Args:
+            url: URL Redis (redis://host:port/db)
+            max_attempts: Максимум захватов одной задачи
+            prefix: Префикс ключей
+        """
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Для очереди на Redis установите пакет redis")
+        super().__init__(max_attempts)
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._queue_key = f"{prefix}:queue"
+        self._leases_key = f"{prefix}:leases"
+        self._claim_script = self._redis.register_script(CLAIM_SCRIPT)
+        self._requeue_script = self._redis.register_script(REQUEUE_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _hash_to_job(self, job_id: str, data: Dict[str, str]) -> Job:
+        """Преобразует hash Redis в Job."""
+        return Job(
+            id=job_id,
+            status=data["status"],
+            payload=json.loads(data["payload"]),
+            result=json.loads(data["result"]) if data.get("result") else None,
+            progress=data.get("progress") or None,
+            worker_id=data.get("worker_id") or None,
+            attempts=int(data.get("attempts", 0)),
+            created_at=float(data.get("created_at", 0)),
+            claimed_at=float(data["claimed_at"]) if data.get("claimed_at") else None,
+            finished_at=float(data["finished_at"]) if data.get("finished_at") else None
+        )
+
+    def _requeue_expired(self, now: float) -> None:
+        """Возвращает в очередь задачи с истекшей арендой."""
+        for job_id in self._redis.zrangebyscore(self._leases_key, "-inf", now):
+            outcome = self._requeue_script(
+                keys=[self._leases_key, self._queue_key],
+                args=[
+                    self._job_key(""), job_id, self.max_attempts, now, self.FINISHED_TTL,
+                    STATUS_FAILED, json.dumps({"error": "lease_expired"}), STATUS_QUEUED
+                ]
+            )
+            if outcome[0] == 1:
+                logger.warning(f"Задача {job_id} провалена: аренда истекла {outcome[1]} раз")
+            elif outcome[0] == 2:
+                logger.warning(f"Задача {job_id} возвращена в очередь после истечения аренды")
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        pipe = self._redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "status": STATUS_QUEUED,
+            "payload": json.dumps(payload),
+            "attempts": 0,
+            "created_at": time.time()
+        })
+        pipe.rpush(self._queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        now = time.time()
+        self._requeue_expired(now)
+
+        claimed = self._claim_script(
+            keys=[self._queue_key, self._leases_key],
+            args=[self._job_key(""), worker_id, now, now + lease_seconds, STATUS_RUNNING]
+        )
+        if claimed is None:
+            return None
+
+        job_id, fields = claimed
+        # HGETALL из скрипта приходит плоским списком: поле, значение, ...
+        data = dict(zip(fields[::2], fields[1::2]))
+        return self._hash_to_job(job_id, data)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        if self._redis.hget(self._job_key(job_id), "worker_id") != worker_id:
+            return False
+        # XX: продлеваем только существующую аренду
+        self._redis.zadd(self._leases_key, {job_id: time.time() + lease_seconds}, xx=True)
+        return self._redis.zscore(self._leases_key, job_id) is not None
+
+    def set_progress(self, job_id: str, worker_id: str, progress: str) -> None:
+        key = self._job_key(job_id)
+        if self._redis.hget(key, "worker_id") == worker_id:
+            self._redis.hset(key, "progress", progress)
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: Dict[str, Any]) -> bool:
+        """Переводит задачу в финальный статус, если ею владеет воркер."""
+        key = self._job_key(job_id)
+        if self._redis.hget(key, "worker_id") != worker_id:
+            return False
+        if not self._redis.zrem(self._leases_key, job_id):
+            return False  # Аренда истекла, задача уже передана другому воркеру
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={
+            "status": status,
+            "result": json.dumps(result),
+            "finished_at": time.time()
+        })
+        pipe.expire(key, self.FINISHED_TTL)
+        pipe.execute()
+        return True
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._finish(job_id, worker_id, STATUS_DONE, result)
+
+    def fail(self, job_id: str, worker_id: str, error: Dict[str, Any]) -> bool:
+        return self._finish(job_id, worker_id, STATUS_FAILED, error)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        data = self._redis.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        return self._hash_to_job(job_id, data)
+
+    def depth(self) -> int:
+        return self._redis.llen(self._queue_key)
+
+    def purge(self, older_than: float) -> int:
+        # Завершенные задачи удаляются самим Redis через EXPIRE
+        return 0
+
+    def close(self) -> None:
+        self._redis.close()
@@ -0,0 +1,155 @@
+"""
+Планировщик конвертаций фронтенда.
+
+Без очереди задач конвертации выполняются в процессе бота с ограничением
+параллельности. С очередью задача передается воркерам, а фронтенд ждет
+результат и пересылает пользователю сообщения о прогрессе.
+"""
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from converter.converter import BookConverter
+from jobs.queue import JobQueue, STATUS_DONE
+from utils.metrics import observe_stage
+from utils.tracing import current_context, span
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionScheduler:
+    """Запускает конвертации локально или через очередь воркеров."""
+
+    def __init__(
+        self,
+        converter: BookConverter,
+        max_concurrent: int = 2,
+        job_queue: Optional[JobQueue] = None,
+        poll_interval: float = 1.0,
+        result_timeout: float = 2 * 3600
+    ):
+        """
+        Инициализация планировщика.
+
+        Args:
+            converter: Конвертер для локального режима
+            max_concurrent: Максимум одновременных локальных конвертаций
+            job_queue: Очередь задач (None - локальный режим)
+            poll_interval: Интервал опроса статуса задачи в секундах
+            result_timeout: Максимальное ожидание результата от воркеров
+        """
+        self.converter = converter
+        self.job_queue = job_queue
+        self.poll_interval = poll_interval
+        self.result_timeout = result_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество конвертаций, ожидающих исполнителя."""
+        if self.job_queue is not None:
+            return self.job_queue.depth()
+        return self._waiting
+
+    async def convert(
+        self,
+        input_path: Path,
+        target_format: str,
+        progress_callback: Optional[Callable] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[Path]:
+        """
+        Конвертирует файл с учетом лимитов.
+
+        Args:
+            input_path: Путь к исходному файлу
+            target_format: Целевой формат
+            progress_callback: Функция для уведомлений о прогрессе
+            user_id: ID пользователя
+
+        Returns:
+            Path к конвертированному файлу или None при ошибке
+        """
+        if self.job_queue is not None:
+            return await self._convert_remote(input_path, target_format, progress_callback, user_id)
+        return await self._convert_local(input_path, target_format, progress_callback, user_id)
+
+    async def _convert_local(self, input_path, target_format, progress_callback, user_id):
+        """Конвертация в процессе бота с ограничением параллельности."""
+        enqueued = time.perf_counter()
+        self._waiting += 1
+        try:
+            with span("queue_wait", waiting=self._waiting - 1):
+                if self._semaphore.locked() and progress_callback:
+                    await progress_callback(f"🕒 Ожидание в очереди (перед вами: {self._waiting - 1})...")
+                await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        observe_stage(
+            "queue_wait", input_path.suffix, target_format,
+            input_path.stat().st_size, time.perf_counter() - enqueued
+        )
+
+        try:
+            return await self.converter.convert(
+                input_path,
+                target_format,
+                progress_callback=progress_callback,
+                user_id=user_id
+            )
+        finally:
+            self._semaphore.release()
+
+    async def _convert_remote(self, input_path, target_format, progress_callback, user_id):
+        """Постановка задачи в очередь и ожидание результата от воркера."""
+        with span("remote_conversion") as remote_span:
+            output_path = await self._wait_remote(input_path, target_format, progress_callback, user_id)
+            if remote_span is not None:
+                remote_span.set_attribute("ok", output_path is not None)
+            return output_path
+
+    async def _wait_remote(self, input_path, target_format, progress_callback, user_id):
+        job_id = await asyncio.to_thread(self.job_queue.enqueue, {
+            "input_path": str(input_path),
+            "target_format": target_format,
+            "user_id": user_id,
+            # Воркер продолжит трассу задачи от спана remote_conversion
+            "trace": current_context()
+        })
+        logger.info(f"Задача {job_id} поставлена в очередь ({input_path.name} → {target_format})")
+
+        if progress_callback:
+            await progress_callback("🕒 Задача поставлена в очередь...")
+
+        deadline = time.monotonic() + self.result_timeout
+        last_progress = None
+        wait_recorded = False
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            job = await asyncio.to_thread(self.job_queue.get, job_id)
+            if job is None:
+                logger.error(f"Задача {job_id} пропала из очереди")
+                return None
+
+            if not wait_recorded and job.claimed_at:
+                wait_recorded = True
+                observe_stage(
+                    "queue_wait", input_path.suffix, target_format,
+                    input_path.stat().st_size, job.claimed_at - job.created_at
+                )
+
+            if progress_callback and job.progress and job.progress != last_progress:
+                last_progress = job.progress
+                await progress_callback(job.progress)
+
+            if job.finished:
+                if job.status == STATUS_DONE and job.result and job.result.get("output_path"):
+                    return Path(job.result["output_path"])
+                logger.error(f"Задача {job_id} провалена: {job.result}")
+                return None
+
+        logger.error(f"Таймаут ожидания результата задачи {job_id}")
+        return None
@@ -0,0 +1,133 @@
+"""
+Воркер конвертации: забирает задачи из очереди и запускает BookConverter.
+"""
+import asyncio
+import logging
+from pathlib import Path
+
+from converter.child_usage import collect_child_usage
+from converter.converter import BookConverter
+from jobs.queue import Job, JobQueue
+from utils.tracing import finish_trace, resume_trace
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Воркер, обрабатывающий задачи из очереди."""
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        converter: BookConverter,
+        worker_id: str,
+        concurrency: int = 1,
+        lease_seconds: float = 60,
+        idle_interval: float = 0.5
+    ):
+        """
+        Args:
+            job_queue: Очередь задач
+            converter: Конвертер книг
+            worker_id: Уникальный ID воркера
+            concurrency: Максимум одновременных конвертаций
+            lease_seconds: Длительность аренды задачи
+            idle_interval: Пауза между опросами пустой очереди
+        """
+        self.job_queue = job_queue
+        self.converter = converter
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.idle_interval = idle_interval
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        """Просит воркер завершиться после текущих задач."""
+        self._stop.set()
+
+    async def run(self) -> None:
+        """Основной цикл: захват задач, пока не запрошена остановка."""
+        logger.info(f"Воркер {self.worker_id} запущен (параллельность: {self.concurrency})")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        while not self._stop.is_set():
+            await semaphore.acquire()
+            job = await asyncio.to_thread(self.job_queue.claim, self.worker_id, self.lease_seconds)
+            if job is None:
+                semaphore.release()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=self.idle_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+        if tasks:
+            logger.info(f"Ожидание завершения {len(tasks)} задач...")
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Воркер {self.worker_id} остановлен")
+
+    async def _heartbeat(self, job: Job, conversion: asyncio.Task) -> None:
+        """Продлевает аренду; при потере аренды отменяет конвертацию."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            alive = await asyncio.to_thread(
+                self.job_queue.heartbeat, job.id, self.worker_id, self.lease_seconds
+            )
+            if not alive:
+                logger.warning(f"Аренда задачи {job.id} потеряна, конвертация отменена")
+                conversion.cancel()
+                return
+
+    async def _process(self, job: Job) -> None:
+        """Выполняет одну задачу и сообщает результат в очередь."""
+        payload = job.payload
+        input_path = Path(payload["input_path"])
+        logger.info(f"Задача {job.id}: {input_path.name} → {payload['target_format']} (попытка {job.attempts})")
+        trace = resume_trace(
+            payload.get("trace"), "worker_conversion",
+            job_id=job.id, worker_id=self.worker_id, attempt=job.attempts
+        )
+
+        async def report_progress(message: str):
+            await asyncio.to_thread(self.job_queue.set_progress, job.id, self.worker_id, message)
+
+        # Ресурсы ebook-convert/gs этой задачи попадают в ее результат
+        with collect_child_usage() as usages:
+            conversion = asyncio.create_task(self.converter.convert(
+                input_path,
+                payload["target_format"],
+                progress_callback=report_progress,
+                user_id=payload.get("user_id")
+            ))
+        heartbeat = asyncio.create_task(self._heartbeat(job, conversion))
+
+        try:
+            output_path = await conversion
+        except asyncio.CancelledError:
+            finish_trace(trace, error=True)
+            return
+        except Exception as e:
+            logger.error(f"Задача {job.id}: ошибка конвертации: {e}")
+            output_path = None
+        finally:
+            heartbeat.cancel()
+        finish_trace(trace, error=not output_path)
+
+        usage = [item.to_dict() for item in usages]
+        if output_path:
+            await asyncio.to_thread(
+                self.job_queue.complete, job.id, self.worker_id,
+                {"output_path": str(output_path), "usage": usage}
+            )
+        else:
+            await asyncio.to_thread(
+                self.job_queue.fail, job.id, self.worker_id,
+                {"error": "conversion_failed", "usage": usage}
+            )
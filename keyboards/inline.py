@@ -8,7 +8,8 @@ from config import SUPPORTED_OUTPUT_FORMATS
 
 def create_format_keyboard(
     current_format: str,
-    exclude_formats: Set[str] = None
+    exclude_formats: Set[str] = None,
+    action: str = "convert"
 ) -> InlineKeyboardMarkup:
     """
     Создает клавиатуру для выбора формата конвертации.
@@ -16,6 +17,7 @@ def create_format_keyboard(
     Args:
         current_format: Текущий формат файла
         exclude_formats: Форматы для исключения
+        action: Префикс callback_data (convert - одна книга, batch - пакет)
         
     Returns:
         InlineKeyboardMarkup: Клавиатура с кнопками форматов
@@ -28,7 +30,7 @@ def create_format_keyboard(
             buttons.append(
                 InlineKeyboardButton(
                     text=f"📄 {format_name}",
-                    callback_data=f"convert:{format_key}"
+                    callback_data=f"{action}:{format_key}"
                 )
             )
     
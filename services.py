@@ -0,0 +1,160 @@
+"""
+Общие сервисы бота: временные файлы, валидатор и планировщик конвертаций.
+
+Создаются один раз при запуске (bot.py) и попадают в обработчики через
+контекст диспетчера: aiogram передает ключи workflow_data в аргументы
+обработчиков по имени (services). Модули конвертации импортируются при
+первом обращении к validator или scheduler, поэтому бот начинает получать
+обновления, не дожидаясь их; warm_up создает их в фоне сразу после старта.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+from config import (
+    TEMP_DIR, RAM_TEMP_DIR, RAM_TEMP_BUDGET, RAM_TEMP_MAX_FILE, JOB_QUEUE_URL, JOB_MAX_ATTEMPTS,
+    MAX_CONCURRENT_CONVERSIONS, EBOOK_CONVERT_BIN, UPLOAD_LIMIT,
+    IMAGE_OPTIMIZE, IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT, IMAGE_JPEG_QUALITY, IMAGE_WORKERS,
+    ZIP_REPACK, ZIP_LEVEL, ZIP_WORKERS
+)
+from utils.file_manager import TempFileManager
+
+if TYPE_CHECKING:
+    from converter.converter import BookConverter
+    from converter.validators import FileValidator
+    from jobs.queue import JobQueue
+    from jobs.scheduler import ConversionScheduler
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед фоновым созданием конвертера: первый getUpdates уходит раньше
+WARM_UP_DELAY = 1.0
+CONVERTER_MODULES = ("converter.validators", "converter.converter", "converter.batch", "jobs.scheduler")
+
+
+def create_converter(
+    ebook_convert: str = EBOOK_CONVERT_BIN,
+    upload_limit: Optional[int] = UPLOAD_LIMIT or None,
+    image_workers: Optional[int] = IMAGE_WORKERS or None,
+    zip_workers: Optional[int] = ZIP_WORKERS or None,
+    **kwargs
+) -> "BookConverter":
+    """
+    Создает BookConverter с постобработкой по настройкам config.py.
+
+    Args:
+        ebook_convert: Исполняемый файл ebook-convert
+        upload_limit: Максимальный размер результата (None - без подгонки)
+        image_workers: Процессов пережатия изображений (None - по числу ядер)
+        zip_workers: Потоков перепаковки (None - по числу ядер)
+        **kwargs: Прочие аргументы BookConverter (timeout)
+    """
+    from converter.converter import BookConverter
+    from converter.image_optimizer import EpubImageOptimizer
+    from converter.zip_repack import ZipRepacker
+
+    image_optimizer = EpubImageOptimizer(
+        max_size=(IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT),
+        jpeg_quality=IMAGE_JPEG_QUALITY,
+        workers=image_workers
+    ) if IMAGE_OPTIMIZE else None
+    return BookConverter(
+        ebook_convert=ebook_convert,
+        image_optimizer=image_optimizer,
+        upload_limit=upload_limit,
+        zip_repacker=ZipRepacker(level=ZIP_LEVEL, workers=zip_workers) if ZIP_REPACK else None,
+        **kwargs
+    )
+
+
+def close_converter(converter: "BookConverter") -> None:
+    """Останавливает пулы постобработки конвертера."""
+    # Заглушки бенчмарков пулов не имеют
+    for pool in (getattr(converter, "image_optimizer", None), getattr(converter, "zip_repacker", None)):
+        if pool:
+            pool.close()
+
+
+class Services:
+    """Сервисы обработчиков; конвертер и валидатор создаются при первом обращении."""
+
+    def __init__(
+        self,
+        file_manager: Optional[TempFileManager] = None,
+        job_queue: Optional["JobQueue"] = None,
+        max_concurrent: int = MAX_CONCURRENT_CONVERSIONS
+    ):
+        """
+        Args:
+            file_manager: Временные файлы (None - по настройкам config.py)
+            job_queue: Очередь воркеров (None - конвертация в процессе бота)
+            max_concurrent: Максимум одновременных локальных конвертаций
+        """
+        self.file_manager = file_manager or TempFileManager(
+            base_dir=TEMP_DIR,
+            ram_dir=RAM_TEMP_DIR,
+            # Воркеры на других узлах не видят tmpfs бота, поэтому в режиме очереди только диск
+            ram_budget=0 if job_queue is not None else RAM_TEMP_BUDGET,
+            ram_max_file_size=RAM_TEMP_MAX_FILE
+        )
+        self.job_queue = job_queue
+        self.max_concurrent = max_concurrent
+        self._validator: Optional["FileValidator"] = None
+        self._scheduler: Optional["ConversionScheduler"] = None
+
+    @property
+    def validator(self) -> "FileValidator":
+        if self._validator is None:
+            from converter.validators import FileValidator
+            self._validator = FileValidator()
+        return self._validator
+
+    @property
+    def scheduler(self) -> "ConversionScheduler":
+        if self._scheduler is None:
+            from jobs.scheduler import ConversionScheduler
+            self._scheduler = ConversionScheduler(
+                create_converter(),
+                max_concurrent=self.max_concurrent,
+                job_queue=self.job_queue
+            )
+        return self._scheduler
+
+    @property
+    def queue_depth(self) -> int:
+        """Конвертации, ожидающие исполнителя (0, пока планировщик не создан)."""
+        if self._scheduler is not None:
+            return self._scheduler.queue_depth
+        return self.job_queue.depth() if self.job_queue is not None else 0
+
+    async def warm_up(self, delay: float = WARM_UP_DELAY) -> None:
+        """Создает валидатор и планировщик в фоне, когда бот уже принимает обновления."""
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            # Импорт - в потоке (модули кешируются), создание объектов - в event loop;
+            # __import__, а не importlib.import_module: так импорт виден в -X importtime
+            await asyncio.to_thread(lambda: [__import__(name) for name in CONVERTER_MODULES])
+            _ = self.validator, self.scheduler
+        except Exception as e:
+            # Не страшно: сервисы создадутся при первом обращении обработчика
+            logger.error(f"Не удалось подготовить конвертер: {e}")
+            return
+        logger.info(f"Конвертер готов ({time.perf_counter() - started:.2f}с)")
+
+    def close(self) -> None:
+        """Останавливает пулы конвертера и закрывает очередь задач."""
+        if self._scheduler is not None:
+            close_converter(self._scheduler.converter)
+        if self.job_queue is not None:
+            self.job_queue.close()
+
+
+def create_services() -> Services:
+    """Сервисы бота по настройкам config.py."""
+    job_queue = None
+    if JOB_QUEUE_URL:
+        from jobs.queue import create_job_queue
+        job_queue = create_job_queue(JOB_QUEUE_URL, max_attempts=JOB_MAX_ATTEMPTS)
+    return Services(job_queue=job_queue)
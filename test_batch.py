@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Тест пакетной конвертации: распаковка архивов, параллельная конвертация и сборка результата.
+"""
+import asyncio
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from converter.batch import BatchBook, convert_batch, extract_books, pack_results, sniff_archive
+from converter.size_target import volume_path
+from utils.error_manager import ErrorCode
+
+FB2 = b'<?xml version="1.0" encoding="utf-8"?><FictionBook><body><p>text</p></body></FictionBook>'
+
+
+def fb2_zip(name: str) -> bytes:
+    """Книга в .fb2.zip, как ее раздают библиотеки."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(name, FB2)
+    return buffer.getvalue()
+
+
+def file_factory(directory: Path):
+    counter = iter(range(1000))
+
+    def create_file(suffix: str, size: int) -> Path:
+        path = directory / f"book_{next(counter)}{suffix}"
+        path.touch()
+        return path
+    return create_file
+
+
+def test_extract_archive():
+    """Книги распаковываются с раскрытием .fb2.zip, мусор и лишнее пропускаются."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        archive_path = tmp / "books.zip"
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("Библиотека/", "")
+            archive.writestr("Библиотека/Первая.fb2", FB2)
+            archive.writestr("Библиотека/Вторая.fb2.zip", fb2_zip("Вторая.fb2"))
+            archive.writestr("../../etc/Третья.txt", "Просто текст")
+            archive.writestr("cover.jpg", b"\xff\xd8\xff")
+            archive.writestr("__MACOSX/Библиотека/._Первая.fb2", b"junk")
+            archive.writestr("Большая.txt", "x" * 5000)
+        assert sniff_archive(archive_path) == "zip"
+
+        out = tmp / "out"
+        out.mkdir()
+        result = extract_books(archive_path, file_factory(out), max_file=4000)
+        assert result.error is None, result
+        assert [book.name for book in result.books] == ["Первая.fb2", "Вторая.fb2", "Третья.txt"]
+        assert result.skipped == ["cover.jpg", "Большая.txt"]
+        assert Path(result.books[1].path).read_bytes() == FB2
+        # Вложенный архив удален, файлы только в выданном каталоге
+        assert sorted(path.name for path in out.iterdir()) == sorted(Path(book.path).name for book in result.books)
+
+        limited = extract_books(archive_path, file_factory(out), max_books=1)
+        assert len(limited.books) == 1 and "Вторая.fb2.zip" in limited.skipped
+
+        # EPUB - книга, а не архив; RAR распознается, чтобы ответить понятно
+        epub = tmp / "book.epub"
+        with zipfile.ZipFile(epub, "w") as archive:
+            archive.writestr("mimetype", "application/epub+zip")
+        assert sniff_archive(epub) is None
+        rar = tmp / "books.rar"
+        rar.write_bytes(b"Rar!\x1a\x07\x01\x00" + bytes(100))
+        assert sniff_archive(rar) == "rar"
+
+        empty = tmp / "empty.zip"
+        with zipfile.ZipFile(empty, "w") as archive:
+            archive.writestr("readme.md", "нет книг")
+        assert extract_books(empty, file_factory(out)).error_code == ErrorCode.VALIDATION_UNSUPPORTED_FORMAT
+        broken = tmp / "broken.zip"
+        broken.write_bytes(archive_path.read_bytes()[:-30])
+        assert extract_books(broken, file_factory(out)).error_code == ErrorCode.VALIDATION_TRUNCATED_ARCHIVE
+    print("✅ Распаковка архивов с книгами")
+
+
+def test_convert_and_pack():
+    """Книги конвертируются с ограничением параллельности, результат - архивы под лимит."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        books = []
+        for index, name in enumerate(["Один.fb2", "Два.txt", "Сломанная.txt", "Один.txt", "Большая.fb2"]):
+            path = tmp / f"book_{index}{Path(name).suffix}"
+            path.write_bytes(os.urandom(1000))
+            books.append(BatchBook(name=name, path=str(path)))
+
+        running = peak = 0
+        progress = []
+
+        async def convert(path: Path, output_format: str):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if path.name == "book_2.txt":
+                return None
+            output = path.with_suffix(f".{output_format}")
+            if path.name == "book_4.fb2":
+                # Результат больше лимита загрузки - тома
+                for number in (1, 2):
+                    volume_path(output, number).write_bytes(os.urandom(30_000))
+                return volume_path(output, 1)
+            output.write_bytes(os.urandom(30_000))
+            return output
+
+        async def on_progress(report):
+            progress.append(report.done)
+
+        report = asyncio.run(convert_batch(books, "epub", convert, concurrency=2, progress_callback=on_progress))
+        assert peak == 2 and progress == [1, 2, 3, 4, 5]
+        assert report.failed == ["Сломанная.txt"]
+        names = [name for name, _ in report.files]
+        assert names == ["Один.epub", "Два.epub", "Один (2).epub", "Большая_Том1.epub", "Большая_Том2.epub"]
+
+        archives = pack_results(report.files, tmp / "result.zip", limit=70_000)
+        assert [path.name for path in archives] == ["result.zip", "result_Часть2.zip", "result_Часть3.zip"]
+        packed = []
+        for path in archives:
+            assert path.stat().st_size <= 70_000
+            with zipfile.ZipFile(path) as archive:
+                assert archive.testzip() is None
+                packed.extend(archive.namelist())
+                assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+        assert packed == names
+    print("✅ Параллельная конвертация и сборка архива")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование пакетной конвертации...")
+    test_extract_archive()
+    test_convert_and_pack()
+    print("✨ Тестирование завершено!")
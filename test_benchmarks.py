@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тест бенчмарков: детерминированность корпуса и поиск регрессий.
+"""
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+from benchmarks.bench_conversion import compare
+
+BENCH_MEMORY = Path(__file__).resolve().parent / "benchmarks" / "bench_memory.py"
+BENCH_STARTUP = Path(__file__).resolve().parent / "benchmarks" / "bench_startup.py"
+from benchmarks.corpus import FORMATS, generate_book
+
+
+def test_corpus_is_deterministic():
+    """Один и тот же seed дает побайтно одинаковые и корректные книги."""
+    with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+        for fmt in FORMATS:
+            a = generate_book(fmt, 100_000, Path(first))
+            b = generate_book(fmt, 100_000, Path(second))
+            assert hashlib.sha256(a.read_bytes()).digest() == hashlib.sha256(b.read_bytes()).digest(), fmt
+            assert 100_000 <= a.stat().st_size < 200_000, (fmt, a.stat().st_size)
+
+        ET.parse(generate_book("fb2", 100_000, Path(first)))
+        with zipfile.ZipFile(generate_book("epub", 100_000, Path(first))) as epub:
+            first_entry = epub.infolist()[0]
+            assert first_entry.filename == "mimetype"
+            assert first_entry.compress_type == zipfile.ZIP_STORED
+            assert epub.testzip() is None
+        pdf = generate_book("pdf", 100_000, Path(first)).read_bytes()
+        assert pdf.startswith(b"%PDF-") and pdf.rstrip().endswith(b"%%EOF")
+    print("✅ Корпус детерминирован")
+
+
+def _report(wall, ok=True):
+    row = {"engine": "book", "corpus_format": "fb2", "src": "fb2", "dst": "epub", "size": "1m",
+           "wall_seconds": wall, "cpu_seconds": wall, "max_rss_bytes": 100, "ok": ok}
+    return {"meta": {}, "results": [row]}
+
+
+def test_compare_flags_regressions():
+    """Рост времени выше порога и минимальной дельты - регрессия, шум - нет."""
+    assert compare(_report(10.0), _report(10.5), threshold=0.1, min_delta=0.5) == []
+    assert compare(_report(0.1), _report(0.3), threshold=0.1, min_delta=0.5) == []
+
+    regressions = compare(_report(10.0), _report(12.0), threshold=0.1, min_delta=0.5)
+    assert {metric for _, metric, *_ in regressions} == {"wall_seconds", "cpu_seconds"}
+
+    regressions = compare(_report(10.0), _report(10.0, ok=False), threshold=0.1, min_delta=0.5)
+    assert regressions[0][1] == "ok"
+    print("✅ Регрессии обнаруживаются")
+
+
+def test_memory_guard():
+    """Документ не копируется в память бота целиком (проверка для CI)."""
+    result = subprocess.run(
+        [sys.executable, str(BENCH_MEMORY), "--users", "4", "--size", "5000000",
+         "--convert-delay", "0", "--max-copies", "0.25"],
+        capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    print("✅ Память на документ в пределах нормы")
+
+
+def test_startup_benchmark():
+    """Бенчмарк старта доводит бота до getUpdates, конвертер создается после."""
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = Path(tmp) / "startup.json"
+        result = subprocess.run(
+            [sys.executable, str(BENCH_STARTUP), "--repeat", "1", "--settle", "2", "--json", str(report_path)],
+            capture_output=True, text=True, timeout=300
+        )
+        assert result.returncode == 0, result.stdout + result.stderr
+        summary = json.loads(report_path.read_text(encoding="utf-8"))["summary"]
+    assert 0 < summary["import_seconds"] < summary["seconds_to_poll"]
+    assert "aiogram" in summary["packages"]
+    assert "converter.converter" in summary["deferred"]
+    print(f"✅ Старт до getUpdates: {summary['seconds_to_poll']:.2f} с")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование бенчмарков...")
+    test_corpus_is_deterministic()
+    test_compare_flags_regressions()
+    test_memory_guard()
+    test_startup_benchmark()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тест учета ресурсов дочерних процессов: обертка wait4, журнал и отчет.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from converter.child_usage import UsageProbe, collect_child_usage
+from utils.cost_ledger import CostLedger, format_cost_report
+
+BUSY_LOOP = "import time\nend = time.process_time() + 0.2\nwhile time.process_time() < end: pass\nprint('done')"
+
+
+async def run_probe(input_path: Path, cmd):
+    probe = UsageProbe("ebook-convert", input_path, "epub")
+    process = await asyncio.create_subprocess_exec(*probe.wrap(cmd), stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    return process.returncode, stdout, probe.collect()
+
+
+def test_usage_collected():
+    """Обертка передает вывод и код возврата, ресурсы попадают в сборщик."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = Path(temp_dir) / "book.fb2"
+        input_path.write_bytes(b"x" * 1000)
+
+        with collect_child_usage() as usages:
+            returncode, stdout, usage = asyncio.run(run_probe(input_path, [sys.executable, "-c", BUSY_LOOP]))
+
+        assert returncode == 0
+        assert stdout.strip() == b"done", "Вывод команды должен проходить без изменений"
+        assert usage is not None and usages == [usage]
+        assert usage.src == "fb2" and usage.dst == "epub" and usage.input_bytes == 1000
+        assert usage.cpu_seconds >= 0.15
+        assert usage.max_rss_bytes > 1_048_576
+
+        _, _, failed = asyncio.run(run_probe(input_path, [sys.executable, "-c", "raise SystemExit(3)"]))
+        assert failed.returncode == 3
+    print("✅ Ресурсы дочернего процесса собраны")
+
+
+async def run_killed_wrapper(pid_file: Path):
+    probe = UsageProbe("gs", pid_file, "pdf")
+    script = f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(60)"
+    process = await asyncio.create_subprocess_exec(*probe.wrap([sys.executable, "-c", script]))
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text():
+            break
+        await asyncio.sleep(0.05)
+    process.kill()
+    await process.wait()
+    return int(pid_file.read_text()), probe.collect()
+
+
+def test_child_killed_with_wrapper():
+    """Убитая по таймауту обертка не оставляет работающую команду."""
+    if not sys.platform.startswith("linux"):
+        return
+    with tempfile.TemporaryDirectory() as temp_dir:
+        child_pid, usage = asyncio.run(run_killed_wrapper(Path(temp_dir) / "child.pid"))
+    assert usage is None
+    for _ in range(50):
+        try:
+            os.kill(child_pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("Дочерний процесс пережил обертку")
+    print("✅ Команда завершается вместе с оберткой")
+
+
+def test_cost_report():
+    """Журнал группирует запуски по парам форматов."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ledger = CostLedger(os.path.join(temp_dir, "costs.db"))
+        for cpu, returncode in ((1.0, 0), (3.0, 0), (2.0, 1)):
+            ledger.append({
+                "tool": "ebook-convert", "src": "pdf", "dst": "epub", "size_bucket": "1-5mb",
+                "input_bytes": 2_000_000, "returncode": returncode, "wall_seconds": cpu * 1.5,
+                "user_cpu_seconds": cpu, "sys_cpu_seconds": 0.0, "max_rss_bytes": 200 * 1_048_576,
+                "read_blocks": 10, "write_blocks": 20,
+            })
+        ledger.flush()
+        rows = ledger.report()
+        ledger.close()
+
+    assert len(rows) == 1
+    row = rows[0]
+    assert row["runs"] == 3 and row["failures"] == 1
+    assert row["cpu_total"] == 6.0 and row["cpu_max"] == 3.0
+    assert "pdf → epub" in format_cost_report(rows)
+    print("✅ Отчет о ресурсах работает")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование учета ресурсов...")
+    test_usage_collected()
+    test_child_killed_with_wrapper()
+    test_cost_report()
+    print("✨ Тестирование завершено!")
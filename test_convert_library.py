@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тест пакетной конвертации библиотеки без бота (convert_library.py).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+import convert_library
+from convert_library import MANIFEST_NAME, run
+
+FAKE_CONVERT = str(Path(__file__).parent / "benchmarks" / "fake_ebook_convert.py")
+FB2 = '<?xml version="1.0" encoding="utf-8"?><FictionBook><body><p>{}</p></body></FictionBook>'
+
+
+def make_args(source: Path, output: Path, **overrides) -> argparse.Namespace:
+    args = dict(
+        source=str(source), output=str(output), format="epub", workers=2, timeout=60,
+        manifest=None, retry_failed=False, ebook_convert=FAKE_CONVERT
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def read_manifest(output: Path) -> dict:
+    return json.loads((output / MANIFEST_NAME).read_text(encoding="utf-8"))["files"]
+
+
+def test_import_without_bot():
+    """Скрипт не требует BOT_TOKEN и не импортирует aiogram."""
+    env = {key: value for key, value in os.environ.items() if key != "BOT_TOKEN"}
+    completed = subprocess.run(
+        [sys.executable, "-c", "import sys, convert_library; print('aiogram' in sys.modules)"],
+        cwd=Path(__file__).parent, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "False"
+    print("✅ Импорт без BOT_TOKEN и aiogram")
+
+
+def test_convert_library():
+    """Дерево конвертируется с манифестом, дубликаты и повторный запуск не конвертируются."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source, output = tmp / "books", tmp / "out"
+        (source / "Автор" / "Цикл").mkdir(parents=True)
+        (source / "Автор" / "Первая.fb2").write_text(FB2.format("первая"), encoding="utf-8")
+        (source / "Автор" / "Цикл" / "Вторая.txt").write_text("Текст второй книги", encoding="utf-8")
+        # Та же книга в другом месте - конвертируется один раз
+        (source / "Копия.fb2").write_text(FB2.format("первая"), encoding="utf-8")
+        (source / "Пустая.fb2").write_bytes(b"")
+        (source / "cover.jpg").write_bytes(b"\xff\xd8\xff")
+
+        assert run(make_args(source, output)) == 0
+        files = read_manifest(output)
+        assert sorted(files) == ["Автор/Первая.fb2", "Автор/Цикл/Вторая.txt", "Копия.fb2", "Пустая.fb2"]
+        assert files["Пустая.fb2"]["status"] == "invalid"
+        for rel in ("Автор/Первая.fb2", "Автор/Цикл/Вторая.txt", "Копия.fb2"):
+            assert files[rel]["status"] == "ok", files[rel]
+            assert files[rel]["outputs"] == [str(Path(rel).with_suffix(".epub").as_posix())]
+            assert (output / files[rel]["outputs"][0]).exists()
+        assert {"hash", "validate", "convert"} <= set(files["Автор/Цикл/Вторая.txt"]["seconds"])
+        # Из двух одинаковых книг конвертировалась одна, у второй только хеш
+        pair = [files["Автор/Первая.fb2"], files["Копия.fb2"]]
+        assert sorted("convert" in entry["seconds"] for entry in pair) == [False, True]
+        assert pair[0]["sha256"] == pair[1]["sha256"]
+        assert not list(output.rglob(f"{convert_library.WORK_PREFIX}*"))
+
+        # Повторный запуск: хеши из манифеста, ничего не конвертируется
+        converted = output / "Автор" / "Первая.epub"
+        mtime = converted.stat().st_mtime_ns
+        assert run(make_args(source, output)) == 0
+        files = read_manifest(output)
+        assert all("convert" not in entry["seconds"] for entry in files.values())
+        assert converted.stat().st_mtime_ns == mtime
+
+        # Прерванный запуск: книга в статусе pending без результата конвертируется заново
+        data = json.loads((output / MANIFEST_NAME).read_text(encoding="utf-8"))
+        data["files"]["Автор/Цикл/Вторая.txt"]["status"] = "pending"
+        (output / MANIFEST_NAME).write_text(json.dumps(data), encoding="utf-8")
+        (output / "Автор" / "Цикл" / "Вторая.epub").unlink()
+        # Измененная книга тоже конвертируется заново
+        (source / "Копия.fb2").write_text(FB2.format("исправленная"), encoding="utf-8")
+        assert run(make_args(source, output)) == 0
+        files = read_manifest(output)
+        assert "convert" in files["Автор/Цикл/Вторая.txt"]["seconds"]
+        assert "convert" in files["Копия.fb2"]["seconds"]
+        assert files["Копия.fb2"]["sha256"] != files["Автор/Первая.fb2"]["sha256"]
+        assert "convert" not in files["Автор/Первая.fb2"]["seconds"]
+        assert (output / "Автор" / "Цикл" / "Вторая.epub").exists()
+    print("✅ Конвертация библиотеки с манифестом")
+
+
+def test_unreadable_files():
+    """Висячая ссылка и файл без прав записываются как ошибка, остальные книги конвертируются."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source, output = tmp / "books", tmp / "out"
+        source.mkdir()
+        (source / "Книга.fb2").write_text(FB2.format("книга"), encoding="utf-8")
+        (source / "x.fb2").symlink_to(tmp / "missing.fb2")
+        locked = source / "locked.fb2"
+        locked.write_text(FB2.format("закрытая"), encoding="utf-8")
+        locked.chmod(0)
+        try:
+            assert run(make_args(source, output)) == 1
+        finally:
+            locked.chmod(0o644)
+        files = read_manifest(output)
+        assert files["Книга.fb2"]["status"] == "ok", files
+        assert files["x.fb2"]["status"] == "failed" and files["x.fb2"]["error"], files
+        # Под root права не мешают чтению - тогда книга конвертируется
+        assert files["locked.fb2"]["status"] in ("failed", "ok"), files
+    print("✅ Нечитаемые файлы не прерывают запуск")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование конвертации библиотеки...")
+    test_import_without_bot()
+    test_convert_library()
+    test_unreadable_files()
+    print("✨ Тестирование завершено!")
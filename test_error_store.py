@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Тест ограниченного журнала ошибок и постоянного хранилища.
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from utils.error_manager import ErrorManager, ErrorCode
+
+
+def test_ring_buffer_is_bounded():
+    """Журнал в памяти не растет бесконечно."""
+    manager = ErrorManager(max_entries=10)
+    ids = [manager.log_error(ErrorCode.CONVERSION_FAILED, user_id=i) for i in range(25)]
+
+    assert len(manager.error_log) == 10
+    assert list(manager.error_log) == ids[-10:], "Вытесняются самые старые ошибки"
+    assert manager.get_error(ids[0]) is None
+    assert manager.get_error(ids[-1])['user_id'] == 24
+    print("✅ Кольцевой буфер ограничен")
+
+
+def test_persistent_lookup():
+    """Ошибки сохраняются на диск и находятся по ID после перезапуска."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "errors.db")
+
+        manager = ErrorManager(max_entries=5)
+        manager.attach_store(db_path)
+        first = manager.log_error(
+            ErrorCode.CONVERSION_TIMEOUT,
+            exception=TimeoutError("slow"),
+            context={'target_format': 'epub', 'path': Path('/tmp/x.pdf')},
+            user_id=42
+        )
+        for i in range(20):
+            manager.log_error(ErrorCode.CONVERSION_FAILED, user_id=i)
+        manager.close()
+
+        # "Перезапуск": новый менеджер с пустым буфером
+        manager = ErrorManager()
+        manager.attach_store(db_path)
+        start = time.perf_counter()
+        info = manager.get_error(first)
+        lookup_ms = (time.perf_counter() - start) * 1000
+
+        assert info is not None, "Ошибка должна найтись после перезапуска"
+        assert info['code'] == ErrorCode.CONVERSION_TIMEOUT.value
+        assert info['user_id'] == 42
+        assert info['exception_type'] == 'TimeoutError'
+        assert info['context']['target_format'] == 'epub'
+        assert lookup_ms < 50, f"Поиск по ID занял {lookup_ms:.1f} мс"
+
+        assert len(manager.find_errors(error_code=ErrorCode.CONVERSION_FAILED)) == 20
+        assert [e['error_id'] for e in manager.find_errors(user_id=42)] == [first]
+        manager.close()
+        print(f"✅ Ошибка найдена по ID за {lookup_ms:.2f} мс")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование журнала ошибок...")
+    test_ring_buffer_is_bounded()
+    test_persistent_lookup()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тест поддельного Bot API: обновления, скачивание файлов и ответы 429.
+"""
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from benchmarks.fake_bot_api import FAKE_TOKEN, FakeBotAPI
+
+
+async def _roundtrip():
+    api = FakeBotAPI()
+    await api.start()
+    bot = Bot(FAKE_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    try:
+        document = api.add_file(b"hello book", "book.txt", "text/plain")
+        api.push_document(42, document)
+
+        updates = await bot.get_updates(offset=0, timeout=1)
+        assert len(updates) == 1
+        message = updates[0].message
+        assert message.document.file_name == "book.txt"
+
+        file = await bot.get_file(message.document.file_id)
+        data = await bot.download_file(file.file_path)
+        assert data.getvalue() == b"hello book"
+
+        sent = await bot.send_message(42, "⏳ Загружаю файл...")
+        await bot.edit_message_text("готово", chat_id=42, message_id=sent.message_id)
+        events = [api.inbox(42).get_nowait() for _ in range(2)]
+        assert [method for method, _ in events] == ["sendMessage", "editMessageText"]
+        assert events[1][1]["message_id"] == sent.message_id
+
+        # Подтвержденные обновления больше не выдаются
+        assert await bot.get_updates(offset=updates[0].update_id + 1, timeout=0) == []
+    finally:
+        await bot.session.close()
+        await api.stop()
+
+
+async def _rate_limited():
+    api = FakeBotAPI(rate_limit_ratio=1.0, retry_after=3)
+    await api.start()
+    bot = Bot(FAKE_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    try:
+        try:
+            await bot.send_message(1, "text")
+        except TelegramRetryAfter as e:
+            assert e.retry_after == 3
+        else:
+            raise AssertionError("Ожидался ответ 429")
+        assert api.rate_limited["sendMessage"] == 1
+    finally:
+        await bot.session.close()
+        await api.stop()
+
+
+def test_fake_api_roundtrip():
+    """Документ пользователя скачивается, сообщения бота попадают в ящик чата."""
+    asyncio.run(_roundtrip())
+    print("✅ Поддельный API обслуживает бота")
+
+
+def test_fake_api_rate_limit():
+    """Ответ 429 превращается в TelegramRetryAfter с retry_after."""
+    asyncio.run(_rate_limited())
+    print("✅ Flood control имитируется")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование поддельного Bot API...")
+    test_fake_api_roundtrip()
+    test_fake_api_rate_limit()
+    print("✨ Тестирование завершено!")
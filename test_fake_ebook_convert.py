@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Тест конвертеров на поддельном ebook-convert (Calibre не нужен).
+"""
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from converter.converter import BookConverter
+from converter.large_file_converter import LargeFileConverter
+from utils.error_manager import ErrorCode, error_manager
+
+FAKE_EBOOK_CONVERT = str(Path(__file__).resolve().parent / "benchmarks" / "fake_ebook_convert.py")
+
+
+@contextmanager
+def fake_env(**values):
+    """Временно задает переменные FAKE_EBOOK_CONVERT_*."""
+    names = {f"FAKE_EBOOK_CONVERT_{name.upper()}": str(value) for name, value in values.items()}
+    previous = {name: os.environ.get(name) for name in names}
+    os.environ.update(names)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_book(directory: str, size: int = 20_000) -> Path:
+    path = Path(directory) / "book.fb2"
+    path.write_bytes(b"<FictionBook/>" + b"x" * (size - 14))
+    return path
+
+
+def test_book_converter_success():
+    """Результат пишется рядом с исходником заданного размера."""
+    with tempfile.TemporaryDirectory() as temp_dir, fake_env(output_bytes=1234):
+        converter = BookConverter(ebook_convert=FAKE_EBOOK_CONVERT)
+        output = asyncio.run(converter.convert(make_book(temp_dir), "epub"))
+        assert output is not None and output.exists()
+        assert output.parent == Path(temp_dir) and output.suffix == ".epub"
+        assert output.stat().st_size == 1234
+    print("✅ Успешная конвертация")
+
+
+def test_book_converter_failure_classified():
+    """Текст ошибки в stderr определяет код ошибки."""
+    with tempfile.TemporaryDirectory() as temp_dir, fake_env(fail="corrupt"):
+        converter = BookConverter(ebook_convert=FAKE_EBOOK_CONVERT)
+        assert asyncio.run(converter.convert(make_book(temp_dir), "epub")) is None
+        last_error = next(reversed(error_manager.error_log.values()))
+        assert last_error["error_code"] == ErrorCode.CONVERSION_CORRUPTED_FILE
+    print("✅ Ошибка конвертации классифицирована")
+
+
+def test_book_converter_timeout_kills_child():
+    """Зависший процесс завершается по таймауту."""
+    with tempfile.TemporaryDirectory() as temp_dir, fake_env(fail="hang"):
+        converter = BookConverter(timeout=1, ebook_convert=FAKE_EBOOK_CONVERT)
+        assert asyncio.run(converter.convert(make_book(temp_dir), "epub")) is None
+        last_error = next(reversed(error_manager.error_log.values()))
+        assert last_error["error_code"] == ErrorCode.CONVERSION_TIMEOUT
+    print("✅ Таймаут обработан")
+
+
+def test_large_converter_reads_progress():
+    """LargeFileConverter читает подробный вывод и получает результат."""
+    messages = []
+
+    async def progress(text):
+        messages.append(text)
+
+    with tempfile.TemporaryDirectory() as temp_dir, fake_env(progress_lines=50, delay=0.1):
+        converter = LargeFileConverter(progress, ebook_convert=FAKE_EBOOK_CONVERT)
+        output = asyncio.run(converter.convert_with_progress(make_book(temp_dir), "txt", timeout=30))
+        assert output is not None and output.exists()
+        assert messages and messages[-1].startswith("✅")
+    print("✅ Конвертация большого файла")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование конвертеров на поддельном ebook-convert...")
+    test_book_converter_success()
+    test_book_converter_failure_classified()
+    test_book_converter_timeout_kills_child()
+    test_large_converter_reads_progress()
+    print("✨ Тестирование завершено!")
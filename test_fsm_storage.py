@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тест постоянного хранилища FSM и уборщика временных файлов.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram.fsm.storage.base import StorageKey
+
+from utils.file_manager import TempFileManager
+from utils.fsm_storage import SQLiteStorage
+from utils.janitor import cleanup_once
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+
+
+async def check_survives_restart(db_path: str):
+    storage = SQLiteStorage(db_path)
+    await storage.set_data(KEY, {"file_path": "/tmp/book_x.fb2", "current_format": "fb2"})
+    await storage.set_state(KEY, "waiting_format")
+    await storage.close()
+
+    # "Перезапуск" бота: новое подключение к тому же файлу
+    storage = SQLiteStorage(db_path)
+    data = await storage.get_data(KEY)
+    state = await storage.get_state(KEY)
+    other = await storage.get_data(StorageKey(bot_id=1, chat_id=200, user_id=200))
+
+    await storage.set_data(KEY, {})
+    cleared = await storage.get_data(KEY)
+    await storage.close()
+    return data, state, other, cleared
+
+
+def test_state_survives_restart():
+    """Данные незавершенной конвертации переживают перезапуск."""
+    with tempfile.TemporaryDirectory() as tmp:
+        data, state, other, cleared = asyncio.run(check_survives_restart(str(Path(tmp) / "fsm.db")))
+        assert data == {"file_path": "/tmp/book_x.fb2", "current_format": "fb2"}
+        assert state == "waiting_format"
+        assert other == {}
+        assert cleared == {}
+        print("✅ Состояние FSM сохраняется между перезапусками")
+
+
+async def check_ttl_and_janitor(tmp: Path):
+    storage = SQLiteStorage(str(tmp / "fsm.db"), ttl=60)
+    manager = TempFileManager(base_dir=str(tmp / "files"))
+
+    old_file = await manager.save_file_from_bytes(b"old", "old.fb2")
+    new_file = await manager.save_file_from_bytes(b"new", "new.fb2")
+    foreign = tmp / "files" / "keep.txt"
+    foreign.write_text("не файл менеджера")
+    past = time.time() - 120
+    os.utime(old_file, (past, past))
+    os.utime(foreign, (past, past))
+
+    await storage.set_data(KEY, {"file_path": str(old_file)})
+    # Запись устарела вместе с файлом
+    storage._conn.execute("UPDATE fsm SET updated_at = ?", (past,))
+    storage._conn.commit()
+    expired = await storage.get_data(KEY)
+
+    await cleanup_once(manager, ttl=60, storage=storage)
+    rows = storage._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+    await storage.close()
+    return expired, rows, old_file.exists(), new_file.exists(), foreign.exists()
+
+
+def test_ttl_tied_to_janitor():
+    """Уборщик удаляет устаревшие файлы и состояния с одинаковым TTL."""
+    with tempfile.TemporaryDirectory() as tmp:
+        expired, rows, old_exists, new_exists, foreign_exists = asyncio.run(check_ttl_and_janitor(Path(tmp)))
+        assert expired == {}, "Устаревшее состояние не возвращается"
+        assert rows == 0, "Устаревшее состояние удалено уборщиком"
+        assert not old_exists, "Устаревший файл удален"
+        assert new_exists, "Свежий файл сохранен"
+        assert foreign_exists, "Посторонние файлы не трогаются"
+        print("✅ TTL состояний и временных файлов согласован")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование хранилища FSM...")
+    test_state_survives_restart()
+    test_ttl_tied_to_janitor()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тест проверок состояния: отчет HealthMonitor и эндпоинты /health/*.
+"""
+import asyncio
+import sys
+import tempfile
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.health import HealthMonitor
+from web.app import create_web_app
+from web.monitoring import register_monitoring_routes
+
+
+async def run_health_checks():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Вместо ebook-convert - интерпретатор Python (тоже понимает --version)
+        health = HealthMonitor(
+            temp_dir,
+            queue_depth=lambda: 3,
+            calibre_cmd=sys.executable,
+            max_update_age=60,
+            lag_interval=0.01,
+            refresh_interval=0.01
+        )
+        app = create_web_app()
+        register_monitoring_routes(app, health)
+
+        await health.start()
+        try:
+            await asyncio.sleep(0.3)
+            assert health.calibre_version, "Проверка calibre должна завершиться"
+            assert health.queue_depth == 3
+            assert health.free_bytes is not None
+
+            async with TestClient(TestServer(app)) as client:
+                response = await client.get("/health/live")
+                assert response.status == 200
+
+                response = await client.get("/health/ready")
+                report = await response.json()
+                assert response.status == 200, report
+                assert report["queue_depth"] == 3
+
+                # Давно не было getUpdates - бот не готов
+                health.last_update = health.started_at - 3600
+                response = await client.get("/health/ready")
+                report = await response.json()
+                assert response.status == 503
+                assert any("updates" in problem for problem in report["problems"])
+
+                health.mark_update()
+                health.min_free_bytes = 1 << 62
+                response = await client.get("/health/ready")
+                report = await response.json()
+                assert response.status == 503
+                assert any("temp" in problem for problem in report["problems"])
+        finally:
+            await health.stop()
+
+
+async def run_missing_calibre_check():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        health = HealthMonitor(temp_dir, calibre_cmd="/nonexistent/ebook-convert", max_update_age=None)
+        assert not health.report()["ready"], "До проверки calibre бот не готов"
+        await health.start()
+        await asyncio.sleep(0.1)
+        await health.stop()
+        report = health.report()
+        assert not report["ready"]
+        assert report["problems"] == ["calibre: недоступен"]
+
+
+def test_health_endpoints():
+    """Эндпоинты отвечают из кеша и отражают причины неготовности."""
+    asyncio.run(run_health_checks())
+    print("✅ Эндпоинты /health/* работают")
+
+
+def test_missing_calibre():
+    """Без calibre бот жив, но не готов."""
+    asyncio.run(run_missing_calibre_check())
+    print("✅ Отсутствие calibre обнаруживается")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование проверок состояния...")
+    test_health_endpoints()
+    test_missing_calibre()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Тест пережатия изображений EPUB после конвертации.
+"""
+import asyncio
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from converter.image_optimizer import IMAGES_PER_WORKER, PIL_AVAILABLE, EpubImageOptimizer, optimize_epub
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+OPF = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<package><metadata><meta name="cover" content="cover"/></metadata><manifest>\n'
+    '<item id="page" href="text/page.xhtml" media-type="application/xhtml+xml"/>\n'
+    '<item id="photo" href="images/photo.jpg" media-type="image/jpeg"/>\n'
+    '<item id="cover" href="images/cover.jpg" media-type="image/jpeg"/>\n'
+    '</manifest><spine><itemref idref="page"/></spine></package>'
+)
+PAGE = '<html><body><img src="../images/photo.jpg"/><img src="../images/cover.jpg"/></body></html>'
+
+
+def make_jpeg(size, quality: int = 98) -> bytes:
+    """Шумное изображение: плохо сжимается, как фотография."""
+    image = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_epub(path: Path, photo: bytes, cover: bytes, page: str = PAGE) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr("OEBPS/content.opf", OPF)
+        archive.writestr("OEBPS/text/page.xhtml", page)
+        archive.writestr("OEBPS/images/photo.jpg", photo, compress_type=zipfile.ZIP_STORED)
+        archive.writestr("OEBPS/images/cover.jpg", cover, compress_type=zipfile.ZIP_STORED)
+
+
+def optimize(path: Path, **kwargs):
+    optimizer = EpubImageOptimizer(workers=1, **kwargs)
+    try:
+        return asyncio.run(optimizer.optimize(path))
+    finally:
+        optimizer.close()
+
+
+def test_downscale_and_dedup():
+    """Большое изображение уменьшается, дубликат удаляется вместе со ссылками."""
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow не установлен, тест пропущен")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        photo = make_jpeg((2400, 1600))
+        make_epub(path, photo, photo)
+        report = optimize(path)
+
+        assert report.images == 2 and report.recompressed == 1 and report.duplicates == 1, report
+        assert report.bytes_saved == report.bytes_before - path.stat().st_size > 0
+        with zipfile.ZipFile(path) as archive:
+            assert archive.namelist()[0] == "mimetype"
+            assert archive.getinfo("mimetype").compress_type == zipfile.ZIP_STORED
+            assert "OEBPS/images/cover.jpg" not in archive.namelist()
+            with Image.open(io.BytesIO(archive.read("OEBPS/images/photo.jpg"))) as image:
+                assert image.width <= 1264 and image.height <= 1680
+            page = archive.read("OEBPS/text/page.xhtml").decode()
+            assert page.count("../images/photo.jpg") == 2
+            opf = archive.read("OEBPS/content.opf").decode()
+            assert "cover.jpg" not in opf
+            assert '<meta name="cover" content="photo"/>' in opf
+    print("✅ Изображения уменьшены, дубликаты удалены")
+
+
+def test_dedup_reference_spellings():
+    """Ссылки с ./ и %XX переводятся, дубликат с нераспознанной ссылкой остается."""
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow не установлен, тест пропущен")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        photo = make_jpeg((2400, 1600))
+        spelled = '<html><body><img src="../images/./cover.jpg"/><img src="../images/cover%2Ejpg"/></body></html>'
+        make_epub(path, photo, photo, page=spelled)
+        report = optimize(path)
+
+        assert report.duplicates == 1, report
+        with zipfile.ZipFile(path) as archive:
+            assert "OEBPS/images/cover.jpg" not in archive.namelist()
+            page = archive.read("OEBPS/text/page.xhtml").decode()
+            assert page.count('src="../images/photo.jpg"') == 2, page
+
+        # Абсолютный путь не переводится - дубликат нельзя удалять
+        absolute = '<html><body><img src="../images/cover.jpg"/><img src="/OEBPS/images/cover.jpg"/></body></html>'
+        make_epub(path, photo, photo, page=absolute)
+        report = optimize(path)
+
+        assert report.duplicates == 0 and report.recompressed == 1, report
+        with zipfile.ZipFile(path) as archive:
+            assert "OEBPS/images/cover.jpg" in archive.namelist()
+            assert archive.read("OEBPS/text/page.xhtml").decode() == absolute
+            assert 'href="images/cover.jpg"' in archive.read("OEBPS/content.opf").decode()
+    print("✅ Дубликат удаляется, только когда ссылок на него не осталось")
+
+
+class CountingPool(ThreadPoolExecutor):
+    """Пул, запоминающий наибольшее число незавершенных задач при отправке."""
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.futures = []
+        self.peak = 0
+
+    def submit(self, fn, *args):
+        self.futures = [future for future in self.futures if not future.done()]
+        future = super().submit(fn, *args)
+        self.futures.append(future)
+        self.peak = max(self.peak, len(self.futures))
+        return future
+
+
+def test_bounded_in_flight():
+    """В пул одновременно уходит не больше окна изображений."""
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow не установлен, тест пропущен")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            for i in range(12):
+                archive.writestr(f"OEBPS/images/{i}.jpg", make_jpeg((1600, 1400)), compress_type=zipfile.ZIP_STORED)
+        with CountingPool() as pool:
+            report = optimize_epub(path, pool, workers=1)
+
+        assert report.recompressed == 12, report
+        assert 1 <= pool.peak <= IMAGES_PER_WORKER, pool.peak
+    print("✅ Число изображений в работе ограничено")
+
+
+def test_no_gain_keeps_original():
+    """Если меньше не получилось, файл остается нетронутым."""
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow не установлен, тест пропущен")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        make_epub(path, make_jpeg((300, 200), quality=40), make_jpeg((200, 300), quality=40))
+        before = path.read_bytes()
+        report = optimize(path, jpeg_quality=95, min_image_bytes=0)
+
+        assert report.bytes_saved == 0 and report.recompressed == 0, report
+        assert path.read_bytes() == before
+        assert list(Path(tmp).iterdir()) == [path]
+    print("✅ Без выигрыша исходный файл сохраняется")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование пережатия изображений EPUB...")
+    test_downscale_and_dedup()
+    test_dedup_reference_spellings()
+    test_bounded_in_flight()
+    test_no_gain_keeps_original()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Тест очереди задач на SQLite и воркеров конвертации.
+"""
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from jobs.queue import SQLiteJobQueue, STATUS_DONE, STATUS_FAILED
+from jobs.scheduler import ConversionScheduler
+from jobs.worker import Worker
+
+
+def claim_all(db_path: str, worker_id: str, results) -> None:
+    """Процесс-воркер: захватывает задачи, пока очередь не опустеет."""
+    queue = SQLiteJobQueue(db_path)
+    while True:
+        job = queue.claim(worker_id, lease_seconds=30)
+        if job is None:
+            break
+        queue.complete(job.id, worker_id, {"output_path": job.payload["n"]})
+        results.append(job.id)
+    queue.close()
+
+
+def test_claim_complete_and_lease_expiry():
+    """Захват, завершение и возврат задачи после истечения аренды."""
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SQLiteJobQueue(str(Path(tmp) / "jobs.db"), max_attempts=2)
+
+        job_id = queue.enqueue({"input_path": "/tmp/a.fb2", "target_format": "epub"})
+        assert queue.depth() == 1
+
+        job = queue.claim("w1", lease_seconds=0.05)
+        assert job.id == job_id and job.attempts == 1
+        assert queue.claim("w2", lease_seconds=30) is None, "Задача уже захвачена"
+
+        # Воркер w1 "упал": аренда истекает, задачу забирает w2
+        time.sleep(0.1)
+        job = queue.claim("w2", lease_seconds=30)
+        assert job is not None and job.attempts == 2
+        assert not queue.complete(job_id, "w1", {}), "Чужой воркер не может завершить задачу"
+        assert queue.heartbeat(job_id, "w2", 30)
+        assert queue.complete(job_id, "w2", {"output_path": "/tmp/a.epub"})
+        assert queue.get(job_id).status == STATUS_DONE
+
+        # После исчерпания попыток задача проваливается
+        job_id = queue.enqueue({"input_path": "/tmp/b.fb2", "target_format": "epub"})
+        queue.claim("w1", lease_seconds=0.01)
+        time.sleep(0.05)
+        queue.claim("w2", lease_seconds=0.01)
+        time.sleep(0.05)
+        assert queue.claim("w3", lease_seconds=30) is None
+        assert queue.get(job_id).status == STATUS_FAILED
+        queue.close()
+        print("✅ Аренда и повторы работают")
+
+
+def test_several_worker_processes():
+    """Несколько процессов не захватывают одну задачу дважды."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "jobs.db")
+        queue = SQLiteJobQueue(db_path)
+        job_ids = {queue.enqueue({"n": str(i)}) for i in range(60)}
+
+        with multiprocessing.Manager() as manager:
+            results = manager.list()
+            workers = [
+                multiprocessing.Process(target=claim_all, args=(db_path, f"w{i}", results))
+                for i in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(30)
+            claimed = list(results)
+
+        assert len(claimed) == len(set(claimed)) == 60, "Каждая задача захвачена ровно один раз"
+        assert set(claimed) == job_ids
+        assert all(queue.get(job_id).status == STATUS_DONE for job_id in job_ids)
+        queue.close()
+        print("✅ 4 процесса-воркера обработали 60 задач без дублей")
+
+
+class FakeConverter:
+    """Конвертер без calibre: создает пустой результат рядом с исходником."""
+
+    async def convert(self, input_path, target_format, progress_callback=None, user_id=None):
+        if progress_callback:
+            await progress_callback("⚙️ Конвертирую...")
+        output_path = input_path.with_suffix(f".{target_format}")
+        output_path.write_bytes(b"converted")
+        return output_path
+
+
+async def run_scheduler_with_worker(tmp: Path):
+    queue = SQLiteJobQueue(str(tmp / "jobs.db"))
+    scheduler = ConversionScheduler(None, job_queue=queue, poll_interval=0.05)
+    worker = Worker(queue, FakeConverter(), worker_id="w1", idle_interval=0.05)
+    worker_task = asyncio.create_task(worker.run())
+
+    input_path = tmp / "book.fb2"
+    input_path.write_text("<FictionBook/>")
+    progress = []
+
+    async def on_progress(message):
+        progress.append(message)
+
+    output_path = await scheduler.convert(input_path, "epub", progress_callback=on_progress)
+
+    worker.stop()
+    await worker_task
+    queue.close()
+    return output_path, progress
+
+
+def test_scheduler_delivers_worker_result():
+    """Фронтенд ставит задачу и получает результат воркера."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path, progress = asyncio.run(run_scheduler_with_worker(Path(tmp)))
+        assert output_path == Path(tmp) / "book.epub"
+        assert output_path.read_bytes() == b"converted"
+        assert "⚙️ Конвертирую..." in progress, "Прогресс воркера передается фронтенду"
+        print("✅ Результат воркера доставлен фронтенду")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование очереди задач...")
+    test_claim_complete_and_lease_expiry()
+    test_several_worker_processes()
+    test_scheduler_delivers_worker_result()
+    print("✨ Тестирование завершено!")
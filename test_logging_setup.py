@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Тест логирования через очередь: фоновая запись, JSON и ротация.
+"""
+import json
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from utils.logging_setup import setup_logging, stop_logging
+
+
+class ThreadRecorder(logging.Handler):
+    """Запоминает потоки, в которых выполняется обработчик."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.get_ident())
+
+
+def test_json_and_background_write():
+    """Записи пишутся фоновым потоком в JSON, исключения сохраняются."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = Path(log_dir) / "logs" / "bot.log"
+        listener = setup_logging("INFO", log_file=str(log_file), json_format=True, console=False)
+        recorder = ThreadRecorder()
+        listener.handlers = listener.handlers + (recorder,)
+        try:
+            logger = logging.getLogger("test.logging")
+            logger.info("Файл %s сконвертирован", "book.fb2")
+            logger.debug("не попадет в лог")
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Ошибка конвертации")
+        finally:
+            stop_logging()
+
+        entries = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+
+    assert threading.get_ident() not in recorder.threads, "Запись должна идти не в вызывающем потоке"
+    assert [entry["level"] for entry in entries] == ["INFO", "ERROR"]
+    assert entries[0]["message"] == "Файл book.fb2 сконвертирован"
+    assert entries[0]["logger"] == "test.logging"
+    assert entries[1]["message"] == "Ошибка конвертации"
+    assert "ValueError: boom" in entries[1]["exception"]
+    print("✅ JSON-лог пишется в фоне")
+
+
+def test_text_traceback():
+    """В текстовом формате traceback идет после сообщения."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = Path(log_dir) / "bot.log"
+        setup_logging("INFO", log_file=str(log_file), console=False)
+        try:
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logging.getLogger("test.logging").exception("Ошибка конвертации")
+        finally:
+            stop_logging()
+        lines = log_file.read_text(encoding="utf-8").splitlines()
+
+    assert lines[0].endswith("ERROR - Ошибка конвертации"), lines
+    assert lines[1] == "Traceback (most recent call last):" and lines[-1] == "ValueError: boom", lines
+    print("✅ Traceback в текстовом логе")
+
+
+def test_size_rotation():
+    """Файл лога ротируется по размеру."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_file = Path(log_dir) / "bot.log"
+        setup_logging("INFO", log_file=str(log_file), max_bytes=2000, backup_count=2, console=False)
+        try:
+            for i in range(200):
+                logging.getLogger("test.rotation").info("строка лога номер %d", i)
+        finally:
+            stop_logging()
+        files = sorted(path.name for path in Path(log_dir).iterdir())
+
+    assert files == ["bot.log", "bot.log.1", "bot.log.2"]
+    print("✅ Ротация по размеру работает")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование логирования...")
+    test_json_and_background_write()
+    test_text_traceback()
+    test_size_rotation()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Тест обнаружения блокировок event loop и сэмплирующего профилировщика.
+"""
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+
+from utils.loop_monitor import LoopWatchdog
+from utils.profiler import SamplingProfiler, top_functions
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+async def block_loop_synchronously():
+    time.sleep(0.5)
+
+
+async def run_watchdog():
+    watchdog = LoopWatchdog(threshold=0.2, beat_interval=0.02, min_report_interval=0)
+    watchdog.start()
+    await asyncio.sleep(0.1)
+    assert watchdog.stalls == 0, "Свободный цикл не должен считаться заблокированным"
+    await block_loop_synchronously()
+    await asyncio.sleep(0.1)
+    await watchdog.stop()
+    return watchdog.stalls
+
+
+def test_watchdog_reports_blocking_call():
+    """Блокировка цикла учитывается один раз и логируется со стеком виновника."""
+    handler = ListHandler()
+    logging.getLogger("utils.loop_monitor").addHandler(handler)
+    try:
+        stalls = asyncio.run(run_watchdog())
+    finally:
+        logging.getLogger("utils.loop_monitor").removeHandler(handler)
+
+    assert stalls == 1
+    assert any("block_loop_synchronously" in message for message in handler.messages)
+    print("✅ Блокировка event loop обнаружена")
+
+
+def spin_in_marked_function(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler():
+    """Профилировщик пишет collapsed-стеки и находит горячую функцию."""
+    stop = threading.Event()
+    worker = threading.Thread(target=spin_in_marked_function, args=(stop,), name="busy")
+    worker.start()
+    try:
+        with tempfile.TemporaryDirectory() as profile_dir:
+            profiler = SamplingProfiler(profile_dir, interval=0.005)
+            path, stacks, samples = profiler.run(0.3)
+            lines = path.read_text().splitlines()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert samples > 10
+    assert any(line.startswith("busy;") and "spin_in_marked_function" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines), "Формат: стек пробел число"
+    assert any("spin_in_marked_function" in frame for frame, _ in top_functions(stacks, limit=5))
+    print("✅ Профилировщик работает")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование мониторинга event loop...")
+    test_watchdog_reports_blocking_call()
+    test_sampling_profiler()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Тест метрик Prometheus: гистограммы, метрики-функции и эндпоинт /metrics.
+"""
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.metrics import Histogram, Gauge, Registry, observe_stage, size_bucket
+from web.app import create_web_app
+from web.monitoring import register_monitoring_routes
+
+
+def test_histogram_render():
+    """Гистограмма отдает накопленные корзины, сумму и количество."""
+    registry = Registry()
+    histogram = registry.register(Histogram("test_seconds", "Тест", ("stage",), buckets=(0.1, 1)))
+    child = histogram.labels("download")
+    assert histogram.labels("download") is child, "Дочерние метрики должны кешироваться"
+
+    for value in (0.05, 0.5, 5):
+        child.observe(value)
+
+    text = registry.render()
+    assert 'test_seconds_bucket{stage="download",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="download",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="download",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="download"} 3' in text
+    print("✅ Гистограмма рендерится корректно")
+
+
+def test_gauge_function():
+    """Метрика-функция вычисляется при чтении, ошибка не ломает рендер."""
+    registry = Registry()
+    gauge = registry.register(Gauge("test_depth", "Тест", ("queue",)))
+    gauge.labels("ok").set_function(lambda: 7)
+    gauge.labels("broken").set_function(lambda: 1 / 0)
+
+    text = registry.render()
+    assert 'test_depth{queue="ok"} 7' in text
+    assert 'test_depth{queue="broken"} NaN' in text
+    print("✅ Метрики-функции работают")
+
+
+def test_size_bucket():
+    assert size_bucket(100) == "lt1mb"
+    assert size_bucket(3 * 1_048_576) == "1-5mb"
+    assert size_bucket(60 * 1_048_576) == "gt50mb"
+
+
+async def fetch_metrics() -> str:
+    app = create_web_app()
+    register_monitoring_routes(app)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.get("/metrics")
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        return await response.text()
+
+
+def test_metrics_endpoint():
+    """Эндпоинт /metrics отдает этапы обработки с метками формата и размера."""
+    observe_stage("conversion", ".fb2", "epub", 2 * 1_048_576, 1.5)
+    text = asyncio.run(fetch_metrics())
+    assert (
+        'bookbot_stage_total{stage="conversion",src="fb2",dst="epub",size="1-5mb",outcome="ok"}'
+        in text
+    )
+    assert "bookbot_stage_duration_seconds_bucket" in text
+    print("✅ Эндпоинт /metrics работает")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование метрик...")
+    test_histogram_render()
+    test_gauge_function()
+    test_size_bucket()
+    test_metrics_endpoint()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Тест очереди исходящих запросов: приоритеты, схлопывание правок и 429.
+"""
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, GetFile, SendDocument, SendMessage
+
+from utils.send_queue import OutgoingScheduler, Priority, send_priority
+
+
+class FakeApi:
+    """Имитация Bot API, записывающая порядок запросов."""
+
+    def __init__(self, flood_once: bool = False):
+        self.sent = []
+        self.flood_once = flood_once
+
+    async def make_request(self, bot, method):
+        if self.flood_once:
+            self.flood_once = False
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0.2)
+        self.sent.append((type(method).__name__, getattr(method, "text", None), time.monotonic()))
+        return True
+
+
+async def run_priorities_and_coalescing():
+    api = FakeApi()
+    # Один токен на чат: первый запрос уходит сразу, остальные копятся в очереди
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+
+    first = asyncio.create_task(scheduler(api.make_request, None, SendMessage(chat_id=1, text="status")))
+    await asyncio.sleep(0.01)
+    calls = [
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress 1")),
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress 2")),
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress 3")),
+        scheduler(api.make_request, None, SendDocument(chat_id=1, document="file_id")),
+    ]
+
+    async def error_edit():
+        with send_priority(Priority.ERROR):
+            return await scheduler(api.make_request, None, SendMessage(chat_id=1, text="error"))
+
+    results = await asyncio.gather(first, *calls, error_edit())
+    # Запросы без chat_id идут напрямую
+    await scheduler(api.make_request, None, GetFile(file_id="x"))
+    await scheduler.close()
+    return api.sent, results
+
+
+def test_priorities_and_coalescing():
+    """Доставка раньше ошибок, ошибки раньше прогресса; правки схлопываются."""
+    sent, results = asyncio.run(run_priorities_and_coalescing())
+    order = [(name, text) for name, text, _ in sent]
+    assert order == [
+        ("SendMessage", "status"),
+        ("SendDocument", None),
+        ("SendMessage", "error"),
+        ("EditMessageText", "progress 3"),
+        ("GetFile", None),
+    ], order
+    assert all(result is True for result in results), "Схлопнутые вызовы получают результат последнего"
+    print("✅ Приоритеты и схлопывание правок работают")
+
+
+async def run_retry_after():
+    api = FakeApi(flood_once=True)
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+    start = time.monotonic()
+    result = await scheduler(api.make_request, None, SendMessage(chat_id=5, text="hello"))
+    await scheduler.close()
+    return result, api.sent, start
+
+
+def test_retry_after_is_honoured():
+    """Ответ 429 не теряет запрос: он повторяется после retry_after."""
+    result, sent, start = asyncio.run(run_retry_after())
+    assert result is True
+    assert len(sent) == 1
+    assert sent[0][2] - start >= 0.19, "Повтор раньше retry_after"
+    print("✅ retry_after соблюдается")
+
+
+class SlowFloodApi(FakeApi):
+    """Первая правка отвечает 429 не сразу: за это время приходит новая."""
+
+    async def make_request(self, bot, method):
+        if self.flood_once:
+            await asyncio.sleep(0.05)
+        return await super().make_request(bot, method)
+
+
+async def run_stale_retry():
+    api = SlowFloodApi(flood_once=True)
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+    stale = asyncio.create_task(
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress"))
+    )
+    await asyncio.sleep(0.01)
+
+    async def error_edit():
+        with send_priority(Priority.ERROR):
+            return await scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="error"))
+
+    results = await asyncio.gather(stale, error_edit())
+    await scheduler.close()
+    return api.sent, results, scheduler
+
+
+def test_stale_edit_not_retried():
+    """Правка, получившая 429 после более новой, не повторяется и не затирает ее."""
+    sent, results, scheduler = asyncio.run(run_stale_retry())
+    assert [(name, text) for name, text, _ in sent] == [("EditMessageText", "error")], sent
+    assert results == [True, True]
+    assert not scheduler._newest and not scheduler._in_flight and not scheduler._tasks
+    print("✅ Устаревшая правка не повторяется после 429")
+
+
+async def run_cancelled_progress():
+    api = FakeApi()
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+    first = asyncio.create_task(scheduler(api.make_request, None, SendMessage(chat_id=1, text="status")))
+    await asyncio.sleep(0.01)
+    progress = asyncio.create_task(
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress"))
+    )
+    await asyncio.sleep(0.01)
+    progress.cancel()
+    await asyncio.gather(first, progress, return_exceptions=True)
+    # Токен чата успевает восстановиться: неотмененная правка ушла бы за это время
+    await asyncio.sleep(0.2)
+    await scheduler.close()
+    return api.sent
+
+
+def test_cancelled_progress_not_sent():
+    """Правка, вызывающий которой отменен, не отправляется."""
+    sent = asyncio.run(run_cancelled_progress())
+    assert [text for _, text, _ in sent] == ["status"], sent
+    print("✅ Отмененный прогресс не отправляется")
+
+
+async def run_newest_edit_priority():
+    api = FakeApi()
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+    first = asyncio.create_task(scheduler(api.make_request, None, SendMessage(chat_id=1, text="status")))
+    await asyncio.sleep(0.01)
+
+    async def normal_edit():
+        with send_priority(Priority.NORMAL):
+            return await scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="keyboard"))
+
+    calls = [
+        normal_edit(),
+        scheduler(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text="progress")),
+        scheduler(api.make_request, None, SendMessage(chat_id=1, text="reply")),
+    ]
+    await asyncio.gather(first, *calls)
+    await scheduler.close()
+    return [text for _, text, _ in api.sent]
+
+
+def test_newest_edit_keeps_own_priority():
+    """Схлопнутая правка уходит с текстом и приоритетом самой новой."""
+    sent = asyncio.run(run_newest_edit_priority())
+    assert sent == ["status", "reply", "progress"], sent
+    print("✅ Схлопнутая правка получает приоритет новой")
+
+
+async def run_close_pending():
+    api = FakeApi()
+    scheduler = OutgoingScheduler(global_rate=100, chat_rate=0.1, chat_burst=1)
+    await scheduler(api.make_request, None, SendMessage(chat_id=1, text="status"))
+    waiting = asyncio.create_task(scheduler(api.make_request, None, SendMessage(chat_id=1, text="late")))
+    await asyncio.sleep(0.01)
+    await scheduler.close()
+    return await asyncio.wait_for(asyncio.gather(waiting, return_exceptions=True), 1), scheduler
+
+
+def test_close_resolves_pending():
+    """После close() ожидающие вызовы получают ошибку, а не висят."""
+    (result,), scheduler = asyncio.run(run_close_pending())
+    assert isinstance(result, RuntimeError), result
+    assert scheduler.queue_depth == 0 and not scheduler._newest
+    print("✅ close() завершает ожидающие вызовы")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование очереди исходящих запросов...")
+    test_priorities_and_coalescing()
+    test_retry_after_is_honoured()
+    test_stale_edit_not_retried()
+    test_cancelled_progress_not_sent()
+    test_newest_edit_keeps_own_priority()
+    test_close_resolves_pending()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Тест быстрого старта: ленивые импорты и общие сервисы обработчиков.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from services import CONVERTER_MODULES, Services
+from utils.file_manager import TempFileManager
+
+ROOT = Path(__file__).resolve().parent
+
+
+def test_startup_imports():
+    """Импорт бота и обработчиков не загружает конвертер, валидатор и Pillow."""
+    deferred = list(CONVERTER_MODULES) + ["converter.image_optimizer", "converter.zip_repack", "PIL"]
+    completed = subprocess.run(
+        [sys.executable, "-c", f"import sys, bot; print([name for name in {deferred!r} if name in sys.modules])"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+        env=dict(os.environ, BOT_TOKEN="123456789:AAFakeTokenForLocalBotApiServer00000")
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "[]", completed.stdout
+    print("✅ Модули конвертации не импортируются при старте")
+
+
+def test_services_created_once():
+    """Валидатор и планировщик создаются один раз: при обращении или прогреве."""
+    with tempfile.TemporaryDirectory() as tmp:
+        services = Services(file_manager=TempFileManager(base_dir=tmp))
+        assert services.queue_depth == 0 and services._scheduler is None
+        assert services.validator is services.validator
+
+        asyncio.run(services.warm_up(delay=0))
+        scheduler = services.scheduler
+        assert scheduler is services._scheduler and scheduler is services.scheduler
+        assert services.queue_depth == 0
+        assert scheduler.converter.upload_limit is not None
+        services.close()
+    print("✅ Сервисы создаются один раз")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование быстрого старта...")
+    test_startup_imports()
+    test_services_created_once()
+    print("✨ Тестирование завершено!")
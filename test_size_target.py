@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Тест подгонки размера результата под лимит загрузки: прогноз, профили и тома.
+"""
+import asyncio
+import base64
+import os
+import re
+import tempfile
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from converter.converter import BookConverter
+from converter.size_target import (
+    PROFILES, drop_fonts, estimate_input, find_volumes, predict_size, split_epub, volume_path
+)
+
+FAKE_EBOOK_CONVERT = str(Path(__file__).resolve().parent / "benchmarks" / "fake_ebook_convert.py")
+CHAPTERS = 6
+IMAGE_BYTES = 100_000
+
+
+def make_epub(path: Path, font: bool = False) -> Path:
+    """EPUB из CHAPTERS глав, в каждой свое несжимаемое изображение."""
+    items = "".join(
+        f'<item id="ch{i}" href="text/ch{i}.xhtml" media-type="application/xhtml+xml"/>'
+        f'<item id="img{i}" href="images/img{i}.jpg" media-type="image/jpeg"/>'
+        for i in range(CHAPTERS)
+    )
+    spine = "".join(f'<itemref idref="ch{i}"/>' for i in range(CHAPTERS))
+    nav_points = "".join(
+        f'<navPoint id="n{i}" playOrder="{i + 1}"><navLabel><text>Глава {i}</text></navLabel>'
+        f'<content src="text/ch{i}.xhtml"/></navPoint>'
+        for i in range(CHAPTERS)
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr(
+            "META-INF/container.xml",
+            '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            '</rootfiles></container>'
+        )
+        archive.writestr(
+            "OEBPS/content.opf",
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="2.0">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>Книга</dc:title></metadata>'
+            '<manifest><item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>'
+            '<item id="css" href="style.css" media-type="text/css"/>'
+            + ('<item id="font" href="fonts/serif.ttf" media-type="font/ttf"/>' if font else "")
+            + f'{items}</manifest><spine toc="ncx">{spine}</spine></package>'
+        )
+        archive.writestr(
+            "OEBPS/toc.ncx",
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1"><navMap>{nav_points}</navMap></ncx>'
+        )
+        css = "p { margin: 0 }"
+        if font:
+            css = '@font-face { font-family: "Serif"; src: url(fonts/serif.ttf) }\n' + css
+            archive.writestr("OEBPS/fonts/serif.ttf", os.urandom(50_000))
+        archive.writestr("OEBPS/style.css", css)
+        for i in range(CHAPTERS):
+            archive.writestr(
+                f"OEBPS/text/ch{i}.xhtml",
+                f'<html><head><link href="../style.css" rel="stylesheet"/></head>'
+                f'<body><p>Глава {i}</p><img src="../images/img{i}.jpg"/></body></html>'
+            )
+            archive.writestr(f"OEBPS/images/img{i}.jpg", os.urandom(IMAGE_BYTES))
+    return path
+
+
+def volume_chapters(path: Path):
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        opf = archive.read("OEBPS/content.opf").decode()
+        ncx = archive.read("OEBPS/toc.ncx").decode()
+    chapters = sorted(int(name[len("OEBPS/text/ch"):-len(".xhtml")]) for name in names if name.startswith("OEBPS/text/"))
+    images = sorted(int(name[len("OEBPS/images/img"):-len(".jpg")]) for name in names if name.startswith("OEBPS/images/"))
+    assert names[0] == "mimetype"
+    assert chapters == images, (chapters, images)
+    assert sorted(int(i) for i in re.findall(r'idref="ch(\d+)"', opf)) == chapters
+    assert sorted(int(i) for i in re.findall(r'href="text/ch(\d+)', opf)) == chapters
+    assert sorted(int(i) for i in re.findall(r'src="text/ch(\d+)', ncx)) == chapters
+    assert "ns0:" not in ncx
+    return chapters, opf
+
+
+def test_prediction():
+    """Состав книги определяется по входу, прогноз учитывает формат и профиль."""
+    with tempfile.TemporaryDirectory() as tmp:
+        epub = make_epub(Path(tmp) / "book.epub", font=True)
+        estimate = estimate_input(epub)
+        assert estimate.image_bytes >= CHAPTERS * IMAGE_BYTES
+        assert estimate.font_bytes >= 50_000
+        assert predict_size(estimate, "txt") < predict_size(estimate, "epub") < predict_size(estimate, "pdf")
+
+        assert predict_size(estimate, "epub", PROFILES[-1]) < predict_size(estimate, "epub") / 4
+
+        fb2 = Path(tmp) / "book.fb2"
+        picture = base64.b64encode(os.urandom(300_000))
+        fb2.write_bytes(b"<FictionBook><body><p>text</p></body><binary id='a'>" + picture + b"</binary></FictionBook>")
+        estimate = estimate_input(fb2)
+        assert abs(estimate.image_bytes - 300_000) < 1000 and estimate.text_bytes < 100
+    print("✅ Прогноз размера по составу книги")
+
+
+def test_split_and_fonts():
+    """Книга делится на тома под лимит, шрифты удаляются вместе с @font-face."""
+    with tempfile.TemporaryDirectory() as tmp:
+        epub = make_epub(Path(tmp) / "book.epub", font=True)
+        saved = drop_fonts(epub)
+        assert saved >= 50_000
+        with zipfile.ZipFile(epub) as archive:
+            assert "OEBPS/fonts/serif.ttf" not in archive.namelist()
+            assert "font-face" not in archive.read("OEBPS/style.css").decode()
+            assert "serif.ttf" not in archive.read("OEBPS/content.opf").decode()
+
+        # Том прошлой конвертации с большим числом томов удаляется
+        volume_path(epub, 4).write_bytes(b"old")
+        limit = 260_000
+        volumes = split_epub(epub, limit)
+        assert len(volumes) == 3 and not epub.exists(), volumes
+        assert find_volumes(volumes[0]) == volumes
+        assert not volume_path(epub, 4).exists()
+
+        seen = []
+        for number, volume in enumerate(volumes, 1):
+            assert volume.stat().st_size <= limit
+            chapters, opf = volume_chapters(volume)
+            assert f"Книга (Том {number})" in opf
+            seen.extend(chapters)
+        assert seen == list(range(CHAPTERS))
+    print("✅ Деление на тома и удаление шрифтов")
+
+
+def test_converter_delivers_volumes():
+    """BookConverter с лимитом возвращает первый том; тома других форматов - через EPUB."""
+    previous = os.environ.get("FAKE_EBOOK_CONVERT_COPY")
+    os.environ["FAKE_EBOOK_CONVERT_COPY"] = "1"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            converter = BookConverter(ebook_convert=FAKE_EBOOK_CONVERT, upload_limit=260_000)
+            for target in ("epub", "mobi"):
+                source = make_epub(Path(tmp) / "source.epub")
+                output = asyncio.run(converter.convert(source, target))
+                assert output is not None, target
+                volumes = find_volumes(output)
+                assert len(volumes) == 3, (target, volumes)
+                assert all(volume.suffix == f".{target}" for volume in volumes)
+                assert all(volume.stat().st_size <= 260_000 for volume in volumes)
+                for volume in volumes:
+                    volume.unlink()
+                # Промежуточные EPUB-тома не остаются на диске
+                assert sorted(path.name for path in Path(tmp).iterdir()) == ["source.epub"], target
+
+            # Книга, которая помещается, приходит одним файлом
+            single = BookConverter(ebook_convert=FAKE_EBOOK_CONVERT, upload_limit=10_000_000)
+            output = asyncio.run(single.convert(source, "epub"))
+            assert find_volumes(output) == [output]
+
+            # Глава больше лимита не делится - конвертация не удается
+            tiny = BookConverter(ebook_convert=FAKE_EBOOK_CONVERT, upload_limit=50_000)
+            assert asyncio.run(tiny.convert(source, "epub")) is None
+    finally:
+        if previous is None:
+            os.environ.pop("FAKE_EBOOK_CONVERT_COPY", None)
+        else:
+            os.environ["FAKE_EBOOK_CONVERT_COPY"] = previous
+    print("✅ Конвертер отдает тома под лимит")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование подгонки размера результата...")
+    test_prediction()
+    test_split_and_fonts()
+    test_converter_delivers_volumes()
+    print("✨ Тестирование завершено!")
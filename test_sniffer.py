@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Тест определения формата книги по содержимому.
+"""
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from converter.sniffer import sniff_format, text_encoding
+from converter.validators import FileValidator
+
+FB2 = (
+    '<?xml version="1.0" encoding="windows-1251"?>\n'
+    '<!-- сгенерировано -->\n'
+    '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0">'
+    '<body><p>Война и мир</p></body></FictionBook>'
+)
+
+
+def make_epub(mimetype_first: bool = True) -> bytes:
+    """Минимальный EPUB-контейнер."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        if mimetype_first:
+            archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr(
+            "META-INF/container.xml",
+            '<container><rootfiles><rootfile full-path="OEBPS/content.opf"/></rootfiles></container>',
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+        archive.writestr("OEBPS/content.opf", "<package/>")
+    return buffer.getvalue()
+
+
+def test_binary_formats():
+    """PDF и EPUB определяются по сигнатурам, прочий ZIP и мусор - нет."""
+    assert sniff_format(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n1 0 obj") == "pdf"
+    assert sniff_format(b"\r\n" * 10 + b"%PDF-1.4") == "pdf"
+    assert sniff_format(b"\x00\x01\x02junk" * 4 + b"%PDF-1.4") == "pdf"
+    assert sniff_format(make_epub()) == "epub"
+    assert sniff_format(make_epub(mimetype_first=False)) == "epub"
+
+    other_zip = io.BytesIO()
+    with zipfile.ZipFile(other_zip, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document/>")
+    assert sniff_format(other_zip.getvalue()) is None
+    assert sniff_format(bytes(range(256)) * 32) is None
+    print("✅ PDF и EPUB распознаются")
+
+
+def test_markup_and_text():
+    """FB2, HTML и текст в разных кодировках."""
+    assert sniff_format(FB2.encode("cp1251")) == "fb2"
+    assert sniff_format(b"\xef\xbb\xbf" + FB2.encode("utf-8")) == "fb2"
+    assert sniff_format(FB2.encode("utf-16")) == "fb2"
+    assert sniff_format(b"<!DOCTYPE html>\n<html><body>x</body></html>") == "html"
+    assert sniff_format(b"<?xml version='1.0'?><html xmlns='http://www.w3.org/1999/xhtml'/>") == "html"
+    assert sniff_format(b"<?xml version='1.0'?><rss/>") is None
+    assert sniff_format(b"Some notes about the %PDF-1.4 header format.") == "txt"
+    assert sniff_format(b"{\\rtf1\\ansi\\deff0 {\\fonttbl}} text}") is None
+
+    russian = "Глава 1\n\nБыл холодный ясный апрельский день.\n" * 50
+    assert sniff_format(russian.encode("utf-8")) == "txt"
+    assert sniff_format(russian.encode("cp1251")) == "txt"
+    assert text_encoding(russian.encode("cp1251")) == "cp1251"
+    # Фрагмент, оборванный посреди двухбайтового символа, - все еще UTF-8
+    assert text_encoding(russian.encode("utf-8")[:101]) == "utf-8"
+    print("✅ FB2, HTML и текст распознаются")
+
+
+def test_validator_uses_content():
+    """Валидатор возвращает настоящий формат, даже если расширение неверное."""
+    validator = FileValidator()
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = {
+            "book.txt": (make_epub(), (True, None, "epub")),
+            "book": (b"%PDF-1.4\n", (True, None, "pdf")),
+            "book.html": (b"plain text", (True, None, "html")),
+            "book.fb2": (b"<?xml version='1.0'?><rss/>", (False, "Неверный тип файла", None)),
+            "book.exe": (b"MZ\x90\x00\x03\x00\x00\x00", (False, "Формат .exe не поддерживается", None)),
+            "notes.txt": (b"Some notes about the %PDF-1.4 header format.", (True, None, "txt")),
+            "book.rtf": (b"{\\rtf1\\ansi Hello}", (False, "Формат .rtf не поддерживается", None)),
+            "readme.md": (b"# Notes\n\nplain text", (False, "Формат .md не поддерживается", None)),
+            "empty.txt": (b"", (False, "Файл пуст", None)),
+        }
+        for name, (data, expected) in cases.items():
+            path = Path(tmp) / name
+            path.write_bytes(data)
+            assert validator.detect_format(path) == expected, name
+        assert validator.validate_file(Path(tmp) / "book.txt") == (True, None)
+    print("✅ Валидатор определяет формат по содержимому")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование определения формата...")
+    test_binary_formats()
+    test_markup_and_text()
+    test_validator_uses_content()
+    print("✨ Тестирование завершено!")
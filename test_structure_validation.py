@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Тест структурной проверки книг: обрезанные архивы, PDF и битый XML.
+"""
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from benchmarks.corpus import generate_book
+from converter.validators import FileValidator
+from utils.error_manager import ErrorCode
+
+
+def inspect_bytes(directory: str, name: str, data: bytes):
+    path = Path(directory) / name
+    path.write_bytes(data)
+    return FileValidator.inspect(path)
+
+
+def make_epub(container: str = None, opf: bool = True) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        if container is not None:
+            archive.writestr("META-INF/container.xml", container)
+        if opf:
+            archive.writestr("OEBPS/content.opf", "<package/>")
+    return buffer.getvalue()
+
+
+CONTAINER = '<container><rootfiles><rootfile full-path="OEBPS/content.opf"/></rootfiles></container>'
+
+
+def test_corpus_books_pass():
+    """Корректные книги корпуса проходят проверку."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("epub", "pdf", "pdf-image", "fb2", "html", "txt"):
+            book = generate_book(fmt, 100_000, Path(tmp))
+            result = FileValidator.inspect(book)
+            assert result.is_valid, (fmt, result)
+    print("✅ Корректные книги проходят")
+
+
+def test_broken_epub():
+    """Обрезанный архив и EPUB без OPF получают свои коды."""
+    with tempfile.TemporaryDirectory() as tmp:
+        book = generate_book("epub", 100_000, Path(tmp)).read_bytes()
+        result = inspect_bytes(tmp, "cut.epub", book[:len(book) // 2])
+        assert result.error_code == ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, result
+        # Оглавление на месте, но данные перед ним вырезаны
+        result = inspect_bytes(tmp, "hole.epub", book[:100] + book[20_000:])
+        assert result.error_code == ErrorCode.VALIDATION_TRUNCATED_ARCHIVE, result
+
+        assert inspect_bytes(tmp, "ok.epub", make_epub(CONTAINER)).is_valid
+        result = inspect_bytes(tmp, "nocontainer.epub", make_epub())
+        assert result.error_code == ErrorCode.VALIDATION_MISSING_OPF, result
+        result = inspect_bytes(tmp, "noopf.epub", make_epub(CONTAINER, opf=False))
+        assert result.error_code == ErrorCode.VALIDATION_MISSING_OPF, result
+        assert result.format == "epub"
+    print("✅ Поврежденный EPUB отклоняется")
+
+
+def test_broken_pdf():
+    """PDF без конца файла, с неверным startxref или без страниц."""
+    with tempfile.TemporaryDirectory() as tmp:
+        book = generate_book("pdf", 100_000, Path(tmp)).read_bytes()
+        result = inspect_bytes(tmp, "cut.pdf", book[:len(book) // 2])
+        assert result.error_code == ErrorCode.VALIDATION_BROKEN_XREF, result
+
+        startxref = book.rindex(b"startxref")
+        broken = book[:startxref] + b"startxref\n999999999\n%%EOF\n"
+        result = inspect_bytes(tmp, "xref.pdf", broken)
+        assert result.error_code == ErrorCode.VALIDATION_BROKEN_XREF, result
+
+        empty = (
+            b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            b"2 0 obj << /Type /Pages /Kids [] /Count 0 >> endobj\n"
+            b"xref\n0 3\ntrailer << /Root 1 0 R >>\nstartxref\n98\n%%EOF\n"
+        )
+        result = inspect_bytes(tmp, "empty.pdf", empty)
+        assert result.error_code == ErrorCode.VALIDATION_NO_PAGES, result
+    print("✅ Поврежденный PDF отклоняется")
+
+
+def test_malformed_xml():
+    """Битый FB2 и XHTML отклоняются, сущности HTML и обычный HTML - нет."""
+    with tempfile.TemporaryDirectory() as tmp:
+        fb2 = generate_book("fb2", 100_000, Path(tmp)).read_bytes()
+        result = inspect_bytes(tmp, "cut.fb2", fb2[:len(fb2) // 2])
+        assert result.error_code == ErrorCode.VALIDATION_MALFORMED_XML, result
+
+        prolog = b'<?xml version="1.0" encoding="windows-1251"?>'
+        assert inspect_bytes(
+            tmp, "nbsp.fb2", prolog + "<FictionBook><p>Глава&nbsp;1</p></FictionBook>".encode("cp1251")
+        ).is_valid
+        result = inspect_bytes(tmp, "tag.fb2", prolog + b"<FictionBook><p>text</b></FictionBook>")
+        assert result.error_code == ErrorCode.VALIDATION_MALFORMED_XML, result
+        assert "1" in result.error
+
+        assert inspect_bytes(tmp, "soup.html", b"<html><body><p>x<br></body>").is_valid
+    print("✅ Битый XML отклоняется")
+
+
+def test_lenient_html():
+    """XHTML с тегами HTML проходит, обрезанный и двоичный HTML - нет."""
+    with tempfile.TemporaryDirectory() as tmp:
+        page = b'<?xml version="1.0"?><html><body><p>hi<br></p></body></html>'
+        assert inspect_bytes(tmp, "void.html", page).is_valid
+        assert inspect_bytes(tmp, "mismatch.html", b"<?xml version='1.0'?><html><body><p>x</body></html>").is_valid
+
+        html = generate_book("html", 100_000, Path(tmp)).read_bytes()
+        assert inspect_bytes(tmp, "cut.html", html[:html.rindex(b"</html>") + 3]).error_code \
+            == ErrorCode.VALIDATION_MALFORMED_XML
+        result = inspect_bytes(tmp, "cut.xhtml.html", page[:page.index(b"</p>")])
+        assert result.error_code == ErrorCode.VALIDATION_MALFORMED_XML, result
+        result = inspect_bytes(tmp, "binary.html", html[:50_000] + b"\x00" * 64 + html[50_000:])
+        assert result.error_code == ErrorCode.FILE_INVALID_TYPE, result
+    print("✅ HTML проверяется нестрого")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование структурной проверки книг...")
+    test_corpus_books_pass()
+    test_broken_epub()
+    test_broken_pdf()
+    test_malformed_xml()
+    test_lenient_html()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тест двухуровневого хранилища временных файлов (RAM + диск).
+"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+from utils.file_manager import TempFileManager
+
+
+def make_manager(root: Path, budget: int, max_file: int) -> TempFileManager:
+    """Создает менеджер с RAM-уровнем в обычной временной директории."""
+    return TempFileManager(
+        base_dir=str(root / "disk"),
+        ram_dir=str(root / "ram"),
+        ram_budget=budget,
+        ram_max_file_size=max_file
+    )
+
+
+def test_small_files_go_to_ram():
+    """Небольшие файлы размещаются в RAM-уровне."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = make_manager(Path(tmp), budget=1024 * 1024, max_file=64 * 1024)
+        path = asyncio.run(manager.save_file_from_bytes(b"x" * 1000, "book.txt"))
+
+        assert manager.is_in_ram(path), f"Файл {path} должен быть в RAM"
+        assert path.read_bytes() == b"x" * 1000
+        assert manager.ram_usage == 1000 * TempFileManager.RAM_JOB_FACTOR
+
+        manager.release(path)
+        assert not path.exists()
+        assert manager.ram_usage == 0
+        print("✅ Небольшой файл размещен в RAM и освобожден")
+
+
+def test_large_files_and_overflow_spill_to_disk():
+    """Крупные файлы и переполнение бюджета уходят на диск."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = make_manager(Path(tmp), budget=10_000, max_file=4_000)
+
+        large = asyncio.run(manager.save_file_from_bytes(b"x" * 5_000, "big.pdf"))
+        assert not manager.is_in_ram(large), "Крупный файл должен быть на диске"
+
+        first = asyncio.run(manager.save_file_from_bytes(b"x" * 4_000, "a.fb2"))
+        second = asyncio.run(manager.save_file_from_bytes(b"x" * 4_000, "b.fb2"))
+        assert manager.is_in_ram(first)
+        assert not manager.is_in_ram(second), "Переполнение бюджета должно уходить на диск"
+
+        # Удаление в обход менеджера тоже освобождает бюджет
+        first.unlink()
+        third = asyncio.run(manager.save_file_from_bytes(b"x" * 4_000, "c.fb2"))
+        assert manager.is_in_ram(third)
+        print("✅ Крупные файлы и переполнение уходят на диск")
+
+
+def test_ram_tier_disabled_by_default():
+    """Без бюджета все файлы сохраняются на диск."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = TempFileManager(base_dir=tmp)
+        path = asyncio.run(manager.save_file_from_bytes(b"data", "book.epub"))
+        assert path.parent == Path(tmp)
+        assert not manager.is_in_ram(path)
+        print("✅ RAM-уровень отключен по умолчанию")
+
+
+def test_download_spills_to_disk_and_cleans_up():
+    """Скачивание при переполненном tmpfs уходит на диск, при ошибке файл удаляется."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = make_manager(Path(tmp), budget=1024 * 1024, max_file=64 * 1024)
+        attempts = []
+
+        async def download(path: Path):
+            attempts.append(path)
+            if manager.is_in_ram(path):
+                raise OSError(28, "No space left on device")
+            path.write_bytes(b"x" * 1000)
+
+        path = asyncio.run(manager.save_file_from_download(download, "book.txt", 1000))
+        assert not manager.is_in_ram(path) and path.read_bytes() == b"x" * 1000
+        assert len(attempts) == 2 and not attempts[0].exists()
+        assert manager.ram_usage == 0
+
+        async def broken(path: Path):
+            path.write_bytes(b"partial")
+            raise ConnectionError("обрыв соединения")
+
+        try:
+            asyncio.run(manager.save_file_from_download(broken, "big.pdf", 100_000))
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("Ожидалась ошибка скачивания")
+        assert [p.name for p in (Path(tmp) / "disk").iterdir()] == [path.name]
+        print("✅ Скачивание в файл: переполнение tmpfs и обрыв обработаны")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование двухуровневого хранилища...")
+    test_small_files_go_to_ram()
+    test_large_files_and_overflow_spill_to_disk()
+    test_ram_tier_disabled_by_default()
+    test_download_spills_to_disk_and_cleans_up()
+    print("✨ Тестирование завершено!")
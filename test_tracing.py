@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Тест трассировки: спаны этапов, продолжение трассы и экспорт OTLP/JSON.
+"""
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from utils import tracing
+from utils.tracing import (
+    configure_tracing, current_context, finish_trace, resume_trace, shutdown_tracing, span, start_trace
+)
+
+
+async def first_handler():
+    trace = start_trace("handle_document", size=100)
+    with span("get_file"):
+        pass
+    with span("download") as download:
+        download.set_attribute("bytes", 100)
+    finish_trace(trace)
+    return trace.context()
+
+
+async def second_handler(context):
+    trace = resume_trace(context, "handle_conversion", dst="epub")
+    with span("queue_wait"):
+        await asyncio.sleep(0)
+    with span("remote_conversion"):
+        worker_context = current_context()
+    try:
+        with span("answer_document"):
+            raise RuntimeError("upload failed")
+    except RuntimeError:
+        pass
+    finish_trace(trace, error=True)
+    return worker_context
+
+
+def test_trace_across_handlers():
+    """Трасса продолжается между обработчиками и пишется в OTLP/JSON."""
+    with tempfile.TemporaryDirectory() as trace_dir:
+        configure_tracing(trace_dir, sample_rate=1.0)
+        try:
+            context = asyncio.run(first_handler())
+            worker_context = asyncio.run(second_handler(context))
+        finally:
+            shutdown_tracing()
+
+        files = list(Path(trace_dir).glob("traces-*.jsonl"))
+        assert len(files) == 1
+        exports = [json.loads(line) for line in files[0].read_text().splitlines()]
+        assert len(exports) == 2
+
+    spans = {}
+    for export in exports:
+        for item in export["resourceSpans"][0]["scopeSpans"][0]["spans"]:
+            spans[item["name"]] = item
+
+    trace_ids = {item["traceId"] for item in spans.values()}
+    assert trace_ids == {context["trace_id"]}, "Все спаны должны принадлежать одной трассе"
+    assert spans["download"]["parentSpanId"] == spans["handle_document"]["spanId"]
+    assert spans["handle_conversion"]["parentSpanId"] == spans["handle_document"]["spanId"]
+    assert spans["queue_wait"]["parentSpanId"] == spans["handle_conversion"]["spanId"]
+    assert worker_context["span_id"] == spans["remote_conversion"]["spanId"]
+    assert spans["answer_document"]["status"]["code"] == tracing.STATUS_ERROR
+    assert spans["get_file"]["status"]["code"] == tracing.STATUS_OK
+    print("✅ Трасса записана корректно")
+
+
+def test_unsampled_is_noop():
+    """Без выборки трасса не создается, span() ничего не записывает."""
+    with tempfile.TemporaryDirectory() as trace_dir:
+        configure_tracing(trace_dir, sample_rate=0.0)
+        assert start_trace("handle_document") is None
+        with span("download") as item:
+            assert item is None
+        assert current_context() is None
+        shutdown_tracing()
+    print("✅ Несэмплированные задачи не трассируются")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование трассировки...")
+    test_trace_across_handlers()
+    test_unsampled_is_noop()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Тест записи трафика: обезличенные события и чтение журнала.
+"""
+import tempfile
+from pathlib import Path
+
+from utils.traffic_recorder import (
+    OUTCOME_INVALID, OUTCOME_OK, close_traffic_recorder, configure_traffic_recorder,
+    load_traffic, record_traffic
+)
+
+
+def test_traffic_roundtrip():
+    """События пишутся без лишних полей и читаются по порядку поступления."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "traffic" / "traffic.jsonl"
+        configure_traffic_recorder(str(path))
+        try:
+            record_traffic(1000.5, ".EPUB", 2_500_000, OUTCOME_OK, "mobi", 4.21234, 12.98765)
+            record_traffic(999.0, ".pdf", 100, OUTCOME_INVALID)
+        finally:
+            close_traffic_recorder()
+
+        events = load_traffic(str(path))
+
+    assert [event["outcome"] for event in events] == [OUTCOME_INVALID, OUTCOME_OK]
+    assert events[1] == {
+        "arrival": 1000.5, "src": "epub", "size_kb": 2441, "dst": "mobi",
+        "decision_seconds": 4.212, "conversion_seconds": 12.988, "outcome": OUTCOME_OK
+    }
+    assert events[0]["size_kb"] == 1 and events[0]["dst"] is None
+    print("✅ Трафик записан и прочитан")
+
+
+def test_disabled_recorder_is_noop():
+    """Без TRAFFIC_LOG_FILE запись ничего не делает."""
+    configure_traffic_recorder(None)
+    record_traffic(0, ".txt", 10, OUTCOME_OK)
+    print("✅ Выключенная запись не создает файлов")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование записи трафика...")
+    test_traffic_roundtrip()
+    test_disabled_recorder_is_noop()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Тест обработчика вебхука: проверка секрета и фоновой обработки.
+"""
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from web.app import create_web_app
+from web.webhook import WebhookHandler, SECRET_HEADER
+
+
+class FakeDispatcher:
+    """Диспетчер, который считает одновременные обработки."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.processed = []
+
+    async def feed_raw_update(self, bot, update):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.processed.append(update["update_id"])
+
+
+async def run_webhook_checks():
+    dispatcher = FakeDispatcher(delay=0.05)
+    webhook = WebhookHandler(dispatcher, bot=None, secret_token="s3cret", max_concurrent=2)
+    app = create_web_app()
+    webhook.register(app, "/webhook")
+
+    async with TestClient(TestServer(app)) as client:
+        # Неверный секрет отклоняется
+        response = await client.post("/webhook", json={"update_id": 0})
+        assert response.status == 401
+
+        # Корректные обновления принимаются сразу, до обработки
+        for update_id in range(1, 7):
+            response = await client.post(
+                "/webhook",
+                json={"update_id": update_id},
+                headers={SECRET_HEADER: "s3cret"}
+            )
+            assert response.status == 200
+        assert webhook.pending == 6, "Обработка должна идти в фоне"
+
+        await webhook.close()
+
+    assert sorted(dispatcher.processed) == [1, 2, 3, 4, 5, 6]
+    assert dispatcher.max_active == 2, "Должен соблюдаться лимит параллельности"
+
+
+def test_webhook_handler():
+    """Вебхук проверяет секрет, отвечает сразу и соблюдает лимит."""
+    asyncio.run(run_webhook_checks())
+    print("✅ Вебхук работает корректно")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование вебхука...")
+    test_webhook_handler()
+    print("✨ Тестирование завершено!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Тест перепаковки ZIP-контейнеров параллельным deflate.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import warnings
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForLocalBotApiServer00000")
+
+from converter.zip_repack import BLOCK_SIZE, ZipRepacker
+
+WORDS = "книга глава страница читатель автор история город дорога ночь утро".split()
+
+
+def text(size: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(size // 4)).encode()[:size]
+
+
+def repack(path: Path, workers: int = 2):
+    repacker = ZipRepacker(level=9, workers=workers)
+    try:
+        return asyncio.run(repacker.repack(path))
+    finally:
+        repacker.close()
+
+
+def test_repack_roundtrip():
+    """Содержимое не меняется, мусор удаляется, mimetype первый и без сжатия."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        # Запись больше BLOCK_SIZE сжимается несколькими блоками со словарем
+        chapter = text(BLOCK_SIZE * 2 + 12345)
+        picture = os.urandom(50_000)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            archive.writestr("OEBPS/", "")
+            archive.writestr("OEBPS/text/ch1.xhtml", chapter)
+            archive.writestr("OEBPS/text/глава.xhtml", text(5000, seed=2))
+            archive.writestr("OEBPS/images/pic.jpg", picture)
+            archive.writestr("OEBPS/.DS_Store", b"junk")
+            archive.writestr("__MACOSX/OEBPS/._ch1.xhtml", b"junk")
+            archive.writestr("OEBPS/empty.css", b"")
+        with zipfile.ZipFile(path, "a") as archive, warnings.catch_warnings():
+            # Повтор имени - намеренно: читатели видят последнюю запись
+            warnings.simplefilter("ignore", UserWarning)
+            archive.writestr("OEBPS/style.css", "p { margin: 0 }")
+            archive.writestr("OEBPS/style.css", "p { margin: 1em }")
+
+        report = repack(path)
+        assert report.entries == 6 and report.dropped == 4, report
+        assert report.bytes_saved == report.bytes_before - path.stat().st_size > 0, report
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            infos = archive.infolist()
+            assert infos[0].filename == "mimetype" and infos[0].compress_type == zipfile.ZIP_STORED
+            assert archive.read("mimetype") == b"application/epub+zip"
+            assert sorted(info.filename for info in infos[1:]) == [
+                "OEBPS/empty.css", "OEBPS/images/pic.jpg", "OEBPS/style.css",
+                "OEBPS/text/ch1.xhtml", "OEBPS/text/глава.xhtml",
+            ]
+            assert archive.read("OEBPS/text/ch1.xhtml") == chapter
+            assert archive.read("OEBPS/text/глава.xhtml") == text(5000, seed=2)
+            assert archive.read("OEBPS/style.css") == b"p { margin: 1em }"
+            # Несжимаемое изображение хранится как есть
+            assert archive.getinfo("OEBPS/images/pic.jpg").compress_type == zipfile.ZIP_STORED
+            assert archive.read("OEBPS/images/pic.jpg") == picture
+        assert list(Path(tmp).iterdir()) == [path]
+    print("✅ Архив перепакован без потери содержимого")
+
+
+def test_no_gain_keeps_original():
+    """Если меньше не получилось, файл остается нетронутым."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book.epub"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr("mimetype", "application/epub+zip")
+            archive.writestr("OEBPS/images/pic.jpg", os.urandom(20_000))
+        before = path.read_bytes()
+        report = repack(path, workers=1)
+        assert report.bytes_saved == 0, report
+        assert path.read_bytes() == before
+        assert list(Path(tmp).iterdir()) == [path]
+    print("✅ Без выигрыша исходный файл сохраняется")
+
+
+if __name__ == "__main__":
+    print("🧪 Тестирование перепаковки ZIP...")
+    test_repack_roundtrip()
+    test_no_gain_keeps_original()
+    print("✨ Тестирование завершено!")
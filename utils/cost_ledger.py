@@ -0,0 +1,174 @@
+"""
+Журнал стоимости конвертаций на SQLite.
+
+Каждый запуск ebook-convert и gs записывается с потребленными ресурсами
+(rusage). По журналу строится отчет по парам форматов для планирования
+мощностей и подбора лимитов контейнеров. Запись выполняется фоновым
+потоком, как в ErrorStore.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CostLedger:
+    """Append-only журнал ресурсов дочерних процессов."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS child_usage (
+            ts REAL NOT NULL,
+            tool TEXT NOT NULL,
+            src TEXT NOT NULL,
+            dst TEXT NOT NULL,
+            size_bucket TEXT NOT NULL,
+            input_bytes INTEGER NOT NULL,
+            returncode INTEGER NOT NULL,
+            wall_seconds REAL NOT NULL,
+            user_cpu_seconds REAL NOT NULL,
+            sys_cpu_seconds REAL NOT NULL,
+            max_rss_bytes INTEGER NOT NULL,
+            read_blocks INTEGER NOT NULL,
+            write_blocks INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_child_usage_ts ON child_usage(ts);
+    """
+
+    COLUMNS = (
+        "ts", "tool", "src", "dst", "size_bucket", "input_bytes", "returncode", "wall_seconds",
+        "user_cpu_seconds", "sys_cpu_seconds", "max_rss_bytes", "read_blocks", "write_blocks"
+    )
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Путь к файлу базы данных
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="cost-ledger-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Ставит запись в очередь на запись (не блокирует).
+
+        Args:
+            record: Значения колонок COLUMNS (ts по умолчанию - текущее время)
+        """
+        record.setdefault("ts", time.time())
+        self._queue.put(tuple(record[column] for column in self.COLUMNS))
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        placeholders = ", ".join("?" * len(self.COLUMNS))
+        sql = f"INSERT INTO child_usage ({', '.join(self.COLUMNS)}) VALUES ({placeholders})"
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(sql, rows)
+                except sqlite3.Error as e:
+                    logger.error(f"Не удалось сохранить {len(rows)} записей учета ресурсов: {e}")
+            for _ in batch:
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self) -> None:
+        """Дожидается записи всех поставленных в очередь записей."""
+        self._queue.join()
+
+    def report(self, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Сводка ресурсов по парам форматов и инструментам.
+
+        Args:
+            since: Unix-время начала периода (None - за все время)
+
+        Returns:
+            list: Строки отчета, самые затратные по суммарному CPU первыми
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                """
+                SELECT src, dst, tool,
+                       COUNT(*) AS runs,
+                       SUM(returncode != 0) AS failures,
+                       SUM(user_cpu_seconds + sys_cpu_seconds) AS cpu_total,
+                       AVG(user_cpu_seconds + sys_cpu_seconds) AS cpu_avg,
+                       MAX(user_cpu_seconds + sys_cpu_seconds) AS cpu_max,
+                       AVG(wall_seconds) AS wall_avg,
+                       AVG(max_rss_bytes) AS rss_avg,
+                       MAX(max_rss_bytes) AS rss_max,
+                       SUM(read_blocks) * 512 AS read_bytes,
+                       SUM(write_blocks) * 512 AS write_bytes
+                FROM child_usage
+                WHERE ts >= ?
+                GROUP BY src, dst, tool
+                ORDER BY cpu_total DESC
+                """,
+                (since or 0,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Записывает оставшиеся записи и останавливает фоновый поток."""
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+
+def format_cost_report(rows: List[Dict[str, Any]]) -> str:
+    """
+    Текстовый отчет для команды /costs и cost_report.py.
+
+    Args:
+        rows: Результат CostLedger.report()
+    """
+    if not rows:
+        return "Нет данных о конвертациях за период"
+
+    lines = []
+    for row in rows:
+        lines.append(
+            f"{row['src']} → {row['dst']} [{row['tool']}]: {row['runs']} запусков"
+            + (f", ошибок {row['failures']}" if row['failures'] else "")
+        )
+        lines.append(
+            f"  CPU: сумма {row['cpu_total']:.1f} с, среднее {row['cpu_avg']:.2f} с, "
+            f"макс {row['cpu_max']:.2f} с; время {row['wall_avg']:.2f} с"
+        )
+        lines.append(
+            f"  RSS: среднее {row['rss_avg'] / 1_048_576:.0f} МБ, макс {row['rss_max'] / 1_048_576:.0f} МБ; "
+            f"I/O: чтение {row['read_bytes'] / 1_048_576:.1f} МБ, запись {row['write_bytes'] / 1_048_576:.1f} МБ"
+        )
+    return "\n".join(lines)
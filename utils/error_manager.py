@@ -3,9 +3,12 @@
 """
 import logging
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from utils.error_store import ErrorStore
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +22,7 @@ class ErrorCode(Enum):
     CONVERSION_INVALID_FORMAT = 103
     CONVERSION_CORRUPTED_FILE = 104
     CONVERSION_MEMORY_ERROR = 105
+    CONVERSION_OUTPUT_TOO_LARGE = 106
     
     # Ошибки файловой системы (200-299)
     FILE_NOT_FOUND = 201
@@ -30,6 +34,11 @@ class ErrorCode(Enum):
     VALIDATION_FAILED = 301
     VALIDATION_UNSUPPORTED_FORMAT = 302
     VALIDATION_EMPTY_FILE = 303
+    VALIDATION_TRUNCATED_ARCHIVE = 304
+    VALIDATION_MISSING_OPF = 305
+    VALIDATION_BROKEN_XREF = 306
+    VALIDATION_NO_PAGES = 307
+    VALIDATION_MALFORMED_XML = 308
     
     # Системные ошибки (400-499)
     SYSTEM_OUT_OF_MEMORY = 401
@@ -41,10 +50,38 @@ class ErrorCode(Enum):
 
 
 class ErrorManager:
-    """Менеджер для обработки и логирования ошибок с уникальными ID."""
+    """
+    Менеджер для обработки и логирования ошибок с уникальными ID.
+
+    Последние ошибки хранятся в памяти в кольцевом буфере ограниченного
+    размера, все ошибки - в постоянном хранилище SQLite (если подключено).
+    """
     
-    def __init__(self):
-        self.error_log: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, max_entries: int = 1000):
+        """
+        Args:
+            max_entries: Размер кольцевого буфера последних ошибок
+        """
+        self.max_entries = max_entries
+        self.error_log: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.store: Optional[ErrorStore] = None
+
+    def attach_store(self, db_path: str) -> None:
+        """
+        Подключает постоянное хранилище ошибок.
+
+        Args:
+            db_path: Путь к файлу базы данных SQLite
+        """
+        if self.store is None:
+            self.store = ErrorStore(db_path)
+            logger.info(f"Хранилище ошибок: {db_path}")
+
+    def close(self) -> None:
+        """Дописывает очередь ошибок на диск и закрывает хранилище."""
+        if self.store is not None:
+            self.store.close()
+            self.store = None
     
     def generate_error_id(self) -> str:
         """Генерирует уникальный ID ошибки."""
@@ -79,6 +116,10 @@ class ErrorManager:
         }
         
         self.error_log[error_id] = error_info
+        if len(self.error_log) > self.max_entries:
+            self.error_log.popitem(last=False)
+        if self.store is not None:
+            self.store.append(error_id, error_info)
         
         # Логируем в файл
         logger.error(
@@ -88,6 +129,61 @@ class ErrorManager:
         
         return error_id
     
+    def get_error(self, error_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Находит ошибку по ID: сначала в памяти, затем в хранилище.
+
+        Args:
+            error_id: ID ошибки (ERR-...)
+
+        Returns:
+            Данные ошибки или None, если не найдена
+        """
+        error_info = self.error_log.get(error_id)
+        if error_info is not None:
+            return {
+                'error_id': error_id,
+                'code': error_info['error_code'].value,
+                'code_name': error_info['error_code'].name,
+                'timestamp': error_info['timestamp'],
+                'user_id': error_info['user_id'],
+                'exception': error_info['exception'],
+                'exception_type': error_info['exception_type'],
+                'context': error_info['context']
+            }
+        if self.store is not None:
+            return self.store.get(error_id)
+        return None
+
+    def find_errors(
+        self,
+        error_code: Optional[ErrorCode] = None,
+        user_id: Optional[int] = None,
+        since: Optional[float] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Ищет ошибки в постоянном хранилище.
+
+        Args:
+            error_code: Код ошибки
+            user_id: ID пользователя
+            since: Unix-время, начиная с которого искать
+            limit: Максимум записей
+
+        Returns:
+            Список ошибок (новые первыми)
+        """
+        if self.store is None:
+            return []
+        self.store.flush()
+        return self.store.find(
+            code=error_code.value if error_code else None,
+            user_id=user_id,
+            since=since,
+            limit=limit
+        )
+
     def get_user_message(self, error_code: ErrorCode, error_id: str) -> str:
         """
         Возвращает пользовательское сообщение об ошибке.
@@ -126,6 +222,18 @@ class ErrorManager:
                     '• Разбить документ на части'
                 ]
             },
+            ErrorCode.CONVERSION_OUTPUT_TOO_LARGE: {
+                'title': '📦 Результат не помещается в лимит Telegram',
+                'causes': [
+                    '• Книга слишком велика даже после сжатия изображений',
+                    '• Одна глава больше лимита и не делится на тома'
+                ],
+                'solutions': [
+                    '• Выбрать формат без изображений (TXT)',
+                    '• Разделить исходный файл на части',
+                    '• Уменьшить изображения в исходном файле'
+                ]
+            },
             ErrorCode.FILE_TOO_LARGE: {
                 'title': '📦 Файл слишком большой',
                 'causes': [
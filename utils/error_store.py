@@ -0,0 +1,182 @@
+"""
+Постоянное хранилище ошибок на SQLite.
+
+Записи только добавляются (append-only). Запись выполняется фоновым
+потоком пачками, поэтому log_error в обработчиках не ждет диска.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorStore:
+    """Append-only хранилище ошибок с пакетной записью в фоновом потоке."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS errors (
+            error_id TEXT PRIMARY KEY,
+            code INTEGER NOT NULL,
+            code_name TEXT NOT NULL,
+            ts REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            user_id INTEGER,
+            exception TEXT,
+            exception_type TEXT,
+            context TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_errors_code_ts ON errors(code, ts);
+        CREATE INDEX IF NOT EXISTS idx_errors_user_ts ON errors(user_id, ts);
+        CREATE INDEX IF NOT EXISTS idx_errors_ts ON errors(ts);
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        """
+        Args:
+            db_path: Путь к файлу базы данных
+            batch_size: Максимум записей в одной транзакции
+            flush_interval: Максимальная задержка записи в секундах
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._read_conn = self._connect()
+        self._writer = threading.Thread(target=self._write_loop, name="error-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def append(self, error_id: str, info: Dict[str, Any]) -> None:
+        """
+        Ставит запись об ошибке в очередь на запись (не блокирует).
+
+        Args:
+            error_id: ID ошибки
+            info: Данные ошибки (как в ErrorManager.error_log)
+        """
+        self._queue.put((
+            error_id,
+            info['error_code'].value,
+            info['error_code'].name,
+            time.time(),
+            info['timestamp'],
+            info['user_id'],
+            info['exception'],
+            info['exception_type'],
+            json.dumps(info['context'], ensure_ascii=False, default=str)
+        ))
+
+    def _write_loop(self) -> None:
+        """Фоновый поток: собирает записи в пачки и пишет одной транзакцией."""
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if item is None:
+                running = False
+
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO errors (error_id, code, code_name, ts, timestamp, "
+                            "user_id, exception, exception_type, context) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            batch
+                        )
+                except sqlite3.Error as e:
+                    logger.error(f"Не удалось сохранить {len(batch)} ошибок: {e}")
+            for _ in range(len(batch) + (0 if running else 1)):
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self) -> None:
+        """Дожидается записи всех поставленных в очередь ошибок."""
+        self._queue.join()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'error_id': row['error_id'],
+            'code': row['code'],
+            'code_name': row['code_name'],
+            'timestamp': row['timestamp'],
+            'user_id': row['user_id'],
+            'exception': row['exception'],
+            'exception_type': row['exception_type'],
+            'context': json.loads(row['context']) if row['context'] else {}
+        }
+
+    def get(self, error_id: str) -> Optional[Dict[str, Any]]:
+        """Находит ошибку по ID (поиск по первичному ключу)."""
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT * FROM errors WHERE error_id = ?", (error_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def find(
+        self,
+        code: Optional[int] = None,
+        user_id: Optional[int] = None,
+        since: Optional[float] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Ищет ошибки по коду, пользователю и времени (новые первыми).
+
+        Args:
+            code: Числовой код ошибки
+            user_id: ID пользователя
+            since: Unix-время, начиная с которого искать
+            limit: Максимум записей
+        """
+        conditions, params = [], []
+        if code is not None:
+            conditions.append("code = ?")
+            params.append(code)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                f"SELECT * FROM errors {where} ORDER BY ts DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Записывает оставшиеся ошибки и останавливает фоновый поток."""
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+        with self._read_lock:
+            self._read_conn.close()
@@ -3,65 +3,254 @@
 """
 import os
 import tempfile
+import time
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Optional, Tuple
 import aiofiles
 import logging
 
+from utils.metrics import record_ram_staging
+
 logger = logging.getLogger(__name__)
 
 
 class TempFileManager:
-    """Менеджер временных файлов с автоматической очисткой."""
-    
-    def __init__(self, base_dir: str = "/tmp/book_converter"):
+    """
+    Менеджер временных файлов с автоматической очисткой.
+
+    Поддерживает двухуровневое хранилище: небольшие файлы размещаются
+    в RAM-директории (tmpfs, например /dev/shm) в пределах общего бюджета,
+    а крупные файлы и всё, что не помещается в бюджет, - на диске.
+    """
+
+    # Во сколько раз резервируем место под задачу: вход + результат конвертации
+    RAM_JOB_FACTOR = 2
+
+    def __init__(
+        self,
+        base_dir: str = "/tmp/book_converter",
+        ram_dir: Optional[str] = None,
+        ram_budget: int = 0,
+        ram_max_file_size: int = 2 * 1024 * 1024
+    ):
         """
         Инициализация менеджера.
-        
+
         Args:
-            base_dir: Базовая директория для временных файлов
+            base_dir: Базовая директория для временных файлов (диск)
+            ram_dir: Директория в RAM (tmpfs) для небольших файлов
+            ram_budget: Общий бюджет RAM-уровня в байтах (0 - отключен)
+            ram_max_file_size: Максимальный размер файла для RAM-уровня
         """
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
-        
+
+        self.ram_dir: Optional[Path] = None
+        self.ram_budget = ram_budget
+        self.ram_max_file_size = ram_max_file_size
+        # Зарезервированные байты RAM-уровня по путям файлов
+        self._ram_reserved: Dict[Path, int] = {}
+
+        if ram_dir and ram_budget > 0:
+            try:
+                ram_path = Path(ram_dir)
+                ram_path.mkdir(parents=True, exist_ok=True)
+                self.ram_dir = ram_path
+                logger.info(
+                    f"RAM-уровень временных файлов: {ram_path} "
+                    f"(бюджет {ram_budget // 1_048_576} МБ)"
+                )
+            except OSError as e:
+                logger.warning(f"RAM-директория {ram_dir} недоступна, используем только диск: {e}")
+
+    @property
+    def ram_usage(self) -> int:
+        """Текущий объем зарезервированного RAM-уровня в байтах."""
+        self._prune_ram_reservations()
+        return sum(self._ram_reserved.values())
+
+    def _prune_ram_reservations(self) -> None:
+        """Освобождает резерв для файлов, удаленных в обход менеджера."""
+        for path in [p for p in list(self._ram_reserved) if not p.exists()]:
+            self._ram_reserved.pop(path, None)
+
+    def _choose_dir(self, size_hint: Optional[int]) -> Path:
+        """
+        Выбирает уровень хранилища для файла заданного размера.
+
+        Args:
+            size_hint: Ожидаемый размер файла в байтах (None - неизвестен)
+
+        Returns:
+            Path: Директория для размещения файла
+        """
+        if self.ram_dir is None or size_hint is None:
+            return self.base_dir
+        if size_hint > self.ram_max_file_size:
+            return self.base_dir
+
+        reserve = size_hint * self.RAM_JOB_FACTOR
+        if self.ram_usage + reserve > self.ram_budget:
+            logger.debug(f"RAM-бюджет исчерпан, файл {size_hint} байт уходит на диск")
+            return self.base_dir
+        return self.ram_dir
+
+    def _create(self, suffix: str, prefix: str, size_hint: Optional[int]) -> Path:
+        """Создает пустой временный файл на подходящем уровне."""
+        target_dir = self._choose_dir(size_hint)
+        try:
+            fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=target_dir)
+        except OSError as e:
+            if target_dir == self.base_dir:
+                raise
+            logger.warning(f"Не удалось создать файл в RAM-директории, используем диск: {e}")
+            target_dir = self.base_dir
+            fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=target_dir)
+        os.close(fd)  # Закрываем дескриптор
+
+        temp_path = Path(path)
+        if target_dir != self.base_dir:
+            self._ram_reserved[temp_path] = size_hint * self.RAM_JOB_FACTOR
+        if self.ram_dir is not None and size_hint is not None:
+            record_ram_staging(hit=target_dir != self.base_dir)
+        return temp_path
+
+    def new_file(self, suffix: str = "", size_hint: Optional[int] = None) -> Path:
+        """
+        Создает пустой временный файл; удаляет его вызывающий (release).
+
+        Args:
+            suffix: Суффикс файла (расширение)
+            size_hint: Ожидаемый размер файла для выбора уровня хранилища
+
+        Returns:
+            Path: Путь к временному файлу
+        """
+        return self._create(suffix, "book_", size_hint)
+
+    def is_in_ram(self, path: Path) -> bool:
+        """Проверяет, размещен ли файл на RAM-уровне."""
+        return self.ram_dir is not None and Path(path).parent == self.ram_dir
+
+    def release(self, path: Path) -> None:
+        """
+        Удаляет временный файл и освобождает его резерв RAM-уровня.
+
+        Args:
+            path: Путь к временному файлу
+        """
+        path = Path(path)
+        self._ram_reserved.pop(path, None)
+        try:
+            path.unlink(missing_ok=True)
+            logger.debug(f"Удален временный файл: {path}")
+        except Exception as e:
+            logger.error(f"Ошибка при удалении файла {path}: {e}")
+
+    def change_suffix(self, path: Path, suffix: str) -> Path:
+        """
+        Меняет расширение временного файла, сохраняя его резерв RAM-уровня.
+
+        Args:
+            path: Путь к временному файлу
+            suffix: Новое расширение (с точкой)
+
+        Returns:
+            Path: Новый путь к файлу
+        """
+        path = Path(path)
+        new_path = path.with_suffix(suffix)
+        path.rename(new_path)
+        if path in self._ram_reserved:
+            self._ram_reserved[new_path] = self._ram_reserved.pop(path)
+        return new_path
+
+    def tier_bytes(self) -> Dict[str, int]:
+        """
+        Объем временных файлов по уровням хранилища.
+
+        Returns:
+            dict: {"disk": байт, "ram": байт}
+        """
+        usage = {"disk": 0, "ram": 0}
+        for tier, directory in (("disk", self.base_dir), ("ram", self.ram_dir)):
+            if directory is None:
+                continue
+            try:
+                for entry in os.scandir(directory):
+                    if entry.is_file(follow_symlinks=False):
+                        usage[tier] += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+        return usage
+
+    def cleanup_expired(self, max_age: float) -> Tuple[int, int]:
+        """
+        Удаляет временные файлы старше max_age секунд на обоих уровнях.
+
+        Затрагиваются только файлы менеджера (префикс book_) и результаты
+        их конвертации, остальные файлы в директориях не трогаются.
+
+        Args:
+            max_age: Максимальный возраст файла в секундах
+
+        Returns:
+            tuple: (количество удаленных файлов, освобождено байт)
+        """
+        deadline = time.time() - max_age
+        removed, freed = 0, 0
+
+        for directory in filter(None, (self.base_dir, self.ram_dir)):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                logger.error(f"Не удалось прочитать директорию {directory}: {e}")
+                continue
+
+            for entry in entries:
+                if not entry.name.startswith("book_") or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime >= deadline:
+                        continue
+                    self.release(Path(entry.path))
+                    removed += 1
+                    freed += stat.st_size
+                except FileNotFoundError:
+                    continue
+
+        if removed:
+            logger.info(f"Удалено устаревших временных файлов: {removed} ({freed // 1024} КБ)")
+        return removed, freed
+
     @asynccontextmanager
     async def temp_file(
-        self, 
+        self,
         suffix: str = "",
-        prefix: str = "book_"
+        prefix: str = "book_",
+        size_hint: Optional[int] = None
     ) -> AsyncGenerator[Path, None]:
         """
         Контекстный менеджер для работы с временным файлом.
-        
+
         Args:
             suffix: Суффикс файла (расширение)
             prefix: Префикс имени файла
-            
+            size_hint: Ожидаемый размер файла для выбора уровня хранилища
+
         Yields:
             Path: Путь к временному файлу
         """
-        # Создаем временный файл
-        fd, path = tempfile.mkstemp(
-            suffix=suffix,
-            prefix=prefix,
-            dir=self.base_dir
-        )
-        os.close(fd)  # Закрываем дескриптор
-        
-        temp_path = Path(path)
-        
+        temp_path = self._create(suffix, prefix, size_hint)
+
         try:
             yield temp_path
         finally:
             # Гарантированно удаляем файл
-            try:
-                if temp_path.exists():
-                    temp_path.unlink()
-                    logger.debug(f"Удален временный файл: {temp_path}")
-            except Exception as e:
-                logger.error(f"Ошибка при удалении файла {temp_path}: {e}")
-                
+            self.release(temp_path)
+
     async def save_file_from_bytes(
         self,
         data: bytes,
@@ -69,23 +258,74 @@ class TempFileManager:
     ) -> Path:
         """
         Сохраняет байты во временный файл.
-        
+
+        Небольшие файлы попадают в RAM-уровень, если он включен и
+        в бюджете есть место; остальные сохраняются на диск.
+
         Args:
             data: Данные файла
             filename: Имя файла для определения расширения
-            
+
         Returns:
             Path: Путь к сохраненному файлу
         """
         suffix = Path(filename).suffix
-        fd, path = tempfile.mkstemp(
-            suffix=suffix,
-            prefix="book_",
-            dir=self.base_dir
-        )
-        os.close(fd)
-        
-        temp_path = Path(path)
-        async with aiofiles.open(temp_path, 'wb') as f:
-            await f.write(data)
+        temp_path = self._create(suffix, "book_", len(data))
+
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                await f.write(data)
+        except OSError as e:
+            if not self.is_in_ram(temp_path):
+                raise
+            # tmpfs переполнен (например, /dev/shm меньше бюджета) - уходим на диск
+            logger.warning(f"Не удалось записать в RAM-директорию, используем диск: {e}")
+            self.release(temp_path)
+            temp_path = self._create(suffix, "book_", None)
+            async with aiofiles.open(temp_path, 'wb') as f:
+                await f.write(data)
+        return temp_path
+
+    async def save_file_from_download(
+        self,
+        download: Callable[[Path], Awaitable[object]],
+        filename: str,
+        size_hint: Optional[int]
+    ) -> Path:
+        """
+        Сохраняет файл, скачивая его сразу на диск (или в RAM-уровень).
+
+        В отличие от save_file_from_bytes, содержимое не собирается в
+        памяти процесса: download пишет поток по частям прямо в файл.
+        При ошибке временный файл удаляется.
+
+        Args:
+            download: Корутина, записывающая файл по переданному пути
+            filename: Имя файла для определения расширения
+            size_hint: Ожидаемый размер файла в байтах
+
+        Returns:
+            Path: Путь к сохраненному файлу
+        """
+        suffix = Path(filename).suffix
+        temp_path = self._create(suffix, "book_", size_hint)
+        try:
+            await download(temp_path)
+            return temp_path
+        except OSError as e:
+            self.release(temp_path)
+            if not self.is_in_ram(temp_path):
+                raise
+            # tmpfs переполнен - скачиваем заново на диск
+            logger.warning(f"Не удалось записать в RAM-директорию, используем диск: {e}")
+        except BaseException:
+            self.release(temp_path)
+            raise
+
+        temp_path = self._create(suffix, "book_", None)
+        try:
+            await download(temp_path)
+        except BaseException:
+            self.release(temp_path)
+            raise
         return temp_path
@@ -0,0 +1,151 @@
+"""
+Постоянные хранилища состояний FSM.
+
+MemoryStorage теряет данные незавершенных конвертаций (file_path,
+current_format) при каждом перезапуске. SQLiteStorage хранит их в файле
+(и позволяет нескольким процессам на одной машине делить состояние),
+для нескольких узлов используется RedisStorage из aiogram.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM на SQLite (WAL) с истечением записей по TTL.
+
+    Запись считается устаревшей, если не изменялась дольше ttl секунд:
+    такие записи не возвращаются и удаляются методом purge_expired(),
+    который вызывает фоновый уборщик временных файлов.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fsm (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_fsm_updated ON fsm(updated_at);
+    """
+
+    def __init__(self, db_path: str, ttl: Optional[float] = None, key_builder: Optional[KeyBuilder] = None):
+        """
+        Args:
+            db_path: Путь к файлу базы данных
+            ttl: Время жизни записи в секундах (None - без ограничения)
+            key_builder: Построитель ключей (по умолчанию с ID бота)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def _min_updated_at(self) -> float:
+        """Граница свежести записей."""
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def _read(self, key: str, column: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM fsm WHERE key = ? AND updated_at >= ?",
+                (key, self._min_updated_at())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, key: str, column: str, value: Optional[str]) -> None:
+        with self._lock:
+            if column == "state":
+                self._conn.execute(
+                    "INSERT INTO fsm (key, state, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                    (key, value, time.time())
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO fsm (key, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (key, value, time.time())
+                )
+            # Пустые записи не храним
+            self._conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL", (key,))
+            self._conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(self._write, self.key_builder.build(key, "state"), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await asyncio.to_thread(self._read, self.key_builder.build(key, "state"), "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        value = json.dumps(data, ensure_ascii=False) if data else None
+        await asyncio.to_thread(self._write, self.key_builder.build(key, "data"), "data", value)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await asyncio.to_thread(self._read, self.key_builder.build(key, "data"), "data")
+        return json.loads(value) if value else {}
+
+    def purge_expired(self) -> int:
+        """
+        Удаляет устаревшие записи.
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        if not self.ttl:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM fsm WHERE updated_at < ?", (self._min_updated_at(),))
+            self._conn.commit()
+        return cursor.rowcount
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_fsm_storage(url: Optional[str], ttl: Optional[float] = None) -> BaseStorage:
+    """
+    Создает хранилище FSM по URL.
+
+    Поддерживаются:
+        memory (или пустое значение) - MemoryStorage
+        sqlite:///path/fsm.db        - SQLiteStorage
+        redis://host:port/db         - RedisStorage из aiogram (нужен пакет redis)
+
+    Args:
+        url: URL хранилища
+        ttl: Время жизни записей в секундах
+
+    Returns:
+        BaseStorage: Хранилище состояний
+    """
+    if not url or url == "memory":
+        return MemoryStorage()
+    if url.startswith("sqlite:///"):
+        return SQLiteStorage(url[len("sqlite:///"):], ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        from aiogram.fsm.storage.redis import RedisStorage
+        ttl_seconds = int(ttl) if ttl else None
+        return RedisStorage.from_url(url, state_ttl=ttl_seconds, data_ttl=ttl_seconds)
+    raise ValueError(f"Неподдерживаемый URL хранилища FSM: {url}")
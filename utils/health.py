@@ -0,0 +1,206 @@
+"""
+Состояние бота для проверок liveness/readiness.
+
+Все дорогие проверки выполняются в фоне: доступность calibre - один раз
+при старте, свободное место и глубина очереди - раз в несколько секунд
+в потоке. Эндпоинт читает только закешированные значения, поэтому ответ
+не порождает процессов и не обращается к диску.
+"""
+import asyncio
+import logging
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, TelegramMethod
+
+from utils.metrics import LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Фоновый сбор показателей здоровья процесса.
+
+    Показатели:
+        - доступность calibre (ebook-convert --version при старте);
+        - задержка event loop (насколько позже ожидаемого просыпается таймер);
+        - глубина очереди конвертаций;
+        - свободное место во временной директории;
+        - время с последнего успешного getUpdates или обновления вебхука.
+    """
+
+    def __init__(
+        self,
+        temp_dir: str,
+        queue_depth: Optional[Callable[[], int]] = None,
+        calibre_cmd: str = "ebook-convert",
+        max_loop_lag: float = 1.0,
+        min_free_bytes: int = 500 * 1_048_576,
+        max_update_age: Optional[float] = 120,
+        lag_interval: float = 0.5,
+        refresh_interval: float = 5
+    ):
+        """
+        Args:
+            temp_dir: Временная директория, свободное место которой проверяется
+            queue_depth: Функция глубины очереди конвертаций (может обращаться к БД)
+            calibre_cmd: Исполняемый файл calibre для проверки при старте
+            max_loop_lag: Допустимая задержка event loop в секундах
+            min_free_bytes: Минимум свободного места во временной директории
+            max_update_age: Допустимое время без успешного получения обновлений
+                (None - не проверять, например в режиме вебхука)
+            lag_interval: Период замера задержки event loop
+            refresh_interval: Период обновления свободного места и глубины очереди
+        """
+        self.temp_dir = temp_dir
+        self.queue_depth_func = queue_depth
+        self.calibre_cmd = calibre_cmd
+        self.max_loop_lag = max_loop_lag
+        self.min_free_bytes = min_free_bytes
+        self.max_update_age = max_update_age
+        self.lag_interval = lag_interval
+        self.refresh_interval = refresh_interval
+
+        self.started_at = time.monotonic()
+        self.calibre_version: Optional[str] = None
+        self.calibre_checked = False
+        self.loop_lag = 0.0
+        self.queue_depth = 0
+        self.free_bytes: Optional[int] = None
+        self.last_update: Optional[float] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def mark_update(self) -> None:
+        """Отмечает успешное получение обновлений (getUpdates или вебхук)."""
+        self.last_update = time.monotonic()
+
+    async def start(self) -> None:
+        """Запускает фоновые проверки."""
+        self.started_at = time.monotonic()
+        self._tasks = [
+            asyncio.create_task(self._probe_calibre()),
+            asyncio.create_task(self._measure_lag()),
+            asyncio.create_task(self._refresh()),
+        ]
+
+    async def stop(self) -> None:
+        """Останавливает фоновые проверки."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _probe_calibre(self) -> None:
+        """Проверяет calibre один раз, не блокируя старт бота."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.calibre_cmd, "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+            if process.returncode == 0:
+                self.calibre_version = stdout.decode(errors="replace").strip().splitlines()[0]
+                logger.info(f"Calibre доступен: {self.calibre_version}")
+            else:
+                logger.error(f"{self.calibre_cmd} --version завершился с кодом {process.returncode}")
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.error(f"Calibre недоступен: {e}")
+        finally:
+            self.calibre_checked = True
+
+    async def _measure_lag(self) -> None:
+        """Замеряет, насколько позже ожидаемого просыпается event loop."""
+        loop = asyncio.get_running_loop()
+        lag_gauge = LOOP_LAG.labels()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, loop.time() - expected)
+            lag_gauge.set(self.loop_lag)
+
+    async def _refresh(self) -> None:
+        """Обновляет показатели, требующие обращения к диску или БД."""
+        while True:
+            try:
+                usage = await asyncio.to_thread(shutil.disk_usage, self.temp_dir)
+                self.free_bytes = usage.free
+            except OSError as e:
+                logger.warning(f"Не удалось получить свободное место в {self.temp_dir}: {e}")
+                self.free_bytes = None
+            if self.queue_depth_func is not None:
+                try:
+                    self.queue_depth = await asyncio.to_thread(self.queue_depth_func)
+                except Exception as e:
+                    logger.warning(f"Не удалось получить глубину очереди: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def update_age(self) -> Optional[float]:
+        """Секунд с последнего успешного получения обновлений."""
+        if self.last_update is None:
+            return None
+        return time.monotonic() - self.last_update
+
+    def live(self) -> bool:
+        """Процесс жив: event loop не завис."""
+        return self.loop_lag <= self.max_loop_lag * 10
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Отчет о состоянии из закешированных значений.
+
+        Returns:
+            dict: Показатели и список причин неготовности в "problems"
+        """
+        problems = []
+        if not self.calibre_checked:
+            problems.append("calibre: проверка не завершена")
+        elif self.calibre_version is None:
+            problems.append("calibre: недоступен")
+        if self.loop_lag > self.max_loop_lag:
+            problems.append(f"event loop: задержка {self.loop_lag:.3f} с")
+        if self.free_bytes is not None and self.free_bytes < self.min_free_bytes:
+            problems.append(f"temp: свободно {self.free_bytes // 1_048_576} МБ")
+
+        update_age = self.update_age()
+        if self.max_update_age is not None:
+            # До первого getUpdates отсчитываем от старта
+            age = update_age if update_age is not None else time.monotonic() - self.started_at
+            if age > self.max_update_age:
+                problems.append(f"updates: нет ответа getUpdates {age:.0f} с")
+
+        return {
+            "ready": not problems,
+            "problems": problems,
+            "calibre": self.calibre_version,
+            "loop_lag_seconds": round(self.loop_lag, 6),
+            "queue_depth": self.queue_depth,
+            "temp_free_bytes": self.free_bytes,
+            "last_update_seconds_ago": round(update_age, 3) if update_age is not None else None,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+        }
+
+
+class UpdatePollObserver(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: отмечает успешные вызовы getUpdates.
+
+    Подключается как bot.session.middleware(UpdatePollObserver(health)).
+    """
+
+    def __init__(self, health: HealthMonitor):
+        self.health = health
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod,
+    ):
+        result = await make_request(bot, method)
+        if isinstance(method, GetUpdates):
+            self.health.mark_update()
+        return result
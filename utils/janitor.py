@@ -0,0 +1,67 @@
+"""
+Фоновый уборщик временных файлов и связанных с ними данных.
+
+Временные файлы, состояния FSM и завершенные задачи очереди живут
+одинаковое время (TEMP_FILE_TTL): состояние пользователя никогда не
+ссылается на уже удаленный файл дольше одного цикла уборки.
+"""
+import asyncio
+import logging
+
+from utils.file_manager import TempFileManager
+
+logger = logging.getLogger(__name__)
+
+
+async def cleanup_once(
+    file_manager: TempFileManager,
+    ttl: float,
+    storage=None,
+    job_queue=None
+) -> None:
+    """
+    Выполняет один цикл уборки.
+
+    Args:
+        file_manager: Менеджер временных файлов
+        ttl: Время жизни в секундах
+        storage: Хранилище FSM (если поддерживает purge_expired)
+        job_queue: Очередь задач (завершенные задачи удаляются)
+    """
+    await asyncio.to_thread(file_manager.cleanup_expired, ttl)
+
+    purge_expired = getattr(storage, "purge_expired", None)
+    if purge_expired is not None:
+        purged = await asyncio.to_thread(purge_expired)
+        if purged:
+            logger.info(f"Удалено устаревших состояний FSM: {purged}")
+
+    if job_queue is not None:
+        purged = await asyncio.to_thread(job_queue.purge, ttl)
+        if purged:
+            logger.info(f"Удалено завершенных задач очереди: {purged}")
+
+
+async def run_janitor(
+    file_manager: TempFileManager,
+    ttl: float,
+    interval: float = 600,
+    storage=None,
+    job_queue=None
+) -> None:
+    """
+    Периодически запускает уборку до отмены задачи.
+
+    Args:
+        file_manager: Менеджер временных файлов
+        ttl: Время жизни в секундах
+        interval: Интервал между циклами в секундах
+        storage: Хранилище FSM
+        job_queue: Очередь задач
+    """
+    while True:
+        try:
+            await cleanup_once(file_manager, ttl, storage=storage, job_queue=job_queue)
+        except Exception as e:
+            logger.error(f"Ошибка уборки временных файлов: {e}")
+        await asyncio.sleep(interval)
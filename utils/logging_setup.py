@@ -0,0 +1,148 @@
+"""
+Настройка логирования без дискового ввода-вывода в event loop.
+
+Все логгеры пишут в QueueHandler: в вызывающем потоке запись только
+форматируется и кладется в очередь. Файл и консоль обслуживает
+QueueListener в отдельном потоке. Файл ротируется по размеру или по
+времени; записи можно писать в JSON (по объекту на строку).
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как JSON-объект в одну строку."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, сохраняющий текст исключения отдельно от сообщения."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare вклеивает traceback в msg и очищает exc_text:
+        # JsonFormatter не увидел бы исключения и записал его в message
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # exc_info держит кадры стека - в очередь уходит только текст
+        record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: Optional[str] = None,
+    json_format: bool = False,
+    max_bytes: int = 10 * 1_048_576,
+    backup_count: int = 5,
+    rotate_when: Optional[str] = None,
+    console: bool = True
+) -> logging.handlers.QueueListener:
+    """
+    Направляет логирование через очередь и фоновый поток.
+
+    Args:
+        level: Уровень корневого логгера
+        log_file: Файл лога (None - без файла)
+        json_format: Писать записи в JSON
+        max_bytes: Размер файла для ротации (0 - без ротации по размеру)
+        backup_count: Количество хранимых старых файлов
+        rotate_when: Ротация по времени вместо размера ("midnight", "H", "D", ...)
+        console: Дублировать записи в stderr
+
+    Returns:
+        QueueListener: Запущенный слушатель (останавливается stop_logging())
+    """
+    handlers: List[logging.Handler] = []
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        if rotate_when:
+            handlers.append(logging.handlers.TimedRotatingFileHandler(
+                log_file, when=rotate_when, backupCount=backup_count, encoding="utf-8"
+            ))
+        else:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            ))
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(DEFAULT_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return start_queue_logging(handlers, level)
+
+
+def start_queue_logging(handlers: List[logging.Handler], level: str = "INFO") -> logging.handlers.QueueListener:
+    """
+    Подключает к корневому логгеру QueueHandler, а handlers - к фоновому слушателю.
+
+    Прежние обработчики корневого логгера закрываются.
+
+    Args:
+        handlers: Обработчики, выполняемые в фоновом потоке
+        level: Уровень корневого логгера
+    """
+    global _listener
+    stop_logging()
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописывает очередь записей и останавливает фоновый поток."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(handler)
+
+
+atexit.register(stop_logging)
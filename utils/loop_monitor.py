@@ -0,0 +1,97 @@
+"""
+Обнаружение блокировок event loop.
+
+Задача в цикле событий регулярно отмечает "пульс", а отдельный поток
+проверяет его давность. Если цикл не отвечает дольше порога, поток
+снимает стек потока цикла через sys._current_frames() - в логе видно,
+какой синхронный вызов (libmagic, stat(), запись лога) держит цикл
+прямо сейчас, а не после того, как он отпустил.
+
+Дополнительно выставляется loop.slow_callback_duration: при
+PYTHONASYNCIODEBUG=1 asyncio сам логирует медленные callback-и
+(режим отладки заметно дороже, в продакшене его лучше не включать).
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from typing import Optional
+
+from utils.metrics import LOOP_STALLS
+from utils.profiler import format_stack
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """Сторожевой поток, логирующий стек заблокированного event loop."""
+
+    def __init__(self, threshold: float = 0.5, beat_interval: float = 0.1, min_report_interval: float = 10):
+        """
+        Args:
+            threshold: Через сколько секунд без пульса цикл считается заблокированным
+            beat_interval: Период пульса
+            min_report_interval: Минимальный интервал между стеками в логе
+        """
+        self.threshold = threshold
+        self.beat_interval = beat_interval
+        self.min_report_interval = min_report_interval
+        self.stalls = 0
+
+        self._last_beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._beat_task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запускает пульс в текущем цикле и сторожевой поток."""
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = self.threshold
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._beat_task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Останавливает пульс и сторожевой поток."""
+        self._stop.set()
+        if self._beat_task is not None:
+            self._beat_task.cancel()
+            try:
+                await self._beat_task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 5)
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.beat_interval)
+
+    def _watch(self) -> None:
+        stalled_since_beat = None
+        last_report = 0.0
+        stall_counter = LOOP_STALLS.labels()
+        while not self._stop.wait(self.beat_interval):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat - self.beat_interval
+            if blocked_for < self.threshold or stalled_since_beat == beat:
+                continue
+
+            # Одна блокировка (один пропущенный пульс) учитывается один раз
+            stalled_since_beat = beat
+            self.stalls += 1
+            stall_counter.inc()
+
+            now = time.monotonic()
+            if now - last_report < self.min_report_interval:
+                continue
+            last_report = now
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "\n".join(f"  {label}" for label in format_stack(frame)) or "  <стек недоступен>"
+            logger.warning(f"Event loop заблокирован {blocked_for:.2f} с, стек потока цикла:\n{stack}")
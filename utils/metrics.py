@@ -0,0 +1,347 @@
+"""
+Метрики в формате Prometheus.
+
+Метрики создаются один раз при импорте модуля. На горячем пути код
+получает дочернюю метрику через labels(...) и вызывает inc()/observe():
+дочерние метрики кешируются, гистограммы хранят заранее выделенные
+счетчики по корзинам, поэтому повторное наблюдение не создает новых
+метрик и корзин. Сам вызов labels(...) не бесплатен: строится кортеж
+значений меток (и нормализуются форматы в observe_stage), поэтому в
+циклах дочернюю метрику стоит сохранить.
+Значения, которые дешевле посчитать при чтении (глубина очередей,
+объем временных файлов), задаются функциями через set_function().
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Корзины длительностей (секунды): от быстрых API-вызовов до 30-минутных конвертаций
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Границы корзин размера файла (байты) и их метки
+SIZE_BUCKETS = (1_048_576, 5 * 1_048_576, 20 * 1_048_576, 50 * 1_048_576)
+SIZE_LABELS = ("lt1mb", "1-5mb", "5-20mb", "20-50mb", "gt50mb")
+
+# Форматы, допустимые как значения меток (прочие расширения -> "other")
+KNOWN_FORMATS = frozenset({
+    "pdf", "epub", "fb2", "txt", "html", "htm", "mobi", "azw3", "docx", "rtf", "odt", "zip", "-"
+})
+
+
+def format_label(fmt: str) -> str:
+    """Нормализует формат для метки, ограничивая число возможных значений."""
+    fmt = fmt.lower().lstrip(".")
+    return fmt if fmt in KNOWN_FORMATS else "other"
+
+
+def size_bucket(size_bytes: int) -> str:
+    """Возвращает метку корзины размера файла."""
+    return SIZE_LABELS[bisect.bisect_right(SIZE_BUCKETS, size_bytes)]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Базовый класс метрики с метками."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Возвращает дочернюю метрику для набора значений меток.
+
+        Результат стоит сохранить, если метрика обновляется в цикле.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидается {len(self.labelnames)} меток")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """Увеличивает счетчик без меток."""
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Значение будет вычисляться функцией при чтении метрик."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception as e:
+                logger.warning(f"Ошибка вычисления метрики: {e}")
+                return float("nan")
+        return self.value
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        """Увеличивает значение на время выполнения блока."""
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+
+class Gauge(_Metric):
+    """Значение, которое может расти и уменьшаться."""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Замеряет длительность блока."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        bounds = self.upper_bounds + (float("inf"),)
+        for bound, count in zip(bounds, list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик, отдаваемых эндпоинтом /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Текст метрик в формате Prometheus exposition 0.0.4."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Этапы обработки файла: download, validation, queue_wait, optimize, conversion, images, size_target, repack, upload
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "bookbot_stage_duration_seconds",
+    "Длительность этапа обработки файла",
+    ("stage", "src", "dst", "size")
+))
+STAGE_TOTAL = REGISTRY.register(Counter(
+    "bookbot_stage_total",
+    "Количество выполненных этапов обработки по результату",
+    ("stage", "src", "dst", "size", "outcome")
+))
+RAM_STAGING = REGISTRY.register(Counter(
+    "bookbot_ram_staging_total",
+    "Временные файлы с известным размером: в RAM-уровне (hit) или на диске (miss)",
+    ("result",)
+))
+POSTPROCESS_SAVED_BYTES = REGISTRY.register(Counter(
+    "bookbot_postprocess_saved_bytes_total",
+    "Байт сэкономлено постобработкой результатов конвертации",
+    ("step",)
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bookbot_queue_depth",
+    "Количество элементов, ожидающих в очереди",
+    ("queue",)
+))
+ACTIVE_CHILDREN = REGISTRY.register(Gauge(
+    "bookbot_active_child_processes",
+    "Количество запущенных дочерних процессов",
+    ("tool",)
+))
+TEMP_DIR_BYTES = REGISTRY.register(Gauge(
+    "bookbot_temp_dir_bytes",
+    "Объем временных файлов по уровням хранилища",
+    ("tier",)
+))
+CHILD_CPU_SECONDS = REGISTRY.register(Histogram(
+    "bookbot_child_cpu_seconds",
+    "Процессорное время (user+sys) дочернего процесса",
+    ("tool", "src", "dst", "size")
+))
+CHILD_MAX_RSS_BYTES = REGISTRY.register(Histogram(
+    "bookbot_child_max_rss_bytes",
+    "Пиковый RSS дочернего процесса",
+    ("tool", "src", "dst", "size"),
+    buckets=tuple(mb * 1_048_576 for mb in (32, 64, 128, 256, 512, 768, 1024, 1536, 2048, 4096))
+))
+CHILD_BLOCK_IO_BYTES = REGISTRY.register(Counter(
+    "bookbot_child_block_io_bytes_total",
+    "Блочный ввод-вывод дочерних процессов",
+    ("tool", "direction")
+))
+LOOP_LAG = REGISTRY.register(Gauge(
+    "bookbot_event_loop_lag_seconds",
+    "Задержка event loop при последнем замере"
+))
+LOOP_STALLS = REGISTRY.register(Counter(
+    "bookbot_event_loop_stalls_total",
+    "Блокировки event loop дольше порога LOOP_STALL_THRESHOLD"
+))
+
+
+def observe_stage(
+    stage: str,
+    src: str,
+    dst: str,
+    size_bytes: int,
+    seconds: float,
+    ok: bool = True
+) -> None:
+    """
+    Записывает длительность и результат этапа обработки.
+
+    Вызывается один раз на этап файла: метки нормализуются при каждом
+    вызове, дочерние метрики берутся из кеша labels().
+
+    Args:
+        stage: Этап (download, validation, queue_wait, optimize, conversion, upload)
+        src: Исходный формат
+        dst: Целевой формат ("-", если еще не выбран)
+        size_bytes: Размер входного файла
+        seconds: Длительность этапа
+        ok: Успешно ли завершился этап
+    """
+    src, dst, size = format_label(src), format_label(dst), size_bucket(size_bytes)
+    STAGE_SECONDS.labels(stage, src, dst, size).observe(seconds)
+    STAGE_TOTAL.labels(stage, src, dst, size, "ok" if ok else "error").inc()
+
+
+def record_ram_staging(hit: bool) -> None:
+    """Учитывает, попал ли временный файл в RAM-уровень или ушел на диск."""
+    RAM_STAGING.labels("hit" if hit else "miss").inc()
@@ -0,0 +1,134 @@
+"""
+Сэмплирующий профилировщик работающего процесса.
+
+Фоновый поток с заданной частотой снимает стеки всех потоков через
+sys._current_frames() и считает одинаковые стеки. Результат пишется
+в формате collapsed stacks ("поток;функция;функция N"), который
+понимают flamegraph.pl, speedscope и inferno.
+
+Профилировщик не устанавливает trace/profile-хуков, поэтому профилируемый
+код не замедляется; стоимость - один проход по стекам на сэмпл.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ограничения, чтобы команду можно было безопасно вызывать в продакшене
+MAX_DURATION = 120  # секунд
+DEFAULT_INTERVAL = 0.01  # 100 сэмплов в секунду
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # Точка с запятой - разделитель кадров в collapsed-формате
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def format_stack(frame: Optional[FrameType]) -> List[str]:
+    """
+    Стек кадра от внешнего вызова к внутреннему.
+
+    Args:
+        frame: Самый внутренний кадр (например, из sys._current_frames())
+    """
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """Сбор стеков всех потоков процесса за заданное время."""
+
+    def __init__(self, output_dir: str, interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            output_dir: Директория файлов профилей
+            interval: Период снятия стеков в секундах
+        """
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Идет ли сейчас профилирование."""
+        return self._lock.locked()
+
+    def sample(self, duration: float) -> Tuple[Counter, int]:
+        """
+        Снимает стеки в течение duration секунд (блокирует вызывающий поток).
+
+        Returns:
+            tuple: (Counter collapsed-стеков, количество сэмплов)
+        """
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = format_stack(frame)
+                stack.insert(0, names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(stack)] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def run(self, duration: float) -> Tuple[Path, Counter, int]:
+        """
+        Профилирует процесс и сохраняет collapsed-стеки в файл.
+
+        Args:
+            duration: Длительность в секундах (не больше MAX_DURATION)
+
+        Returns:
+            tuple: (путь к файлу, Counter стеков, количество сэмплов)
+
+        Raises:
+            RuntimeError: Если профилирование уже выполняется
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Профилирование уже выполняется")
+        try:
+            duration = max(0.1, min(duration, MAX_DURATION))
+            logger.info(f"Профилирование: {duration:g} с, интервал {self.interval * 1000:g} мс")
+            stacks, samples = self.sample(duration)
+
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path = self.output_dir / time.strftime(f"profile-%Y%m%d-%H%M%S-{os.getpid()}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            logger.info(f"Профиль сохранен: {path} ({samples} сэмплов)")
+            return path, stacks, samples
+        finally:
+            self._lock.release()
+
+
+def top_functions(stacks: Counter, limit: int = 10) -> List[Tuple[str, int]]:
+    """
+    Самые частые верхние кадры (где процесс проводил время).
+
+    Args:
+        stacks: Counter collapsed-стеков из SamplingProfiler
+        limit: Количество строк
+    """
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(limit)
@@ -0,0 +1,394 @@
+"""
+Планировщик исходящих запросов к Telegram Bot API.
+
+Все запросы, адресованные чату (сообщения, правки, документы), проходят
+через общую очередь с приоритетами и token bucket-ами: глобальным и
+отдельным для каждого чата. Ответ 429 (retry_after) не теряет запрос:
+чат блокируется на указанное время, а запрос возвращается в очередь.
+Несколько правок одного сообщения, ожидающих отправки, схлопываются
+в одну - уходит только последняя, с ее собственным приоритетом. Правки одного сообщения не отправляются
+параллельно, а правка, получившая 429 после появления более новой, не
+повторяется: устаревший прогресс не затирает итоговое сообщение. Запрос,
+все вызывающие которого отменены, не отправляется.
+
+Подключается как middleware сессии: bot.session.middleware(OutgoingScheduler()).
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Приоритеты исходящих запросов (меньше - важнее)."""
+
+    DELIVERY = 0   # Отправка результата конвертации
+    ERROR = 1      # Сообщения об ошибках
+    NORMAL = 2     # Обычные ответы и служебные сообщения
+    PROGRESS = 3   # Обновления прогресса
+
+
+# Приоритет по умолчанию для методов API
+METHOD_PRIORITIES = {
+    "SendDocument": Priority.DELIVERY,
+    "EditMessageText": Priority.PROGRESS,
+}
+
+# Явно заданный приоритет для запросов из текущего контекста
+_priority_override: ContextVar[Optional[Priority]] = ContextVar("send_priority", default=None)
+
+
+@contextmanager
+def send_priority(priority: Priority) -> Iterator[None]:
+    """
+    Задает приоритет запросов, отправляемых внутри блока.
+
+    Пример:
+        with send_priority(Priority.ERROR):
+            await callback.message.edit_text(error_message)
+    """
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+class TokenBucket:
+    """Token bucket с возможностью блокировки до заданного момента."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Пополнение токенов в секунду
+            capacity: Максимум накопленных токенов (размер всплеска)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available_at(self, now: float) -> float:
+        """Момент, когда будет доступен токен."""
+        self._refill(now)
+        ready = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(ready, self.blocked_until)
+
+    def take(self, now: float) -> None:
+        """Забирает токен (вызывать после available_at(now) <= now)."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float) -> None:
+        """Блокирует bucket на заданное время (ответ 429)."""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+
+    def idle(self, now: float) -> bool:
+        """Bucket полон и не заблокирован - его можно удалить."""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Request:
+    """Запрос, ожидающий отправки."""
+
+    __slots__ = ("priority", "seq", "newest", "chat_id", "coalesce_key", "make_request",
+                 "bot", "method", "waiters", "attempts", "enqueued_at")
+
+    def __init__(self, priority, seq, chat_id, coalesce_key, make_request, bot, method):
+        self.priority = priority
+        self.seq = seq
+        # Номер самого нового вызова, схлопнутого в этот запрос
+        self.newest = seq
+        self.chat_id = chat_id
+        self.coalesce_key = coalesce_key
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.waiters: List[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def order(self) -> Tuple[int, int]:
+        return self.priority, self.seq
+
+    def resolve(self, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if exception is not None:
+                waiter.set_exception(exception)
+            else:
+                waiter.set_result(result)
+
+
+class OutgoingScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: приоритетная очередь исходящих запросов.
+
+    Запросы без chat_id (getUpdates, getFile, answerCallbackQuery и т.п.)
+    проходят напрямую, остальные ставятся в очередь.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 25,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        max_retries: int = 5
+    ):
+        """
+        Args:
+            global_rate: Запросов в секунду на весь бот
+            chat_rate: Запросов в секунду на один чат
+            chat_burst: Допустимый всплеск запросов в один чат
+            max_retries: Максимум повторов после ответа 429
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._pending: List[_Request] = []
+        self._pending_keys: List[Tuple[int, int]] = []
+        self._by_key: Dict[Tuple[Any, int], _Request] = {}
+        # Номер последней правки сообщения и правки, отправляемые сейчас
+        self._newest: Dict[Tuple[Any, int], int] = {}
+        self._in_flight: Dict[Tuple[Any, int], int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._last_prune = time.monotonic()
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих отправки."""
+        return len(self._pending)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod,
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = _priority_override.get()
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(type(method).__name__, Priority.NORMAL)
+
+        coalesce_key = None
+        message_id = getattr(method, "message_id", None)
+        if type(method).__name__ == "EditMessageText" and message_id is not None:
+            coalesce_key = (chat_id, message_id)
+
+        request = _Request(priority, next(self._seq), chat_id, coalesce_key, make_request, bot, method)
+        if coalesce_key is not None:
+            self._newest[coalesce_key] = request.seq
+        waiter = request.waiters[0]
+        self._enqueue(request)
+        self._ensure_runner()
+        return await waiter
+
+    def _ensure_runner(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _insert(self, request: _Request) -> None:
+        index = bisect.bisect(self._pending_keys, request.order)
+        self._pending_keys.insert(index, request.order)
+        self._pending.insert(index, request)
+
+    def _remove(self, request: _Request) -> None:
+        index = bisect.bisect_left(self._pending_keys, request.order)
+        del self._pending_keys[index]
+        del self._pending[index]
+        if request.coalesce_key is not None and self._by_key.get(request.coalesce_key) is request:
+            del self._by_key[request.coalesce_key]
+
+    def _enqueue(self, request: _Request) -> None:
+        """
+        Ставит запрос в очередь, схлопывая правки одного сообщения.
+
+        Уходит текст самой новой правки и с ее приоритетом: прогресс,
+        пришедший после обычной правки, не получает ее приоритета. Устаревший
+        прогресс после итоговой правки не появляется - обработчики отменяют
+        его заранее (handlers.callbacks.cancel_progress).
+        """
+        existing = self._by_key.get(request.coalesce_key) if request.coalesce_key else None
+        if existing is None:
+            self._insert(request)
+            if request.coalesce_key is not None:
+                self._by_key[request.coalesce_key] = request
+            return
+
+        # Выживает более новая правка
+        if request.newest >= existing.newest:
+            survivor, superseded = request, existing
+        else:
+            survivor, superseded = existing, request
+
+        self._remove(existing)
+        survivor.waiters.extend(superseded.waiters)
+        # Схлопнутый запрос сохраняет место в очереди старого, приоритет - свой
+        survivor.seq = min(survivor.seq, superseded.seq)
+        self._insert(survivor)
+        self._by_key[survivor.coalesce_key] = survivor
+        logger.debug(f"Правка сообщения {survivor.coalesce_key} схлопнута")
+
+    def _forget(self, coalesce_key) -> None:
+        """Забывает номер последней правки, когда по сообщению ничего не ждет и не отправляется."""
+        if coalesce_key is not None and coalesce_key not in self._by_key and coalesce_key not in self._in_flight:
+            self._newest.pop(coalesce_key, None)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[_Request], Optional[float]]:
+        """
+        Выбирает самый приоритетный запрос, готовый к отправке.
+
+        Returns:
+            tuple: (запрос или None, через сколько секунд проверить снова;
+                None - ждать завершения отправляемой правки)
+        """
+        global_ready = self.global_bucket.available_at(now)
+        if global_ready > now:
+            return None, global_ready - now
+
+        earliest = float("inf")
+        for request in self._pending:
+            # Правки одного сообщения уходят по одной: иначе Telegram может применить их не по порядку
+            if request.coalesce_key in self._in_flight:
+                continue
+            ready = self._chat_bucket(request.chat_id).available_at(now)
+            if ready <= now:
+                return request, 0.0
+            earliest = min(earliest, ready)
+        return None, earliest - now if earliest != float("inf") else None
+
+    async def _run(self) -> None:
+        """Цикл отправки запросов из очереди."""
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            request, wait = self._pick(now)
+            if request is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._remove(request)
+            if all(waiter.done() for waiter in request.waiters):
+                # Все вызывающие отменены (прогресс перед итоговой правкой) - не отправляем
+                self._forget(request.coalesce_key)
+                continue
+            self.global_bucket.take(now)
+            self._chat_bucket(request.chat_id).take(now)
+            if request.coalesce_key is not None:
+                self._in_flight[request.coalesce_key] = self._in_flight.get(request.coalesce_key, 0) + 1
+            task = asyncio.create_task(self._execute(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self._prune_buckets(now)
+
+    async def _execute(self, request: _Request) -> None:
+        """Выполняет запрос; при 429 возвращает его в очередь, если он не устарел."""
+        request.attempts += 1
+        key = request.coalesce_key
+        try:
+            result = await request.make_request(request.bot, request.method)
+        except TelegramRetryAfter as e:
+            now = time.monotonic()
+            self._chat_bucket(request.chat_id).block(e.retry_after, now)
+            if request.attempts > self.max_retries:
+                request.resolve(exception=e)
+                return
+            if key is not None and self._newest.get(key, request.newest) > request.newest:
+                # Пока запрос ждал ответа, пришла более новая правка того же сообщения:
+                # повтор затер бы ее устаревшим текстом
+                newer = self._by_key.get(key)
+                if newer is not None:
+                    newer.waiters.extend(request.waiters)
+                else:
+                    request.resolve(exception=e)
+                logger.debug(f"Устаревшая правка сообщения {key} не повторяется")
+                return
+            logger.warning(
+                f"Flood control в чате {request.chat_id}: повтор через {e.retry_after} с "
+                f"({type(request.method).__name__}, попытка {request.attempts})"
+            )
+            self._enqueue(request)
+            self._wakeup.set()
+        except Exception as e:
+            request.resolve(exception=e)
+        else:
+            request.resolve(result)
+        finally:
+            if key is not None:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+                self._forget(key)
+                # Следующая правка сообщения могла ждать окончания этой
+                self._wakeup.set()
+
+    def _prune_buckets(self, now: float) -> None:
+        """Периодически удаляет bucket-ы неактивных чатов."""
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        active = {request.chat_id for request in self._pending}
+        for chat_id in [c for c, b in self._chat_buckets.items() if c not in active and b.idle(now)]:
+            del self._chat_buckets[chat_id]
+
+    async def close(self) -> None:
+        """Останавливает цикл отправки; ожидающие отправки вызовы получают ошибку."""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        error = RuntimeError("Очередь исходящих запросов остановлена")
+        for request in self._pending:
+            request.resolve(exception=error)
+        self._pending.clear()
+        self._pending_keys.clear()
+        self._by_key.clear()
+        for key in list(self._newest):
+            self._forget(key)
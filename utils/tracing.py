@@ -0,0 +1,278 @@
+"""
+Трассировка обработки файлов.
+
+Одна трасса на задачу: создается в handle_document, ее контекст
+(trace_id и span_id корневого спана) сохраняется в состоянии FSM и
+продолжается в handle_conversion. Текущая трасса хранится в contextvar,
+поэтому спаны этапов (скачивание, проверка, очередь, gs, ebook-convert,
+отправка) создаются вызовом span(...) без передачи объектов через
+аргументы.
+
+Трассы сэмплируются при создании: для несэмплированной задачи span(...)
+ничего не записывает. Завершенные трассы пишутся фоновым потоком в файлы
+OTLP/JSON (по строке на трассу), которые можно загрузить в коллектор
+OpenTelemetry (filelog receiver) или разобрать напрямую.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "bookbot"
+
+# Коды статуса спана OTLP
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """Интервал выполнения этапа."""
+
+    __slots__ = ("name", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, parent_span_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = STATUS_UNSET
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: bool = False) -> None:
+        if not self.end_ns:
+            self.end_ns = time.time_ns()
+            if self.status == STATUS_UNSET:
+                self.status = STATUS_ERROR if error else STATUS_OK
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class Trace:
+    """Часть трассы, записанная в одном обработчике."""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None,
+                 parent_span_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.root = self._start_span(name, parent_span_id, attributes or {})
+        self._stack: List[Span] = [self.root]
+
+    def _start_span(self, name: str, parent_span_id: Optional[str], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, parent_span_id, attributes)
+        self.spans.append(span)
+        return span
+
+    @property
+    def current(self) -> Span:
+        return self._stack[-1]
+
+    def context(self) -> Dict[str, str]:
+        """Контекст для продолжения трассы в другом обработчике или процессе."""
+        return {"trace_id": self.trace_id, "span_id": self.root.span_id}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Трасса в формате OTLP/JSON (ExportTraceServiceRequest)."""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp(self.trace_id) for span in self.spans],
+                }],
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class OTLPFileExporter:
+    """Запись завершенных трасс в файлы OTLP/JSON фоновым потоком."""
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Директория файлов трасс (traces-ГГГГММДД.jsonl)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+        self._writer.start()
+
+    def export(self, trace: Trace) -> None:
+        """Ставит трассу в очередь на запись (не блокирует)."""
+        self._queue.put(trace)
+
+    def _write_loop(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            path = self.directory / time.strftime("traces-%Y%m%d.jsonl")
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_otlp(), ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.error(f"Не удалось записать трассу {trace.trace_id}: {e}")
+
+    def close(self) -> None:
+        """Дописывает очередь и останавливает поток."""
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+
+_exporter: Optional[OTLPFileExporter] = None
+_sample_rate = 0.0
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def configure_tracing(directory: str, sample_rate: float) -> None:
+    """
+    Включает трассировку.
+
+    Args:
+        directory: Директория файлов трасс
+        sample_rate: Доля трассируемых задач (0 - выключено, 1 - все)
+    """
+    global _exporter, _sample_rate
+    _sample_rate = sample_rate
+    if sample_rate > 0 and _exporter is None:
+        _exporter = OTLPFileExporter(directory)
+        logger.info(f"Трассировка включена: {directory} (доля {sample_rate:g})")
+
+
+def shutdown_tracing() -> None:
+    """Дописывает трассы и останавливает экспорт."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def start_trace(name: str, **attributes: Any) -> Optional[Trace]:
+    """
+    Начинает новую трассу, если задача попала в выборку.
+
+    Returns:
+        Trace или None, если задача не трассируется
+    """
+    if _exporter is None or random.random() >= _sample_rate:
+        return None
+    trace = Trace(name, attributes=attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def resume_trace(context: Optional[Dict[str, str]], name: str, **attributes: Any) -> Optional[Trace]:
+    """
+    Продолжает трассу по контексту, сохраненному через Trace.context().
+
+    Решение о сэмплировании уже принято: без контекста трасса не создается.
+    """
+    if _exporter is None or not context:
+        return None
+    trace = Trace(name, context["trace_id"], context["span_id"], attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Optional[Trace], error: bool = False) -> None:
+    """Завершает корневой спан и отправляет трассу на экспорт."""
+    if trace is None:
+        return
+    trace.root.end(error)
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    if _exporter is not None:
+        _exporter.export(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    """Трасса текущей задачи (None, если задача не трассируется)."""
+    return _current_trace.get()
+
+
+def current_context() -> Optional[Dict[str, str]]:
+    """
+    Контекст для продолжения трассы от текущего спана (например, в воркере).
+
+    Returns:
+        dict с trace_id и span_id или None, если задача не трассируется
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return {"trace_id": trace.trace_id, "span_id": trace.current.span_id}
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Спан этапа внутри текущей трассы.
+
+    Без текущей трассы ничего не записывает. Исключение внутри блока
+    помечает спан ошибкой и пробрасывается дальше.
+
+    Пример:
+        with span("download", size=document.file_size):
+            file_data = await bot.download_file(file.file_path)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = trace._start_span(name, trace.current.span_id, attributes)
+    trace._stack.append(current)
+    try:
+        yield current
+    except BaseException:
+        current.end(error=True)
+        raise
+    finally:
+        current.end()
+        if trace._stack and trace._stack[-1] is current:
+            trace._stack.pop()
+        else:
+            # Спаны параллельных задач могут завершаться не по порядку
+            try:
+                trace._stack.remove(current)
+            except ValueError:
+                pass
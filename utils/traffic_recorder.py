@@ -0,0 +1,128 @@
+"""
+Обезличенная запись трафика для планирования мощностей.
+
+По каждой задаче пишется строка JSON: время поступления файла, входной
+формат, размер (с точностью до килобайта), выбранный формат, время
+выбора формата, время конвертации и результат. Содержимое файлов,
+имена и идентификаторы пользователей не записываются. Запись ведет
+фоновый поток, как экспорт трасс. По журналу benchmarks/replay_traffic.py
+воспроизводит нагрузку на локальном экземпляре бота.
+"""
+import json
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Результаты задач
+OUTCOME_OK = "ok"                # результат отправлен
+OUTCOME_FAILED = "failed"        # конвертация не удалась
+OUTCOME_ERROR = "error"          # непредвиденная ошибка
+OUTCOME_INVALID = "invalid"      # файл не прошел проверку
+OUTCOME_TOO_LARGE = "too_large"  # файл больше MAX_FILE_SIZE
+OUTCOME_EXPIRED = "expired"      # файл удален до выбора формата
+
+
+class TrafficRecorder:
+    """Запись событий трафика в JSONL фоновым потоком."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Файл журнала (дописывается)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+        self._writer.start()
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Ставит событие в очередь на запись (не блокирует)."""
+        self._queue.put(event)
+
+    def _write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    return
+                try:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except OSError as e:
+                    logger.error(f"Не удалось записать событие трафика: {e}")
+
+    def close(self) -> None:
+        """Дописывает очередь и останавливает поток."""
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+
+_recorder: Optional[TrafficRecorder] = None
+
+
+def configure_traffic_recorder(path: Optional[str]) -> None:
+    """Включает запись трафика (path=None - выключено)."""
+    global _recorder
+    if path and _recorder is None:
+        _recorder = TrafficRecorder(path)
+        logger.info(f"Запись трафика включена: {path}")
+
+
+def close_traffic_recorder() -> None:
+    """Дописывает журнал и останавливает фоновый поток."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def record_traffic(
+    arrival: float,
+    src: str,
+    size: int,
+    outcome: str,
+    dst: Optional[str] = None,
+    decision_seconds: Optional[float] = None,
+    conversion_seconds: Optional[float] = None
+) -> None:
+    """
+    Записывает задачу, если запись включена.
+
+    Args:
+        arrival: Unix-время поступления файла
+        src: Входной формат (расширение без точки)
+        size: Размер файла в байтах
+        outcome: Результат (OUTCOME_*)
+        dst: Выбранный формат
+        decision_seconds: Время от поступления файла до выбора формата
+        conversion_seconds: Время конвертации
+    """
+    if _recorder is None:
+        return
+    _recorder.record({
+        "arrival": round(arrival, 3),
+        "src": src.lstrip(".").lower() or "-",
+        "size_kb": max(1, round(size / 1024)),
+        "dst": dst,
+        "decision_seconds": None if decision_seconds is None else round(decision_seconds, 3),
+        "conversion_seconds": None if conversion_seconds is None else round(conversion_seconds, 3),
+        "outcome": outcome,
+    })
+
+
+def load_traffic(path: str) -> list:
+    """Читает журнал трафика, упорядоченный по времени поступления."""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    events.sort(key=lambda event: event["arrival"])
+    return events
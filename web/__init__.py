@@ -0,0 +1 @@
+# Web package
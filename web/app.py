@@ -0,0 +1,51 @@
+"""
+Общее aiohttp-приложение бота.
+
+Одно приложение обслуживает вебхук Telegram и служебные эндпоинты,
+поэтому несколько экземпляров бота можно поставить за балансировщик.
+"""
+import logging
+from typing import Iterable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def create_web_app() -> web.Application:
+    """
+    Создает aiohttp-приложение без маршрутов.
+
+    Маршруты регистрируют модули, которым они нужны (вебхук, мониторинг).
+
+    Returns:
+        web.Application: Пустое приложение
+    """
+    return web.Application()
+
+
+async def start_web_server(
+    app: web.Application,
+    ports: Iterable[int],
+    host: str = "0.0.0.0"
+) -> web.AppRunner:
+    """
+    Запускает приложение на одном или нескольких портах.
+
+    Args:
+        app: aiohttp-приложение
+        ports: Порты для прослушивания (одинаковые объединяются)
+        host: Адрес для прослушивания
+
+    Returns:
+        web.AppRunner: Запущенный runner (для остановки вызвать cleanup())
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    for port in sorted(set(ports)):
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logger.info(f"HTTP-сервер слушает {host}:{port}")
+
+    return runner
@@ -0,0 +1,64 @@
+"""
+Служебные эндпоинты мониторинга.
+"""
+import asyncio
+from typing import Optional
+
+from aiohttp import web
+
+from utils.health import HealthMonitor
+from utils.metrics import REGISTRY
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HEALTH_KEY = web.AppKey("health", HealthMonitor)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """
+    Отдает метрики в формате Prometheus.
+
+    Метрики-функции (объем временных файлов, глубина очереди задач)
+    могут обращаться к диску, поэтому рендер выполняется в потоке.
+    """
+    body = await asyncio.to_thread(REGISTRY.render)
+    return web.Response(body=body.encode(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+async def handle_live(request: web.Request) -> web.Response:
+    """
+    Liveness: процесс отвечает и event loop не завис.
+
+    Возвращает 503, если задержка event loop на порядок выше допустимой.
+    """
+    health = request.app[HEALTH_KEY]
+    live = health.live()
+    return web.json_response(
+        {"live": live, "loop_lag_seconds": round(health.loop_lag, 6)},
+        status=200 if live else 503
+    )
+
+
+async def handle_ready(request: web.Request) -> web.Response:
+    """
+    Readiness: бот может принимать и конвертировать файлы.
+
+    Отчет собирается из закешированных значений HealthMonitor.
+    """
+    report = request.app[HEALTH_KEY].report()
+    return web.json_response(report, status=200 if report["ready"] else 503)
+
+
+def register_monitoring_routes(app: web.Application, health: Optional[HealthMonitor] = None) -> None:
+    """
+    Регистрирует эндпоинты мониторинга в приложении.
+
+    Args:
+        app: aiohttp-приложение
+        health: Монитор состояния для /health/live и /health/ready
+    """
+    app.router.add_get("/metrics", handle_metrics)
+    if health is not None:
+        app[HEALTH_KEY] = health
+        app.router.add_get("/health/live", handle_live)
+        app.router.add_get("/health/ready", handle_ready)
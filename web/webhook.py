@@ -0,0 +1,113 @@
+"""
+Прием обновлений Telegram через вебхук.
+"""
+import asyncio
+import hmac
+import logging
+from typing import Callable, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """
+    Обработчик вебхука с фоновой обработкой обновлений.
+
+    Проверяет секретный токен, сразу отвечает Telegram 200 OK и обрабатывает
+    обновление в фоновой задаче. Одновременно обрабатывается не больше
+    max_concurrent обновлений, остальные ждут своей очереди.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str,
+        max_concurrent: int = 32,
+        on_update: Optional[Callable[[], None]] = None
+    ):
+        """
+        Инициализация обработчика.
+
+        Args:
+            dispatcher: Диспетчер aiogram
+            bot: Экземпляр бота
+            secret_token: Секрет, переданный Telegram в set_webhook
+            max_concurrent: Максимум одновременно обрабатываемых обновлений
+            on_update: Вызывается при каждом принятом обновлении (мониторинг)
+        """
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.on_update = on_update
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        """Количество принятых, но еще не обработанных обновлений."""
+        return len(self._tasks)
+
+    def register(self, app: web.Application, path: str) -> None:
+        """
+        Регистрирует маршрут вебхука в приложении.
+
+        Args:
+            app: aiohttp-приложение
+            path: Путь вебхука
+        """
+        app.router.add_post(path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Принимает обновление от Telegram.
+
+        Args:
+            request: HTTP-запрос
+
+        Returns:
+            web.Response: 200 сразу после постановки обновления в обработку
+        """
+        received = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            logger.warning(f"Вебхук: неверный секретный токен от {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        if self.on_update is not None:
+            self.on_update()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: dict) -> None:
+        """Обрабатывает обновление с учетом лимита параллельности."""
+        async with self._semaphore:
+            try:
+                await self.dispatcher.feed_raw_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    async def close(self, timeout: float = 30) -> None:
+        """
+        Дожидается завершения фоновых обработок при остановке.
+
+        Args:
+            timeout: Максимальное время ожидания в секундах
+        """
+        if not self._tasks:
+            return
+        logger.info(f"Ожидание завершения {len(self._tasks)} обновлений...")
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,85 @@
+"""
+Воркер конвертации: забирает задачи из очереди и запускает BookConverter.
+
+Несколько воркеров (в том числе на разных узлах) могут работать с одной
+очередью. Исходные файлы должны лежать на общем для бота и воркеров томе
+(TEMP_DIR), результат сохраняется рядом с исходником.
+
+Запуск:
+    JOB_QUEUE_URL=sqlite:///data/jobs.db python worker.py --concurrency 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from config import (
+    JOB_QUEUE_URL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, ERROR_DB_PATH,
+    TRACE_DIR, TRACE_SAMPLE_RATE, COST_DB_PATH, LOG_LEVEL, LOG_JSON
+)
+from converter.child_usage import close_cost_ledger, configure_cost_ledger
+from jobs.queue import create_job_queue
+from jobs.worker import Worker
+from services import close_converter, create_converter
+from utils.error_manager import error_manager
+from utils.logging_setup import setup_logging, stop_logging
+from utils.tracing import configure_tracing, shutdown_tracing
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    """
+    Запуск воркера до получения SIGINT/SIGTERM.
+    """
+    parser = argparse.ArgumentParser(description="Воркер конвертации книг")
+    parser.add_argument("--queue-url", default=JOB_QUEUE_URL, help="URL очереди задач")
+    parser.add_argument("--concurrency", type=int, default=1, help="одновременных конвертаций")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    if not args.queue_url:
+        logger.error("JOB_QUEUE_URL не задан")
+        return
+
+    # Ошибки конвертации на воркере сохраняются для поиска по ERR-ID
+    error_manager.attach_store(ERROR_DB_PATH)
+    # Воркер продолжает трассы, начатые ботом (решение о выборке принимает бот)
+    configure_tracing(TRACE_DIR, TRACE_SAMPLE_RATE)
+    configure_cost_ledger(COST_DB_PATH)
+    job_queue = create_job_queue(args.queue_url, max_attempts=JOB_MAX_ATTEMPTS)
+    converter = create_converter()
+    worker = Worker(
+        job_queue,
+        converter,
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        lease_seconds=JOB_LEASE_SECONDS
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await worker.run()
+    finally:
+        job_queue.close()
+        error_manager.close()
+        shutdown_tracing()
+        close_cost_ledger()
+        close_converter(converter)
+
+
+if __name__ == "__main__":
+    # Воркеры обычно работают под supervisor/systemd, которые собирают stderr
+    setup_logging(LOG_LEVEL, json_format=LOG_JSON)
+    try:
+        asyncio.run(main())
+    finally:
+        stop_logging()